@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+K8s MCP 后端基准测试
+
+在本地启动一个桩 Kubernetes API Server（HTTP/1.1 keep-alive，返回 N 个 Pod），
+通过 MCP 工具 kubectl_get_pods 对比每秒调用数：
+- kubectl：每次调用 fork 一个 kubectl 进程（未安装 kubectl 时跳过）
+- 原生客户端（每次新建）：每次调用重新解析 kubeconfig、新建连接
+- 原生客户端（共享）：K8sClientManager 复用同一个 ApiClient 和连接池，分顺序和并发两种
+
+用法：
+    python scripts/bench_k8s_client.py [--calls 300] [--concurrency 20] [--pods 50]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sre_nanobot.mcp import k8s_server
+from sre_nanobot.mcp.k8s_client import K8sClientConfig, K8sClientManager
+
+
+# ─────────────────────────────────────────────────────────────
+# 桩 API Server
+# ─────────────────────────────────────────────────────────────
+
+DISCOVERY = {
+    "/api": {"kind": "APIVersions", "versions": ["v1"],
+             "serverAddressByClientCIDRs": [{"clientCIDR": "0.0.0.0/0", "serverAddress": "127.0.0.1"}]},
+    "/apis": {"kind": "APIGroupList", "apiVersion": "v1", "groups": []},
+    "/api/v1": {"kind": "APIResourceList", "groupVersion": "v1", "resources": [
+        {"name": "pods", "singularName": "pod", "namespaced": True, "kind": "Pod",
+         "verbs": ["get", "list", "watch"], "shortNames": ["po"]},
+    ]},
+}
+
+
+def build_pod_list(pods: int) -> bytes:
+    items = [{
+        "metadata": {"name": f"web-{i}", "namespace": "default", "labels": {"app": "web"},
+                     "creationTimestamp": "2024-01-10T00:00:00Z"},
+        "spec": {"nodeName": f"node-{i % 5}", "containers": [{"name": "app", "image": "web:1.0"}]},
+        "status": {"phase": "Running", "containerStatuses": [
+            {"name": "app", "ready": True, "restartCount": i % 3, "state": {"running": {}}}]},
+    } for i in range(pods)]
+    return json.dumps({"kind": "PodList", "apiVersion": "v1", "metadata": {}, "items": items}).encode()
+
+
+async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, pod_list: bytes):
+    """处理一个连接上的多个 keep-alive 请求"""
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            path = head.split(b" ", 2)[1].decode().split("?")[0]
+            body = json.dumps(DISCOVERY[path]).encode() if path in DISCOVERY else pod_list
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: application/json\r\n"
+                b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body
+            )
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionResetError):
+        pass
+    finally:
+        writer.close()
+
+
+def serve_stub(port_queue: multiprocessing.Queue, pods: int):
+    """在独立进程中运行桩服务器，避免与被测客户端争用同一个 GIL"""
+    pod_list = build_pod_list(pods)
+
+    async def serve():
+        server = await asyncio.start_server(
+            lambda r, w: handle_connection(r, w, pod_list), "127.0.0.1", 0
+        )
+        port_queue.put(server.sockets[0].getsockname()[1])
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+def write_kubeconfig(directory: str, port: int) -> str:
+    path = Path(directory) / "config"
+    path.write_text(json.dumps({
+        "apiVersion": "v1", "kind": "Config", "current-context": "bench",
+        "clusters": [{"name": "bench", "cluster": {"server": f"http://127.0.0.1:{port}"}}],
+        "users": [{"name": "bench", "user": {"token": "bench"}}],
+        "contexts": [{"name": "bench", "context": {"cluster": "bench", "user": "bench", "namespace": "default"}}],
+    }))
+    return str(path)
+
+
+# ─────────────────────────────────────────────────────────────
+# 测量
+# ─────────────────────────────────────────────────────────────
+
+async def get_pods() -> None:
+    text = (await k8s_server.call_tool("kubectl_get_pods", {"namespace": "default"}))[0].text
+    if "❌" in text:
+        raise RuntimeError(text)
+
+
+async def run_sequential(calls: int, fresh_client=None) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        if fresh_client is not None:
+            k8s_server.k8s_client = fresh_client()
+        await get_pods()
+        if fresh_client is not None:
+            k8s_server.k8s_client.close()
+    return calls / (time.perf_counter() - start)
+
+
+async def run_concurrent(calls: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await get_pods()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(calls)))
+    return calls / (time.perf_counter() - start)
+
+
+async def bench(kubeconfig: str, calls: int, concurrency: int):
+    results = []
+
+    if shutil.which("kubectl"):
+        os.environ["KUBECONFIG"] = kubeconfig
+        k8s_server.k8s_client = K8sClientManager(K8sClientConfig(backend="kubectl"))
+        kubectl_calls = max(10, calls // 10)
+        results.append(("kubectl（每次 fork）", await run_sequential(kubectl_calls)))
+    else:
+        print("未找到 kubectl，跳过 kubectl 后端")
+
+    config = K8sClientConfig(backend="native", kubeconfig=kubeconfig, pool_size=concurrency)
+    results.append(("原生客户端（每次新建）", await run_sequential(calls, lambda: K8sClientManager(config))))
+
+    k8s_server.k8s_client = K8sClientManager(config)
+    await get_pods()   # 预热：加载配置、建立连接
+    results.append(("原生客户端（共享，顺序）", await run_sequential(calls)))
+    results.append((f"原生客户端（共享，并发 {concurrency}）", await run_concurrent(calls, concurrency)))
+    k8s_server.k8s_client.close()
+    return results
+
+
+def main(calls: int, concurrency: int, pods: int):
+    port_queue = multiprocessing.Queue()
+    stub = multiprocessing.Process(target=serve_stub, args=(port_queue, pods), daemon=True)
+    stub.start()
+    port = port_queue.get(timeout=10)
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            kubeconfig = write_kubeconfig(directory, port)
+            print(f"桩 API Server：127.0.0.1:{port}，每次返回 {pods} 个 Pod，{calls} 次 kubectl_get_pods")
+            print("-" * 60)
+            results = asyncio.run(bench(kubeconfig, calls, concurrency))
+    finally:
+        stub.terminate()
+
+    baseline = results[0][1]
+    for name, rate in results:
+        print(f"{name:<28} {rate:10.1f} 次/秒  ({1000 / rate:7.2f} ms/次，{rate / baseline:5.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="K8s MCP 后端基准测试")
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--pods", type=int, default=50)
+    args = parser.parse_args()
+    main(args.calls, args.concurrency, args.pods)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+列式序列表示基准测试
+
+构造一个 N 条序列 × T 个点的 query_range 响应，对比：
+- 解码后的 JSON（[[ts, "value"], ...] 列表）+ 逐样本 Python 循环
+- SeriesMatrix（float64 连续数组）+ 向量化统计
+
+输出内存占用（RSS 增量）和统计计算耗时。
+
+用法：
+    python scripts/bench_prom_series.py [--series 5000] [--points 2000]
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sre_nanobot.mcp.prom_series import SeriesMatrix
+
+
+def rss_bytes() -> int:
+    """当前进程常驻内存"""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def build_body(series: int, points: int, start: int = 1700000000, step: int = 15) -> bytes:
+    """生成 query_range 响应体"""
+    timestamps = [start + i * step for i in range(points)]
+    parts = []
+    for s in range(series):
+        metric = json.dumps({"__name__": "container_cpu_usage_seconds_total",
+                             "namespace": f"ns-{s % 20}", "pod": f"pod-{s}"})
+        values = ",".join(f'[{ts},"{(s * 7 + i) % 1000 / 10}"]' for i, ts in enumerate(timestamps))
+        parts.append(f'{{"metric":{metric},"values":[{values}]}}')
+    return ('{"status":"success","data":{"resultType":"matrix","result":['
+            + ",".join(parts) + "]}}").encode()
+
+
+def python_summary(result: list) -> list[tuple]:
+    """旧方式：逐样本循环计算 min/max/avg/last"""
+    stats = []
+    for item in result:
+        lo, hi, total, last = float("inf"), float("-inf"), 0.0, None
+        for _, raw in item["values"]:
+            value = float(raw)
+            lo = min(lo, value)
+            hi = max(hi, value)
+            total += value
+            last = value
+        stats.append((lo, hi, total / max(len(item["values"]), 1), last))
+    return stats
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main(series: int, points: int):
+    samples = series * points
+    print(f"构造响应：{series} 条序列 × {points} 点 = {samples:,} 个样本")
+    body = build_body(series, points)
+    print(f"响应体：{len(body) / 1e6:.1f} MB")
+    print("-" * 72)
+
+    gc.collect()
+    base = rss_bytes()
+    data, decode_time = timed(json.loads, body)
+    result = data["data"]["result"]
+    gc.collect()
+    json_rss = rss_bytes() - base
+    print(f"json.loads                 {decode_time:8.2f}s  RSS +{json_rss / 1e6:8.1f} MB "
+          f"({json_rss / samples:5.1f} B/样本)")
+
+    _, loop_time = timed(python_summary, result)
+    print(f"逐样本循环统计             {loop_time:8.2f}s  {samples / loop_time / 1e6:8.2f} M样本/s")
+
+    gc.collect()
+    base = rss_bytes()
+    matrix, build_time = timed(SeriesMatrix.from_result, result)
+    gc.collect()
+    matrix_rss = rss_bytes() - base
+    print(f"构建 SeriesMatrix          {build_time:8.2f}s  RSS +{matrix_rss / 1e6:8.1f} MB "
+          f"(数组 {matrix.nbytes / 1e6:.1f} MB, {matrix.nbytes / samples:4.1f} B/样本)")
+
+    _, vector_time = timed(matrix.summary)
+    print(f"向量化统计                 {vector_time:8.2f}s  {samples / vector_time / 1e6:8.2f} M样本/s")
+    print("-" * 72)
+    print(f"内存：JSON 列表 {json_rss / 1e6:.1f} MB → 列式数组 {matrix.nbytes / 1e6:.1f} MB "
+          f"（{json_rss / max(matrix.nbytes, 1):.1f}x）")
+    print(f"统计吞吐：{loop_time / vector_time:.1f}x（不含一次性解码 {build_time:.2f}s）")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="列式序列表示基准测试")
+    parser.add_argument("--series", type=int, default=5000)
+    parser.add_argument("--points", type=int, default=2000)
+    args = parser.parse_args()
+    main(args.series, args.points)
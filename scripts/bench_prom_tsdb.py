@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+故障窗口本地存储基准测试
+
+构造一个 N 条序列 × T 个点的 query_range 响应（计数器、一位小数的仪表值、常量各占一部分），对比：
+- 原始 JSON：存储大小，json.loads + 逐样本 float 转换的扫描耗时
+- MiniTSDB block：压缩后大小，mmap 打开 + 解压全部序列的扫描耗时
+
+用法：
+    python scripts/bench_prom_tsdb.py [--series 2000] [--points 1000]
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sre_nanobot.mcp.prom_series import format_value, parse_matrix
+from sre_nanobot.mcp.prom_tsdb import MiniTSDB, TSDBConfig
+
+
+def build_body(series: int, points: int, start: int = 1700000000, step: int = 15) -> bytes:
+    """生成 query_range 响应体"""
+    rng = np.random.default_rng(0)
+    timestamps = [start + i * step for i in range(points)]
+    parts = []
+    for s in range(series):
+        kind = s % 3
+        if kind == 0:
+            values = np.cumsum(rng.integers(0, 50, points)).astype(float)    # 计数器
+        elif kind == 1:
+            values = np.round(rng.normal(50, 5, points), 1)                  # 仪表值
+        else:
+            values = np.full(points, float(s % 2))                           # 常量（如 up）
+        metric = json.dumps({"__name__": "metric", "namespace": f"ns-{s % 20}", "pod": f"pod-{s}"})
+        samples = ",".join(f'[{ts},"{format_value(v)}"]' for ts, v in zip(timestamps, values))
+        parts.append(f'{{"metric":{metric},"values":[{samples}]}}')
+    return ('{"status":"success","data":{"resultType":"matrix","result":['
+            + ",".join(parts) + "]}}").encode()
+
+
+def scan_json(body: bytes) -> float:
+    """解析 JSON 并把所有样本转换为 float"""
+    total = 0.0
+    for item in json.loads(body)["data"]["result"]:
+        for _, raw in item["values"]:
+            total += float(raw)
+    return total
+
+
+def scan_block(tsdb: MiniTSDB, name: str) -> float:
+    """打开 block 并解压全部序列"""
+    tsdb.close()
+    return float(sum(np.nansum(series.values) for series in tsdb.select(name)))
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main(series: int, points: int):
+    samples = series * points
+    print(f"构造响应：{series} 条序列 × {points} 点 = {samples:,} 个样本")
+    body = build_body(series, points)
+    columns = parse_matrix(json.loads(body)["data"]["result"])
+    print("-" * 72)
+
+    with tempfile.TemporaryDirectory() as root:
+        tsdb = MiniTSDB(TSDBConfig(path=root))
+        info, write_time = timed(tsdb.write_block, "bench", [(item, "metric") for item in columns])
+        stored = info["bytes"] + (Path(root) / "bench" / "index.json").stat().st_size
+
+        json_total, json_time = timed(scan_json, body)
+        block_total, block_time = timed(scan_block, tsdb, "bench")
+        tsdb.close()
+
+    assert abs(json_total - block_total) <= 1e-6 * abs(json_total)
+    print(f"原始 JSON        {len(body) / 1e6:8.2f} MB  ({len(body) / samples:5.2f} B/样本)  "
+          f"扫描 {json_time:6.2f}s  {samples / json_time / 1e6:6.2f} M样本/s")
+    print(f"float64 数组     {samples * 16 / 1e6:8.2f} MB  (16.00 B/样本)")
+    print(f"MiniTSDB block   {stored / 1e6:8.2f} MB  ({stored / samples:5.2f} B/样本)  "
+          f"扫描 {block_time:6.2f}s  {samples / block_time / 1e6:6.2f} M样本/s")
+    print(f"写入耗时         {write_time:8.2f}s")
+    print("-" * 72)
+    print(f"压缩比：JSON {len(body) / stored:.1f}x，float64 {samples * 16 / stored:.1f}x；"
+          f"扫描速度：{json_time / block_time:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="故障窗口本地存储基准测试")
+    parser.add_argument("--series", type=int, default=2000)
+    parser.add_argument("--points", type=int, default=1000)
+    args = parser.parse_args()
+    main(args.series, args.points)
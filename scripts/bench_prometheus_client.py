@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Prometheus 客户端基准测试
+
+在本地启动一个桩 Prometheus（HTTP/1.1 keep-alive），对比：
+- 每次调用新建 httpx.AsyncClient（旧实现）
+- 共享连接池 PrometheusClientManager（新实现）
+
+分别测量 1000 次顺序查询与并发查询的 p50/p99 延迟。
+
+用法：
+    python scripts/bench_prometheus_client.py [--requests 1000] [--concurrency 50]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sre_nanobot.mcp.prom_client import ClientConfig, PrometheusClientManager
+
+
+STUB_BODY = json.dumps({
+    "status": "success",
+    "data": {
+        "resultType": "vector",
+        "result": [
+            {"metric": {"__name__": "up", "job": "node", "instance": f"node-{i}:9100"},
+             "value": [1700000000.0, "1"]}
+            for i in range(10)
+        ]
+    }
+}).encode()
+
+
+# ─────────────────────────────────────────────────────────────
+# 桩 Prometheus
+# ─────────────────────────────────────────────────────────────
+
+async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """处理一个连接上的多个 keep-alive 请求"""
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            keep_alive = b"connection: close" not in head.lower()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: application/json\r\n"
+                b"Content-Length: " + str(len(STUB_BODY)).encode() + b"\r\n"
+                + (b"" if keep_alive else b"Connection: close\r\n")
+                + b"\r\n" + STUB_BODY
+            )
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionResetError):
+        pass
+    finally:
+        writer.close()
+
+
+def serve_stub(port_queue: multiprocessing.Queue):
+    """在独立进程中运行桩服务器，避免与被测客户端争用同一个事件循环"""
+    async def serve():
+        server = await asyncio.start_server(handle_connection, "127.0.0.1", 0)
+        port_queue.put(server.sockets[0].getsockname()[1])
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+def start_stub() -> tuple[multiprocessing.Process, str]:
+    """启动桩服务器进程，返回 (process, base_url)"""
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve_stub, args=(port_queue,), daemon=True)
+    process.start()
+    return process, f"http://127.0.0.1:{port_queue.get(timeout=10)}"
+
+
+# ─────────────────────────────────────────────────────────────
+# 客户端实现
+# ─────────────────────────────────────────────────────────────
+
+async def legacy_query(url: str, _manager=None):
+    """旧实现：每次调用新建客户端"""
+    async with httpx.AsyncClient() as client:
+        response = await client.get(url, params={"query": "up"}, timeout=30.0)
+        response.raise_for_status()
+        return response.json()
+
+
+async def pooled_query(url: str, manager: PrometheusClientManager):
+    """新实现：复用共享连接池"""
+    response = await manager.get(url, params={"query": "up"})
+    response.raise_for_status()
+    return response.json()
+
+
+async def timed(fn, url, manager) -> float:
+    start = time.perf_counter()
+    await fn(url, manager)
+    return (time.perf_counter() - start) * 1000
+
+
+async def run_sequential(fn, url, manager, n: int) -> list[float]:
+    return [await timed(fn, url, manager) for _ in range(n)]
+
+
+async def run_concurrent(fn, url, manager, n: int, concurrency: int) -> list[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            return await timed(fn, url, manager)
+
+    return await asyncio.gather(*(one() for _ in range(n)))
+
+
+def percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def report(label: str, samples: list[float], wall: float):
+    print(f"{label:<28} p50={percentile(samples, 0.50):7.2f}ms  "
+          f"p99={percentile(samples, 0.99):7.2f}ms  "
+          f"mean={statistics.mean(samples):7.2f}ms  "
+          f"qps={len(samples) / wall:8.1f}")
+
+
+async def main(requests: int, concurrency: int, base_url: str):
+    url = f"{base_url}/api/v1/query"
+    manager = PrometheusClientManager(ClientConfig(max_connections=concurrency,
+                                                   max_keepalive_connections=concurrency))
+
+    print(f"桩 Prometheus: {base_url}  请求数={requests}  并发={concurrency}")
+    print("-" * 80)
+    try:
+        for mode in ("sequential", "concurrent"):
+            for label, fn in (("legacy (client per call)", legacy_query),
+                              ("pooled (shared client)", pooled_query)):
+                start = time.perf_counter()
+                if mode == "sequential":
+                    samples = await run_sequential(fn, url, manager, requests)
+                else:
+                    samples = await run_concurrent(fn, url, manager, requests, concurrency)
+                report(f"{mode:<10} {label}", samples, time.perf_counter() - start)
+            print("-" * 80)
+        print(f"连接池统计：{manager.stats()}")
+    finally:
+        await manager.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prometheus 客户端基准测试")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    stub, stub_url = start_stub()
+    try:
+        asyncio.run(main(args.requests, args.concurrency, stub_url))
+    finally:
+        stub.terminate()
@@ -5,7 +5,9 @@ SRE 故障分析技能
 """
 
 import asyncio
+import re
 from datetime import datetime, timedelta
+from string import Template
 from typing import Dict, Any, List, Optional
 from skills.base import BaseSkill
 import logging
@@ -132,7 +134,7 @@ class SREIncidentAnalyzer(BaseSkill):
         data = {
             "incident_id": incident_id,
             "alerts": alerts[:depth_config["max_alerts"]],
-            "metrics": await self.fetch_metrics(start_time, end_time),
+            "metrics": await self.fetch_metrics(start_time, end_time, incident_id),
             "logs": await self.fetch_logs(start_time, end_time),
             "changes": await self.fetch_changes(start_time, end_time),
             "time_range": {
@@ -144,10 +146,80 @@ class SREIncidentAnalyzer(BaseSkill):
         self.logger.info(f"收集完成：{len(data['alerts'])} 告警，{len(data['metrics'])} 指标")
         return data
     
-    async def fetch_metrics(self, start_time: datetime, end_time: datetime) -> List[Dict]:
-        """获取指标数据"""
-        # TODO: 从 Prometheus 获取
-        return []
+    async def fetch_metrics(self, start_time: datetime, end_time: datetime,
+                            incident_id: Optional[str] = None) -> List[Dict]:
+        """
+        获取异常指标
+        
+        对配置的每个范围查询做异常与变点检测，只返回异常序列
+        （metrics.queries 未配置时使用 Prometheus MCP 的预定义资源查询）。
+        该故障已冻结到本地时直接读取冻结的数据；否则查询 Prometheus，
+        并在 metrics.freeze 开启时把原始序列冻结下来，供重新分析和复盘使用
+        """
+        metrics_config = self.get_config('metrics', {}) or {}
+        if not metrics_config.get('enabled', True):
+            return []
+        
+        try:
+            from sre_nanobot.mcp import prometheus_server as prom
+            from sre_nanobot.mcp.prom_anomaly import detect_anomalies
+            from sre_nanobot.mcp.prom_series import parse_matrix
+            from sre_nanobot.mcp.prom_time import parse_duration
+            from sre_nanobot.mcp.prom_tsdb import mini_tsdb
+        except ImportError as e:
+            self.logger.warning(f"Prometheus MCP 不可用，跳过指标检测：{e}")
+            return []
+        
+        queries = metrics_config.get('queries') or [
+            {"name": "node_cpu", "query": prom.NODE_CPU_QUERY},
+            {"name": "node_memory", "query": prom.NODE_MEMORY_QUERY},
+            {"name": "pod_cpu", "query": prom.POD_CPU_QUERY},
+            {"name": "service_error_rate", "query": prom.SERVICE_ERROR_RATE_QUERY},
+        ]
+        step = metrics_config.get('step', '1m')
+        top = metrics_config.get('top', 5)
+        # 窗口名只允许字母、数字、_ . -
+        block = re.sub(r'[^A-Za-z0-9_.-]', '_', incident_id or '').lstrip('_.-')
+        freeze = bool(block) and metrics_config.get('freeze', True)
+        frozen = freeze and mini_tsdb.has_block(block)
+        
+        async def load(item: Dict) -> list:
+            if frozen:
+                return mini_tsdb.select(block, query=item['query'],
+                                        start=start_time.timestamp(), end=end_time.timestamp())
+            data = await prom.prometheus_query_range(
+                item['query'], str(start_time.timestamp()), str(end_time.timestamp()), step
+            )
+            return parse_matrix(data.get('result', []))
+        
+        results = await asyncio.gather(*(load(item) for item in queries), return_exceptions=True)
+        
+        metrics = []
+        loaded = []
+        for item, result in zip(queries, results):
+            if isinstance(result, Exception):
+                self.logger.warning(f"指标 {item['name']} 获取失败：{result}")
+                continue
+            loaded.extend((series, item['query']) for series in result)
+            matrix = prom.SeriesMatrix.from_series(result)
+            metrics.extend(
+                {"name": item['name'], "query": item['query'], **finding.to_dict()}
+                for finding in detect_anomalies(matrix, limit=top)
+            )
+        
+        if freeze and not frozen and loaded:
+            try:
+                await asyncio.to_thread(mini_tsdb.write_block, block, loaded, {
+                    "start": start_time.timestamp(),
+                    "end": end_time.timestamp(),
+                    "step": parse_duration(step),
+                    "queries": [item['query'] for item in queries],
+                })
+            except OSError as e:
+                self.logger.warning(f"冻结故障窗口 {block} 失败：{e}")
+        
+        metrics.sort(key=lambda m: m['score'], reverse=True)
+        return metrics
     
     async def fetch_logs(self, start_time: datetime, end_time: datetime) -> List[Dict]:
         """获取日志数据"""
@@ -185,9 +257,77 @@ class SREIncidentAnalyzer(BaseSkill):
                         "confidence": 0.8
                     })
         
+        # 基于指标联动的关联（根因线索）
+        correlations.extend(await self.correlate_metrics(data))
+        
         self.logger.info(f"发现 {len(correlations)} 个关联关系")
         return correlations
     
+    async def correlate_metrics(self, data: Dict[str, Any]) -> List[Dict]:
+        """
+        指标联动分析
+        
+        以每个告警服务的锚点指标（默认错误率）为基准，计算候选指标序列在故障时间窗口内的
+        相关性和领先/滞后，|r| 不低于 min_confidence 的序列作为关联返回
+        """
+        correlation_config = self.get_config('correlation', {}) or {}
+        if not correlation_config.get('enabled', True) or not correlation_config.get('metrics_enabled', True):
+            return []
+        
+        services = sorted({alert['service'] for alert in data.get('alerts', []) if alert.get('service')})
+        time_range = data.get('time_range', {})
+        anchor_template = correlation_config.get('anchor_query')
+        if not services or not anchor_template or 'start' not in time_range:
+            return []
+        
+        try:
+            from sre_nanobot.mcp import prometheus_server as prom
+            from sre_nanobot.mcp.prom_correlate import nearest_lag
+            from sre_nanobot.mcp.prom_time import parse_duration
+        except ImportError as e:
+            self.logger.warning(f"Prometheus MCP 不可用，跳过指标关联：{e}")
+            return []
+        
+        candidates = correlation_config.get('candidate_queries') or [
+            prom.NODE_CPU_QUERY, prom.NODE_MEMORY_QUERY, prom.POD_CPU_QUERY, prom.POD_MEMORY_QUERY
+        ]
+        step = correlation_config.get('step', '1m')
+        max_lag = nearest_lag(parse_duration(correlation_config.get('max_lag') or 0, allow_zero=True),
+                              parse_duration(step))
+        min_abs = correlation_config.get('min_confidence', 0.6)
+        top = correlation_config.get('top', 10)
+        start = str(datetime.fromisoformat(time_range['start']).timestamp())
+        end = str(datetime.fromisoformat(time_range['end']).timestamp())
+        
+        async def run(service: str) -> List[Dict]:
+            anchor = Template(anchor_template).safe_substitute(service=service)
+            items, sources = await prom.correlate_queries(
+                anchor, candidates, start, end, step,
+                method=correlation_config.get('method', 'pearson'), max_lag=max_lag
+            )
+            return [
+                {
+                    "service": service,
+                    "metric": item.metric,
+                    "query": sources[item.row],
+                    "type": "metric",
+                    "coefficient": round(item.best, 4),
+                    "lag_seconds": item.lag_seconds,
+                    "confidence": round(abs(item.best), 4)
+                }
+                for item in items if abs(item.best) >= min_abs
+            ][:top]
+        
+        results = await asyncio.gather(*(run(service) for service in services), return_exceptions=True)
+        
+        correlations = []
+        for service, result in zip(services, results):
+            if isinstance(result, Exception):
+                self.logger.warning(f"服务 {service} 指标关联失败：{result}")
+                continue
+            correlations.extend(result)
+        return correlations
+    
     def are_related(self, alert1: Dict, alert2: Dict) -> bool:
         """判断两个告警是否相关"""
         # 同一服务
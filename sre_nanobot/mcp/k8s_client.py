@@ -0,0 +1,227 @@
+"""
+Kubernetes API 客户端管理
+
+为 K8s MCP Server 提供进程内共享、长连接复用的原生 API 客户端，代替每次调用 fork 一个 kubectl：
+- kubeconfig（或 in-cluster 配置）只在首次调用时解析一次，之后复用同一个 ApiClient 和 urllib3 连接池
+- 请求以 _preload_content=False 发送，直接解析 JSON 为 dict，跳过 kubernetes 模型对象的反序列化
+- kubernetes 包不可用或配置加载失败时，auto 模式回退到 kubectl
+"""
+
+import asyncio
+import inspect
+import json
+import logging
+import os
+from dataclasses import dataclass, asdict
+from typing import Any, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("auto", "native", "kubectl")
+
+
+# ─────────────────────────────────────────────────────────────
+# 配置
+# ─────────────────────────────────────────────────────────────
+
+@dataclass
+class K8sClientConfig:
+    """原生客户端配置"""
+    backend: str = "auto"              # auto: 优先原生客户端，不可用时回退 kubectl
+    pool_size: int = 20                # urllib3 连接池大小（并发请求数）
+    timeout: float = 30.0              # 单次请求超时（秒）
+    kubeconfig: Optional[str] = None   # 为空时使用 KUBECONFIG 或 ~/.kube/config
+    context: Optional[str] = None      # 为空时使用 current-context
+
+    @classmethod
+    def from_env(cls) -> "K8sClientConfig":
+        """从环境变量读取配置（K8S_*），未设置时使用默认值"""
+        default = cls()
+        return cls(
+            backend=os.getenv("K8S_BACKEND", default.backend).lower(),
+            pool_size=int(os.getenv("K8S_POOL_SIZE", default.pool_size)),
+            timeout=float(os.getenv("K8S_TIMEOUT", default.timeout)),
+            kubeconfig=os.getenv("K8S_KUBECONFIG") or None,
+            context=os.getenv("K8S_CONTEXT") or None,
+        )
+
+
+class ApiError(Exception):
+    """Kubernetes API 返回的错误，status 为 HTTP 状态码（例如 watch 的 410 Gone）"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"Kubernetes API 失败（{status}）：{message}")
+        self.status = status
+
+
+def _api_error(e: Exception) -> ApiError:
+    """把 ApiException 转换为带 Kubernetes 错误信息和状态码的异常"""
+    message = getattr(e, "reason", None) or str(e)
+    try:
+        message = json.loads(e.body).get("message", message)
+    except (AttributeError, TypeError, ValueError):
+        pass
+    return ApiError(e.status, message)
+
+
+# ─────────────────────────────────────────────────────────────
+# 客户端管理器
+# ─────────────────────────────────────────────────────────────
+
+class K8sClientManager:
+    """
+    管理共享的 kubernetes ApiClient
+
+    首次调用时惰性加载配置并创建客户端；加载失败的结果也会被记住，
+    auto 模式下之后的调用直接走 kubectl，不会反复尝试
+    """
+
+    def __init__(self, config: Optional[K8sClientConfig] = None):
+        self.config = config or K8sClientConfig()
+        if self.config.backend not in BACKENDS:
+            raise ValueError(f"不支持的 K8s 后端：{self.config.backend}，可选：{', '.join(BACKENDS)}")
+        self._client = None
+        self._apis: dict[str, Any] = {}
+        self.load_error: Optional[str] = None
+        self.clients_created = 0
+        self.requests_total = 0
+        self.errors = 0
+
+    def _create_client(self):
+        """按 kubeconfig（或 in-cluster 配置）创建 ApiClient"""
+        from kubernetes import client, config as kube_config
+
+        configuration = client.Configuration()
+        if os.getenv("KUBERNETES_SERVICE_HOST") and not self.config.kubeconfig:
+            kube_config.load_incluster_config(client_configuration=configuration)
+        else:
+            kube_config.load_kube_config(config_file=self.config.kubeconfig, context=self.config.context,
+                                         client_configuration=configuration, persist_config=False)
+        configuration.connection_pool_maxsize = self.config.pool_size
+        self.clients_created += 1
+        return client.ApiClient(configuration)
+
+    @property
+    def native(self) -> bool:
+        """
+        是否使用原生客户端
+
+        Raises:
+            Exception: backend 为 native 但客户端不可用
+        """
+        if self.config.backend == "kubectl":
+            return False
+        if self._client is None and self.load_error is None:
+            try:
+                self._client = self._create_client()
+            except Exception as e:
+                self.load_error = str(e) or repr(e)
+                logger.warning(f"原生 Kubernetes 客户端不可用，回退到 kubectl：{self.load_error}")
+        if self._client is None and self.config.backend == "native":
+            raise Exception(f"原生 Kubernetes 客户端不可用：{self.load_error}")
+        return self._client is not None
+
+    def api(self, name: str):
+        """按类名获取 API 对象（CoreV1Api、AppsV1Api、CustomObjectsApi 等），共享同一个 ApiClient"""
+        if name not in self._apis:
+            from kubernetes import client
+            self._apis[name] = getattr(client, name)(self._client)
+        return self._apis[name]
+
+    def call(self, api: str, method: str, *args, raw: bool = False,
+             content_type: Optional[str] = None, **kwargs) -> Any:
+        """
+        同步调用 API 方法（阻塞，在线程池或后台线程中使用）
+
+        Args:
+            api: API 类名，例如 CoreV1Api
+            method: 方法名，例如 list_namespaced_pod
+            raw: 返回原始文本（例如日志），否则解析为 JSON
+            content_type: 请求体类型（PATCH 使用）；旧版客户端没有 _content_type 参数，
+                会自动把 dict 请求体按 strategic-merge-patch 发送
+
+        Returns:
+            解析后的 JSON（dict）或文本
+        """
+        if not self.native:
+            raise Exception("原生 Kubernetes 客户端未启用")
+        function = getattr(self.api(api), method)
+        if content_type and "_content_type" in inspect.signature(function).parameters:
+            kwargs["_content_type"] = content_type
+        kwargs.setdefault("_request_timeout", self.config.timeout)
+
+        self.requests_total += 1
+        try:
+            data = function(*args, _preload_content=False, **kwargs).data
+        except Exception as e:
+            self.errors += 1
+            if getattr(e, "status", None):
+                raise _api_error(e) from e
+            raise
+        text = data.decode("utf-8", errors="replace")
+        return text if raw else json.loads(text)
+
+    async def request(self, api: str, method: str, *args, **kwargs) -> Any:
+        """在线程池中调用 API 方法，参数同 call()"""
+        if not self.native:
+            raise Exception("原生 Kubernetes 客户端未启用")
+        return await asyncio.to_thread(self.call, api, method, *args, **kwargs)
+
+    def watch(self, api: str, method: str, *args, timeout_seconds: int = 300, **kwargs) -> Iterator[dict]:
+        """
+        发起 watch 请求（阻塞直到响应头返回），返回逐条解析的 watch 事件
+
+        服务端在 timeout_seconds 后正常结束响应；读超时比它多留 30 秒余量
+        """
+        if not self.native:
+            raise Exception("原生 Kubernetes 客户端未启用")
+        function = getattr(self.api(api), method)
+        self.requests_total += 1
+        try:
+            response = function(*args, watch=True, timeout_seconds=timeout_seconds, _preload_content=False,
+                                _request_timeout=(self.config.timeout, timeout_seconds + 30), **kwargs)
+        except Exception as e:
+            self.errors += 1
+            if getattr(e, "status", None):
+                raise _api_error(e) from e
+            raise
+        return self._iter_events(response)
+
+    @staticmethod
+    def _iter_events(response) -> Iterator[dict]:
+        buffer = b""
+        try:
+            for chunk in response.stream(65536):
+                buffer += chunk
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    if line.strip():
+                        yield json.loads(line)
+            if buffer.strip():
+                yield json.loads(buffer)
+        finally:
+            response.release_conn()
+
+    def close(self) -> None:
+        """关闭客户端，下一次调用时重新加载配置"""
+        if self._client is not None:
+            self._client.close()
+        self._client = None
+        self._apis.clear()
+        self.load_error = None
+
+    def stats(self) -> dict:
+        """客户端统计"""
+        return {
+            "backend": "native" if self._client is not None else (
+                "kubectl" if self.config.backend == "kubectl" or self.load_error else "unloaded"),
+            "load_error": self.load_error,
+            "clients_created": self.clients_created,
+            "requests_total": self.requests_total,
+            "errors": self.errors,
+            "config": asdict(self.config),
+        }
+
+
+# 进程内共享的客户端管理器
+k8s_client = K8sClientManager(K8sClientConfig.from_env())
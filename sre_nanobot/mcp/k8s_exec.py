@@ -0,0 +1,226 @@
+"""
+kubectl 子进程执行器
+
+所有 kubectl 调用经由同一个执行器，避免 API Server 抖动时子进程堆积：
+- 并发进程数受信号量限制，排队超过 max_wait 直接拒绝，而不是无限 fork
+- 子进程在独立的进程组中启动；超时或调用被取消时先 SIGTERM 整个进程组，
+  kill_grace 秒后仍未退出则 SIGKILL，不会遗留挂起的 kubectl（及其 exec 凭据插件等子进程）
+- stdout 按块读取并增量解码，超过上限时终止进程并报错；stderr 只保留末尾。
+  表格、describe 等文本输出使用 max_output，-o json 全量对象和 logs 可由调用方按次放宽
+- 按动词（get、describe、logs、top……）统计调用数、失败、超时和延迟分位数，并记录排队深度
+"""
+
+import asyncio
+import codecs
+import logging
+import os
+import signal
+import time
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 65536
+STDERR_LIMIT = 65536      # stderr 保留的末尾字节数
+LATENCY_WINDOW = 256      # 每个动词保留最近多少次延迟用于计算分位数
+
+
+# ─────────────────────────────────────────────────────────────
+# 配置
+# ─────────────────────────────────────────────────────────────
+
+@dataclass
+class ExecConfig:
+    """kubectl 执行器配置"""
+    binary: str = "kubectl"
+    max_concurrency: int = 8              # 同时运行的 kubectl 进程数
+    max_wait: float = 30.0                # 排队等待上限（秒）
+    max_output: int = 64 * 1024 * 1024    # stdout 默认上限（字节），同时是单次调用的内存上限
+    max_bulk_output: int = 1024 * 1024 * 1024   # -o json 全量对象、logs 等大输出的上限（字节）
+    kill_grace: float = 2.0               # SIGTERM 后等待多久再 SIGKILL（秒）
+
+    @classmethod
+    def from_env(cls) -> "ExecConfig":
+        """从环境变量读取配置（K8S_KUBECTL_*），未设置时使用默认值"""
+        default = cls()
+        return cls(
+            binary=os.getenv("K8S_KUBECTL_BINARY", default.binary),
+            max_concurrency=int(os.getenv("K8S_KUBECTL_MAX_CONCURRENCY", default.max_concurrency)),
+            max_wait=float(os.getenv("K8S_KUBECTL_MAX_WAIT", default.max_wait)),
+            max_output=int(os.getenv("K8S_KUBECTL_MAX_OUTPUT", default.max_output)),
+            max_bulk_output=int(os.getenv("K8S_KUBECTL_MAX_BULK_OUTPUT", default.max_bulk_output)),
+            kill_grace=float(os.getenv("K8S_KUBECTL_KILL_GRACE", default.kill_grace)),
+        )
+
+
+class OutputTooLarge(Exception):
+    """stdout 超过 max_output"""
+
+
+# ─────────────────────────────────────────────────────────────
+# 统计
+# ─────────────────────────────────────────────────────────────
+
+class VerbStats:
+    """单个动词的调用统计"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.recent: deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, seconds: float, error: bool = False, timeout: bool = False) -> None:
+        self.calls += 1
+        self.errors += error
+        self.timeouts += timeout
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.recent.append(seconds)
+
+    def stats(self) -> dict:
+        recent = sorted(self.recent)
+        quantile = lambda q: round(recent[min(len(recent) - 1, int(q * len(recent)))], 4) if recent else None
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "avg_seconds": round(self.total_seconds / self.calls, 4) if self.calls else None,
+            "p50_seconds": quantile(0.5),
+            "p95_seconds": quantile(0.95),
+            "max_seconds": round(self.max_seconds, 4),
+        }
+
+
+# ─────────────────────────────────────────────────────────────
+# 执行器
+# ─────────────────────────────────────────────────────────────
+
+class CommandExecutor:
+    """并发受限、超时终止进程组的命令执行器"""
+
+    def __init__(self, config: Optional[ExecConfig] = None):
+        self.config = config or ExecConfig()
+        self.name = os.path.basename(self.config.binary)
+        self._semaphore = asyncio.Semaphore(self.config.max_concurrency)
+        self.inflight = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.rejected = 0
+        self.killed = 0
+        self.verbs: dict[str, VerbStats] = {}
+
+    async def run(self, args: list[str], timeout: float = 30, max_output: Optional[int] = None) -> str:
+        """
+        运行命令并返回 stdout（max_output 为空时使用 config.max_output）
+
+        Raises:
+            Exception: 排队超时、命令超时、退出码非 0 或输出超过上限
+        """
+        verb = args[0] if args else ""
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.config.max_wait)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Exception(f"{self.name} 并发已达上限 {self.config.max_concurrency}，排队超过 {self.config.max_wait}s")
+        finally:
+            self.waiting -= 1
+
+        self.inflight += 1
+        start = time.monotonic()
+        error = timed_out = False
+        try:
+            return await self._execute(args, timeout, max_output or self.config.max_output)
+        except asyncio.TimeoutError:
+            error = timed_out = True
+            raise Exception(f"{self.name} 超时（{timeout}秒）")
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.inflight -= 1
+            self._semaphore.release()
+            self.verbs.setdefault(verb, VerbStats()).record(time.monotonic() - start, error, timed_out)
+
+    async def _execute(self, args: list[str], timeout: float, max_output: int) -> str:
+        process = await asyncio.create_subprocess_exec(
+            self.config.binary, *args,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True,
+        )
+        try:
+            stdout, stderr, _ = await asyncio.wait_for(
+                asyncio.gather(self._read_stdout(process.stdout, max_output), self._read_stderr(process.stderr), process.wait()),
+                timeout=timeout,
+            )
+        except BaseException as e:
+            # 超时、输出超限或调用被取消：连同 kubectl 派生的子进程一起终止
+            await self._terminate(process)
+            if isinstance(e, OutputTooLarge):
+                raise Exception(f"{self.name} 输出超过 {max_output} 字节上限")
+            raise
+
+        if process.returncode != 0:
+            raise Exception(f"{self.name} 失败：{stderr.decode('utf-8', errors='replace')}")
+        return stdout
+
+    @staticmethod
+    async def _read_stdout(stream: asyncio.StreamReader, max_output: int) -> str:
+        """逐块解码为文本，不保留原始字节（峰值约为文本片段加上最后拼接的结果）"""
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        parts, size = [], 0
+        while chunk := await stream.read(CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_output:
+                raise OutputTooLarge()
+            parts.append(decoder.decode(chunk))
+        parts.append(decoder.decode(b"", final=True))
+        return "".join(parts)
+
+    @staticmethod
+    async def _read_stderr(stream: asyncio.StreamReader) -> bytes:
+        tail = b""
+        while chunk := await stream.read(CHUNK_SIZE):
+            tail = (tail + chunk)[-STDERR_LIMIT:]
+        return tail
+
+    async def _terminate(self, process: asyncio.subprocess.Process) -> None:
+        """终止整个进程组：先 SIGTERM，kill_grace 秒后 SIGKILL"""
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            try:
+                os.killpg(process.pid, sig)
+            except ProcessLookupError:
+                return
+            except PermissionError:
+                process.kill()      # 无法向进程组发信号时只终止子进程本身
+            if sig == signal.SIGTERM:
+                self.killed += 1
+            try:
+                await asyncio.wait_for(asyncio.shield(process.wait()), timeout=self.config.kill_grace)
+                return
+            except asyncio.TimeoutError:
+                if sig == signal.SIGTERM:
+                    logger.warning(f"{self.name}（pid {process.pid}）在 SIGTERM 后 {self.config.kill_grace}s 未退出，发送 SIGKILL")
+
+    def stats(self) -> dict:
+        return {
+            "inflight": self.inflight,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "rejected": self.rejected,
+            "killed": self.killed,
+            "verbs": {verb: stats.stats() for verb, stats in sorted(self.verbs.items())},
+            "config": asdict(self.config),
+        }
+
+
+# 进程内共享的 kubectl 执行器
+kubectl_executor = CommandExecutor(ExecConfig.from_env())
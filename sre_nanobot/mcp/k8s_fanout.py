@@ -0,0 +1,211 @@
+"""
+K8s 多命名空间 / 多资源并发查询
+
+一次工具调用查询 命名空间 × 资源类型 的所有组合：
+- 在并发上限内同时获取，耗时从 N 次往返降到约一次往返
+- 每个目标有独立的超时，单个目标失败只记录在该目标的状态中，其余结果照常返回
+- 重复的命名空间 / 资源类型只查询一次；Node 等集群级资源不区分命名空间，只查询一次
+- 合并结果按对象 uid（缺失时按 命名空间/名称）去重
+- 字段选择器只发给支持其字段的资源类型（API Server 对不支持的字段返回 400），也可按资源类型分别指定
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, asdict
+from typing import Awaitable, Callable, Optional, Union
+
+from .k8s_informer import parse_field_selector
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("pods", "deployments", "services", "events", "nodes")
+CLUSTER_SCOPED = {"nodes"}
+
+# 各资源支持的字段选择器字段（metadata.name、metadata.namespace 所有资源都支持）
+COMMON_FIELDS = {"metadata.name", "metadata.namespace"}
+SELECTABLE_FIELDS = {
+    "pods": {"spec.nodeName", "spec.restartPolicy", "spec.schedulerName", "spec.serviceAccountName",
+             "spec.hostNetwork", "status.phase", "status.podIP", "status.nominatedNodeName"},
+    "deployments": set(),
+    "services": set(),
+    "events": {"involvedObject.kind", "involvedObject.namespace", "involvedObject.name", "involvedObject.uid",
+               "involvedObject.apiVersion", "involvedObject.resourceVersion", "involvedObject.fieldPath",
+               "reason", "reportingComponent", "source", "type"},
+    "nodes": {"spec.unschedulable"},
+}
+
+
+# ─────────────────────────────────────────────────────────────
+# 配置
+# ─────────────────────────────────────────────────────────────
+
+@dataclass
+class K8sFanOutConfig:
+    """多目标查询配置"""
+    max_concurrency: int = 8
+    max_targets: int = 100
+    timeout: float = 30.0     # 单个目标的超时（秒）
+
+    @classmethod
+    def from_env(cls) -> "K8sFanOutConfig":
+        """从环境变量读取配置（K8S_FANOUT_*），未设置时使用默认值"""
+        default = cls()
+        return cls(
+            max_concurrency=int(os.getenv("K8S_FANOUT_MAX_CONCURRENCY", default.max_concurrency)),
+            max_targets=int(os.getenv("K8S_FANOUT_MAX_TARGETS", default.max_targets)),
+            timeout=float(os.getenv("K8S_FANOUT_TIMEOUT", default.timeout)),
+        )
+
+
+@dataclass(frozen=True)
+class FanOutTarget:
+    """一个查询目标：资源类型 + 命名空间（集群级资源为 None）"""
+    kind: str
+    namespace: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return f"{self.kind}@{self.namespace}" if self.namespace else self.kind
+
+
+# fetch(kind, namespace) -> 完整对象列表
+TargetFetcher = Callable[[str, Optional[str]], Awaitable[list[dict]]]
+
+
+def plan_targets(namespaces: list[str], kinds: list[str]) -> list[FanOutTarget]:
+    """
+    展开为目标列表（保持输入顺序，去掉重复项）
+
+    Raises:
+        ValueError: 不支持的资源类型，或命名空间级资源未指定命名空间
+    """
+    unknown = [kind for kind in kinds if kind not in KINDS]
+    if unknown:
+        raise ValueError(f"不支持的资源类型：{', '.join(unknown)}，可选：{', '.join(KINDS)}")
+    namespaces = list(dict.fromkeys(ns.strip() for ns in namespaces if ns and ns.strip()))
+
+    targets = []
+    for kind in dict.fromkeys(kinds):
+        if kind in CLUSTER_SCOPED:
+            targets.append(FanOutTarget(kind))
+        elif not namespaces:
+            raise ValueError(f"{kind} 需要指定至少一个命名空间")
+        else:
+            targets.extend(FanOutTarget(kind, namespace) for namespace in namespaces)
+    return targets
+
+
+def plan_field_selectors(field_selector: Union[str, dict, None], kinds: list[str]) -> dict[str, str]:
+    """
+    确定每种资源使用的字段选择器
+
+    字符串只应用于支持其全部字段的资源类型（例如 status.phase=Running 只用于 pods，
+    nodes、events 照常查询）；{资源类型: 选择器} 按类型分别指定
+
+    Returns:
+        {资源类型: 选择器}，不含不使用选择器的资源类型
+
+    Raises:
+        ValueError: 选择器语法错误、没有任何资源类型支持它，或指定了未查询的资源类型
+    """
+    if not field_selector:
+        return {}
+    if isinstance(field_selector, dict):
+        unknown = [kind for kind in field_selector if kind not in kinds]
+        if unknown:
+            raise ValueError(f"字段选择器指定了未查询的资源类型：{', '.join(unknown)}")
+        return {kind: selector for kind, selector in field_selector.items() if selector}
+
+    fields = {".".join(path) for path, _, _ in parse_field_selector(field_selector)}
+    selectors = {kind: field_selector for kind in dict.fromkeys(kinds)
+                 if fields <= COMMON_FIELDS | SELECTABLE_FIELDS[kind]}
+    if not selectors:
+        raise ValueError(f"字段选择器 {field_selector} 不适用于任何查询的资源类型：{', '.join(dict.fromkeys(kinds))}")
+    return selectors
+
+
+def object_identity(obj: dict) -> str:
+    metadata = obj.get("metadata", {})
+    return metadata.get("uid") or f"{metadata.get('namespace', '')}/{metadata.get('name', '')}"
+
+
+# ─────────────────────────────────────────────────────────────
+# 并发查询
+# ─────────────────────────────────────────────────────────────
+
+class K8sFanOut:
+    """多命名空间 / 多资源类型的并发查询"""
+
+    def __init__(self, config: Optional[K8sFanOutConfig] = None):
+        self.config = config or K8sFanOutConfig()
+        self.fanouts = 0
+        self.targets_total = 0
+        self.targets_failed = 0
+        self.duplicates_dropped = 0
+
+    async def query(self, targets: list[FanOutTarget], fetch: TargetFetcher) -> dict:
+        """
+        并发查询各目标并按资源类型合并
+
+        Returns:
+            - items: {资源类型: [去重后的对象]}
+            - targets: {目标名: {status, latency, count, error}}
+            - partial: 是否有目标失败
+        """
+        if len(targets) > self.config.max_targets:
+            raise ValueError(f"单次最多 {self.config.max_targets} 个目标，实际 {len(targets)} 个")
+        semaphore = asyncio.Semaphore(self.config.max_concurrency)
+
+        async def run(target: FanOutTarget) -> tuple[Optional[list[dict]], dict]:
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    items = await asyncio.wait_for(fetch(target.kind, target.namespace), timeout=self.config.timeout)
+                    report = {"status": "success", "count": len(items)}
+                except asyncio.TimeoutError:
+                    items, report = None, {"status": "error", "error": f"超时（{self.config.timeout}s）"}
+                except Exception as e:
+                    items, report = None, {"status": "error", "error": str(e) or repr(e)}
+                report["latency"] = round(time.perf_counter() - started, 4)
+                if items is None:
+                    self.targets_failed += 1
+                    logger.warning(f"K8s 目标 {target.name} 查询失败：{report['error']}")
+                return items, report
+
+        outcomes = await asyncio.gather(*(run(target) for target in targets))
+
+        merged: dict[str, dict[str, dict]] = {}
+        reports = {}
+        for target, (items, report) in zip(targets, outcomes):
+            reports[target.name] = report
+            objects = merged.setdefault(target.kind, {})
+            for obj in items or []:
+                key = object_identity(obj)
+                if key in objects:
+                    self.duplicates_dropped += 1
+                else:
+                    objects[key] = obj
+
+        self.fanouts += 1
+        self.targets_total += len(targets)
+        return {
+            "items": {kind: list(objects.values()) for kind, objects in merged.items()},
+            "targets": reports,
+            "partial": any(report["status"] != "success" for report in reports.values()),
+        }
+
+    def stats(self) -> dict:
+        """多目标查询统计"""
+        return {
+            "fanouts": self.fanouts,
+            "targets_total": self.targets_total,
+            "targets_failed": self.targets_failed,
+            "duplicates_dropped": self.duplicates_dropped,
+            "config": asdict(self.config),
+        }
+
+
+# 进程内共享的多目标查询器
+k8s_fanout = K8sFanOut(K8sFanOutConfig.from_env())
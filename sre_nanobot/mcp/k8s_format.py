@@ -0,0 +1,452 @@
+"""
+Kubernetes 对象的文本输出
+
+原生 API 后端返回的是 JSON 对象，这里按 kubectl 的默认输出格式渲染，
+使两个后端的工具输出保持一致：
+- 列表类输出（get）：与 kubectl get 相同的列和 AGE 格式
+- 详情类输出（describe）：kubectl describe 中用于排障的主要字段和相关事件
+"""
+
+from datetime import datetime, timezone
+from typing import Optional
+
+
+# ─────────────────────────────────────────────────────────────
+# 通用格式
+# ─────────────────────────────────────────────────────────────
+
+def format_table(headers: list[str], rows: list[list]) -> str:
+    """按列左对齐，列间隔 3 个空格（与 kubectl 相同）"""
+    if not rows:
+        return "No resources found.\n"
+    table = [headers] + [[str(cell) for cell in row] for row in rows]
+    widths = [max(len(row[i]) for row in table) for i in range(len(headers))]
+    lines = ["   ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip() for row in table]
+    return "\n".join(lines) + "\n"
+
+
+def parse_time(value: Optional[str]) -> Optional[datetime]:
+    """解析 RFC3339 时间（Kubernetes API 的时间字段）"""
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def format_age(value: Optional[str], now: Optional[datetime] = None) -> str:
+    """与 kubectl 相同的相对时间：45s、5m10s、3h、2d5h、120d"""
+    then = parse_time(value)
+    if then is None:
+        return "<unknown>"
+    seconds = int(((now or datetime.now(timezone.utc)) - then).total_seconds())
+    if seconds < 0:
+        return "0s"
+    minutes, hours, days = seconds // 60, seconds // 3600, seconds // 86400
+    if seconds < 120:
+        return f"{seconds}s"
+    if minutes < 10:
+        return f"{minutes}m{seconds % 60}s" if seconds % 60 else f"{minutes}m"
+    if hours < 3:
+        return f"{minutes}m"
+    if hours < 8:
+        return f"{hours}h{minutes % 60}m" if minutes % 60 else f"{hours}h"
+    if days < 2:
+        return f"{hours}h"
+    if days < 8:
+        return f"{days}d{hours % 24}h" if hours % 24 else f"{days}d"
+    return f"{days}d"
+
+
+def format_labels(labels: Optional[dict]) -> str:
+    if not labels:
+        return "<none>"
+    return ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+
+
+_QUANTITY_SUFFIXES = {
+    "n": 1e-9, "u": 1e-6, "m": 1e-3, "": 1.0,
+    "k": 1e3, "M": 1e6, "G": 1e9, "T": 1e12, "P": 1e15, "E": 1e18,
+    "Ki": 2 ** 10, "Mi": 2 ** 20, "Gi": 2 ** 30, "Ti": 2 ** 40, "Pi": 2 ** 50, "Ei": 2 ** 60,
+}
+
+
+def parse_quantity(value) -> float:
+    """解析资源数量，例如 250m、1.5、128Mi、12345n"""
+    value = str(value)
+    for length in (2, 1):
+        suffix = value[-length:]
+        if len(value) > length and suffix in _QUANTITY_SUFFIXES and not suffix[0].isdigit():
+            return float(value[:-length]) * _QUANTITY_SUFFIXES[suffix]
+    return float(value)
+
+
+# ─────────────────────────────────────────────────────────────
+# get 输出
+# ─────────────────────────────────────────────────────────────
+
+def pod_status(pod: dict) -> tuple[str, int, int, int]:
+    """
+    与 kubectl 相同的 Pod 状态
+
+    Returns:
+        (STATUS, 就绪容器数, 容器总数, 重启次数)
+    """
+    status = pod.get("status", {})
+    containers = pod.get("spec", {}).get("containers", [])
+    reason = status.get("reason") or status.get("phase") or "Unknown"
+
+    for container in reversed(status.get("initContainerStatuses") or []):
+        state = container.get("state", {})
+        terminated, waiting = state.get("terminated"), state.get("waiting")
+        if terminated and terminated.get("exitCode") == 0:
+            continue
+        if terminated:
+            reason = f"Init:{terminated.get('reason') or 'Signal'}"
+        elif waiting and waiting.get("reason") not in (None, "PodInitializing"):
+            reason = f"Init:{waiting['reason']}"
+        else:
+            reason = f"Init:{len(status.get('initContainerStatuses'))}"
+        break
+    else:
+        running = False
+        for container in reversed(status.get("containerStatuses") or []):
+            state = container.get("state", {})
+            if state.get("waiting", {}).get("reason"):
+                reason = state["waiting"]["reason"]
+            elif state.get("terminated", {}).get("reason"):
+                reason = state["terminated"]["reason"]
+            elif "terminated" in state:
+                reason = "Completed" if state["terminated"].get("exitCode") == 0 else "Error"
+            elif "running" in state and container.get("ready"):
+                running = True
+        if reason == "Completed" and running:
+            reason = "Running"
+
+    if pod.get("metadata", {}).get("deletionTimestamp"):
+        reason = "Unknown" if status.get("reason") == "NodeLost" else "Terminating"
+
+    statuses = status.get("containerStatuses") or []
+    ready = sum(1 for container in statuses if container.get("ready"))
+    restarts = sum(container.get("restartCount", 0) for container in statuses)
+    return reason, ready, len(containers), restarts
+
+
+def default_container(pod: dict) -> Optional[str]:
+    """与 kubectl 相同的默认容器：kubectl.kubernetes.io/default-container 注解指定的容器，否则第一个容器"""
+    names = [container.get("name") for container in pod.get("spec", {}).get("containers", [])]
+    annotated = (pod.get("metadata", {}).get("annotations") or {}).get("kubectl.kubernetes.io/default-container")
+    if annotated in names:
+        return annotated
+    return names[0] if names else None
+
+
+def format_pods(pods: list, show_labels: bool = False, now: Optional[datetime] = None) -> str:
+    """kubectl get pods"""
+    headers = ["NAME", "READY", "STATUS", "RESTARTS", "AGE"] + (["LABELS"] if show_labels else [])
+    rows = []
+    for pod in pods:
+        metadata = pod.get("metadata", {})
+        reason, ready, total, restarts = pod_status(pod)
+        row = [metadata.get("name"), f"{ready}/{total}", reason, restarts,
+               format_age(metadata.get("creationTimestamp"), now)]
+        if show_labels:
+            row.append(format_labels(metadata.get("labels")))
+        rows.append(row)
+    return format_table(headers, rows)
+
+
+def format_deployments(deployments: list, wide: bool = False, now: Optional[datetime] = None) -> str:
+    """kubectl get deployments [-o wide]"""
+    headers = ["NAME", "READY", "UP-TO-DATE", "AVAILABLE", "AGE"]
+    if wide:
+        headers += ["CONTAINERS", "IMAGES", "SELECTOR"]
+    rows = []
+    for deployment in deployments:
+        metadata, spec, status = (deployment.get(key, {}) for key in ("metadata", "spec", "status"))
+        row = [metadata.get("name"),
+               f"{status.get('readyReplicas', 0)}/{spec.get('replicas', 0)}",
+               status.get("updatedReplicas", 0), status.get("availableReplicas", 0),
+               format_age(metadata.get("creationTimestamp"), now)]
+        if wide:
+            containers = spec.get("template", {}).get("spec", {}).get("containers", [])
+            row += [",".join(c.get("name", "") for c in containers),
+                    ",".join(c.get("image", "") for c in containers),
+                    format_labels(spec.get("selector", {}).get("matchLabels"))]
+        rows.append(row)
+    return format_table(headers, rows)
+
+
+def format_services(services: list, now: Optional[datetime] = None) -> str:
+    """kubectl get services"""
+    rows = []
+    for service in services:
+        metadata, spec = service.get("metadata", {}), service.get("spec", {})
+        ingress = service.get("status", {}).get("loadBalancer", {}).get("ingress") or []
+        external = spec.get("externalIPs") or [i.get("ip") or i.get("hostname") for i in ingress]
+        if spec.get("type") == "ExternalName":
+            external = [spec.get("externalName")]
+        ports = [
+            f"{port['port']}:{port['nodePort']}/{port.get('protocol', 'TCP')}" if port.get("nodePort")
+            else f"{port['port']}/{port.get('protocol', 'TCP')}"
+            for port in spec.get("ports") or []
+        ]
+        external_ip = ",".join(external) or ("<pending>" if spec.get("type") == "LoadBalancer" else "<none>")
+        rows.append([metadata.get("name"), spec.get("type", "ClusterIP"), spec.get("clusterIP") or "<none>",
+                     external_ip, ",".join(ports) or "<none>",
+                     format_age(metadata.get("creationTimestamp"), now)])
+    return format_table(["NAME", "TYPE", "CLUSTER-IP", "EXTERNAL-IP", "PORT(S)", "AGE"], rows)
+
+
+def event_time(event: dict) -> str:
+    """事件的最后发生时间（兼容 events.k8s.io 风格的 eventTime）"""
+    return (event.get("lastTimestamp") or event.get("eventTime")
+            or event.get("metadata", {}).get("creationTimestamp") or "")
+
+
+def sort_events(events: list) -> list:
+    """按最后发生时间升序（kubectl --sort-by=.lastTimestamp）"""
+    return sorted(events, key=lambda event: parse_time(event_time(event)) or datetime.min.replace(tzinfo=timezone.utc))
+
+
+def format_events(events: list, now: Optional[datetime] = None) -> str:
+    """kubectl get events（调用方负责排序）"""
+    rows = []
+    for event in events:
+        involved = event.get("involvedObject", {})
+        rows.append([format_age(event_time(event), now), event.get("type", ""), event.get("reason", ""),
+                     f"{involved.get('kind', '').lower()}/{involved.get('name', '')}",
+                     (event.get("message") or "").strip()])
+    return format_table(["LAST SEEN", "TYPE", "REASON", "OBJECT", "MESSAGE"], rows)
+
+
+def node_roles(node: dict) -> str:
+    prefix = "node-role.kubernetes.io/"
+    labels = node.get("metadata", {}).get("labels", {})
+    roles = sorted(key[len(prefix):] for key in labels if key.startswith(prefix) and key != prefix)
+    return ",".join(roles) or "<none>"
+
+
+def node_status(node: dict) -> str:
+    conditions = {c.get("type"): c.get("status") for c in node.get("status", {}).get("conditions", [])}
+    status = {"True": "Ready", "False": "NotReady"}.get(conditions.get("Ready"), "Unknown")
+    if node.get("spec", {}).get("unschedulable"):
+        status += ",SchedulingDisabled"
+    return status
+
+
+def format_nodes(nodes: list, wide: bool = False, now: Optional[datetime] = None) -> str:
+    """kubectl get nodes [-o wide]"""
+    headers = ["NAME", "STATUS", "ROLES", "AGE", "VERSION"]
+    if wide:
+        headers += ["INTERNAL-IP", "EXTERNAL-IP", "OS-IMAGE", "KERNEL-VERSION", "CONTAINER-RUNTIME"]
+    rows = []
+    for node in nodes:
+        metadata, status = node.get("metadata", {}), node.get("status", {})
+        info = status.get("nodeInfo", {})
+        row = [metadata.get("name"), node_status(node), node_roles(node),
+               format_age(metadata.get("creationTimestamp"), now), info.get("kubeletVersion", "")]
+        if wide:
+            addresses = {a.get("type"): a.get("address") for a in status.get("addresses", [])}
+            row += [addresses.get("InternalIP", "<none>"), addresses.get("ExternalIP", "<none>"),
+                    info.get("osImage", ""), info.get("kernelVersion", ""), info.get("containerRuntimeVersion", "")]
+        rows.append(row)
+    return format_table(headers, rows)
+
+
+def format_pod_metrics(metrics: list) -> str:
+    """kubectl top pods"""
+    rows = []
+    for item in metrics:
+        containers = item.get("containers", [])
+        cpu = sum(parse_quantity(c.get("usage", {}).get("cpu", 0)) for c in containers)
+        memory = sum(parse_quantity(c.get("usage", {}).get("memory", 0)) for c in containers)
+        rows.append([item.get("metadata", {}).get("name"), f"{round(cpu * 1000)}m", f"{round(memory / 2 ** 20)}Mi"])
+    return format_table(["NAME", "CPU(cores)", "MEMORY(bytes)"], rows)
+
+
+# ─────────────────────────────────────────────────────────────
+# describe 输出
+# ─────────────────────────────────────────────────────────────
+
+def _describe_map(title: str, values: Optional[dict], width: int) -> str:
+    """多行的 key=value 字段，续行与首行的值对齐"""
+    head = f"{title}:".ljust(width)
+    if not values:
+        return head + "<none>\n"
+    items = [f"{k}={v}" for k, v in sorted(values.items())]
+    return head + items[0] + "\n" + "".join(" " * width + item + "\n" for item in items[1:])
+
+
+def _describe_events(events: list, now: Optional[datetime] = None) -> str:
+    if not events:
+        return "Events:            <none>\n"
+    rows = []
+    for event in sort_events(events):
+        count = event.get("count") or 1
+        age = format_age(event_time(event), now)
+        if count > 1:
+            age = f"{age} (x{count} over {format_age(event.get('firstTimestamp') or event_time(event), now)})"
+        source = event.get("source", {}).get("component") or event.get("reportingComponent", "")
+        rows.append([event.get("type", ""), event.get("reason", ""), age, source,
+                     (event.get("message") or "").strip()])
+    table = format_table(["Type", "Reason", "Age", "From", "Message"], rows)
+    return "Events:\n" + "".join(f"  {line}\n" for line in table.splitlines())
+
+
+def describe_pod(pod: dict, events: list, now: Optional[datetime] = None) -> str:
+    """kubectl describe pod（排障常用字段）"""
+    metadata, spec, status = (pod.get(key, {}) for key in ("metadata", "spec", "status"))
+    reason = pod_status(pod)[0]
+    out = f"Name:             {metadata.get('name')}\n"
+    out += f"Namespace:        {metadata.get('namespace')}\n"
+    out += f"Priority:         {spec.get('priority', 0)}\n"
+    out += f"Service Account:  {spec.get('serviceAccountName', 'default')}\n"
+    node = spec.get("nodeName")
+    out += f"Node:             {node}/{status.get('hostIP', '')}\n" if node else "Node:             <none>\n"
+    out += f"Start Time:       {status.get('startTime', '<none>')}\n"
+    out += _describe_map("Labels", metadata.get("labels"), 18)
+    out += f"Status:           {status.get('phase', 'Unknown')}\n"
+    if reason != status.get("phase"):
+        out += f"Reason:           {reason}\n"
+    out += f"IP:               {status.get('podIP', '')}\n"
+    owners = metadata.get("ownerReferences") or []
+    if owners:
+        out += f"Controlled By:    {owners[0].get('kind')}/{owners[0].get('name')}\n"
+
+    statuses = {c.get("name"): c for c in status.get("containerStatuses") or []}
+    out += "Containers:\n"
+    for container in spec.get("containers", []):
+        name = container.get("name")
+        state = statuses.get(name, {})
+        out += f"  {name}:\n"
+        out += f"    Image:          {container.get('image')}\n"
+        for key, value in (state.get("state") or {}).items():
+            out += f"    State:          {key.capitalize()}\n"
+            for field in ("reason", "exitCode", "startedAt", "finishedAt"):
+                if value.get(field) is not None:
+                    out += f"      {field[0].upper() + field[1:]}:".ljust(22) + f"{value[field]}\n"
+        for key, value in (state.get("lastState") or {}).items():
+            out += f"    Last State:     {key.capitalize()}\n"
+            for field in ("reason", "exitCode", "finishedAt"):
+                if value.get(field) is not None:
+                    out += f"      {field[0].upper() + field[1:]}:".ljust(22) + f"{value[field]}\n"
+        out += f"    Ready:          {state.get('ready', False)}\n"
+        out += f"    Restart Count:  {state.get('restartCount', 0)}\n"
+        resources = container.get("resources", {})
+        for title in ("limits", "requests"):
+            if resources.get(title):
+                out += f"    {title.capitalize()}:\n"
+                for k, v in resources[title].items():
+                    out += f"      {k}:".ljust(22) + f"{v}\n"
+
+    conditions = status.get("conditions") or []
+    if conditions:
+        out += "Conditions:\n  Type              Status\n"
+        for condition in conditions:
+            out += f"  {condition.get('type', ''):<17} {condition.get('status', '')}\n"
+    return out + _describe_events(events, now)
+
+
+def pod_resources(pod: dict) -> dict[str, dict[str, float]]:
+    """
+    与 kubectl 相同地汇总 Pod 的资源：各容器之和与每个 init 容器取较大值，再加上 overhead
+    （limits 只对已设置上限的资源加 overhead）
+
+    Returns:
+        {"requests": {资源: 数量}, "limits": {资源: 数量}}
+    """
+    spec = pod.get("spec", {})
+    totals: dict[str, dict[str, float]] = {"requests": {}, "limits": {}}
+    for kind, values in totals.items():
+        for container in spec.get("containers", []):
+            for name, quantity in ((container.get("resources") or {}).get(kind) or {}).items():
+                values[name] = values.get(name, 0.0) + parse_quantity(quantity)
+        for container in spec.get("initContainers") or []:
+            for name, quantity in ((container.get("resources") or {}).get(kind) or {}).items():
+                values[name] = max(values.get(name, 0.0), parse_quantity(quantity))
+        for name, quantity in (spec.get("overhead") or {}).items():
+            if kind == "requests" or name in values:
+                values[name] = values.get(name, 0.0) + parse_quantity(quantity)
+    return totals
+
+
+def format_resource(name: str, value: float) -> str:
+    """资源数量：cpu 为核数或毫核（750m、2），其余按整除的二进制单位（512Mi、2Gi）"""
+    if name == "cpu":
+        millis = round(value * 1000)
+        return str(millis // 1000) if millis % 1000 == 0 else f"{millis}m"
+    value = round(value)
+    for suffix in ("Ei", "Pi", "Ti", "Gi", "Mi", "Ki"):
+        unit = int(_QUANTITY_SUFFIXES[suffix])
+        if value and value % unit == 0:
+            return f"{value // unit}{suffix}"
+    return str(value)
+
+
+def _node_resources(node: dict, pods: list, now: Optional[datetime] = None) -> str:
+    """Non-terminated Pods 和 Allocated resources 两节，百分比相对 allocatable"""
+    allocatable = {name: parse_quantity(v) for name, v in node.get("status", {}).get("allocatable", {}).items()}
+
+    def with_percent(name: str, value: float) -> str:
+        capacity = allocatable.get(name)
+        return f"{format_resource(name, value)} ({int(value / capacity * 100) if capacity else 0}%)"
+
+    rows, requests, limits = [], {}, {}
+    for pod in pods:
+        metadata, resources = pod.get("metadata", {}), pod_resources(pod)
+        for totals, values in ((requests, resources["requests"]), (limits, resources["limits"])):
+            for name, value in values.items():
+                totals[name] = totals.get(name, 0.0) + value
+        rows.append([metadata.get("namespace", ""), metadata.get("name", ""),
+                     with_percent("cpu", resources["requests"].get("cpu", 0.0)),
+                     with_percent("cpu", resources["limits"].get("cpu", 0.0)),
+                     with_percent("memory", resources["requests"].get("memory", 0.0)),
+                     with_percent("memory", resources["limits"].get("memory", 0.0)),
+                     format_age(metadata.get("creationTimestamp"), now)])
+    out = f"Non-terminated Pods:          ({len(pods)} in total)\n"
+    if rows:
+        table = format_table(["Namespace", "Name", "CPU Requests", "CPU Limits", "Memory Requests",
+                              "Memory Limits", "Age"], rows)
+        out += "".join(f"  {line}\n" for line in table.splitlines())
+
+    names = ["cpu", "memory", "ephemeral-storage"]
+    names += sorted((set(requests) | set(limits)) - set(names))
+    table = format_table(["Resource", "Requests", "Limits"], [
+        [name, with_percent(name, requests.get(name, 0.0)), with_percent(name, limits.get(name, 0.0))]
+        for name in names
+    ])
+    out += "Allocated resources:\n  (Total limits may be over 100 percent, i.e., overcommitted.)\n"
+    return out + "".join(f"  {line}\n" for line in table.splitlines())
+
+
+def describe_node(node: dict, events: list, pods: Optional[list] = None, now: Optional[datetime] = None) -> str:
+    """kubectl describe node（排障常用字段；pods 为该节点上未终止的 Pod，用于资源分配汇总）"""
+    metadata, spec, status = (node.get(key, {}) for key in ("metadata", "spec", "status"))
+    out = f"Name:               {metadata.get('name')}\n"
+    out += f"Roles:              {node_roles(node)}\n"
+    out += _describe_map("Labels", metadata.get("labels"), 20)
+    out += f"CreationTimestamp:  {metadata.get('creationTimestamp')}\n"
+    taints = spec.get("taints") or []
+    out += "Taints:             " + (
+        "\n                    ".join(f"{t.get('key')}{'=' + t['value'] if t.get('value') else ''}:{t.get('effect')}"
+                                      for t in taints) or "<none>") + "\n"
+    out += f"Unschedulable:      {str(bool(spec.get('unschedulable'))).lower()}\n"
+
+    out += "Conditions:\n"
+    rows = [[c.get("type", ""), c.get("status", ""), c.get("lastHeartbeatTime", ""),
+             c.get("lastTransitionTime", ""), c.get("reason", ""), c.get("message", "")]
+            for c in status.get("conditions", [])]
+    table = format_table(["Type", "Status", "LastHeartbeatTime", "LastTransitionTime", "Reason", "Message"], rows)
+    out += "".join(f"  {line}\n" for line in table.splitlines())
+    out += "Addresses:\n" + "".join(f"  {a.get('type')}:  {a.get('address')}\n" for a in status.get("addresses", []))
+    for title in ("capacity", "allocatable"):
+        out += f"{title.capitalize()}:\n"
+        out += "".join(f"  {k}:".ljust(22) + f"{v}\n" for k, v in status.get(title, {}).items())
+    info = status.get("nodeInfo", {})
+    out += "System Info:\n"
+    for key, title in (("osImage", "OS Image"), ("kernelVersion", "Kernel Version"),
+                       ("containerRuntimeVersion", "Container Runtime Version"),
+                       ("kubeletVersion", "Kubelet Version")):
+        out += f"  {title}:".ljust(30) + f"{info.get(key, '')}\n"
+    if pods is not None:
+        out += _node_resources(node, pods, now)
+    return out + _describe_events(events, now)
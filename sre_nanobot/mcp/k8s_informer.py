@@ -0,0 +1,438 @@
+"""
+Kubernetes watch 缓存（informer）
+
+仿照 client-go 的 informer，在本地维护 Pod、Deployment、Node、Event 的完整副本：
+- 启动时 list 一次，之后从返回的 resourceVersion 开始 watch，逐条应用 ADDED / MODIFIED / DELETED
+- watch 到期（timeoutSeconds）后从最新的 resourceVersion 续接；BOOKMARK 只推进 resourceVersion
+- resourceVersion 过期（410 Gone）时重新 list
+- 按命名空间、标签（key=value）和 owner 建立索引，读取不访问 API Server
+
+每种资源由一个后台线程负责 list/watch，读取方在事件循环中持锁查询，耗时为微秒级。
+watch 断开超过 max_stale，或在线但超过 max_silence 没有收到任何事件（含 BOOKMARK，
+API Server 约每分钟发送一次；半开的连接不会断开但也收不到事件）后缓存视为不可用，
+由调用方回退到直接请求 API
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, asdict, field
+from typing import Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 资源 -> 跨命名空间 list/watch 使用的 (API 类, 方法)
+KINDS = {
+    "pods": ("CoreV1Api", "list_pod_for_all_namespaces"),
+    "deployments": ("AppsV1Api", "list_deployment_for_all_namespaces"),
+    "nodes": ("CoreV1Api", "list_node"),
+    "events": ("CoreV1Api", "list_event_for_all_namespaces"),
+}
+
+
+# ─────────────────────────────────────────────────────────────
+# 配置
+# ─────────────────────────────────────────────────────────────
+
+@dataclass
+class InformerConfig:
+    """watch 缓存配置（默认关闭）"""
+    enabled: bool = False
+    kinds: tuple = tuple(KINDS)
+    watch_timeout: int = 300       # 每次 watch 请求的服务端超时（秒），到期后续接
+    retry_interval: float = 5.0    # list/watch 失败后的重试间隔（秒）
+    max_stale: float = 60.0        # watch 断开超过该时长后不再从缓存读取（秒）
+    max_silence: float = 120.0     # watch 在线但超过该时长没有任何事件时不再从缓存读取（秒）
+
+    @classmethod
+    def from_env(cls) -> "InformerConfig":
+        """从环境变量读取配置（K8S_INFORMER_*），未设置时使用默认值"""
+        default = cls()
+        kinds = os.getenv("K8S_INFORMER_KINDS")
+        return cls(
+            enabled=os.getenv("K8S_INFORMER_ENABLED", "").lower() in ("1", "true", "yes"),
+            kinds=tuple(k.strip() for k in kinds.split(",") if k.strip()) if kinds else default.kinds,
+            watch_timeout=int(os.getenv("K8S_INFORMER_WATCH_TIMEOUT", default.watch_timeout)),
+            retry_interval=float(os.getenv("K8S_INFORMER_RETRY_INTERVAL", default.retry_interval)),
+            max_stale=float(os.getenv("K8S_INFORMER_MAX_STALE", default.max_stale)),
+            max_silence=float(os.getenv("K8S_INFORMER_MAX_SILENCE", default.max_silence)),
+        )
+
+
+class ResourceExpired(Exception):
+    """watch 的 resourceVersion 已过期（410 Gone），需要重新 list"""
+
+
+# ─────────────────────────────────────────────────────────────
+# 选择器
+# ─────────────────────────────────────────────────────────────
+
+@dataclass
+class Requirement:
+    """标签选择器中的一项：key op values"""
+    key: str
+    op: str                 # = != in notin exists !
+    values: tuple = field(default_factory=tuple)
+
+    def matches(self, labels: dict) -> bool:
+        value = labels.get(self.key)
+        if self.op == "=":
+            return value == self.values[0]
+        if self.op == "!=":
+            return value != self.values[0]
+        if self.op == "in":
+            return value in self.values
+        if self.op == "notin":
+            return value not in self.values
+        if self.op == "exists":
+            return self.key in labels
+        return self.key not in labels
+
+
+_SET_REQUIREMENT = re.compile(r"^([\w./-]+)\s+(in|notin)\s+\(([^)]*)\)$")
+_EQUALITY_REQUIREMENT = re.compile(r"^([\w./-]+)\s*(==|=|!=)\s*([\w.-]*)$")
+
+
+def parse_label_selector(selector: Optional[str]) -> list[Requirement]:
+    """
+    解析标签选择器（与 kubectl -l 相同的语法）
+
+    支持 k=v、k==v、k!=v、k in (a,b)、k notin (a,b)、k、!k，多项以逗号分隔
+    """
+    if not selector or not selector.strip():
+        return []
+    terms = re.split(r",(?![^()]*\))", selector)
+    requirements = []
+    for term in (t.strip() for t in terms):
+        if match := _SET_REQUIREMENT.match(term):
+            values = tuple(v.strip() for v in match.group(3).split(",") if v.strip())
+            requirements.append(Requirement(match.group(1), match.group(2), values))
+        elif match := _EQUALITY_REQUIREMENT.match(term):
+            op = "!=" if match.group(2) == "!=" else "="
+            requirements.append(Requirement(match.group(1), op, (match.group(3),)))
+        elif re.fullmatch(r"![\w./-]+", term):
+            requirements.append(Requirement(term[1:], "!"))
+        elif re.fullmatch(r"[\w./-]+", term):
+            requirements.append(Requirement(term, "exists"))
+        else:
+            raise ValueError(f"无效的标签选择器：{selector}")
+    return requirements
+
+
+def parse_field_selector(selector: Optional[str]) -> list[tuple[list[str], str, str]]:
+    """解析字段选择器（path=v、path==v、path!=v），返回 [(路径, 操作, 值)]"""
+    if not selector or not selector.strip():
+        return []
+    terms = []
+    for term in selector.split(","):
+        match = re.fullmatch(r"\s*([\w.]+)\s*(==|=|!=)\s*(.*?)\s*", term)
+        if not match:
+            raise ValueError(f"无效的字段选择器：{selector}")
+        terms.append((match.group(1).split("."), "!=" if match.group(2) == "!=" else "=", match.group(3)))
+    return terms
+
+
+def field_value(obj: dict, path: list[str]) -> str:
+    """按路径取字段值（缺失为空字符串，与 API Server 的字段选择器一致）"""
+    value = obj
+    for name in path:
+        if not isinstance(value, dict):
+            return ""
+        value = value.get(name)
+    return "" if value is None else str(value)
+
+
+# ─────────────────────────────────────────────────────────────
+# 对象存储
+# ─────────────────────────────────────────────────────────────
+
+def object_key(obj: dict) -> str:
+    metadata = obj.get("metadata", {})
+    namespace = metadata.get("namespace")
+    return f"{namespace}/{metadata.get('name')}" if namespace else metadata.get("name", "")
+
+
+class ObjectStore:
+    """
+    带索引的对象存储（线程安全）
+
+    返回的是存储中的对象本身，调用方只读不改
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._objects: dict[str, dict] = {}
+        self._by_namespace: dict[str, set[str]] = defaultdict(set)
+        self._by_label: dict[tuple[str, str], set[str]] = defaultdict(set)
+        self._by_owner: dict[tuple[str, str, str], set[str]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self._objects)
+
+    @staticmethod
+    def _index_keys(obj: dict):
+        metadata = obj.get("metadata", {})
+        namespace = metadata.get("namespace", "")
+        labels = [(k, v) for k, v in (metadata.get("labels") or {}).items()]
+        owners = [(namespace, o.get("kind", ""), o.get("name", "")) for o in metadata.get("ownerReferences") or []]
+        return namespace, labels, owners
+
+    def _add(self, key: str, obj: dict) -> None:
+        self._objects[key] = obj
+        namespace, labels, owners = self._index_keys(obj)
+        self._by_namespace[namespace].add(key)
+        for label in labels:
+            self._by_label[label].add(key)
+        for owner in owners:
+            self._by_owner[owner].add(key)
+
+    def _remove(self, key: str) -> None:
+        obj = self._objects.pop(key, None)
+        if obj is None:
+            return
+        namespace, labels, owners = self._index_keys(obj)
+        for index, names in ((self._by_namespace, [namespace]), (self._by_label, labels), (self._by_owner, owners)):
+            for name in names:
+                keys = index.get(name)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del index[name]
+
+    def upsert(self, obj: dict) -> None:
+        key = object_key(obj)
+        with self._lock:
+            self._remove(key)
+            self._add(key, obj)
+
+    def delete(self, obj: dict) -> None:
+        with self._lock:
+            self._remove(object_key(obj))
+
+    def replace(self, items: Iterable[dict]) -> None:
+        """用 list 结果整体替换"""
+        with self._lock:
+            self._objects.clear()
+            self._by_namespace.clear()
+            self._by_label.clear()
+            self._by_owner.clear()
+            for obj in items:
+                self._add(object_key(obj), obj)
+
+    def get(self, name: str, namespace: Optional[str] = None) -> Optional[dict]:
+        with self._lock:
+            return self._objects.get(f"{namespace}/{name}" if namespace else name)
+
+    def list(self, namespace: Optional[str] = None, label_selector: Optional[str] = None,
+             field_selector: Optional[str] = None, owner: Optional[tuple[str, str]] = None) -> list[dict]:
+        """
+        按条件查询（结果按 命名空间/名称 排序，与 API Server 的 list 顺序一致）
+
+        Args:
+            namespace: 命名空间，为空表示全部
+            label_selector: 标签选择器，等值条件走索引，其余条件逐个过滤
+            field_selector: 字段选择器，例如 involvedObject.name=web-1
+            owner: (kind, name)，只返回 ownerReferences 中包含该对象的资源（需同时指定 namespace）
+        """
+        requirements = parse_label_selector(label_selector)
+        fields = parse_field_selector(field_selector)
+        with self._lock:
+            candidates: Optional[set[str]] = None
+            indexed = []
+            if namespace:
+                indexed.append(self._by_namespace.get(namespace, set()))
+            if owner:
+                indexed.append(self._by_owner.get((namespace or "", *owner), set()))
+            for requirement in requirements:
+                if requirement.op == "=":
+                    indexed.append(self._by_label.get((requirement.key, requirement.values[0]), set()))
+            for keys in sorted(indexed, key=len):
+                candidates = set(keys) if candidates is None else candidates & keys
+                if not candidates:
+                    return []
+            objects = [self._objects[key] for key in sorted(self._objects if candidates is None else candidates)]
+
+        rest = [r for r in requirements if r.op != "="]
+        return [
+            obj for obj in objects
+            if all(r.matches(obj.get("metadata", {}).get("labels") or {}) for r in rest)
+            and all((field_value(obj, path) == value) == (op == "=") for path, op, value in fields)
+        ]
+
+
+# ─────────────────────────────────────────────────────────────
+# Informer
+# ─────────────────────────────────────────────────────────────
+
+class Informer:
+    """单种资源的 list/watch 循环（在后台线程中运行）"""
+
+    def __init__(self, kind: str, client, config: InformerConfig, clock: Callable[[], float] = time.monotonic):
+        self.kind = kind
+        self.api, self.method = KINDS[kind]
+        self.client = client
+        self.config = config
+        self.clock = clock
+        self.store = ObjectStore()
+        self.resource_version: Optional[str] = None
+        self.synced = False
+        self.connected = False
+        self.last_contact: Optional[float] = None
+        self.lists = 0
+        self.watches = 0
+        self.events = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def fresh(self) -> bool:
+        """已完成首次 list，且最近一次收到数据距今不超过 max_silence（watch 在线）或 max_stale（已断开）"""
+        if not self.synced:
+            return False
+        limit = self.config.max_silence if self.connected else self.config.max_stale
+        return (self.clock() - self.last_contact) <= limit
+
+    def relist(self) -> None:
+        """list 全量并替换存储"""
+        data = self.client.call(self.api, self.method)
+        self.store.replace(data.get("items", []))
+        self.resource_version = data.get("metadata", {}).get("resourceVersion")
+        self.lists += 1
+        self.synced = True
+        self.last_contact = self.clock()
+
+    def apply(self, event: dict) -> None:
+        """应用一条 watch 事件"""
+        kind, obj = event.get("type"), event.get("object", {})
+        if kind == "ERROR":
+            if obj.get("code") == 410:
+                raise ResourceExpired(obj.get("message", "resourceVersion 已过期"))
+            raise Exception(f"watch 错误：{obj.get('message', obj)}")
+        if kind in ("ADDED", "MODIFIED"):
+            self.store.upsert(obj)
+        elif kind == "DELETED":
+            self.store.delete(obj)
+        elif kind != "BOOKMARK":
+            return
+        self.resource_version = obj.get("metadata", {}).get("resourceVersion", self.resource_version)
+        self.events += 1
+
+    def watch_once(self) -> None:
+        """从当前 resourceVersion watch，直到服务端超时结束或出错"""
+        try:
+            events = self.client.watch(self.api, self.method, resource_version=self.resource_version,
+                                       allow_watch_bookmarks=True, timeout_seconds=self.config.watch_timeout)
+        except Exception as e:
+            # resourceVersion 过旧时 API Server 也可能直接以 HTTP 410 拒绝 watch，而不是发送 ERROR 事件
+            if getattr(e, "status", None) == 410:
+                raise ResourceExpired(str(e)) from e
+            raise
+        self.watches += 1
+        self.connected = True
+        self.last_contact = self.clock()
+        try:
+            for event in events:
+                self.last_contact = self.clock()
+                self.apply(event)
+                if self._stop.is_set():
+                    return
+        finally:
+            self.connected = False
+            self.last_contact = self.clock()
+
+    def run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if self.resource_version is None:
+                    self.relist()
+                self.watch_once()
+            except ResourceExpired as e:
+                logger.info(f"{self.kind} 的 resourceVersion 已过期，重新 list：{e}")
+                self.resource_version = None
+            except Exception as e:
+                self.errors += 1
+                self.last_error = str(e) or repr(e)
+                logger.warning(f"{self.kind} list/watch 失败，{self.config.retry_interval}s 后重试：{e!r}")
+                self._stop.wait(self.config.retry_interval)
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name=f"informer-{self.kind}", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 1.0) -> None:
+        """停止后台线程（阻塞在 watch 读取中的线程会在下一条事件或超时后退出）"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "objects": len(self.store),
+            "synced": self.synced,
+            "fresh": self.fresh(),
+            "resource_version": self.resource_version,
+            "lists": self.lists,
+            "watches": self.watches,
+            "events": self.events,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
+
+
+# ─────────────────────────────────────────────────────────────
+# watch 缓存
+# ─────────────────────────────────────────────────────────────
+
+class WatchCache:
+    """多种资源的 informer 集合"""
+
+    def __init__(self, config: Optional[InformerConfig] = None):
+        self.config = config or InformerConfig()
+        unknown = set(self.config.kinds) - set(KINDS)
+        if unknown:
+            raise ValueError(f"不支持的 watch 资源：{', '.join(sorted(unknown))}，可选：{', '.join(KINDS)}")
+        self.informers: dict[str, Informer] = {}
+        self.served = 0
+        self.misses = 0
+
+    def start(self, client) -> None:
+        """为配置的资源启动 informer（未启用时忽略）"""
+        if not self.config.enabled:
+            return
+        for kind in self.config.kinds:
+            if kind not in self.informers:
+                self.informers[kind] = Informer(kind, client, self.config)
+            self.informers[kind].start()
+
+    def stop(self) -> None:
+        for informer in self.informers.values():
+            informer.stop()
+
+    def store(self, kind: str) -> Optional[ObjectStore]:
+        """可用的本地存储；未启用、未同步或 watch 断开过久时返回 None"""
+        informer = self.informers.get(kind)
+        if informer is None:
+            return None
+        if not informer.fresh():
+            self.misses += 1
+            return None
+        self.served += 1
+        return informer.store
+
+    def stats(self) -> dict:
+        return {
+            "served": self.served,
+            "misses": self.misses,
+            "informers": {kind: informer.stats() for kind, informer in self.informers.items()},
+            "config": asdict(self.config),
+        }
+
+
+# 进程内共享的 watch 缓存
+watch_cache = WatchCache(InformerConfig.from_env())
@@ -0,0 +1,195 @@
+"""
+K8s 对象的字段投影
+
+结构化输出模式（output=json）下，把完整的 Kubernetes 对象裁剪为紧凑记录，代替 kubectl 文本表格：
+- 字段用类 JSONPath 的路径指定：metadata.name、spec.containers[0].image、status.containerStatuses[*].restartCount、
+  metadata.labels['app.kubernetes.io/name']，也接受 kubectl 风格的 {.metadata.name}
+- 每个字段可起别名（alias=path），未指定时取路径的最后一段
+- 内置与 kubectl 输出一致的计算字段（pods 的 status/ready/restarts/age，nodes 的 status/roles 等）
+- group_by 对任意字段计数（例如每个 phase 的 Pod 数），只指定 group_by 时只返回汇总
+
+记录中值为空的字段会被省略；一个大命名空间的 -o json 通常有数 MB，投影后缩小 10–100 倍，只返回汇总时更小
+"""
+
+import re
+from typing import Any, Callable, Optional, Union
+
+from .k8s_format import event_time, format_age, node_roles, node_status, pod_status
+
+WILDCARD = object()
+
+
+# ─────────────────────────────────────────────────────────────
+# 计算字段与默认字段
+# ─────────────────────────────────────────────────────────────
+
+def _deployment_ready(deployment: dict) -> str:
+    status = deployment.get("status", {})
+    return f"{status.get('readyReplicas', 0)}/{deployment.get('spec', {}).get('replicas', 0)}"
+
+
+COMPUTED: dict[str, dict[str, Callable[[dict], Any]]] = {
+    "pods": {
+        "status": lambda pod: pod_status(pod)[0],
+        "ready": lambda pod: "{1}/{2}".format(*pod_status(pod)),
+        "restarts": lambda pod: pod_status(pod)[3],
+    },
+    "deployments": {
+        "ready": _deployment_ready,
+    },
+    "nodes": {
+        "status": node_status,
+        "roles": node_roles,
+    },
+    "events": {
+        "last": event_time,
+    },
+}
+
+# 所有资源通用的计算字段
+COMMON: dict[str, Callable[[dict], Any]] = {
+    "age": lambda obj: format_age(obj.get("metadata", {}).get("creationTimestamp")),
+}
+
+DEFAULT_FIELDS = {
+    "pods": "name=metadata.name,namespace=metadata.namespace,status,ready,restarts,node=spec.nodeName,age",
+    "deployments": ("name=metadata.name,namespace=metadata.namespace,ready,updated=status.updatedReplicas,"
+                    "available=status.availableReplicas,images=spec.template.spec.containers[*].image"),
+    "services": ("name=metadata.name,namespace=metadata.namespace,type=spec.type,"
+                 "cluster_ip=spec.clusterIP,ports=spec.ports[*].port"),
+    "events": ("namespace=metadata.namespace,type,reason,kind=involvedObject.kind,object=involvedObject.name,"
+               "count,last,message"),
+    "nodes": "name=metadata.name,status,roles,version=status.nodeInfo.kubeletVersion,age",
+}
+
+
+# ─────────────────────────────────────────────────────────────
+# 路径
+# ─────────────────────────────────────────────────────────────
+
+_TOKEN = re.compile(r"""\.?([^.\[\]]+)|\[(\*|-?\d+)\]|\[\s*(['"])(.*?)\3\s*\]""")
+
+
+def compile_path(path: str) -> list[Union[str, int, object]]:
+    """
+    解析字段路径为 [键名 | 下标 | WILDCARD]
+
+    Raises:
+        ValueError: 路径语法错误
+    """
+    text = path.strip()
+    if text.startswith("{") and text.endswith("}"):
+        text = text[1:-1].strip()
+    text = text[1:] if text.startswith("$") else text
+
+    tokens, position = [], 0
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if not match or match.end() == position:
+            raise ValueError(f"无效的字段路径：{path}")
+        name, index, _, quoted = match.groups()
+        if name is not None:
+            tokens.append(name)
+        elif quoted is not None:
+            tokens.append(quoted)
+        else:
+            tokens.append(WILDCARD if index == "*" else int(index))
+        position = match.end()
+    if not tokens:
+        raise ValueError(f"无效的字段路径：{path}")
+    return tokens
+
+
+def extract(obj: Any, tokens: list) -> Any:
+    """按路径取值；缺失返回 None，[*] 展开为列表（多层 [*] 展平为一层）"""
+    for i, token in enumerate(tokens):
+        if token is WILDCARD:
+            values = obj.values() if isinstance(obj, dict) else obj if isinstance(obj, list) else []
+            result = []
+            for value in values:
+                value = extract(value, tokens[i + 1:])
+                if isinstance(value, list) and WILDCARD in tokens[i + 1:]:
+                    result.extend(value)
+                elif value is not None:
+                    result.append(value)
+            return result
+        if isinstance(token, int):
+            if not isinstance(obj, list) or not -len(obj) <= token < len(obj):
+                return None
+            obj = obj[token]
+        elif isinstance(obj, dict):
+            obj = obj.get(token)
+        else:
+            return None
+    return obj
+
+
+# ─────────────────────────────────────────────────────────────
+# 投影
+# ─────────────────────────────────────────────────────────────
+
+def parse_fields(spec: Union[str, list, None], kind: str) -> list[tuple[str, Callable[[dict], Any]]]:
+    """
+    解析字段列表（逗号分隔的字符串或列表），返回 [(名称, 取值函数)]
+
+    每项为 path、alias=path 或计算字段名；为空时使用该资源的默认字段
+    """
+    if spec is None or spec == "" or spec == []:
+        spec = DEFAULT_FIELDS[kind]
+    items = spec if isinstance(spec, list) else re.split(r",(?![^\[]*\])", spec)
+
+    computed = {**COMMON, **COMPUTED.get(kind, {})}
+    fields = []
+    for item in (str(i).strip() for i in items):
+        if not item:
+            continue
+        alias, _, path = item.partition("=") if re.match(r"^[\w-]+=", item) else ("", "", item)
+        if path in computed:
+            fields.append((alias or path, computed[path]))
+            continue
+        tokens = compile_path(path)
+        name = alias or next((t for t in reversed(tokens) if isinstance(t, str)), path)
+        fields.append((name, lambda obj, tokens=tokens: extract(obj, tokens)))
+    return fields
+
+
+def _group_key(value: Any) -> str:
+    if isinstance(value, list):
+        return ",".join(str(v) for v in value) or "<none>"
+    return "<none>" if value is None or value == "" else str(value)
+
+
+def project(items: list[dict], kind: str, fields: Union[str, list, None] = None,
+            group_by: Optional[str] = None) -> dict:
+    """
+    把对象列表投影为紧凑结果
+
+    Args:
+        items: 完整的 Kubernetes 对象
+        kind: 资源类型（pods/deployments/services/events/nodes），决定默认字段和计算字段
+        fields: 返回的字段；只指定 group_by 时默认不返回记录
+        group_by: 分组计数的字段（路径或计算字段名，可带别名）
+
+    Returns:
+        {"count": 对象数, "items": [记录], "groups": {"by": 名称, "counts": {值: 数量}}}
+    """
+    result: dict[str, Any] = {"count": len(items)}
+    if fields or not group_by:
+        columns = parse_fields(fields, kind)
+        records = []
+        for obj in items:
+            record = {}
+            for name, getter in columns:
+                value = getter(obj)
+                if value is not None and value != "" and value != []:
+                    record[name] = value
+            records.append(record)
+        result["items"] = records
+    if group_by:
+        ((name, getter),) = parse_fields([group_by], kind)
+        counts: dict[str, int] = {}
+        for obj in items:
+            key = _group_key(getter(obj))
+            counts[key] = counts.get(key, 0) + 1
+        result["groups"] = {"by": name, "counts": dict(sorted(counts.items(), key=lambda kv: (-kv[1], kv[0])))}
+    return result
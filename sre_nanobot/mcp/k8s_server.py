@@ -2,14 +2,40 @@
 Kubernetes MCP Server
 
 提供 K8s 集群操作的 MCP 工具接口
+
+默认通过共享的原生 API 客户端访问集群（见 k8s_client），
+kubernetes 包或 kubeconfig 不可用时回退到 kubectl（K8S_BACKEND=kubectl 可强制使用 kubectl）；
+启用 watch 缓存（K8S_INFORMER_ENABLED=1，见 k8s_informer）后，Pod、Deployment、Node、Event 的读取直接查本地副本
+列表工具支持 output=json，按 fields / group_by 返回投影后的紧凑记录（见 k8s_project）；
+k8s_multi_get 并发查询多个命名空间的多种资源（见 k8s_fanout）
 """
 
 import asyncio
-import subprocess
+import json
+from datetime import datetime, timezone
 from typing import Any
 from mcp.server import Server
 from mcp.types import Tool, TextContent, Resource, ResourceTemplate
 
+from .k8s_client import k8s_client
+from .k8s_exec import kubectl_executor
+from .k8s_fanout import KINDS as FANOUT_KINDS, k8s_fanout, plan_field_selectors, plan_targets
+from .k8s_informer import watch_cache
+from .k8s_project import project
+from .k8s_format import (
+    default_container,
+    describe_node as format_describe_node,
+    describe_pod as format_describe_pod,
+    format_deployments,
+    format_events,
+    format_nodes,
+    format_pod_metrics,
+    format_pods,
+    format_services,
+    sort_events,
+)
+from .prom_time import parse_duration
+
 # 创建 MCP 服务器实例
 k8s_server = Server("sre-k8s-mcp")
 
@@ -18,6 +44,29 @@ k8s_server = Server("sre-k8s-mcp")
 # 工具定义
 # ─────────────────────────────────────────────────────────────
 
+def structured_properties(example_group: str) -> dict:
+    """列表工具共用的结构化输出参数"""
+    return {
+        "output": {
+            "type": "string",
+            "enum": ["text", "json"],
+            "description": "输出格式：text 为 kubectl 表格，json 为按 fields 投影的紧凑记录",
+            "default": "text"
+        },
+        "fields": {
+            "type": "string",
+            "description": (
+                "json 模式返回的字段，逗号分隔，支持别名和类 JSONPath 路径，例如："
+                "name=metadata.name,status,images=spec.containers[*].image；为空时使用默认字段"
+            )
+        },
+        "group_by": {
+            "type": "string",
+            "description": f"json 模式下按字段分组计数，例如：{example_group}；只指定 group_by 时只返回汇总"
+        }
+    }
+
+
 @k8s_server.list_tools()
 async def list_tools() -> list[Tool]:
     """列出所有可用的 K8s 工具"""
@@ -41,7 +90,8 @@ async def list_tools() -> list[Tool]:
                         "type": "boolean",
                         "description": "是否显示 Pod 标签",
                         "default": False
-                    }
+                    },
+                    **structured_properties("status.phase")
                 },
                 "required": ["namespace"]
             }
@@ -61,7 +111,8 @@ async def list_tools() -> list[Tool]:
                         "type": "boolean",
                         "description": "是否显示详细信息（副本数、镜像等）",
                         "default": False
-                    }
+                    },
+                    **structured_properties("ready")
                 },
                 "required": ["namespace"]
             }
@@ -76,7 +127,8 @@ async def list_tools() -> list[Tool]:
                         "type": "string",
                         "description": "Kubernetes 命名空间",
                         "default": "default"
-                    }
+                    },
+                    **structured_properties("spec.type")
                 },
                 "required": ["namespace"]
             }
@@ -100,7 +152,8 @@ async def list_tools() -> list[Tool]:
                         "type": "integer",
                         "description": "返回事件数量限制",
                         "default": 50
-                    }
+                    },
+                    **structured_properties("reason")
                 },
                 "required": ["namespace"]
             }
@@ -219,7 +272,8 @@ async def list_tools() -> list[Tool]:
                         "type": "boolean",
                         "description": "是否显示详细信息（CPU、内存等）",
                         "default": False
-                    }
+                    },
+                    **structured_properties("status")
                 }
             }
         ),
@@ -237,6 +291,57 @@ async def list_tools() -> list[Tool]:
                 },
                 "required": ["namespace"]
             }
+        ),
+        Tool(
+            name="k8s_multi_get",
+            description=(
+                "一次并发查询多个命名空间的多种资源（Pod、Deployment、Service、Event、Node），"
+                "合并去重后按资源类型返回紧凑 JSON，并列出每个目标的状态；用于跨命名空间排障"
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "namespaces": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "命名空间列表，例如：[\"prod\", \"staging\"]（nodes 不需要）"
+                    },
+                    "kinds": {
+                        "type": "array",
+                        "items": {"type": "string", "enum": list(FANOUT_KINDS)},
+                        "description": "资源类型列表",
+                        "default": ["pods"]
+                    },
+                    "label_selector": {
+                        "type": "string",
+                        "description": "标签选择器，应用于所有目标"
+                    },
+                    "field_selector": {
+                        "type": ["string", "object"],
+                        "description": (
+                            "字段选择器：字符串只应用于支持其字段的资源类型（例如 status.phase=Running 只过滤 pods）；"
+                            "也可按资源类型分别指定，例如：{\"pods\": \"status.phase!=Running\", \"events\": \"type=Warning\"}"
+                        )
+                    },
+                    "fields": {
+                        "type": "string",
+                        "description": "返回的字段（语法同列表工具的 fields），为空时各资源使用默认字段"
+                    },
+                    "group_by": {
+                        "type": "string",
+                        "description": "按字段分组计数，例如：status；只指定 group_by 时只返回汇总"
+                    }
+                },
+                "required": ["namespaces"]
+            }
+        ),
+        Tool(
+            name="k8s_runtime_stats",
+            description="获取 K8s MCP Server 运行时统计（当前后端、API 请求数等）",
+            inputSchema={
+                "type": "object",
+                "properties": {}
+            }
         )
     ]
 
@@ -272,6 +377,10 @@ async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent]:
             return await get_nodes(arguments)
         elif name == "kubectl_get_resource_usage":
             return await get_resource_usage(arguments)
+        elif name == "k8s_multi_get":
+            return await multi_get(arguments)
+        elif name == "k8s_runtime_stats":
+            return await get_runtime_stats(arguments)
         else:
             return [TextContent(type="text", text=f"未知工具：{name}")]
     
@@ -284,26 +393,51 @@ async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent]:
 # ─────────────────────────────────────────────────────────────
 
 async def run_kubectl(args: list[str], timeout: int = 30) -> str:
-    """运行 kubectl 命令"""
-    cmd = ["kubectl"] + args
-    try:
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        stdout, stderr = await asyncio.wait_for(
-            process.communicate(),
-            timeout=timeout
-        )
-        
-        if process.returncode != 0:
-            raise Exception(f"kubectl 失败：{stderr.decode('utf-8')}")
-        
-        return stdout.decode('utf-8')
-    
-    except asyncio.TimeoutError:
-        raise Exception(f"kubectl 超时（{timeout}秒）")
+    """
+    运行 kubectl 命令（经由共享执行器：并发受限，超时终止整个进程组）
+
+    -o json 全量对象和 logs 在大命名空间中可达数百 MB，使用 max_bulk_output 上限
+    """
+    bulk = args[:1] == ["logs"] or any(flag == "-o" and value == "json" for flag, value in zip(args, args[1:]))
+    return await kubectl_executor.run(args, timeout, kubectl_executor.config.max_bulk_output if bulk else None)
+
+
+# 资源 -> 原生客户端的 list 方法（nodes 不区分命名空间）
+LIST_METHODS = {
+    "pods": ("CoreV1Api", "list_namespaced_pod"),
+    "deployments": ("AppsV1Api", "list_namespaced_deployment"),
+    "services": ("CoreV1Api", "list_namespaced_service"),
+    "events": ("CoreV1Api", "list_namespaced_event"),
+    "nodes": ("CoreV1Api", "list_node"),
+}
+
+
+async def list_objects(kind: str, namespace: str = None, label_selector: str = None,
+                       field_selector: str = None) -> list[dict]:
+    """获取完整对象：watch 缓存 → 原生客户端 → kubectl -o json"""
+    if (store := watch_cache.store(kind)) is not None:
+        return store.list(namespace, label_selector, field_selector)
+
+    if k8s_client.native:
+        api, method = LIST_METHODS[kind]
+        result = await k8s_client.request(api, method, *([namespace] if namespace else []),
+                                          label_selector=label_selector, field_selector=field_selector)
+        return result.get("items", [])
+
+    cmd_args = ["get", kind] + (["-n", namespace] if namespace else [])
+    if label_selector:
+        cmd_args.extend(["-l", label_selector])
+    if field_selector:
+        cmd_args.extend(["--field-selector", field_selector])
+    output = await run_kubectl(cmd_args + ["-o", "json"])
+    return json.loads(output).get("items", []) if output.strip() else []
+
+
+def structured_output(title: str, kind: str, items: list[dict], args: dict) -> list[TextContent]:
+    """按 fields / group_by 投影为紧凑 JSON"""
+    result = project(items, kind, args.get("fields"), args.get("group_by"))
+    text = json.dumps(result, ensure_ascii=False, separators=(",", ":"))
+    return [TextContent(type="text", text=f"{title}（{result['count']} 个）:\n```json\n{text}\n```")]
 
 
 async def get_pods(args: dict) -> list[TextContent]:
@@ -312,15 +446,26 @@ async def get_pods(args: dict) -> list[TextContent]:
     label_selector = args.get("label_selector")
     show_labels = args.get("show_labels", False)
     
-    cmd_args = ["get", "pods", "-n", namespace]
+    if args.get("output") == "json":
+        items = await list_objects("pods", namespace, label_selector)
+        return structured_output(f"📦 Pods in {namespace}", "pods", items, args)
     
-    if label_selector:
-        cmd_args.extend(["-l", label_selector])
-    
-    if show_labels:
-        cmd_args.append("--show-labels")
-    
-    output = await run_kubectl(cmd_args)
+    if (store := watch_cache.store("pods")) is not None:
+        output = format_pods(store.list(namespace, label_selector), show_labels)
+    elif k8s_client.native:
+        pods = await k8s_client.request("CoreV1Api", "list_namespaced_pod", namespace,
+                                        label_selector=label_selector)
+        output = format_pods(pods.get("items", []), show_labels)
+    else:
+        cmd_args = ["get", "pods", "-n", namespace]
+        
+        if label_selector:
+            cmd_args.extend(["-l", label_selector])
+        
+        if show_labels:
+            cmd_args.append("--show-labels")
+        
+        output = await run_kubectl(cmd_args)
     return [TextContent(type="text", text=f"📦 Pods in {namespace}:\n```\n{output}\n```")]
 
 
@@ -329,12 +474,22 @@ async def get_deployments(args: dict) -> list[TextContent]:
     namespace = args.get("namespace", "default")
     show_details = args.get("show_details", False)
     
-    cmd_args = ["get", "deployments", "-n", namespace]
-    
-    if show_details:
-        cmd_args.append("-o wide")
+    if args.get("output") == "json":
+        items = await list_objects("deployments", namespace)
+        return structured_output(f"🚀 Deployments in {namespace}", "deployments", items, args)
     
-    output = await run_kubectl(cmd_args)
+    if (store := watch_cache.store("deployments")) is not None:
+        output = format_deployments(store.list(namespace), wide=show_details)
+    elif k8s_client.native:
+        deployments = await k8s_client.request("AppsV1Api", "list_namespaced_deployment", namespace)
+        output = format_deployments(deployments.get("items", []), wide=show_details)
+    else:
+        cmd_args = ["get", "deployments", "-n", namespace]
+        
+        if show_details:
+            cmd_args.extend(["-o", "wide"])
+        
+        output = await run_kubectl(cmd_args)
     return [TextContent(type="text", text=f"🚀 Deployments in {namespace}:\n```\n{output}\n```")]
 
 
@@ -342,7 +497,15 @@ async def get_services(args: dict) -> list[TextContent]:
     """获取 Service 列表"""
     namespace = args.get("namespace", "default")
     
-    output = await run_kubectl(["get", "services", "-n", namespace])
+    if args.get("output") == "json":
+        items = await list_objects("services", namespace)
+        return structured_output(f"🌐 Services in {namespace}", "services", items, args)
+    
+    if k8s_client.native:
+        services = await k8s_client.request("CoreV1Api", "list_namespaced_service", namespace)
+        output = format_services(services.get("items", []))
+    else:
+        output = await run_kubectl(["get", "services", "-n", namespace])
     return [TextContent(type="text", text=f"🌐 Services in {namespace}:\n```\n{output}\n```")]
 
 
@@ -352,6 +515,22 @@ async def get_events(args: dict) -> list[TextContent]:
     field_selector = args.get("field_selector")
     limit = args.get("limit", 50)
     
+    if args.get("output") == "json":
+        items = sort_events(await list_objects("events", namespace, field_selector=field_selector))[-limit:]
+        return structured_output(f"📋 Events in {namespace}", "events", items, args)
+    
+    if (store := watch_cache.store("events")) is not None or k8s_client.native:
+        if store is not None:
+            items = store.list(namespace, field_selector=field_selector)
+        else:
+            events = await k8s_client.request("CoreV1Api", "list_namespaced_event", namespace,
+                                              field_selector=field_selector)
+            items = events.get("items", [])
+        # 只返回最新的 limit 条事件
+        return [TextContent(type="text", text=(
+            f"📋 Events in {namespace}:\n```\n{format_events(sort_events(items)[-limit:])}\n```"
+        ))]
+    
     cmd_args = ["get", "events", "-n", namespace, "--sort-by=.lastTimestamp"]
     
     if field_selector:
@@ -359,9 +538,9 @@ async def get_events(args: dict) -> list[TextContent]:
     
     output = await run_kubectl(cmd_args)
     
-    # 只返回最新的 limit 条事件
+    # 只返回最新的 limit 条事件（保留表头）
     lines = output.strip().split('\n')
-    recent_events = '\n'.join(lines[-limit:]) if len(lines) > limit else output
+    recent_events = '\n'.join(lines[:1] + lines[-limit:]) if len(lines) > limit + 1 else output
     
     return [TextContent(type="text", text=f"📋 Events in {namespace}:\n```\n{recent_events}\n```")]
 
@@ -374,9 +553,21 @@ async def restart_deployment(args: dict) -> list[TextContent]:
     if not namespace or not deployment:
         return [TextContent(type="text", text="❌ 缺少参数：namespace 和 deployment 是必需的")]
     
-    output = await run_kubectl([
-        "rollout", "restart", "deployment", deployment, "-n", namespace
-    ])
+    if k8s_client.native:
+        # 与 kubectl rollout restart 相同：更新 Pod 模板上的 restartedAt 注解触发滚动更新
+        restarted_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        await k8s_client.request(
+            "AppsV1Api", "patch_namespaced_deployment", deployment, namespace,
+            {"spec": {"template": {"metadata": {"annotations": {
+                "kubectl.kubernetes.io/restartedAt": restarted_at
+            }}}}},
+            content_type="application/strategic-merge-patch+json",
+        )
+        output = f"deployment.apps/{deployment} restarted\n"
+    else:
+        output = await run_kubectl([
+            "rollout", "restart", "deployment", deployment, "-n", namespace
+        ])
     
     return [TextContent(type="text", text=f"✅ 重启 Deployment `{deployment}` (namespace: {namespace}):\n```\n{output}\n```")]
 
@@ -390,9 +581,17 @@ async def scale_deployment(args: dict) -> list[TextContent]:
     if not all([namespace, deployment, replicas is not None]):
         return [TextContent(type="text", text="❌ 缺少参数：namespace, deployment, replicas 是必需的")]
     
-    output = await run_kubectl([
-        "scale", "deployment", deployment, "-n", namespace, f"--replicas={replicas}"
-    ])
+    if k8s_client.native:
+        await k8s_client.request(
+            "AppsV1Api", "patch_namespaced_deployment_scale", deployment, namespace,
+            {"spec": {"replicas": int(replicas)}},
+            content_type="application/strategic-merge-patch+json",
+        )
+        output = f"deployment.apps/{deployment} scaled\n"
+    else:
+        output = await run_kubectl([
+            "scale", "deployment", deployment, "-n", namespace, f"--replicas={replicas}"
+        ])
     
     return [TextContent(type="text", text=f"✅ 扩缩容 Deployment `{deployment}` 到 {replicas} 副本:\n```\n{output}\n```")]
 
@@ -408,15 +607,29 @@ async def get_logs(args: dict) -> list[TextContent]:
     if not namespace or not pod:
         return [TextContent(type="text", text="❌ 缺少参数：namespace 和 pod 是必需的")]
     
-    cmd_args = ["logs", pod, "-n", namespace, "--tail", str(tail)]
-    
-    if container:
-        cmd_args.extend(["-c", container])
-    
-    if since:
-        cmd_args.extend(["--since", since])
-    
-    output = await run_kubectl(cmd_args)
+    if k8s_client.native:
+        if not container:
+            # 与 kubectl 相同地选默认容器：多容器 Pod 不指定容器时 API 返回 400
+            store = watch_cache.store("pods")
+            obj = store.get(pod, namespace) if store is not None else None
+            if obj is None:
+                obj = await k8s_client.request("CoreV1Api", "read_namespaced_pod", pod, namespace)
+            container = default_container(obj)
+        output = await k8s_client.request(
+            "CoreV1Api", "read_namespaced_pod_log", pod, namespace, raw=True,
+            container=container, tail_lines=int(tail),
+            since_seconds=int(parse_duration(since)) if since else None,
+        )
+    else:
+        cmd_args = ["logs", pod, "-n", namespace, "--tail", str(tail)]
+        
+        if container:
+            cmd_args.extend(["-c", container])
+        
+        if since:
+            cmd_args.extend(["--since", since])
+        
+        output = await run_kubectl(cmd_args)
     return [TextContent(type="text", text=f"📜 Logs from `{pod}`:\n```\n{output}\n```")]
 
 
@@ -428,7 +641,20 @@ async def describe_pod(args: dict) -> list[TextContent]:
     if not namespace or not pod:
         return [TextContent(type="text", text="❌ 缺少参数：namespace 和 pod 是必需的")]
     
-    output = await run_kubectl(["describe", "pod", pod, "-n", namespace])
+    pods, events = watch_cache.store("pods"), watch_cache.store("events")
+    if pods is not None and events is not None and (obj := pods.get(pod, namespace)) is not None:
+        selector = f"involvedObject.kind=Pod,involvedObject.name={pod}"
+        output = format_describe_pod(obj, events.list(namespace, field_selector=selector))
+    elif k8s_client.native:
+        # Pod 和相关事件并发获取
+        obj, events = await asyncio.gather(
+            k8s_client.request("CoreV1Api", "read_namespaced_pod", pod, namespace),
+            k8s_client.request("CoreV1Api", "list_namespaced_event", namespace,
+                               field_selector=f"involvedObject.kind=Pod,involvedObject.name={pod}"),
+        )
+        output = format_describe_pod(obj, events.get("items", []))
+    else:
+        output = await run_kubectl(["describe", "pod", pod, "-n", namespace])
     return [TextContent(type="text", text=f"🔍 Pod `{pod}` 详情:\n```\n{output}\n```")]
 
 
@@ -439,7 +665,23 @@ async def describe_node(args: dict) -> list[TextContent]:
     if not node:
         return [TextContent(type="text", text="❌ 缺少参数：node 是必需的")]
     
-    output = await run_kubectl(["describe", "node", node])
+    # 与 kubectl 相同：Non-terminated Pods / Allocated resources 按该节点上未终止的 Pod 汇总
+    pod_selector = f"spec.nodeName={node},status.phase!=Succeeded,status.phase!=Failed"
+    nodes, events, pods = watch_cache.store("nodes"), watch_cache.store("events"), watch_cache.store("pods")
+    if None not in (nodes, events, pods) and (obj := nodes.get(node)) is not None:
+        selector = f"involvedObject.kind=Node,involvedObject.name={node}"
+        output = format_describe_node(obj, events.list(field_selector=selector),
+                                      pods.list(field_selector=pod_selector))
+    elif k8s_client.native:
+        obj, events, pods = await asyncio.gather(
+            k8s_client.request("CoreV1Api", "read_node", node),
+            k8s_client.request("CoreV1Api", "list_event_for_all_namespaces",
+                               field_selector=f"involvedObject.kind=Node,involvedObject.name={node}"),
+            k8s_client.request("CoreV1Api", "list_pod_for_all_namespaces", field_selector=pod_selector),
+        )
+        output = format_describe_node(obj, events.get("items", []), pods.get("items", []))
+    else:
+        output = await run_kubectl(["describe", "node", node])
     return [TextContent(type="text", text=f"🔍 Node `{node}` 详情:\n```\n{output}\n```")]
 
 
@@ -447,12 +689,21 @@ async def get_nodes(args: dict) -> list[TextContent]:
     """获取 Node 列表"""
     show_details = args.get("show_details", False)
     
-    cmd_args = ["get", "nodes"]
+    if args.get("output") == "json":
+        return structured_output("🖥️ Cluster Nodes", "nodes", await list_objects("nodes"), args)
     
-    if show_details:
-        cmd_args.append("-o wide")
-    
-    output = await run_kubectl(cmd_args)
+    if (store := watch_cache.store("nodes")) is not None:
+        output = format_nodes(store.list(), wide=show_details)
+    elif k8s_client.native:
+        nodes = await k8s_client.request("CoreV1Api", "list_node")
+        output = format_nodes(nodes.get("items", []), wide=show_details)
+    else:
+        cmd_args = ["get", "nodes"]
+        
+        if show_details:
+            cmd_args.extend(["-o", "wide"])
+        
+        output = await run_kubectl(cmd_args)
     return [TextContent(type="text", text=f"🖥️ Cluster Nodes:\n```\n{output}\n```")]
 
 
@@ -461,12 +712,62 @@ async def get_resource_usage(args: dict) -> list[TextContent]:
     namespace = args.get("namespace", "default")
     
     try:
-        output = await run_kubectl(["top", "pods", "-n", namespace])
+        if k8s_client.native:
+            metrics = await k8s_client.request("CustomObjectsApi", "list_namespaced_custom_object",
+                                               "metrics.k8s.io", "v1beta1", namespace, "pods")
+            output = format_pod_metrics(metrics.get("items", []))
+        else:
+            output = await run_kubectl(["top", "pods", "-n", namespace])
         return [TextContent(type="text", text=f"📊 Resource Usage in {namespace}:\n```\n{output}\n```")]
     except Exception as e:
         return [TextContent(type="text", text=f"⚠️ 无法获取资源使用（需要 metrics-server）: {str(e)}")]
 
 
+async def multi_get(args: dict) -> list[TextContent]:
+    """并发查询多个命名空间 × 资源类型"""
+    label_selector = args.get("label_selector")
+    targets = plan_targets(args.get("namespaces") or [], args.get("kinds") or ["pods"])
+    field_selectors = plan_field_selectors(args.get("field_selector"), [target.kind for target in targets])
+    
+    async def fetch(kind: str, namespace: str) -> list[dict]:
+        return await list_objects(kind, namespace, label_selector, field_selectors.get(kind))
+    
+    data = await k8s_fanout.query(targets, fetch)
+    
+    output = f"🔎 多目标查询：{len(targets)} 个目标"
+    if data["partial"]:
+        output += "（部分目标失败，结果不完整）"
+    output += "\n"
+    if field_selectors:
+        output += "字段选择器：" + "，".join(f"{kind}: {selector}" for kind, selector in field_selectors.items()) + "\n"
+    output += "\n目标状态:\n"
+    for name, report in data["targets"].items():
+        if report["status"] == "success":
+            output += f"  ✅ {name}: {report['latency'] * 1000:.0f}ms, {report['count']} 个对象\n"
+        else:
+            output += f"  ❌ {name}: {report['latency'] * 1000:.0f}ms, {report['error']}\n"
+    
+    results = {}
+    for kind, items in data["items"].items():
+        if kind == "events":
+            items = sort_events(items)
+        results[kind] = project(items, kind, args.get("fields"), args.get("group_by"))
+    text = json.dumps(results, ensure_ascii=False, separators=(",", ":"))
+    return [TextContent(type="text", text=f"{output}\n```json\n{text}\n```")]
+
+
+async def get_runtime_stats(args: dict) -> list[TextContent]:
+    """获取运行时统计"""
+    stats = {
+        "client": k8s_client.stats(),
+        "kubectl": kubectl_executor.stats(),
+        "watch_cache": watch_cache.stats(),
+        "fanout": k8s_fanout.stats(),
+    }
+    
+    return [TextContent(type="text", text=f"📊 运行时统计:\n```json\n{json.dumps(stats, ensure_ascii=False, indent=2)}\n```")]
+
+
 # ─────────────────────────────────────────────────────────────
 # 资源定义（可选）
 # ─────────────────────────────────────────────────────────────
@@ -494,8 +795,12 @@ async def list_resources() -> list[Resource]:
 async def read_resource(uri: str) -> str:
     """读取 K8s 资源"""
     if uri == "k8s://cluster/nodes":
+        if k8s_client.native:
+            return json.dumps(await k8s_client.request("CoreV1Api", "list_node"), ensure_ascii=False, indent=4)
         return await run_kubectl(["get", "nodes", "-o", "json"])
     elif uri == "k8s://cluster/namespaces":
+        if k8s_client.native:
+            return json.dumps(await k8s_client.request("CoreV1Api", "list_namespace"), ensure_ascii=False, indent=4)
         return await run_kubectl(["get", "namespaces", "-o", "json"])
     else:
         raise ValueError(f"不支持的资源 URI: {uri}")
@@ -531,11 +836,17 @@ if __name__ == "__main__":
     import asyncio
     
     async def main():
-        async with stdio_server() as (read_stream, write_stream):
-            await k8s_server.run(
-                read_stream,
-                write_stream,
-                k8s_server.create_initialization_options()
-            )
+        if watch_cache.config.enabled and k8s_client.native:
+            watch_cache.start(k8s_client)
+        try:
+            async with stdio_server() as (read_stream, write_stream):
+                await k8s_server.run(
+                    read_stream,
+                    write_stream,
+                    k8s_server.create_initialization_options()
+                )
+        finally:
+            watch_cache.stop()
+            k8s_client.close()
     
     asyncio.run(main())
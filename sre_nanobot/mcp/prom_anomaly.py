@@ -0,0 +1,213 @@
+"""
+时间序列异常与变点检测
+
+对 SeriesMatrix（N 条序列 × T 个时间点，缺失为 NaN）一次性向量化计算：
+- zscore: 滚动 z-score，当前点相对前 window 个点的均值 / 标准差的偏离
+- ewma: 当前点相对指数加权均值的偏离（以指数加权标准差归一化）
+- cusum: 累积和变点，找出均值发生跳变的位置及幅度
+
+每个检测器的得分除以各自阈值后取最大值作为序列得分，只返回超过阈值的序列
+"""
+
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+
+from .prom_series import SeriesMatrix
+
+DETECTORS = ("zscore", "ewma", "cusum")
+
+
+@dataclass
+class AnomalyConfig:
+    """检测参数"""
+    window: int = 20              # 滚动 z-score 窗口（点数）
+    z_threshold: float = 5.0
+    ewma_alpha: float = 0.3
+    ewma_threshold: float = 5.0
+    cusum_threshold: float = 1.6  # 归一化累积和统计量阈值（白噪声下约 1% 超过）
+    min_points: int = 10          # 有效点数少于该值的序列不检测
+    max_timestamps: int = 5       # 每个检测器最多返回的异常时间点
+
+
+@dataclass
+class Finding:
+    """一条异常序列"""
+    metric: dict
+    score: float
+    detectors: dict = field(default_factory=dict)
+    change_point: Optional[dict] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "metric": self.metric,
+            "score": round(self.score, 3),
+            "detectors": self.detectors,
+            "change_point": self.change_point,
+        }
+
+
+# ─────────────────────────────────────────────────────────────
+# 检测器（输入 N×T 矩阵，逐点输出 N×T 得分）
+# ─────────────────────────────────────────────────────────────
+
+def _scale_floor(values: np.ndarray) -> np.ndarray:
+    """标准差下限：整条序列标准差的 10%，避免平稳序列的微小波动被放大"""
+    with np.errstate(invalid="ignore"):
+        scale = np.nanstd(values, axis=1, keepdims=True) * 0.1
+    return np.where(np.isfinite(scale) & (scale > 0), scale, np.inf)
+
+
+def rolling_zscore(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    滚动 z-score：|x_t - mean(x_{t-w..t-1})| / std(x_{t-w..t-1})
+
+    窗口统计通过累积和一次算出，窗口内有效点不足一半时得分为 0
+    """
+    n, t = values.shape
+    valid = ~np.isnan(values)
+    x = np.where(valid, values, 0.0)
+    zeros = np.zeros((n, 1))
+    sums = np.hstack([zeros, np.cumsum(x, axis=1)])
+    squares = np.hstack([zeros, np.cumsum(x * x, axis=1)])
+    counts = np.hstack([zeros, np.cumsum(valid, axis=1)])
+
+    hi = np.arange(t)
+    lo = np.maximum(hi - window, 0)
+    count = counts[:, hi] - counts[:, lo]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = (sums[:, hi] - sums[:, lo]) / count
+        var = (squares[:, hi] - squares[:, lo]) / count - mean * mean
+        std = np.maximum(np.sqrt(np.maximum(var, 0.0)), _scale_floor(values))
+        score = np.abs(values - mean) / std
+    enough = count >= max(window // 2, 2)
+    return np.where(valid & enough & np.isfinite(score), score, 0.0)
+
+
+def ewma_deviation(values: np.ndarray, alpha: float) -> np.ndarray:
+    """
+    EWMA 偏离：|x_t - ewma_{t-1}| / ewstd_{t-1}
+
+    递推沿时间方向进行，每一步同时处理所有序列；缺失点不更新状态
+    """
+    n, t = values.shape
+    beta = alpha / 4
+    floor = _scale_floor(values)[:, 0]
+    mean = np.full(n, np.nan)
+    var = np.zeros(n)
+    seen = np.zeros(n)
+    score = np.zeros((n, t))
+    for col in range(t):
+        x = values[:, col]
+        valid = ~np.isnan(x)
+        started = valid & ~np.isnan(mean)
+        dev = np.where(started, x - mean, 0.0)
+        std = np.maximum(np.sqrt(var), floor)
+        # 前几个点方差尚未稳定，不打分
+        score[:, col] = np.where(started & (seen >= 10), np.abs(dev) / std, 0.0)
+        mean = np.where(valid & np.isnan(mean), x, mean)
+        mean = np.where(started, mean + alpha * dev, mean)
+        # 方差更新得更慢，避免少数几个点就把尺度估计拉低
+        var = np.where(started, (1 - beta) * (var + beta * dev * dev), var)
+        seen += valid
+    return score
+
+
+def cusum_change_points(values: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    单变点累积和检测
+
+    C_t = Σ(x_i - mean)，|C_t| 最大处即均值跳变位置；
+    统计量 max|C_t| / (std * sqrt(n)) 越大，跳变越显著
+
+    Returns:
+        (统计量 (N,), 变点下标 (N,)，变点后的第一个点, 均值变化量 (N,))
+    """
+    n, t = values.shape
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=1)
+    with np.errstate(invalid="ignore"):
+        mean = np.nanmean(np.where(count[:, None] > 0, values, 0.0), axis=1)
+        std = np.nanstd(np.where(count[:, None] > 0, values, 0.0), axis=1)
+    filled = np.where(valid, values, mean[:, None])
+    cumulative = np.cumsum(filled - mean[:, None], axis=1)
+
+    index = np.abs(cumulative[:, :-1]).argmax(axis=1) if t > 1 else np.zeros(n, dtype=int)
+    peak = np.abs(cumulative[np.arange(n), index])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        stat = np.where(std > 0, peak / (std * np.sqrt(np.maximum(count, 1))), 0.0)
+        total = filled.sum(axis=1)
+        before = np.cumsum(filled, axis=1)[np.arange(n), index]
+        shift = (total - before) / np.maximum(t - index - 1, 1) - before / (index + 1)
+    return np.nan_to_num(stat), index + 1, np.nan_to_num(shift)
+
+
+# ─────────────────────────────────────────────────────────────
+# 汇总
+# ─────────────────────────────────────────────────────────────
+
+def _top_timestamps(score_row: np.ndarray, threshold: float, timestamps: np.ndarray, limit: int) -> list:
+    hits = np.flatnonzero(score_row >= threshold)
+    if len(hits) > limit:
+        hits = hits[np.argsort(score_row[hits])[::-1][:limit]]
+    return [float(ts) for ts in np.sort(timestamps[hits])]
+
+
+def detect_anomalies(matrix: SeriesMatrix, config: Optional[AnomalyConfig] = None,
+                     detectors: tuple = DETECTORS, limit: int = 10) -> list[Finding]:
+    """
+    对矩阵中的所有序列运行检测器，返回按得分降序排列的异常序列
+
+    Args:
+        matrix: 范围查询结果
+        config: 检测参数
+        detectors: 启用的检测器
+        limit: 最多返回的序列数
+    """
+    config = config or AnomalyConfig()
+    unknown = set(detectors) - set(DETECTORS)
+    if unknown:
+        raise ValueError(f"不支持的检测器：{', '.join(sorted(unknown))}，可选：{', '.join(DETECTORS)}")
+    if not len(matrix) or not matrix.values.size:
+        return []
+
+    values = matrix.values
+    timestamps = matrix.timestamps
+    eligible = (~np.isnan(values)).sum(axis=1) >= config.min_points
+    combined = np.zeros(len(matrix))
+    details: dict[str, tuple] = {}
+
+    if "zscore" in detectors:
+        score = rolling_zscore(values, config.window)
+        details["zscore"] = (score, config.z_threshold)
+        combined = np.maximum(combined, score.max(axis=1) / config.z_threshold)
+    if "ewma" in detectors:
+        score = ewma_deviation(values, config.ewma_alpha)
+        details["ewma"] = (score, config.ewma_threshold)
+        combined = np.maximum(combined, score.max(axis=1) / config.ewma_threshold)
+    if "cusum" in detectors:
+        stat, change_index, shift = cusum_change_points(values)
+        combined = np.maximum(combined, stat / config.cusum_threshold)
+
+    combined = np.where(eligible, combined, 0.0)
+    ranked = [row for row in np.argsort(combined)[::-1] if combined[row] >= 1.0][:limit]
+
+    findings = []
+    for row in ranked:
+        finding = Finding(metric=matrix.metric(row), score=float(combined[row]))
+        for name, (score, threshold) in details.items():
+            peak = float(score[row].max())
+            if peak >= threshold:
+                finding.detectors[name] = {
+                    "max": round(peak, 3),
+                    "timestamps": _top_timestamps(score[row], threshold, timestamps, config.max_timestamps),
+                }
+        if "cusum" in detectors and stat[row] >= config.cusum_threshold:
+            finding.change_point = {
+                "timestamp": float(timestamps[min(change_index[row], len(timestamps) - 1)]),
+                "shift": round(float(shift[row]), 6),
+                "stat": round(float(stat[row]), 3),
+            }
+        findings.append(finding)
+    return findings
@@ -0,0 +1,176 @@
+"""
+Prometheus 批量查询
+
+一次工具调用执行多条即时 / 范围查询：
+- 规范化后相同的查询只执行一次，结果共享给所有重复项
+- 在并发上限内并行执行
+- 单条查询失败只记录在该条结果中，不影响其它查询
+"""
+
+import asyncio
+import logging
+import os
+from dataclasses import dataclass, asdict
+from typing import Awaitable, Callable, Optional
+
+from .prom_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+
+# ─────────────────────────────────────────────────────────────
+# 配置
+# ─────────────────────────────────────────────────────────────
+
+@dataclass
+class BatchConfig:
+    """批量查询配置"""
+    max_concurrency: int = 8
+    max_queries: int = 100
+    query_timeout: float = 30.0  # 单条查询超时（秒）
+    max_series: int = 50         # 每条查询最多输出的序列数，超出部分截断
+
+    @classmethod
+    def from_env(cls) -> "BatchConfig":
+        """从环境变量读取配置（PROM_BATCH_*），未设置时使用默认值"""
+        default = cls()
+        return cls(
+            max_concurrency=int(os.getenv("PROM_BATCH_MAX_CONCURRENCY", default.max_concurrency)),
+            max_queries=int(os.getenv("PROM_BATCH_MAX_QUERIES", default.max_queries)),
+            query_timeout=float(os.getenv("PROM_BATCH_QUERY_TIMEOUT", default.query_timeout)),
+            max_series=int(os.getenv("PROM_BATCH_MAX_SERIES", default.max_series)),
+        )
+
+
+# ─────────────────────────────────────────────────────────────
+# 查询描述
+# ─────────────────────────────────────────────────────────────
+
+@dataclass
+class BatchQuery:
+    """批量中的一条查询"""
+    name: str
+    query: str
+    time: Optional[str] = None
+    start: Optional[str] = None
+    end: Optional[str] = None
+    step: Optional[str] = None
+
+    @property
+    def kind(self) -> str:
+        """同时给出 start / end / step 时为范围查询"""
+        return "range" if self.start and self.end and self.step else "instant"
+
+    def key(self) -> tuple:
+        """去重键：规范化查询 + 时间参数"""
+        if self.kind == "range":
+            return ("range", normalize_query(self.query), self.start, self.end, self.step)
+        return ("instant", normalize_query(self.query), self.time)
+
+    @classmethod
+    def from_dict(cls, item: dict, index: int) -> "BatchQuery":
+        """
+        从工具参数构造，name 缺省时使用序号
+
+        只给出 start / end / step 中的部分字段视为参数错误
+        """
+        query = item.get("query")
+        if not query:
+            raise ValueError(f"第 {index + 1} 条查询缺少 query")
+        range_fields = [item.get(field) for field in ("start", "end", "step")]
+        if any(range_fields) and not all(range_fields):
+            raise ValueError(f"第 {index + 1} 条查询的 start、end、step 需同时提供")
+        return cls(
+            name=str(item.get("name") or item.get("id") or f"q{index + 1}"),
+            query=query,
+            time=item.get("time"),
+            start=item.get("start"),
+            end=item.get("end"),
+            step=item.get("step"),
+        )
+
+
+# execute(query) -> Prometheus 返回的 data 字段
+QueryExecutor = Callable[[BatchQuery], Awaitable[dict]]
+
+
+# ─────────────────────────────────────────────────────────────
+# 批量执行器
+# ─────────────────────────────────────────────────────────────
+
+class BatchQueryRunner:
+    """批量查询执行器"""
+
+    def __init__(self, config: Optional[BatchConfig] = None):
+        self.config = config or BatchConfig()
+        self.batches = 0
+        self.queries_total = 0
+        self.queries_deduplicated = 0
+        self.queries_failed = 0
+
+    async def run(self, queries: list[BatchQuery], execute: QueryExecutor,
+                  max_concurrency: Optional[int] = None) -> list[dict]:
+        """
+        执行一批查询
+
+        Args:
+            queries: 查询列表
+            execute: 单条查询的执行函数
+            max_concurrency: 本批次并发上限，不超过配置值
+
+        Returns:
+            与 queries 顺序一致的结果列表，每项包含 name、query、type、status，
+            成功时带 data，失败时带 error
+        """
+        if len(queries) > self.config.max_queries:
+            raise ValueError(f"单次最多 {self.config.max_queries} 条查询，实际 {len(queries)} 条")
+
+        unique: dict[tuple, BatchQuery] = {}
+        for query in queries:
+            unique.setdefault(query.key(), query)
+
+        self.batches += 1
+        self.queries_total += len(queries)
+        self.queries_deduplicated += len(queries) - len(unique)
+
+        limit = self.config.max_concurrency
+        if max_concurrency:
+            limit = max(1, min(limit, max_concurrency))
+        semaphore = asyncio.Semaphore(limit)
+
+        async def run_one(query: BatchQuery) -> dict:
+            async with semaphore:
+                try:
+                    data = await asyncio.wait_for(execute(query), timeout=self.config.query_timeout)
+                    return {"status": "success", "data": data}
+                except asyncio.TimeoutError:
+                    self.queries_failed += 1
+                    return {"status": "error", "error": f"查询超时（{self.config.query_timeout}s）"}
+                except Exception as e:
+                    self.queries_failed += 1
+                    logger.warning(f"批量查询 {query.name} 失败：{e!r}")
+                    return {"status": "error", "error": str(e) or repr(e)}
+
+        outcomes = await asyncio.gather(*(run_one(q) for q in unique.values()))
+        by_key = dict(zip(unique.keys(), outcomes))
+
+        results = []
+        for query in queries:
+            item = {"name": query.name, "query": query.query, "type": query.kind}
+            item.update(by_key[query.key()])
+            results.append(item)
+        return results
+
+    def stats(self) -> dict:
+        """批量查询统计"""
+        return {
+            "batches": self.batches,
+            "queries_total": self.queries_total,
+            "queries_deduplicated": self.queries_deduplicated,
+            "queries_failed": self.queries_failed,
+            "config": asdict(self.config),
+        }
+
+
+# 进程内共享的批量查询执行器
+batch_runner = BatchQueryRunner(BatchConfig.from_env())
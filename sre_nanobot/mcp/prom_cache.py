@@ -0,0 +1,240 @@
+"""
+Prometheus 即时查询结果缓存
+
+按「规范化查询 + 对齐后的评估时间」缓存 /api/v1/query 的结果，
+支持 TTL 过期、LRU 淘汰和总字节数上限
+"""
+
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Hashable, Optional
+
+
+# ─────────────────────────────────────────────────────────────
+# 配置
+# ─────────────────────────────────────────────────────────────
+
+@dataclass
+class CacheConfig:
+    """结果缓存配置"""
+    enabled: bool = True
+    max_entries: int = 1024
+    max_bytes: int = 32 * 1024 * 1024
+    ttl: float = 15.0
+    resolution: float = 5.0  # 评估时间对齐粒度（秒）
+
+    @classmethod
+    def from_env(cls) -> "CacheConfig":
+        """从环境变量读取配置（PROM_CACHE_*），未设置时使用默认值"""
+        default = cls()
+        return cls(
+            enabled=os.getenv("PROM_CACHE_ENABLED", "true").lower() not in ("0", "false", "no"),
+            max_entries=int(os.getenv("PROM_CACHE_MAX_ENTRIES", default.max_entries)),
+            max_bytes=int(os.getenv("PROM_CACHE_MAX_BYTES", default.max_bytes)),
+            ttl=float(os.getenv("PROM_CACHE_TTL", default.ttl)),
+            resolution=float(os.getenv("PROM_CACHE_RESOLUTION", default.resolution)),
+        )
+
+
+# ─────────────────────────────────────────────────────────────
+# 查询规范化
+# ─────────────────────────────────────────────────────────────
+
+# 这些符号两侧的空白不影响 PromQL 语义
+_TIGHT_CHARS = set("(){}[],=!~")
+
+
+def normalize_query(query: str) -> str:
+    """
+    规范化 PromQL 用作缓存键
+
+    折叠字符串字面量之外的连续空白，并去掉括号、逗号、匹配符两侧的空白；
+    引号内的标签值保持原样。
+    """
+    out: list[str] = []
+    quote: Optional[str] = None
+    pending_space = False
+    i = 0
+    while i < len(query):
+        ch = query[i]
+        if quote:
+            out.append(ch)
+            if ch == "\\" and quote != "`" and i + 1 < len(query):
+                out.append(query[i + 1])
+                i += 1
+            elif ch == quote:
+                quote = None
+        elif ch.isspace():
+            pending_space = True
+        else:
+            if pending_space and out and out[-1] not in _TIGHT_CHARS and ch not in _TIGHT_CHARS:
+                out.append(" ")
+            pending_space = False
+            if ch in "\"'`":
+                quote = ch
+            out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def estimate_size(value: Any) -> int:
+    """估算缓存值占用的字节数（按紧凑 JSON 长度）"""
+    return len(json.dumps(value, separators=(",", ":"), ensure_ascii=False))
+
+
+# ─────────────────────────────────────────────────────────────
+# TTL + LRU 缓存
+# ─────────────────────────────────────────────────────────────
+
+class TTLCache:
+    """
+    带 TTL 的 LRU 缓存
+
+    条目数超过 max_entries 或总字节数超过 max_bytes 时淘汰最久未使用的条目；
+    单个值超过 max_bytes 时不缓存。
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 32 * 1024 * 1024,
+                 ttl: float = 15.0, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: "OrderedDict[Hashable, tuple[Any, int, float]]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry[2] > self.clock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """读取缓存，未命中或已过期返回 None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, _, expires_at = entry
+        if expires_at <= self.clock():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any, size: Optional[int] = None,
+            ttl: Optional[float] = None) -> bool:
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            value: 缓存值
+            size: 值的字节数，不填时按 JSON 长度估算
+            ttl: 本条目的 TTL，不填使用默认值
+
+        Returns:
+            是否写入成功
+        """
+        size = estimate_size(value) if size is None else size
+        if size > self.max_bytes:
+            return False
+
+        if key in self._entries:
+            self._remove(key)
+
+        expires_at = self.clock() + (self.ttl if ttl is None else ttl)
+        self._entries[key] = (value, size, expires_at)
+        self.total_bytes += size
+
+        while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+        return True
+
+    def invalidate(self, key: Hashable) -> None:
+        """删除指定条目"""
+        if key in self._entries:
+            self._remove(key)
+
+    def clear(self) -> None:
+        """清空缓存（保留统计计数）"""
+        self._entries.clear()
+        self.total_bytes = 0
+
+    def _remove(self, key: Hashable) -> None:
+        _, size, _ = self._entries.pop(key)
+        self.total_bytes -= size
+
+    def stats(self) -> dict:
+        """缓存统计"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+# ─────────────────────────────────────────────────────────────
+# 即时查询缓存
+# ─────────────────────────────────────────────────────────────
+
+class QueryResultCache:
+    """即时查询结果缓存，键为 (规范化查询, 对齐后的评估时间)"""
+
+    def __init__(self, config: Optional[CacheConfig] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.config = config or CacheConfig()
+        self._cache = TTLCache(
+            max_entries=self.config.max_entries,
+            max_bytes=self.config.max_bytes,
+            ttl=self.config.ttl,
+            clock=clock,
+        )
+        self.bypassed = 0
+
+    @staticmethod
+    def make_key(query: str, eval_time: float) -> tuple[str, float]:
+        return normalize_query(query), eval_time
+
+    def get(self, query: str, eval_time: float) -> Optional[Any]:
+        if not self.config.enabled:
+            return None
+        return self._cache.get(self.make_key(query, eval_time))
+
+    def put(self, query: str, eval_time: float, value: Any) -> bool:
+        if not self.config.enabled:
+            return False
+        return self._cache.put(self.make_key(query, eval_time), value)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        stats = self._cache.stats()
+        stats["bypassed"] = self.bypassed
+        stats["config"] = asdict(self.config)
+        return stats
+
+
+# 进程内共享的即时查询缓存
+query_cache = QueryResultCache(CacheConfig.from_env())
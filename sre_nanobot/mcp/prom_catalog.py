@@ -0,0 +1,309 @@
+"""
+Prometheus 指标元数据 / 标签值目录
+
+在内存中维护指标名称、类型、帮助信息和标签值的索引，后台定时刷新：
+- 元数据整体拉取后与现有索引做差异合并，只更新变化的指标
+- 标签值按 start 参数只拉取上次刷新之后出现的值，定期全量同步以移除过期值
+- 指标名和标签值都按排序列表保存，支持前缀查找（二分）和模糊查找
+"""
+
+import asyncio
+import bisect
+import difflib
+import logging
+import os
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# fetch(endpoint, params) -> Prometheus 返回的 data 字段
+CatalogFetcher = Callable[[str, Optional[dict]], Awaitable[Any]]
+
+
+# ─────────────────────────────────────────────────────────────
+# 配置
+# ─────────────────────────────────────────────────────────────
+
+@dataclass
+class CatalogConfig:
+    """元数据目录配置"""
+    enabled: bool = True
+    refresh_interval: float = 300.0   # 后台刷新间隔（秒）
+    full_resync_every: int = 12       # 每隔多少次增量刷新做一次全量同步
+    overlap: float = 60.0             # 增量拉取标签值时向前多取的时长（秒）
+    fuzzy_cutoff: float = 0.6         # 模糊匹配相似度下限
+
+    @classmethod
+    def from_env(cls) -> "CatalogConfig":
+        """从环境变量读取配置（PROM_CATALOG_*），未设置时使用默认值"""
+        default = cls()
+        return cls(
+            enabled=os.getenv("PROM_CATALOG_ENABLED", "true").lower() not in ("0", "false", "no"),
+            refresh_interval=float(os.getenv("PROM_CATALOG_REFRESH_INTERVAL", default.refresh_interval)),
+            full_resync_every=int(os.getenv("PROM_CATALOG_FULL_RESYNC_EVERY", default.full_resync_every)),
+            overlap=float(os.getenv("PROM_CATALOG_OVERLAP", default.overlap)),
+            fuzzy_cutoff=float(os.getenv("PROM_CATALOG_FUZZY_CUTOFF", default.fuzzy_cutoff)),
+        )
+
+
+# ─────────────────────────────────────────────────────────────
+# 排序索引
+# ─────────────────────────────────────────────────────────────
+
+class SortedIndex:
+    """排序字符串集合，支持前缀和模糊查找"""
+
+    def __init__(self, values: Iterable[str] = ()):
+        self._items: list[str] = sorted(set(values))
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, value: str) -> bool:
+        i = bisect.bisect_left(self._items, value)
+        return i < len(self._items) and self._items[i] == value
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def add(self, values: Iterable[str]) -> int:
+        """加入新值，返回实际新增的数量"""
+        new = set(values).difference(self._items)
+        if new:
+            self._items = sorted(new.union(self._items))
+        return len(new)
+
+    def replace(self, values: Iterable[str]) -> tuple[int, int]:
+        """整体替换，返回 (新增数, 移除数)"""
+        new = set(values)
+        old = set(self._items)
+        self._items = sorted(new)
+        return len(new - old), len(old - new)
+
+    def prefix(self, prefix: str, limit: Optional[int] = None) -> list[str]:
+        """返回以 prefix 开头的值（按字典序）"""
+        start = bisect.bisect_left(self._items, prefix)
+        result = []
+        for value in self._items[start:]:
+            if not value.startswith(prefix) or (limit is not None and len(result) >= limit):
+                break
+            result.append(value)
+        return result
+
+    def fuzzy(self, pattern: str, limit: int = 10, cutoff: float = 0.6) -> list[str]:
+        """
+        模糊查找：依次返回前缀匹配、子串匹配和相似度匹配的结果
+
+        比较时忽略大小写
+        """
+        result = self.prefix(pattern, limit)
+        if len(result) >= limit:
+            return result
+        seen = set(result)
+        lowered = pattern.lower()
+        for value in self._items:
+            if value not in seen and lowered in value.lower():
+                result.append(value)
+                seen.add(value)
+                if len(result) >= limit:
+                    return result
+        for value in difflib.get_close_matches(pattern, self._items, n=limit, cutoff=cutoff):
+            if value not in seen:
+                result.append(value)
+                if len(result) >= limit:
+                    break
+        return result
+
+
+# ─────────────────────────────────────────────────────────────
+# 目录
+# ─────────────────────────────────────────────────────────────
+
+def _first_metadata(entries: Any) -> Optional[dict]:
+    """/api/v1/metadata 中每个指标对应一个列表，取第一项；不是列表或对象的项返回 None"""
+    if isinstance(entries, list):
+        return entries[0] if entries and isinstance(entries[0], dict) else {}
+    if isinstance(entries, dict):
+        return entries
+    return None
+
+
+class MetricCatalog:
+    """
+    指标元数据与标签值目录
+
+    首次使用时同步加载元数据，之后由后台任务按 refresh_interval 刷新；
+    标签值在首次查询某个标签时加载，之后随后台刷新增量更新。
+    """
+
+    def __init__(self, config: Optional[CatalogConfig] = None, clock: Callable[[], float] = time.time):
+        self.config = config or CatalogConfig()
+        self.clock = clock
+        self.metadata: dict[str, dict] = {}
+        self.metrics = SortedIndex()
+        self.labels: dict[str, SortedIndex] = {}
+        self._label_synced: dict[str, float] = {}
+        self._fetch: Optional[CatalogFetcher] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.loaded_at: Optional[float] = None
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.lookups = 0
+        self.last_changes: dict = {}
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    # ── 加载与刷新 ─────────────────────────────────────────
+
+    async def ensure_loaded(self, fetch: CatalogFetcher) -> None:
+        """确保元数据已加载，并启动后台刷新任务"""
+        self._fetch = fetch
+        if not self.loaded:
+            async with self._lock:
+                if not self.loaded:
+                    await self._refresh_metadata()
+                    self.loaded_at = self.clock()
+        self._start_background()
+
+    async def label_values(self, label: str, fetch: CatalogFetcher) -> SortedIndex:
+        """获取标签值索引，首次查询时全量加载"""
+        await self.ensure_loaded(fetch)
+        self.lookups += 1
+        if label not in self.labels:
+            async with self._lock:
+                if label not in self.labels:
+                    await self._refresh_label(label, full=True)
+        return self.labels[label]
+
+    async def refresh(self) -> dict:
+        """
+        执行一次刷新：元数据差异合并，已加载的标签值增量更新
+
+        Returns:
+            本次变化统计
+        """
+        async with self._lock:
+            full = self.config.full_resync_every > 0 and self.refreshes % self.config.full_resync_every == 0
+            changes = await self._refresh_metadata()
+            for label in list(self.labels):
+                added, removed = await self._refresh_label(label, full=full)
+                changes["label_values_added"] += added
+                changes["label_values_removed"] += removed
+            self.refreshes += 1
+            self.loaded_at = self.clock()
+            self.last_changes = changes
+            return changes
+
+    async def _refresh_metadata(self) -> dict:
+        data = await self._fetch("metadata", None)
+        changes = {"added": 0, "removed": 0, "updated": 0,
+                   "label_values_added": 0, "label_values_removed": 0}
+        if data and data.get("stale") is True:
+            # 熔断期间返回的旧结果：已有索引时本轮跳过，首次加载时去掉附加的 stale 字段后使用
+            if self.metadata:
+                return changes
+            data = {k: v for k, v in data.items() if k not in ("stale", "stale_age")}
+
+        current = {name: meta for name, entries in (data or {}).items()
+                   if (meta := _first_metadata(entries)) is not None}
+        for name, meta in current.items():
+            old = self.metadata.get(name)
+            if old is None:
+                changes["added"] += 1
+            elif old != meta:
+                changes["updated"] += 1
+            else:
+                continue
+            self.metadata[name] = meta
+        for name in set(self.metadata) - set(current):
+            del self.metadata[name]
+            changes["removed"] += 1
+
+        if changes["added"] or changes["removed"]:
+            # 没有元数据但出现在 __name__ 标签值中的指标同样保留
+            names = set(self.metadata)
+            if "__name__" in self.labels:
+                names.update(self.labels["__name__"])
+            self.metrics.replace(names)
+        return changes
+
+    async def _refresh_label(self, label: str, full: bool) -> tuple[int, int]:
+        now = self.clock()
+        synced = self._label_synced.get(label)
+        params = None
+        if not full and synced is not None:
+            params = {"start": str(synced - self.config.overlap)}
+
+        values = await self._fetch(f"label/{label}/values", params) or []
+        index = self.labels.setdefault(label, SortedIndex())
+        if params is None:
+            added, removed = index.replace(values)
+        else:
+            added, removed = index.add(values), 0
+        self._label_synced[label] = now
+
+        if label == "__name__" and (added or removed):
+            self.metrics.replace(set(self.metadata).union(index))
+        return added, removed
+
+    def _start_background(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._refresh_loop())
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.config.refresh_interval)
+            try:
+                changes = await self.refresh()
+                logger.debug(f"元数据目录已刷新：{changes}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 刷新失败时继续使用现有索引
+                self.refresh_errors += 1
+                logger.warning(f"元数据目录刷新失败：{e!r}")
+
+    async def stop(self) -> None:
+        """停止后台刷新任务"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # ── 查询 ───────────────────────────────────────────────
+
+    def get_metadata(self, metric: str) -> Optional[dict]:
+        self.lookups += 1
+        return self.metadata.get(metric)
+
+    def search_metrics(self, pattern: str, limit: int = 20) -> list[str]:
+        """按前缀 / 子串 / 相似度查找指标名"""
+        self.lookups += 1
+        return self.metrics.fuzzy(pattern, limit, self.config.fuzzy_cutoff)
+
+    def stats(self) -> dict:
+        """目录统计"""
+        return {
+            "loaded": self.loaded,
+            "loaded_at": self.loaded_at,
+            "metrics": len(self.metrics),
+            "labels": {label: len(index) for label, index in self.labels.items()},
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "lookups": self.lookups,
+            "last_changes": self.last_changes,
+            "background": self._task is not None and not self._task.done(),
+            "config": asdict(self.config),
+        }
+
+
+# 进程内共享的元数据目录
+metric_catalog = MetricCatalog(CatalogConfig.from_env())
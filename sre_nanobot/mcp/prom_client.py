@@ -0,0 +1,168 @@
+"""
+Prometheus HTTP 客户端管理
+
+为 Prometheus MCP Server 提供进程内共享、长连接复用的 httpx 客户端
+"""
+
+import logging
+import os
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+# ─────────────────────────────────────────────────────────────
+# 配置
+# ─────────────────────────────────────────────────────────────
+
+@dataclass
+class ClientConfig:
+    """HTTP 客户端连接池配置"""
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    http2: bool = False
+    timeout: float = 30.0
+    connect_timeout: float = 5.0
+
+    @classmethod
+    def from_env(cls) -> "ClientConfig":
+        """从环境变量读取配置（PROM_HTTP_*），未设置时使用默认值"""
+        default = cls()
+        return cls(
+            max_connections=int(os.getenv("PROM_HTTP_MAX_CONNECTIONS", default.max_connections)),
+            max_keepalive_connections=int(os.getenv(
+                "PROM_HTTP_MAX_KEEPALIVE", default.max_keepalive_connections
+            )),
+            keepalive_expiry=float(os.getenv("PROM_HTTP_KEEPALIVE_EXPIRY", default.keepalive_expiry)),
+            http2=os.getenv("PROM_HTTP_HTTP2", "").lower() in ("1", "true", "yes"),
+            timeout=float(os.getenv("PROM_HTTP_TIMEOUT", default.timeout)),
+            connect_timeout=float(os.getenv("PROM_HTTP_CONNECT_TIMEOUT", default.connect_timeout)),
+        )
+
+
+def _http2_available() -> bool:
+    """HTTP/2 需要可选依赖 h2"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# ─────────────────────────────────────────────────────────────
+# 客户端管理器
+# ─────────────────────────────────────────────────────────────
+
+class PrometheusClientManager:
+    """
+    管理共享的 httpx.AsyncClient
+
+    首次请求时惰性创建客户端，之后所有工具调用复用同一个连接池；
+    关闭或重新配置后，下一次请求会重建客户端。
+    """
+
+    def __init__(self, config: Optional[ClientConfig] = None,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        """
+        初始化客户端管理器
+
+        Args:
+            config: 连接池配置
+            transport: 自定义传输层（测试或代理场景使用）
+        """
+        self.config = config or ClientConfig()
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self.requests_total = 0
+        self.clients_created = 0
+
+    def _build_timeout(self, timeout: Optional[float] = None) -> httpx.Timeout:
+        """构造超时配置，连接超时不超过总超时"""
+        total = timeout if timeout is not None else self.config.timeout
+        return httpx.Timeout(total, connect=min(self.config.connect_timeout, total))
+
+    def _create_client(self) -> httpx.AsyncClient:
+        """按当前配置创建客户端"""
+        http2 = self.config.http2
+        if http2 and not _http2_available():
+            logger.warning("未安装 h2，HTTP/2 已禁用，回退到 HTTP/1.1")
+            http2 = False
+
+        limits = httpx.Limits(
+            max_connections=self.config.max_connections,
+            max_keepalive_connections=self.config.max_keepalive_connections,
+            keepalive_expiry=self.config.keepalive_expiry,
+        )
+        self.clients_created += 1
+        return httpx.AsyncClient(
+            limits=limits,
+            http2=http2,
+            timeout=self._build_timeout(),
+            transport=self.transport,
+        )
+
+    @property
+    def is_open(self) -> bool:
+        """客户端是否已创建且未关闭"""
+        return self._client is not None and not self._client.is_closed
+
+    def client(self) -> httpx.AsyncClient:
+        """获取共享客户端（不存在时创建）"""
+        if not self.is_open:
+            self._client = self._create_client()
+        return self._client
+
+    async def get(self, url: str, params: Optional[dict] = None,
+                  timeout: Optional[float] = None) -> httpx.Response:
+        """
+        发送 GET 请求
+
+        Args:
+            url: 请求地址
+            params: 查询参数
+            timeout: 本次请求的超时（秒），不填使用默认配置
+
+        Returns:
+            httpx.Response
+        """
+        self.requests_total += 1
+        return await self.client().get(url, params=params, timeout=self._build_timeout(timeout))
+
+    def stream(self, url: str, params: Optional[dict] = None,
+               timeout: Optional[float] = None):
+        """
+        发送流式 GET 请求
+
+        返回异步上下文管理器，响应体需通过 aiter_bytes() 逐块读取；
+        提前退出上下文会关闭连接、不再读取剩余响应。
+        """
+        self.requests_total += 1
+        return self.client().stream("GET", url, params=params, timeout=self._build_timeout(timeout))
+
+    async def configure(self, config: ClientConfig) -> None:
+        """更新配置，已有连接池会被关闭并在下次请求时按新配置重建"""
+        self.config = config
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """关闭连接池"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> dict:
+        """连接池统计"""
+        return {
+            "open": self.is_open,
+            "requests_total": self.requests_total,
+            "clients_created": self.clients_created,
+            "config": asdict(self.config),
+        }
+
+
+# 进程内共享的客户端管理器
+client_manager = PrometheusClientManager(ClientConfig.from_env())
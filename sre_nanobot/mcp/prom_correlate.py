@@ -0,0 +1,178 @@
+"""
+指标联动相关性搜索
+
+给定一条锚点序列（例如告警服务的错误率），在同一时间网格上计算它与
+候选序列集合的相关系数，用于根因提示：
+- pearson: 线性相关
+- spearman: 秩相关（对量纲和单调非线性变换不敏感）
+- 滞后互相关：候选序列整体平移 -max_lag..max_lag 个点，找出相关性最强的滞后，
+  lag > 0 表示候选序列的变化领先于锚点
+
+所有候选序列作为 N×T 矩阵一起计算，缺失点（NaN）按每对序列的公共有效点处理
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from .prom_series import SeriesMatrix
+
+METHODS = ("pearson", "spearman")
+
+
+@dataclass
+class Correlation:
+    """锚点与一条候选序列的相关性"""
+    row: int             # 在候选矩阵中的行号
+    metric: dict
+    coefficient: float   # lag=0 时的相关系数
+    lag: int             # 相关性最强的滞后（点数，>0 表示候选领先）
+    lag_seconds: float
+    best: float          # 该滞后下的相关系数
+    overlap: int         # 该滞后下参与计算的点数
+
+    def to_dict(self) -> dict:
+        return {
+            "metric": self.metric,
+            "coefficient": round(self.coefficient, 4),
+            "lag": self.lag,
+            "lag_seconds": self.lag_seconds,
+            "best": round(self.best, 4),
+            "overlap": self.overlap,
+        }
+
+
+# ─────────────────────────────────────────────────────────────
+# 向量化计算
+# ─────────────────────────────────────────────────────────────
+
+def rank_rows(values: np.ndarray) -> np.ndarray:
+    """
+    按行计算秩（并列取平均秩，NaN 保持为 NaN）
+
+    每行先排序，再用全局递增的分组编号一次求出所有并列组的起点和大小
+    """
+    values = np.atleast_2d(values)
+    n, t = values.shape
+    if not values.size:
+        return values.astype(np.float64)
+    order = np.argsort(values, axis=1, kind="stable")   # NaN 排在末尾
+    ordered = np.take_along_axis(values, order, axis=1)
+
+    new_group = np.ones((n, t), dtype=bool)
+    new_group[:, 1:] = ordered[:, 1:] != ordered[:, :-1]
+    group = np.cumsum(new_group.ravel()) - 1
+    _, first, counts = np.unique(group, return_index=True, return_counts=True)
+    position = np.arange(n * t) - np.repeat(first, counts)   # 组内偏移
+    rank = (np.arange(n * t) - position) % t + (np.repeat(counts, counts) - 1) / 2 + 1
+
+    ranks = np.empty((n, t))
+    np.put_along_axis(ranks, order, rank.reshape(n, t), axis=1)
+    return np.where(np.isnan(values), np.nan, ranks)
+
+
+def lagged_pearson(anchor: np.ndarray, candidates: np.ndarray, lag: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    anchor[t] 与 candidates[:, t - lag] 的 Pearson 相关系数
+
+    Returns:
+        (相关系数 (N,)，无法计算时为 NaN；公共有效点数 (N,))
+    """
+    t = anchor.shape[0]
+    if lag >= 0:
+        a, c = anchor[lag:], candidates[:, :t - lag]
+    else:
+        a, c = anchor[:t + lag], candidates[:, -lag:]
+
+    mask = ~np.isnan(c) & ~np.isnan(a)[None, :]
+    count = mask.sum(axis=1)
+    ax = np.where(mask, a[None, :], 0.0)
+    cx = np.where(mask, c, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # 先减去公共有效点上的均值，避免大数值下的精度损失
+        ax = np.where(mask, ax - (ax.sum(axis=1) / count)[:, None], 0.0)
+        cx = np.where(mask, cx - (cx.sum(axis=1) / count)[:, None], 0.0)
+        r = (ax * cx).sum(axis=1) / np.sqrt((ax * ax).sum(axis=1) * (cx * cx).sum(axis=1))
+    return np.clip(r, -1.0, 1.0), count
+
+
+def correlate(anchor: np.ndarray, matrix: SeriesMatrix, method: str = "pearson",
+              max_lag: int = 0, min_overlap: int = 10, difference: bool = False) -> list[Correlation]:
+    """
+    计算锚点与矩阵中每条序列的相关性（锚点须与矩阵共享时间网格）
+
+    Args:
+        anchor: (T,) 锚点序列
+        matrix: 候选序列
+        method: pearson 或 spearman
+        max_lag: 最大滞后点数，0 表示只计算同步相关
+        min_overlap: 公共有效点少于该值时不计算
+        difference: 先做一阶差分，比较变化量而不是水平值（排除共同趋势造成的伪相关）
+
+    Returns:
+        按 |best| 降序排列的结果（无法计算的序列不返回）
+    """
+    if method not in METHODS:
+        raise ValueError(f"不支持的相关性方法：{method}，可选：{', '.join(METHODS)}")
+    if not len(matrix) or not matrix.values.size:
+        return []
+
+    values = matrix.values
+    if difference:
+        anchor, values = np.diff(anchor), np.diff(values, axis=1)
+    if method == "spearman":
+        anchor = rank_rows(anchor)[0]
+        values = rank_rows(values)
+
+    t = values.shape[1]
+    max_lag = max(0, min(max_lag, t - min_overlap))
+    lags = np.arange(-max_lag, max_lag + 1)
+    coefficients = np.full((len(lags), len(matrix)), np.nan)
+    counts = np.zeros((len(lags), len(matrix)), dtype=int)
+    for i, lag in enumerate(lags):
+        coefficients[i], counts[i] = lagged_pearson(anchor, values, int(lag))
+    coefficients[counts < min_overlap] = np.nan
+
+    zero = coefficients[max_lag]
+    strength = np.where(np.isnan(coefficients), -1.0, np.abs(coefficients))
+    # 并列时取绝对值最小的滞后（同步优先）
+    strength -= np.abs(lags)[:, None] * 1e-9
+    best_index = strength.argmax(axis=0)
+    columns = np.arange(len(matrix))
+    best = coefficients[best_index, columns]
+
+    interval = float(np.median(np.diff(matrix.timestamps))) if len(matrix.timestamps) > 1 else 0.0
+    results = []
+    for row in np.argsort(-np.nan_to_num(np.abs(best), nan=-1.0)):
+        if np.isnan(best[row]):
+            continue
+        lag = int(lags[best_index[row]])
+        results.append(Correlation(
+            row=int(row),
+            metric=matrix.metric(row),
+            coefficient=float(np.nan_to_num(zero[row])),
+            lag=lag,
+            lag_seconds=lag * interval,
+            best=float(best[row]),
+            overlap=int(counts[best_index[row], row]),
+        ))
+    return results
+
+
+def split_anchor(matrix: SeriesMatrix, anchor_rows: int) -> tuple[np.ndarray, SeriesMatrix]:
+    """
+    拆出锚点：matrix 的前 anchor_rows 行来自锚点查询，且必须恰好 1 行
+
+    锚点和候选一起构造矩阵，保证二者共享同一时间网格
+    """
+    if anchor_rows != 1:
+        raise ValueError(f"锚点查询返回 {anchor_rows} 条序列，需要恰好 1 条（可用 sum/avg 聚合）")
+    return matrix.values[0], matrix.select(range(1, len(matrix)))
+
+
+def nearest_lag(duration: Optional[float], step: float) -> int:
+    """把滞后时长换算为点数"""
+    if not duration or step <= 0:
+        return 0
+    return int(round(duration / step))
@@ -0,0 +1,384 @@
+"""
+PromQL 查询代价估算与基数保护
+
+执行 prom_query / prom_query_range 之前估算查询会触及的序列数和返回的样本数：
+- 从 PromQL 中提取向量选择器，序列数来自 TSDB 状态（整库序列数、按指标名的 Top 统计）
+  和 /api/v1/series 计数（流式计数、达到上限即停止），计数结果按 选择器 + 时间窗口 带 TTL 缓存
+- 超出限制时按策略处理：拒绝（默认）、自动放大 step，或在外层注入 topk
+
+注意 topk 只缩小返回给调用方的结果：Prometheus 仍要读取并计算全部序列，不能减轻服务端负载；
+范围查询的每个 step 各自取 top N，结果中的序列数仍可能远多于 N
+"""
+
+import logging
+import math
+import os
+import re
+import time
+from dataclasses import dataclass, asdict, field
+from typing import Awaitable, Callable, Optional
+
+from .prom_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# count_series(selector, start, end, cap) -> 匹配的序列数（达到 cap 时返回 cap）
+SeriesCounter = Callable[[str, Optional[float], Optional[float], int], Awaitable[int]]
+
+# tsdb_status() -> /api/v1/status/tsdb 的 data 字段
+TSDBStatusFetcher = Callable[[], Awaitable[dict]]
+
+SERIES_ACTIONS = ("reject", "topk", "warn")
+SAMPLES_ACTIONS = ("reject", "widen_step", "warn")
+
+
+# ─────────────────────────────────────────────────────────────
+# 配置
+# ─────────────────────────────────────────────────────────────
+
+@dataclass
+class CostConfig:
+    """查询代价限制配置"""
+    enabled: bool = True
+    max_series: int = 50_000          # 单次查询允许触及的序列数
+    max_points: int = 11_000          # 每条序列的最大点数（与 Prometheus 的限制一致）
+    max_samples: int = 50_000_000     # 返回样本数上限（序列数 × 点数）
+    series_action: str = "reject"     # 序列数超限：reject / topk（只缩小返回结果）/ warn
+    samples_action: str = "widen_step"  # 样本数超限：reject / widen_step / warn
+    topk_limit: int = 100
+    count_ttl: float = 300.0          # 序列计数和 TSDB 状态的缓存时间（秒）
+
+    @classmethod
+    def from_env(cls) -> "CostConfig":
+        """从环境变量读取配置（PROM_COST_*），未设置时使用默认值"""
+        default = cls()
+        return cls(
+            enabled=os.getenv("PROM_COST_ENABLED", "true").lower() not in ("0", "false", "no"),
+            max_series=int(os.getenv("PROM_COST_MAX_SERIES", default.max_series)),
+            max_points=int(os.getenv("PROM_COST_MAX_POINTS", default.max_points)),
+            max_samples=int(os.getenv("PROM_COST_MAX_SAMPLES", default.max_samples)),
+            series_action=os.getenv("PROM_COST_SERIES_ACTION", default.series_action),
+            samples_action=os.getenv("PROM_COST_SAMPLES_ACTION", default.samples_action),
+            topk_limit=int(os.getenv("PROM_COST_TOPK_LIMIT", default.topk_limit)),
+            count_ttl=float(os.getenv("PROM_COST_COUNT_TTL", default.count_ttl)),
+        )
+
+
+class QueryRejectedError(Exception):
+    """查询代价超出限制被拒绝"""
+
+
+# ─────────────────────────────────────────────────────────────
+# 选择器提取
+# ─────────────────────────────────────────────────────────────
+
+# 后面跟括号标签列表的关键字
+_GROUPING_KEYWORDS = {"by", "without", "on", "ignoring", "group_left", "group_right"}
+_OTHER_KEYWORDS = {"bool", "offset", "and", "or", "unless", "atan2", "inf", "nan"}
+_AGGREGATIONS = {"sum", "min", "max", "avg", "group", "stddev", "stdvar", "count", "count_values",
+                 "bottomk", "topk", "quantile", "limitk", "limit_ratio"}
+
+_IDENT = re.compile(r"[a-zA-Z_:][a-zA-Z0-9_:]*")
+_NUMBER = re.compile(r"(?:0x[0-9a-fA-F]+|\d+(?:\.\d*)?(?:[eE][+-]?\d+)?)[a-zA-Z0-9]*|\.\d+")
+
+
+def _skip_string(query: str, pos: int) -> int:
+    """pos 指向引号，返回字符串之后的位置"""
+    quote = query[pos]
+    pos += 1
+    while pos < len(query):
+        if query[pos] == "\\" and quote != "`":
+            pos += 2
+            continue
+        if query[pos] == quote:
+            return pos + 1
+        pos += 1
+    return pos
+
+
+def _skip_block(query: str, pos: int, close: str) -> int:
+    """pos 指向开括号，返回匹配的闭括号之后的位置（忽略字符串中的括号）"""
+    opening = query[pos]
+    depth = 0
+    while pos < len(query):
+        ch = query[pos]
+        if ch in "\"'`":
+            pos = _skip_string(query, pos)
+            continue
+        if ch == opening:
+            depth += 1
+        elif ch == close:
+            depth -= 1
+            if depth == 0:
+                return pos + 1
+        pos += 1
+    return pos
+
+
+def _skip_spaces(query: str, pos: int) -> int:
+    while pos < len(query) and query[pos].isspace():
+        pos += 1
+    return pos
+
+
+def extract_selectors(query: str) -> list[str]:
+    """
+    提取 PromQL 中的向量选择器（去重，保持出现顺序）
+
+    例如 sum by (pod) (rate(http_requests_total{code="500"}[5m])) / on() up
+    返回 ['http_requests_total{code="500"}', 'up']
+    """
+    selectors: list[str] = []
+    pos = 0
+    length = len(query)
+    while pos < length:
+        ch = query[pos]
+        if ch.isspace():
+            pos += 1
+        elif ch in "\"'`":
+            pos = _skip_string(query, pos)
+        elif ch == "[":
+            # 范围 / 子查询时长
+            pos = _skip_block(query, pos, "]")
+        elif ch == "{":
+            end = _skip_block(query, pos, "}")
+            selectors.append(query[pos:end])
+            pos = end
+        elif ch.isdigit() or (ch == "." and pos + 1 < length and query[pos + 1].isdigit()):
+            match = _NUMBER.match(query, pos)
+            pos = match.end() if match else pos + 1
+        elif _IDENT.match(query, pos):
+            match = _IDENT.match(query, pos)
+            name = match.group()
+            pos = match.end()
+            after = _skip_spaces(query, pos)
+            next_word = _IDENT.match(query, after)
+            if name in _GROUPING_KEYWORDS:
+                if after < length and query[after] == "(":
+                    pos = _skip_block(query, after, ")")
+            elif after < length and query[after] == "(":
+                # 函数或聚合运算
+                pos = after
+            elif name in _AGGREGATIONS and next_word and next_word.group() in ("by", "without"):
+                # sum by (...) (...) 形式的聚合
+                continue
+            elif name.lower() in _OTHER_KEYWORDS:
+                continue
+            elif after < length and query[after] == "{":
+                end = _skip_block(query, after, "}")
+                selectors.append(name + query[after:end])
+                pos = end
+            else:
+                selectors.append(name)
+        else:
+            pos += 1
+
+    unique = []
+    for selector in selectors:
+        if selector not in unique:
+            unique.append(selector)
+    return unique
+
+
+def selector_metric(selector: str) -> Optional[str]:
+    """选择器的指标名（{__name__="x"} 形式也识别）"""
+    match = _IDENT.match(selector)
+    if match:
+        return match.group()
+    match = re.search(r'__name__\s*=\s*"([^"]+)"', selector)
+    return match.group(1) if match else None
+
+
+def widen_step(start: float, end: float, step: float, max_points: int) -> float:
+    """放大 step 使点数不超过 max_points，新 step 为原 step 的整数倍"""
+    points = (end - start) / step + 1
+    if points <= max_points:
+        return step
+    factor = math.ceil((end - start) / step / max(max_points - 1, 1))
+    return step * max(factor, 1)
+
+
+# ─────────────────────────────────────────────────────────────
+# 估算结果
+# ─────────────────────────────────────────────────────────────
+
+@dataclass
+class CostEstimate:
+    """查询代价估算及处理结果"""
+    query: str
+    step: Optional[float] = None
+    selectors: dict[str, int] = field(default_factory=dict)
+    series: int = 0
+    points: int = 1
+    samples: int = 0
+    exact: bool = True                # 序列数是否为精确值（未被截断或回退估计）
+    basis: str = "series"             # 序列数来源：series（逐个计数）/ tsdb（整库序列数）/ none
+    actions: list[str] = field(default_factory=list)
+    notes: list[str] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+# ─────────────────────────────────────────────────────────────
+# 代价保护
+# ─────────────────────────────────────────────────────────────
+
+class QueryCostGuard:
+    """查询代价估算与限制"""
+
+    def __init__(self, config: Optional[CostConfig] = None, clock: Callable[[], float] = time.monotonic):
+        self.config = config or CostConfig()
+        self.counts = TTLCache(max_entries=4096, max_bytes=4 * 1024 * 1024,
+                               ttl=self.config.count_ttl, clock=clock)
+        self.estimates = 0
+        self.rejected = 0
+        self.topk_injected = 0
+        self.step_widened = 0
+        self.estimate_errors = 0
+
+    async def _tsdb_status(self, fetch: TSDBStatusFetcher) -> dict:
+        status = self.counts.get("__tsdb_status__")
+        if status is None:
+            status = await fetch() or {}
+            self.counts.put("__tsdb_status__", status, size=1024)
+        return status
+
+    def _count_key(self, selector: str, start: Optional[float], end: Optional[float]) -> tuple:
+        """计数缓存键：时间窗口按 count_ttl 对齐，窗口平移不超过一个区间时复用计数"""
+        bucket = max(self.config.count_ttl, 1.0)
+        window = tuple(None if t is None else int(t // bucket) for t in (start, end))
+        return ("series", selector) + window
+
+    async def _count_selector(self, selector: str, start: Optional[float], end: Optional[float],
+                              count_series: SeriesCounter, status: dict) -> tuple[int, bool]:
+        """返回 (序列数, 是否精确)"""
+        cap = self.config.max_series + 1
+        key = self._count_key(selector, start, end)
+        cached = self.counts.get(key)
+        if cached is not None:
+            return cached
+
+        # 不带匹配条件的选择器可直接使用 TSDB 按指标名的统计
+        metric = selector_metric(selector)
+        if metric and selector == metric:
+            for item in status.get("seriesCountByMetricName", []):
+                if item.get("name") == metric:
+                    result = (int(item.get("value", 0)), True)
+                    self.counts.put(key, result, size=64)
+                    return result
+
+        count = await count_series(selector, start, end, cap)
+        result = (count, count < cap)
+        self.counts.put(key, result, size=64)
+        return result
+
+    async def estimate(self, query: str, count_series: SeriesCounter, tsdb_status: TSDBStatusFetcher,
+                       start: Optional[float] = None, end: Optional[float] = None,
+                       step: Optional[float] = None) -> CostEstimate:
+        """
+        估算查询代价（不做任何处理）
+
+        range 查询需同时给出 start、end、step
+        """
+        self.estimates += 1
+        estimate = CostEstimate(query=query, step=step)
+        if step:
+            estimate.points = int((end - start) // step) + 1
+
+        status = await self._tsdb_status(tsdb_status)
+        head_series = int(status.get("headStats", {}).get("numSeries", 0) or 0)
+        selectors = extract_selectors(query)
+
+        if (head_series and head_series <= self.config.max_series
+                and head_series * estimate.points <= self.config.max_samples):
+            # 按整库序列数估计都不会超限，无需逐个计数
+            estimate.series = head_series
+            estimate.exact = False
+            estimate.basis = "tsdb"
+        else:
+            for selector in selectors:
+                count, exact = await self._count_selector(selector, start, end, count_series, status)
+                estimate.selectors[selector] = count
+                estimate.series += count
+                estimate.exact = estimate.exact and exact
+
+        estimate.samples = estimate.series * estimate.points
+        return estimate
+
+    async def check(self, query: str, count_series: SeriesCounter, tsdb_status: TSDBStatusFetcher,
+                    start: Optional[float] = None, end: Optional[float] = None,
+                    step: Optional[float] = None) -> CostEstimate:
+        """
+        估算并按策略处理查询
+
+        Returns:
+            CostEstimate，其中 query / step 为处理后实际应执行的值
+
+        Raises:
+            QueryRejectedError: 策略为 reject 且超出限制
+        """
+        if not self.config.enabled:
+            return CostEstimate(query=query, step=step, exact=False, basis="none")
+
+        try:
+            estimate = await self.estimate(query, count_series, tsdb_status, start, end, step)
+        except Exception as e:
+            # 估算失败不阻塞查询
+            self.estimate_errors += 1
+            logger.warning(f"查询代价估算失败：{e!r}")
+            result = CostEstimate(query=query, step=step, exact=False, basis="none")
+            result.notes.append(f"代价估算失败，未做限制：{e}")
+            return result
+
+        config = self.config
+        if estimate.series > config.max_series:
+            message = f"查询预计触及 {estimate.series}{'' if estimate.exact else '+'} 条序列，超过上限 {config.max_series}"
+            if config.series_action == "reject":
+                self.rejected += 1
+                raise QueryRejectedError(f"{message}，请增加标签过滤条件或聚合")
+            if config.series_action == "topk":
+                self.topk_injected += 1
+                estimate.query = f"topk({config.topk_limit}, {query})"
+                estimate.actions.append("topk")
+                estimate.notes.append(f"{message}，已限制返回 topk({config.topk_limit})（Prometheus 仍会计算全部序列）")
+            else:
+                estimate.notes.append(message)
+
+        if step:
+            # 范围查询的每个 step 各自取 top N，topk 不能减少返回的序列数上界
+            series = estimate.series
+            samples = max(series, 1) * estimate.points
+            if estimate.points > config.max_points or samples > config.max_samples:
+                message = f"查询预计返回 {samples} 个样本（{estimate.points} 点/序列），超过上限"
+                if config.samples_action == "reject":
+                    self.rejected += 1
+                    raise QueryRejectedError(f"{message}，请缩小时间范围或增大 step")
+                if config.samples_action == "widen_step":
+                    max_points = min(config.max_points, max(config.max_samples // max(series, 1), 2))
+                    new_step = widen_step(start, end, step, max_points)
+                    self.step_widened += 1
+                    estimate.step = new_step
+                    estimate.points = int((end - start) // new_step) + 1
+                    estimate.actions.append("widen_step")
+                    estimate.notes.append(f"{message}，step 已从 {step:g}s 放大到 {new_step:g}s")
+                else:
+                    estimate.notes.append(message)
+            estimate.samples = series * estimate.points
+        return estimate
+
+    def stats(self) -> dict:
+        """代价保护统计"""
+        return {
+            "estimates": self.estimates,
+            "rejected": self.rejected,
+            "topk_injected": self.topk_injected,
+            "step_widened": self.step_widened,
+            "estimate_errors": self.estimate_errors,
+            "count_cache": self.counts.stats(),
+            "config": asdict(self.config),
+        }
+
+
+# 进程内共享的查询代价保护
+cost_guard = QueryCostGuard(CostConfig.from_env())
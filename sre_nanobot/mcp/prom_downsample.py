@@ -0,0 +1,102 @@
+"""
+时间序列降采样
+
+将每条序列压缩到固定的点数预算，同时保留峰值和谷值的形状：
+- lttb: Largest-Triangle-Three-Buckets，每个桶选出与相邻桶构成最大三角形面积的点
+- minmax: 每个桶保留最小值和最大值两个点
+
+两种方法都只返回被选中样本的下标，首尾两个点总是保留
+"""
+
+import numpy as np
+
+METHODS = ("lttb", "minmax")
+
+
+def _finite(values: np.ndarray) -> np.ndarray:
+    """NaN / Inf 不参与形状计算，按 0 处理"""
+    return np.where(np.isfinite(values), values, 0.0)
+
+
+def lttb_indices(timestamps: np.ndarray, values: np.ndarray, budget: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets 降采样
+
+    Args:
+        timestamps: (T,) 升序时间戳
+        values: (T,) 样本值
+        budget: 输出点数（至少 3 才会降采样）
+
+    Returns:
+        被选中样本的下标（升序）
+    """
+    length = len(timestamps)
+    if budget >= length or budget < 3:
+        return np.arange(length)
+
+    x = timestamps.astype(np.float64)
+    y = _finite(values.astype(np.float64))
+
+    # 中间 T-2 个点均分为 budget-2 个桶，桶边界及每个桶的均值一次性算出
+    edges = (np.arange(budget - 1) * (length - 2) / (budget - 2)).astype(np.int64) + 1
+    edges[-1] = length - 1
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[:-1], edges[:-1]) / counts
+    mean_y = np.add.reduceat(y[:-1], edges[:-1]) / counts
+    # 最后一个桶的「下一个桶」是末尾点
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    selected = np.empty(budget, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = length - 1
+    anchor = 0
+    for bucket in range(budget - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        ax, ay = x[anchor], y[anchor]
+        area = np.abs((ax - next_x[bucket]) * (y[lo:hi] - ay)
+                      - (ax - x[lo:hi]) * (next_y[bucket] - ay))
+        anchor = lo + int(np.argmax(area))
+        selected[bucket + 1] = anchor
+    return selected
+
+
+def minmax_indices(timestamps: np.ndarray, values: np.ndarray, budget: int) -> np.ndarray:
+    """
+    按桶保留最小值和最大值
+
+    中间的点被等分为 (budget - 2) // 2 个桶，每个桶选出最小值和最大值，
+    补齐为矩形后一次性向量化求 argmin / argmax
+
+    Returns:
+        被选中样本的下标（升序、去重）
+    """
+    length = len(timestamps)
+    buckets = (budget - 2) // 2
+    if budget >= length or buckets < 1:
+        return np.arange(length)
+
+    middle = np.asarray(values[1:-1], dtype=np.float64)
+    width = -(-len(middle) // buckets)
+    padded = np.full(buckets * width, np.nan)
+    padded[:len(middle)] = middle
+    grid = padded.reshape(buckets, width)
+    valid = ~np.isnan(grid)
+
+    offsets = np.arange(buckets) * width + 1
+    low = np.where(valid, grid, np.inf).argmin(axis=1) + offsets
+    high = np.where(valid, grid, -np.inf).argmax(axis=1) + offsets
+    has_data = valid.any(axis=1)
+
+    picked = np.concatenate(([0], low[has_data], high[has_data], [length - 1]))
+    return np.unique(np.clip(picked, 0, length - 1))
+
+
+def downsample_indices(timestamps: np.ndarray, values: np.ndarray, budget: int,
+                       method: str = "lttb") -> np.ndarray:
+    """按指定方法降采样，返回被选中样本的下标"""
+    if method == "lttb":
+        return lttb_indices(timestamps, values, budget)
+    if method == "minmax":
+        return minmax_indices(timestamps, values, budget)
+    raise ValueError(f"不支持的降采样方法：{method}，可选：{', '.join(METHODS)}")
@@ -0,0 +1,361 @@
+"""
+范围查询结果导出（Arrow IPC / Parquet）
+
+把范围查询结果写成列式文件，供离线 notebook 和批处理直接读取：
+- 长表结构：每个标签一列（字典编码）+ timestamp（毫秒，UTC）+ value
+- Arrow IPC 文件不压缩，可用 pyarrow.memory_map 零拷贝读取；Parquet 默认 zstd 压缩
+- SeriesWriter 按行组流式写出，累积的行数达到 row_group_size 即写出一个行组，
+  内存占用与导出总量无关；后续出现的新标签会扩展标签列，不会被丢弃
+- 先写临时文件，成功后改名，失败时不会留下截断的文件
+
+依赖可选包 pyarrow（pip install 'sre-nanobot[export]'），未安装时调用导出接口会报错
+"""
+
+import logging
+import os
+import re
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+from .prom_series import ColumnarSeries
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+_EXPORT_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]*")
+
+
+# ─────────────────────────────────────────────────────────────
+# 配置
+# ─────────────────────────────────────────────────────────────
+
+@dataclass
+class ExportConfig:
+    """导出配置"""
+    directory: str = "data/exports"
+    row_group_size: int = 1_000_000   # 每个行组（Arrow record batch）的最大行数
+    window: float = 6 * 3600.0        # 导出时按该时长分段查询，处理完一段再取下一段（秒）
+    compression: str = "zstd"         # Parquet 压缩算法
+
+    @classmethod
+    def from_env(cls) -> "ExportConfig":
+        """从环境变量读取配置（PROM_EXPORT_*），未设置时使用默认值"""
+        default = cls()
+        return cls(
+            directory=os.getenv("PROM_EXPORT_DIR", default.directory),
+            row_group_size=int(os.getenv("PROM_EXPORT_ROW_GROUP_SIZE", default.row_group_size)),
+            window=float(os.getenv("PROM_EXPORT_WINDOW", default.window)),
+            compression=os.getenv("PROM_EXPORT_COMPRESSION", default.compression),
+        )
+
+    def path_for(self, name: str, fmt: str) -> Path:
+        """导出文件路径（只允许写到导出目录下）"""
+        if fmt not in FORMATS:
+            raise ValueError(f"不支持的导出格式：{fmt}，可选：{', '.join(FORMATS)}")
+        if not _EXPORT_NAME.fullmatch(name):
+            raise ValueError(f"无效的导出名称：{name}（只允许字母、数字、_ . -）")
+        return Path(self.directory) / f"{name}{FORMATS[fmt]}"
+
+
+def require_pyarrow():
+    """导入 pyarrow，未安装时给出安装提示"""
+    try:
+        import pyarrow
+        import pyarrow.compute  # noqa: F401
+        import pyarrow.ipc  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise Exception("导出 Arrow/Parquet 需要安装可选依赖 pyarrow：pip install 'sre-nanobot[export]'")
+    return pyarrow
+
+
+# ─────────────────────────────────────────────────────────────
+# 流式写出
+# ─────────────────────────────────────────────────────────────
+
+class SeriesWriter:
+    """
+    按行组流式写出序列
+
+    数据先写到同目录下的临时文件，close 成功后才改名为目标文件；写出失败或调用 abort 时
+    删除临时文件，不会留下截断的导出文件。
+
+    标签列在创建时确定；之后出现新标签名时扩展 schema：已写出的部分作为一段关闭，
+    之后的行组写入新的一段，close 时按最终 schema（缺少的标签列为空值）逐个行组合并成一个文件，
+    只有一段时直接改名。每个标签列维护只增不减的字典，Arrow IPC 以字典增量（delta）写出，
+    文件仍可整体 memory-map。
+    """
+
+    def __init__(self, path: Path, fmt: str, label_names: Iterable[str],
+                 row_group_size: int = 1_000_000, compression: str = "zstd",
+                 metadata: Optional[dict] = None):
+        pa = require_pyarrow()
+        if fmt not in FORMATS:
+            raise ValueError(f"不支持的导出格式：{fmt}，可选：{', '.join(FORMATS)}")
+        self._pa = pa
+        self.path = Path(path)
+        self.format = fmt
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.metadata = {k: str(v) for k, v in (metadata or {}).items()}
+        self.label_names = sorted(set(label_names))
+        self.added_labels: list[str] = []
+        self._codes: dict[str, dict[str, int]] = {name: {} for name in self.label_names}
+        self._pending: list[tuple[list[int], np.ndarray, np.ndarray]] = []
+        self._pending_rows = 0
+        self.rows = 0
+        self.series = 0
+        self.row_groups = 0
+        self._segments: list[Path] = []
+        self._writer = self._sink = None
+        self._result: Optional[dict] = None
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._open_segment()
+
+    def _build_schema(self):
+        pa = self._pa
+        label_type = pa.dictionary(pa.int32(), pa.string())
+        return pa.schema(
+            [pa.field(name, label_type) for name in self.label_names]
+            + [pa.field("timestamp", pa.timestamp("ms", tz="UTC"), nullable=False),
+               pa.field("value", pa.float64(), nullable=False)],
+            metadata=self.metadata,
+        )
+
+    def _open(self, path: Path, schema) -> tuple:
+        """打开一个写出器，返回 (writer, sink)"""
+        pa = self._pa
+        if self.format == "parquet":
+            return pa.parquet.ParquetWriter(path, schema, compression=self.compression), None
+        sink = pa.OSFile(str(path), "wb")
+        options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+        return pa.ipc.new_file(sink, schema, options=options), sink
+
+    def _write_batch(self, writer, batch) -> None:
+        if self.format == "parquet":
+            writer.write_table(self._pa.Table.from_batches([batch]), row_group_size=batch.num_rows)
+        else:
+            writer.write_batch(batch)
+
+    def _open_segment(self) -> None:
+        self.schema = self._build_schema()
+        segment = self.path.with_name(f".{self.path.name}.{len(self._segments)}.tmp")
+        self._segments.append(segment)
+        self._writer, self._sink = self._open(segment, self.schema)
+
+    def _close_segment(self) -> None:
+        writer, sink = self._writer, self._sink
+        self._writer = self._sink = None
+        if writer is not None:
+            writer.close()
+        if sink is not None:
+            sink.close()
+
+    def _widen(self, names: list[str]) -> None:
+        """出现新标签名：关闭当前一段，按扩展后的 schema 开始新的一段"""
+        self.flush()
+        self._close_segment()
+        self.label_names = sorted(self.label_names + names)
+        self.added_labels.extend(names)
+        self._codes.update({name: {} for name in names})
+        self._open_segment()
+
+    def write(self, series: ColumnarSeries) -> None:
+        """追加一条序列，累积的行数达到 row_group_size 时写出"""
+        if not len(series):
+            return
+        metric = series.metric
+        new = sorted(name for name in metric if name not in self._codes)
+        if new:
+            self._widen(new)
+        codes = []
+        for name in self.label_names:
+            value = metric.get(name)
+            if value is None:
+                codes.append(-1)
+            else:
+                codes.append(self._codes[name].setdefault(value, len(self._codes[name])))
+        self._pending.append((codes, series.timestamps, series.values))
+        self._pending_rows += len(series)
+        self.series += 1
+        if self._pending_rows >= self.row_group_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """把累积的序列写成一个行组"""
+        if not self._pending:
+            return
+        pa = self._pa
+        counts = np.array([len(ts) for _, ts, _ in self._pending])
+        codes = np.array([c for c, _, _ in self._pending], dtype=np.int32).reshape(len(self._pending), -1)
+        timestamps = np.round(np.concatenate([ts for _, ts, _ in self._pending]) * 1000).astype(np.int64)
+        values = np.concatenate([v for _, _, v in self._pending])
+
+        columns = []
+        for i, name in enumerate(self.label_names):
+            indices = np.repeat(codes[:, i], counts)
+            columns.append(pa.DictionaryArray.from_arrays(
+                pa.array(indices, type=pa.int32(), mask=indices < 0),
+                pa.array(list(self._codes[name]), type=pa.string()),
+            ))
+        columns.append(pa.array(timestamps, type=pa.timestamp("ms", tz="UTC")))
+        columns.append(pa.array(values, type=pa.float64()))
+        self._write_batch(self._writer, pa.RecordBatch.from_arrays(columns, schema=self.schema))
+
+        self.rows += len(values)
+        self.row_groups += 1
+        self._pending.clear()
+        self._pending_rows = 0
+
+    def _segment_batches(self, segment: Path):
+        """逐个行组读出一段"""
+        pa = self._pa
+        if self.format == "parquet":
+            source = pa.parquet.ParquetFile(segment)
+            for i in range(source.num_row_groups):
+                yield from source.read_row_group(i).combine_chunks().to_batches()
+        else:
+            with pa.memory_map(str(segment)) as source:
+                reader = pa.ipc.open_file(source)
+                for i in range(reader.num_record_batches):
+                    yield reader.get_batch(i)
+
+    def _merge(self, target: Path) -> None:
+        """按最终 schema 把各段逐个行组写入 target，缺少的标签列为空值"""
+        pa, pc = self._pa, self._pa.compute
+        dictionaries = {name: pa.array(list(codes), type=pa.string()) for name, codes in self._codes.items()}
+        writer, sink = self._open(target, self.schema)
+        try:
+            for segment in self._segments:
+                for batch in self._segment_batches(segment):
+                    columns = []
+                    for name in self.label_names:
+                        if name not in batch.schema.names:
+                            indices = pa.nulls(batch.num_rows, pa.int32())
+                        else:
+                            # 按取值映射到最终字典（Parquet 读回的字典只含该行组用到的值）
+                            column = batch.column(name)
+                            mapping = pc.index_in(column.dictionary, value_set=dictionaries[name])
+                            indices = pc.take(mapping, column.indices)
+                        columns.append(pa.DictionaryArray.from_arrays(indices.cast(pa.int32()), dictionaries[name]))
+                    columns += [batch.column("timestamp"), batch.column("value")]
+                    self._write_batch(writer, pa.RecordBatch.from_arrays(columns, schema=self.schema))
+        finally:
+            writer.close()
+            if sink is not None:
+                sink.close()
+
+    def _remove_temporary(self) -> None:
+        for path in self._segments + [self.path.with_name(f".{self.path.name}.tmp")]:
+            path.unlink(missing_ok=True)
+
+    def close(self) -> dict:
+        """写出剩余数据、合并各段并改名为目标文件，返回导出统计（重复调用返回同一结果）"""
+        if self._result is not None:
+            return self._result
+        try:
+            self.flush()
+            self._close_segment()
+            if len(self._segments) == 1:
+                os.replace(self._segments[0], self.path)
+            else:
+                staging = self.path.with_name(f".{self.path.name}.tmp")
+                self._merge(staging)
+                os.replace(staging, self.path)
+        except BaseException:
+            self.abort()
+            raise
+        self._remove_temporary()
+        if self.added_labels:
+            logger.info(f"导出 {self.path} 时扩展了标签列：{self.added_labels}（共 {len(self._segments)} 段）")
+        self._result = {
+            "path": str(self.path),
+            "format": self.format,
+            "series": self.series,
+            "rows": self.rows,
+            "row_groups": self.row_groups,
+            "bytes": self.path.stat().st_size,
+            "labels": self.label_names,
+            "added_labels": sorted(self.added_labels),
+        }
+        return self._result
+
+    def abort(self) -> None:
+        """放弃导出：关闭并删除临时文件，已存在的目标文件保持不变"""
+        if self._result is not None:
+            return
+        try:
+            self._close_segment()
+        except Exception as e:
+            logger.warning(f"关闭导出文件 {self.path} 失败：{e}")
+        self._remove_temporary()
+        self._pending.clear()
+        self._result = {"path": str(self.path), "aborted": True}
+
+    def __enter__(self) -> "SeriesWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def write_series(path: Path, series: Iterable[ColumnarSeries], fmt: str = "parquet",
+                 config: Optional[ExportConfig] = None, metadata: Optional[dict] = None) -> dict:
+    """
+    一次性导出一组已在内存中的序列（标签列取所有序列标签名的并集）
+
+    Returns:
+        导出统计
+    """
+    config = config or ExportConfig()
+    series = list(series)
+    labels = {name for item in series for name, _ in item.labels}
+    with SeriesWriter(path, fmt, labels, config.row_group_size, config.compression, metadata) as writer:
+        for item in series:
+            writer.write(item)
+    return writer.close()
+
+
+# ─────────────────────────────────────────────────────────────
+# 导出器
+# ─────────────────────────────────────────────────────────────
+
+class RangeExporter:
+    """按配置创建导出文件，并累计导出统计"""
+
+    def __init__(self, config: Optional[ExportConfig] = None):
+        self.config = config or ExportConfig()
+        self.exports = 0
+        self.rows = 0
+        self.bytes = 0
+
+    def writer(self, name: str, fmt: str, label_names: Iterable[str], metadata: Optional[dict] = None,
+               row_group_size: Optional[int] = None) -> SeriesWriter:
+        """在导出目录下创建 name 对应的文件"""
+        return SeriesWriter(self.config.path_for(name, fmt), fmt, label_names,
+                            row_group_size or self.config.row_group_size, self.config.compression, metadata)
+
+    def record(self, result: dict) -> None:
+        self.exports += 1
+        self.rows += result["rows"]
+        self.bytes += result["bytes"]
+
+    def stats(self) -> dict:
+        """导出统计"""
+        return {
+            "exports": self.exports,
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "config": asdict(self.config),
+        }
+
+
+# 进程内共享的导出器
+range_exporter = RangeExporter(ExportConfig.from_env())
@@ -0,0 +1,185 @@
+"""
+多 Prometheus 并发查询
+
+按集群 / 区域配置多个 Prometheus，同一个查询并发发往各个实例：
+- 每个实例有独立的超时，慢实例不会拖住整次查询
+- 结果按序列合并，并加上实例名标签区分来源
+- 返回每个实例的耗时和状态，部分实例失败时仍返回其余结果
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# ─────────────────────────────────────────────────────────────
+# 配置
+# ─────────────────────────────────────────────────────────────
+
+@dataclass
+class PrometheusEndpoint:
+    """一个 Prometheus 实例"""
+    name: str
+    url: str
+    timeout: Optional[float] = None  # 不填时使用 FanOutConfig.timeout
+
+
+def parse_endpoints(value: str) -> list[PrometheusEndpoint]:
+    """
+    解析实例列表
+
+    格式：name=url[|timeout]，多个实例用逗号分隔，例如：
+    prod-bj=http://prom-bj:9090,prod-sh=http://prom-sh:9090|10
+    """
+    endpoints = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, sep, rest = item.partition("=")
+        if not sep or not name.strip() or not rest.strip():
+            raise ValueError(f"无法解析 Prometheus 实例配置：{item}")
+        url, _, timeout = rest.partition("|")
+        endpoints.append(PrometheusEndpoint(
+            name=name.strip(),
+            url=url.strip().rstrip("/"),
+            timeout=float(timeout) if timeout.strip() else None,
+        ))
+    return endpoints
+
+
+@dataclass
+class FanOutConfig:
+    """多实例查询配置"""
+    endpoints: list[PrometheusEndpoint] = field(default_factory=list)
+    label: str = "prom_endpoint"   # 合并结果时标记来源实例的标签名
+    timeout: float = 15.0          # 单个实例的默认超时（秒）
+
+    @classmethod
+    def from_env(cls) -> "FanOutConfig":
+        """从环境变量读取配置（PROM_ENDPOINTS、PROM_FANOUT_*），未设置时使用默认值"""
+        default = cls()
+        return cls(
+            endpoints=parse_endpoints(os.getenv("PROM_ENDPOINTS", "")),
+            label=os.getenv("PROM_FANOUT_LABEL", default.label),
+            timeout=float(os.getenv("PROM_FANOUT_TIMEOUT", default.timeout)),
+        )
+
+
+# fetch(endpoint) -> 该实例返回的 data 字段
+EndpointFetcher = Callable[[PrometheusEndpoint], Awaitable[dict]]
+
+
+# ─────────────────────────────────────────────────────────────
+# 结果合并
+# ─────────────────────────────────────────────────────────────
+
+def merge_results(responses: dict[str, dict], label: str) -> dict:
+    """
+    合并各实例的查询结果，每条序列加上 label=实例名
+
+    scalar / string 结果转换为带实例标签的 vector 元素
+    """
+    result_type = None
+    merged = []
+    for name, data in responses.items():
+        kind = data.get("resultType")
+        result = data.get("result", [])
+        if kind in ("scalar", "string"):
+            kind = "vector"
+            result = [{"metric": {}, "value": result}]
+        result_type = result_type or kind
+        for item in result:
+            merged.append({**item, "metric": {**item.get("metric", {}), label: name}})
+    return {"resultType": result_type or "vector", "result": merged}
+
+
+# ─────────────────────────────────────────────────────────────
+# 并发查询
+# ─────────────────────────────────────────────────────────────
+
+class PrometheusFanOut:
+    """多 Prometheus 实例的并发查询"""
+
+    def __init__(self, config: Optional[FanOutConfig] = None):
+        self.config = config or FanOutConfig()
+        self.fanouts = 0
+        self.partial_results = 0
+        self.endpoint_errors: dict[str, int] = {}
+
+    def resolve(self, names: Optional[list[str]], default_url: str) -> list[PrometheusEndpoint]:
+        """
+        按名称选出实例，names 为空时返回全部
+
+        未配置任何实例时，使用 default_url 作为名为 default 的唯一实例
+        """
+        endpoints = self.config.endpoints or [PrometheusEndpoint("default", default_url)]
+        if not names:
+            return endpoints
+        by_name = {endpoint.name: endpoint for endpoint in endpoints}
+        unknown = [name for name in names if name not in by_name]
+        if unknown:
+            raise ValueError(f"未配置的 Prometheus 实例：{', '.join(unknown)}，可选：{', '.join(by_name)}")
+        return [by_name[name] for name in names]
+
+    async def query(self, endpoints: list[PrometheusEndpoint], fetch: EndpointFetcher) -> dict:
+        """
+        并发查询各实例并合并结果
+
+        Returns:
+            合并后的 data 字段，额外包含：
+            - endpoints: {实例名: {status, latency, series, error}}
+            - partial: 是否有实例失败
+        """
+        async def run(endpoint: PrometheusEndpoint) -> tuple[Optional[dict], dict]:
+            timeout = endpoint.timeout or self.config.timeout
+            started = time.perf_counter()
+            try:
+                data = await asyncio.wait_for(fetch(endpoint), timeout=timeout)
+                report = {"status": "success", "series": len(data.get("result", []))}
+            except asyncio.TimeoutError:
+                data, report = None, {"status": "error", "error": f"超时（{timeout}s）"}
+            except Exception as e:
+                data, report = None, {"status": "error", "error": str(e) or repr(e)}
+            report["latency"] = round(time.perf_counter() - started, 4)
+            if data is None:
+                self.endpoint_errors[endpoint.name] = self.endpoint_errors.get(endpoint.name, 0) + 1
+                logger.warning(f"Prometheus 实例 {endpoint.name} 查询失败：{report['error']}")
+            return data, report
+
+        outcomes = await asyncio.gather(*(run(endpoint) for endpoint in endpoints))
+
+        responses = {}
+        reports = {}
+        for endpoint, (data, report) in zip(endpoints, outcomes):
+            reports[endpoint.name] = report
+            if data is not None:
+                responses[endpoint.name] = data
+
+        self.fanouts += 1
+        partial = len(responses) < len(endpoints)
+        if partial:
+            self.partial_results += 1
+
+        merged = merge_results(responses, self.config.label)
+        merged["endpoints"] = reports
+        merged["partial"] = partial
+        return merged
+
+    def stats(self) -> dict:
+        """多实例查询统计"""
+        return {
+            "fanouts": self.fanouts,
+            "partial_results": self.partial_results,
+            "endpoint_errors": dict(self.endpoint_errors),
+            "config": asdict(self.config),
+        }
+
+
+# 进程内共享的多实例查询器
+prometheus_fanout = PrometheusFanOut(FanOutConfig.from_env())
@@ -0,0 +1,339 @@
+"""
+告警和规则变更流
+
+后台定期拉取 /api/v1/alerts 和 /api/v1/rules，保留上一次的快照，只把变化发布给订阅者：
+- 告警按标签指纹对齐：新触发（firing）、新进入 pending、恢复（消失）、注解或状态变化
+- 规则按 (规则组文件, 规则组, 规则名, 标签) 对齐：新增、删除、查询/健康状态/错误等变化
+- 告警的 value、activeAt 以及规则的评估时间、耗时每轮都会变，不参与比较
+
+订阅者通过异步迭代逐条取得变更事件，每轮处理量与变化数成正比，而不是与告警总数成正比。
+订阅队列有上限，消费过慢时丢弃最旧的事件并计数，订阅者可通过 snapshot() 重新同步
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, asdict, field
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# fetch(endpoint) -> Prometheus API 响应的 data 字段
+FeedFetcher = Callable[[str], Awaitable[dict]]
+
+# 参与比较的字段（其余字段如 value、evaluationTime 每轮都会变化）
+ALERT_FIELDS = ("state", "annotations")
+RULE_FIELDS = ("query", "health", "lastError", "state", "duration", "annotations")
+
+
+# ─────────────────────────────────────────────────────────────
+# 配置
+# ─────────────────────────────────────────────────────────────
+
+@dataclass
+class FeedConfig:
+    """变更流配置（默认关闭后台拉取，工具调用时按需拉取）"""
+    enabled: bool = False
+    interval: float = 30.0     # 拉取周期（秒）
+    queue_size: int = 100      # 每个订阅者最多积压的事件数
+    history: int = 200         # 保留最近的事件数，供按序号增量读取
+
+    @classmethod
+    def from_env(cls) -> "FeedConfig":
+        """从环境变量读取配置（PROM_FEED_*），未设置时使用默认值"""
+        default = cls()
+        return cls(
+            enabled=os.getenv("PROM_FEED_ENABLED", "").lower() in ("1", "true", "yes"),
+            interval=float(os.getenv("PROM_FEED_INTERVAL", default.interval)),
+            queue_size=int(os.getenv("PROM_FEED_QUEUE_SIZE", default.queue_size)),
+            history=int(os.getenv("PROM_FEED_HISTORY", default.history)),
+        )
+
+
+@dataclass
+class FeedEvent:
+    """一轮拉取的变化"""
+    seq: int
+    at: float
+    firing: list = field(default_factory=list)      # 新触发的告警（含 pending → firing）
+    pending: list = field(default_factory=list)     # 新进入 pending 的告警
+    resolved: list = field(default_factory=list)    # 已恢复（从列表中消失）的告警
+    changed: list = field(default_factory=list)     # 注解或状态变化的告警：{"alert": ..., "fields": [...]}
+    rules_added: list = field(default_factory=list)
+    rules_removed: list = field(default_factory=list)
+    rules_changed: list = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return (len(self.firing) + len(self.pending) + len(self.resolved) + len(self.changed)
+                + len(self.rules_added) + len(self.rules_removed) + len(self.rules_changed))
+
+    def to_dict(self) -> dict:
+        return {k: v for k, v in asdict(self).items() if v or k in ("seq", "at")}
+
+
+# ─────────────────────────────────────────────────────────────
+# 对齐与比较
+# ─────────────────────────────────────────────────────────────
+
+def fingerprint(labels: dict) -> str:
+    """标签集合的指纹（与标签顺序无关）"""
+    payload = "\xff".join(f"{k}\xff{labels[k]}" for k in sorted(labels))
+    return hashlib.blake2b(payload.encode(), digest_size=8).hexdigest()
+
+
+def _signature(item: dict, fields: tuple) -> tuple[str, ...]:
+    """参与比较的字段的序列化值（保存快照时计算，不受之后修改原对象的影响）"""
+    return tuple(json.dumps(item.get(name), sort_keys=True, ensure_ascii=False) for name in fields)
+
+
+def index_alerts(alerts: list) -> dict[str, tuple[dict, tuple]]:
+    """按指纹索引告警：指纹 -> (告警, 比较签名)"""
+    return {
+        fingerprint(alert.get("labels", {})): (alert, _signature(alert, ALERT_FIELDS))
+        for alert in alerts
+    }
+
+
+def index_rules(groups: list) -> dict[str, tuple[dict, tuple]]:
+    """按 (文件, 组, 规则名, 标签) 索引规则，去掉告警规则里内嵌的告警列表"""
+    index = {}
+    for group in groups:
+        for rule in group.get("rules", []):
+            rule = {k: v for k, v in rule.items() if k != "alerts"}
+            rule["group"] = group.get("name", "")
+            rule["file"] = group.get("file", "")
+            key = fingerprint({
+                "file": rule["file"], "group": rule["group"],
+                "name": rule.get("name", ""), "labels": json.dumps(rule.get("labels") or {}, sort_keys=True),
+            })
+            index[key] = (rule, _signature(rule, RULE_FIELDS))
+    return index
+
+
+def _changed_fields(old: tuple, new: tuple, fields: tuple) -> list[str]:
+    return [name for name, a, b in zip(fields, old, new) if a != b]
+
+
+def diff_alerts(previous: dict, current: dict, event: FeedEvent) -> None:
+    """比较两次告警索引，把变化写入 event"""
+    for key, (alert, signature) in current.items():
+        old = previous.get(key)
+        if old is None:
+            (event.firing if alert.get("state") == "firing" else event.pending).append(alert)
+        elif old[1] != signature:
+            if old[0].get("state") != "firing" and alert.get("state") == "firing":
+                event.firing.append(alert)
+            else:
+                event.changed.append({"alert": alert, "fields": _changed_fields(old[1], signature, ALERT_FIELDS)})
+    event.resolved.extend(alert for key, (alert, _) in previous.items() if key not in current)
+
+
+def diff_rules(previous: dict, current: dict, event: FeedEvent) -> None:
+    """比较两次规则索引，把变化写入 event"""
+    for key, (rule, signature) in current.items():
+        old = previous.get(key)
+        if old is None:
+            event.rules_added.append(rule)
+        elif old[1] != signature:
+            event.rules_changed.append({"rule": rule, "fields": _changed_fields(old[1], signature, RULE_FIELDS)})
+    event.rules_removed.extend(rule for key, (rule, _) in previous.items() if key not in current)
+
+
+# ─────────────────────────────────────────────────────────────
+# 订阅
+# ─────────────────────────────────────────────────────────────
+
+class FeedSubscription:
+    """
+    变更流订阅，用 async for 逐条读取事件
+
+    队列满时丢弃最旧的事件（dropped 计数），变更流停止或取消订阅后迭代结束
+    """
+
+    _CLOSED = object()
+
+    def __init__(self, feed: "ChangeFeed", queue_size: int):
+        self._feed = feed
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, queue_size) + 1)
+        self._limit = max(1, queue_size)
+        self.dropped = 0
+        self.closed = False
+
+    def _put(self, item) -> None:
+        if item is not self._CLOSED and self._queue.qsize() >= self._limit:
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(item)
+
+    def close(self) -> None:
+        """取消订阅"""
+        if not self.closed:
+            self.closed = True
+            self._feed._subscribers.discard(self)
+            self._put(self._CLOSED)
+
+    def __aiter__(self) -> "FeedSubscription":
+        return self
+
+    async def __anext__(self) -> FeedEvent:
+        if self.closed and self._queue.empty():
+            raise StopAsyncIteration
+        item = await self._queue.get()
+        if item is self._CLOSED:
+            raise StopAsyncIteration
+        return item
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[FeedEvent]:
+        """等待下一条事件，超时或订阅已关闭时返回 None"""
+        try:
+            return await asyncio.wait_for(self.__anext__(), timeout)
+        except (asyncio.TimeoutError, StopAsyncIteration):
+            return None
+
+
+# ─────────────────────────────────────────────────────────────
+# 变更流
+# ─────────────────────────────────────────────────────────────
+
+class ChangeFeed:
+    """告警和规则的变更流"""
+
+    def __init__(self, config: Optional[FeedConfig] = None, clock: Callable[[], float] = time.time):
+        self.config = config or FeedConfig()
+        self.clock = clock
+        self._alerts: Optional[dict] = None
+        self._rules: Optional[dict] = None
+        self._events: deque[FeedEvent] = deque(maxlen=self.config.history)
+        self._subscribers: set[FeedSubscription] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.seq = 0
+        self.polls = 0
+        self.errors: dict[str, str] = {}
+        self.last_poll: Optional[float] = None
+
+    async def _fetch(self, fetch: FeedFetcher, endpoint: str) -> Optional[dict]:
+        try:
+            data = await fetch(endpoint)
+        except Exception as e:
+            self.errors[endpoint] = str(e) or repr(e)
+            logger.warning(f"变更流拉取 {endpoint} 失败：{e!r}")
+            return None
+        if data.get("stale"):
+            # 熔断期间返回的旧结果不代表当前状态，本轮跳过
+            self.errors[endpoint] = "Prometheus 不可用，返回的是旧结果"
+            return None
+        self.errors.pop(endpoint, None)
+        return data
+
+    async def poll_once(self, fetch: FeedFetcher) -> Optional[FeedEvent]:
+        """
+        拉取一次并与上一次快照比较
+
+        第一次拉取时所有告警和规则都作为新增发布；拉取失败的部分保留上一次快照。
+
+        Returns:
+            有变化时返回发布的事件，否则返回 None
+        """
+        async with self._lock:
+            alerts, rules = await asyncio.gather(self._fetch(fetch, "alerts"), self._fetch(fetch, "rules"))
+            self.polls += 1
+            self.last_poll = self.clock()
+            event = FeedEvent(seq=self.seq + 1, at=self.last_poll)
+            if alerts is not None:
+                current = index_alerts(alerts.get("alerts", []))
+                diff_alerts(self._alerts or {}, current, event)
+                self._alerts = current
+            if rules is not None:
+                current = index_rules(rules.get("groups", []))
+                diff_rules(self._rules or {}, current, event)
+                self._rules = current
+            if not len(event):
+                return None
+            self.seq = event.seq
+            self._events.append(event)
+            for subscriber in list(self._subscribers):
+                subscriber._put(event)
+            return event
+
+    def subscribe(self) -> FeedSubscription:
+        """订阅之后发布的事件"""
+        subscription = FeedSubscription(self, self.config.queue_size)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def since(self, seq: int) -> tuple[list[FeedEvent], bool]:
+        """
+        序号大于 seq 的事件
+
+        Returns:
+            (事件列表, 是否完整)；seq 之后的部分事件已被挤出历史时不完整，需要用 snapshot() 重新同步
+        """
+        events = [event for event in self._events if event.seq > seq]
+        complete = seq >= self.seq or (bool(events) and events[0].seq == seq + 1)
+        return events, complete
+
+    def snapshot(self) -> dict:
+        """当前的完整状态（用于订阅者重新同步）"""
+        return {
+            "seq": self.seq,
+            "alerts": [alert for alert, _ in (self._alerts or {}).values()],
+            "rules": [rule for rule, _ in (self._rules or {}).values()],
+        }
+
+    # ── 后台任务 ───────────────────────────────────────────
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, fetch: FeedFetcher) -> None:
+        """启动后台拉取（未启用或已在运行时忽略）"""
+        if not self.config.enabled or self.running:
+            return
+        self._task = asyncio.ensure_future(self._run(fetch))
+
+    async def _run(self, fetch: FeedFetcher) -> None:
+        while True:
+            started = self.clock()
+            try:
+                await self.poll_once(fetch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"变更流拉取失败：{e!r}")
+            await asyncio.sleep(max(0.0, self.config.interval - (self.clock() - started)))
+
+    async def stop(self) -> None:
+        """停止后台拉取并结束所有订阅"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for subscriber in list(self._subscribers):
+            subscriber.close()
+
+    def stats(self) -> dict:
+        """变更流统计"""
+        return {
+            "running": self.running,
+            "polls": self.polls,
+            "seq": self.seq,
+            "alerts": len(self._alerts or {}),
+            "rules": len(self._rules or {}),
+            "subscribers": len(self._subscribers),
+            "dropped": sum(subscriber.dropped for subscriber in self._subscribers),
+            "errors": dict(self.errors),
+            "config": asdict(self.config),
+        }
+
+
+# 进程内共享的变更流
+change_feed = ChangeFeed(FeedConfig.from_env())
@@ -0,0 +1,119 @@
+"""
+本地 histogram_quantile 计算
+
+取回一次 `sum by (le, ...) (rate(xxx_bucket[5m]))` 的结果后，在本地一次算出任意多个
+分位数，代替每个分位数各执行一次 histogram_quantile：
+- 按去掉 le 后的标签分组，组成 G×B（即时查询）或 G×T×B（范围查询）的累积计数矩阵
+- 分位数插值对所有分组、时间点和分位数同时进行，语义与 Prometheus 的
+  histogram_quantile 一致（桶内线性插值，落在 +Inf 桶时返回最大的有限上界）
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from .prom_series import SeriesMatrix, labels_key
+
+
+@dataclass
+class HistogramBuckets:
+    """
+    按分组对齐的累积桶计数
+
+    counts 的最后一维对应 le（升序），即时查询为 (G, B)，范围查询为 (G, T, B)；
+    某个分组缺少某个桶时为 NaN
+    """
+    labels: list[tuple]
+    le: np.ndarray
+    counts: np.ndarray
+    timestamps: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def metric(self, group: int) -> dict:
+        return dict(self.labels[group])
+
+
+def _split_le(metric: dict) -> tuple[tuple, float]:
+    le = metric.get("le")
+    if le is None:
+        raise ValueError("查询结果缺少 le 标签，请对 _bucket 序列按 le 聚合（例如 sum by (le) (...)）")
+    return labels_key({k: v for k, v in metric.items() if k not in ("le", "__name__")}), float(le)
+
+
+def _index(result: list) -> tuple[list[tuple], np.ndarray, np.ndarray, np.ndarray]:
+    """每个结果对应的 (分组下标, 桶下标)"""
+    keys = [_split_le(item.get("metric", {})) for item in result]
+    groups = list(dict.fromkeys(key for key, _ in keys))
+    position = {key: i for i, key in enumerate(groups)}
+    le = np.unique(np.array([bound for _, bound in keys], dtype=np.float64))
+    group_index = np.array([position[key] for key, _ in keys], dtype=int)
+    bucket_index = np.searchsorted(le, [bound for _, bound in keys])
+    return groups, le, group_index, bucket_index
+
+
+def buckets_from_vector(result: list) -> HistogramBuckets:
+    """从即时查询结果（vector）构造"""
+    if not result:
+        return HistogramBuckets([], np.empty(0), np.empty((0, 0)))
+    groups, le, group_index, bucket_index = _index(result)
+    counts = np.full((len(groups), len(le)), np.nan)
+    counts[group_index, bucket_index] = [float(item["value"][1]) for item in result]
+    return HistogramBuckets(groups, le, counts)
+
+
+def buckets_from_matrix(result: list) -> HistogramBuckets:
+    """从范围查询结果（matrix）构造，所有桶序列对齐到同一时间网格"""
+    if not result:
+        return HistogramBuckets([], np.empty(0), np.empty((0, 0, 0)), np.empty(0))
+    groups, le, group_index, bucket_index = _index(result)
+    matrix = SeriesMatrix.from_result(result)
+    counts = np.full((len(groups), len(matrix.timestamps), len(le)), np.nan)
+    counts[group_index, :, bucket_index] = matrix.values
+    return HistogramBuckets(groups, le, counts, matrix.timestamps)
+
+
+def histogram_quantiles(quantiles, le: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """
+    按 Prometheus histogram_quantile 的语义计算分位数
+
+    Args:
+        quantiles: 分位数列表，例如 [0.5, 0.9, 0.99]
+        le: (B,) 升序的桶上界，最后一个应为 +Inf
+        counts: (..., B) 累积计数
+
+    Returns:
+        (Q, ...) 分位数矩阵；没有 +Inf 桶、桶数少于 2 或总数为 0 时为 NaN
+    """
+    q = np.asarray(quantiles, dtype=np.float64)
+    shape = (len(q),) + counts.shape[:-1]
+    if len(le) < 2 or not np.isinf(le[-1]):
+        return np.full(shape, np.nan)
+
+    has_inf = ~np.isnan(counts[..., -1])
+    # 缺失的桶沿用前一个桶的计数，并修正因抓取时间差造成的非单调
+    counts = np.fmax.accumulate(np.where(np.isnan(counts), -np.inf, counts), axis=-1)
+    counts = np.where(np.isneginf(counts), 0.0, counts)
+    total = counts[..., -1]
+    rank = q.reshape((-1,) + (1,) * total.ndim) * total
+
+    # 在前 B-1 个桶中找第一个计数 >= rank 的桶，找不到即为 +Inf 桶
+    index = (counts[..., :-1] < rank[..., None]).sum(axis=-1)
+    expanded = np.broadcast_to(counts, shape + counts.shape[-1:])
+    previous = np.maximum(index - 1, 0)
+    upper_count = np.take_along_axis(expanded, index[..., None], axis=-1)[..., 0]
+    lower_count = np.where(index > 0, np.take_along_axis(expanded, previous[..., None], axis=-1)[..., 0], 0.0)
+    upper = le[index]
+    lower = np.where(index > 0, le[previous], 0.0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        value = lower + (upper - lower) * (rank - lower_count) / (upper_count - lower_count)
+    value = np.where(index == len(le) - 1, le[-2], value)
+    value = np.where((index == 0) & (le[0] <= 0), le[0], value)
+    value = np.where(has_inf & (total > 0), value, np.nan)
+
+    q_shape = q.reshape((-1,) + (1,) * total.ndim)
+    value = np.where(q_shape < 0, -np.inf, value)
+    return np.where(q_shape > 1, np.inf, value)
@@ -0,0 +1,303 @@
+"""
+Prometheus 范围查询增量缓存
+
+参考 Thanos / Cortex query-frontend 的结果缓存：
+- 查询窗口按 step 对齐，保证相同 step 的查询落在同一组采样时间点上
+- 按 (规范化查询, step) 保存每条序列的样本块和已覆盖的时间区间
+- 重复查询只回源缺失的头部或尾部，再与缓存合并
+- 最近 max_freshness 秒内的样本可能尚未抓取完整，不写入缓存
+"""
+
+import os
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass, asdict, field
+from typing import Awaitable, Callable, Optional
+
+from .prom_cache import normalize_query
+from .prom_time import align_timestamp
+
+
+# fetch(query, start, end, step) -> Prometheus query_range 的 data 字段
+RangeFetcher = Callable[[str, float, float, float], Awaitable[dict]]
+
+
+# ─────────────────────────────────────────────────────────────
+# 配置
+# ─────────────────────────────────────────────────────────────
+
+@dataclass
+class RangeCacheConfig:
+    """范围查询缓存配置"""
+    enabled: bool = True
+    max_entries: int = 256
+    max_samples: int = 5_000_000
+    max_freshness: float = 60.0  # 最近多少秒的样本不缓存
+    max_window: float = 86400.0  # 单个条目最多保留多长的时间区间
+
+    @classmethod
+    def from_env(cls) -> "RangeCacheConfig":
+        """从环境变量读取配置（PROM_RANGE_CACHE_*），未设置时使用默认值"""
+        default = cls()
+        return cls(
+            enabled=os.getenv("PROM_RANGE_CACHE_ENABLED", "true").lower() not in ("0", "false", "no"),
+            max_entries=int(os.getenv("PROM_RANGE_CACHE_MAX_ENTRIES", default.max_entries)),
+            max_samples=int(os.getenv("PROM_RANGE_CACHE_MAX_SAMPLES", default.max_samples)),
+            max_freshness=float(os.getenv("PROM_RANGE_CACHE_MAX_FRESHNESS", default.max_freshness)),
+            max_window=float(os.getenv("PROM_RANGE_CACHE_MAX_WINDOW", default.max_window)),
+        )
+
+
+# ─────────────────────────────────────────────────────────────
+# 样本块
+# ─────────────────────────────────────────────────────────────
+
+@dataclass
+class SeriesBlock:
+    """单条序列的样本块（时间戳升序）"""
+    metric: dict
+    timestamps: list = field(default_factory=list)
+    values: list = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def prepend(self, values: list) -> int:
+        """在头部插入早于当前块的样本，返回新增样本数"""
+        if self.timestamps:
+            cut = bisect_left([v[0] for v in values], self.timestamps[0])
+            values = values[:cut]
+        self.timestamps[:0] = [v[0] for v in values]
+        self.values[:0] = [v[1] for v in values]
+        return len(values)
+
+    def append(self, values: list) -> int:
+        """在尾部追加晚于当前块的样本，返回新增样本数"""
+        if self.timestamps:
+            start = bisect_right([v[0] for v in values], self.timestamps[-1])
+            values = values[start:]
+        self.timestamps.extend(v[0] for v in values)
+        self.values.extend(v[1] for v in values)
+        return len(values)
+
+    def trim_before(self, timestamp: float) -> int:
+        """删除早于 timestamp 的样本，返回删除数"""
+        cut = bisect_left(self.timestamps, timestamp)
+        del self.timestamps[:cut]
+        del self.values[:cut]
+        return cut
+
+    def slice(self, start: float, end: float) -> list:
+        """返回 [start, end] 内的样本（Prometheus values 格式）"""
+        lo = bisect_left(self.timestamps, start)
+        hi = bisect_right(self.timestamps, end)
+        return [[ts, val] for ts, val in zip(self.timestamps[lo:hi], self.values[lo:hi])]
+
+
+@dataclass
+class RangeCacheEntry:
+    """某个 (查询, step) 的缓存条目，[start, end] 为已完整覆盖的区间"""
+    start: float
+    end: float
+    series: "OrderedDict[tuple, SeriesBlock]" = field(default_factory=OrderedDict)
+
+    @property
+    def samples(self) -> int:
+        return sum(len(block) for block in self.series.values())
+
+
+def series_key(metric: dict) -> tuple:
+    """以排序后的标签集合作为序列键"""
+    return tuple(sorted(metric.items()))
+
+
+def split_fresh(values: list, fresh_limit: float) -> tuple[list, list]:
+    """按 fresh_limit 将样本分为可缓存部分和过新部分"""
+    cut = bisect_right([v[0] for v in values], fresh_limit)
+    return values[:cut], values[cut:]
+
+
+# ─────────────────────────────────────────────────────────────
+# 增量缓存
+# ─────────────────────────────────────────────────────────────
+
+class RangeResultCache:
+    """step 对齐的范围查询增量缓存"""
+
+    def __init__(self, config: Optional[RangeCacheConfig] = None,
+                 clock: Callable[[], float] = time.time):
+        self.config = config or RangeCacheConfig()
+        self.clock = clock
+        self._entries: "OrderedDict[tuple, RangeCacheEntry]" = OrderedDict()
+        self.total_samples = 0
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+        self.samples_fetched = 0
+        self.samples_from_cache = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def query_range(self, query: str, start: float, end: float, step: float,
+                          fetch: RangeFetcher) -> dict:
+        """
+        执行带缓存的范围查询
+
+        Args:
+            query: PromQL 查询语句
+            start: 开始时间（Unix 时间戳）
+            end: 结束时间（Unix 时间戳）
+            step: 步长（秒）
+            fetch: 回源函数，接收对齐后的 (query, start, end, step)
+
+        Returns:
+            与 Prometheus query_range 相同结构的 data 字段
+        """
+        start = align_timestamp(start, step)
+        end = align_timestamp(end, step)
+        if start > end:
+            return {"resultType": "matrix", "result": []}
+
+        key = (normalize_query(query), step)
+        fresh_limit = align_timestamp(self.clock() - self.config.max_freshness, step)
+        entry = self._entries.get(key)
+
+        # 无缓存或与已有区间不相邻：整段回源并重建条目
+        if entry is None or start > entry.end + step or end < entry.start - step:
+            self.misses += 1
+            data = await fetch(query, start, end, step)
+            self._count_fetched(data)
+            if min(end, fresh_limit) >= start:
+                self._store(key, start, min(end, fresh_limit), data.get("result", []))
+            return data
+
+        self._entries.move_to_end(key)
+        volatile: dict[tuple, list] = {}
+        fetched = False
+
+        if start < entry.start:
+            head = await fetch(query, start, entry.start - step, step)
+            self._count_fetched(head)
+            self._merge(key, entry, head.get("result", []), prepend=True)
+            entry.start = start
+            fetched = True
+
+        if end > entry.end:
+            tail = await fetch(query, entry.end + step, end, step)
+            self._count_fetched(tail)
+            cacheable = []
+            for result in tail.get("result", []):
+                keep, recent = split_fresh(result.get("values", []), fresh_limit)
+                cacheable.append({"metric": result.get("metric", {}), "values": keep})
+                if recent:
+                    volatile[series_key(result.get("metric", {}))] = (result.get("metric", {}), recent)
+            self._merge(key, entry, cacheable, prepend=False)
+            entry.end = max(entry.end, min(end, fresh_limit))
+            fetched = True
+
+        if fetched:
+            self.partial_hits += 1
+        else:
+            self.hits += 1
+
+        response = self._assemble(entry, start, end, volatile)
+        if self._entries.get(key) is entry:
+            self._trim(key, entry)
+            self._evict()
+        return response
+
+    def _count_fetched(self, data: dict) -> None:
+        self.samples_fetched += sum(len(r.get("values", [])) for r in data.get("result", []))
+
+    def _store(self, key: tuple, start: float, end: float, results: list) -> None:
+        if key in self._entries:
+            self._drop(key)
+        entry = RangeCacheEntry(start=start, end=end)
+        for result in results:
+            keep, _ = split_fresh(result.get("values", []), end)
+            block = SeriesBlock(metric=result.get("metric", {}))
+            block.append(keep)
+            entry.series[series_key(block.metric)] = block
+        self._entries[key] = entry
+        self.total_samples += entry.samples
+        self._trim(key, entry)
+        self._evict()
+
+    def _merge(self, key: tuple, entry: RangeCacheEntry, results: list, prepend: bool) -> None:
+        # 回源期间条目可能已被其他协程淘汰，此时只更新条目本身，不计入总样本数
+        live = self._entries.get(key) is entry
+        for result in results:
+            metric = result.get("metric", {})
+            series_id = series_key(metric)
+            block = entry.series.get(series_id)
+            if block is None:
+                block = entry.series[series_id] = SeriesBlock(metric=metric)
+            values = result.get("values", [])
+            added = block.prepend(values) if prepend else block.append(values)
+            if live:
+                self.total_samples += added
+
+    def _assemble(self, entry: RangeCacheEntry, start: float, end: float,
+                  volatile: dict) -> dict:
+        results = []
+        for key, block in entry.series.items():
+            values = block.slice(start, end)
+            self.samples_from_cache += len(values)
+            if key in volatile:
+                values.extend(volatile.pop(key)[1])
+            if values:
+                results.append({"metric": block.metric, "values": values})
+        for metric, recent in volatile.values():
+            results.append({"metric": metric, "values": recent})
+        return {"resultType": "matrix", "result": results}
+
+    def _trim(self, key: tuple, entry: RangeCacheEntry) -> None:
+        """将条目限制在 max_window 内，并丢弃已无样本的序列"""
+        if entry.end - entry.start <= self.config.max_window:
+            return
+        step = key[1]
+        new_start = entry.end - align_timestamp(self.config.max_window, step)
+        for series_id in list(entry.series):
+            block = entry.series[series_id]
+            self.total_samples -= block.trim_before(new_start)
+            if not block:
+                del entry.series[series_id]
+        entry.start = new_start
+
+    def _evict(self) -> None:
+        while self._entries and (len(self._entries) > self.config.max_entries
+                                 or self.total_samples > self.config.max_samples):
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _drop(self, key: tuple) -> None:
+        entry = self._entries.pop(key)
+        self.total_samples -= entry.samples
+
+    def clear(self) -> None:
+        """清空缓存（保留统计计数）"""
+        self._entries.clear()
+        self.total_samples = 0
+
+    def stats(self) -> dict:
+        """缓存统计"""
+        return {
+            "entries": len(self._entries),
+            "samples": self.total_samples,
+            "hits": self.hits,
+            "partial_hits": self.partial_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "evictions": self.evictions,
+            "samples_fetched": self.samples_fetched,
+            "samples_from_cache": self.samples_from_cache,
+            "config": asdict(self.config),
+        }
+
+
+# 进程内共享的范围查询缓存
+range_cache = RangeResultCache(RangeCacheConfig.from_env())
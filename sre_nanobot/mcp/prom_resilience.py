@@ -0,0 +1,429 @@
+"""
+Prometheus 调用保护
+
+- AdaptiveLimiter: AIMD 自适应并发上限。延迟接近基线时每完成一个请求加性增加，
+  延迟超过基线的 tolerance 倍或请求失败时乘性减少（每个往返窗口最多减少一次）；
+  超出上限的请求排队等待。基线是每个请求类别（按回看窗口分档的即时查询、按点数分档的
+  范围查询等）最近延迟的 p90，正常的延迟抖动和重查询都不会被当作变慢
+- CircuitBreaker: 连续失败达到阈值后熔断，熔断期间直接失败；冷却后放行探测请求，
+  探测成功则恢复
+- 熔断或请求失败时，返回同一请求最近一次成功的结果（last known good）；
+  结果按 实例 + 接口 + 去掉评估时间的参数 保存，缓存对齐后的时间变化不影响命中
+"""
+
+import asyncio
+import logging
+import math
+import os
+import re
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, asdict
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable, Optional
+
+from .prom_cache import TTLCache, estimate_size
+from .prom_singleflight import request_key
+from .prom_splitter import is_retryable
+from .prom_time import parse_duration
+
+logger = logging.getLogger(__name__)
+
+BASELINE_WINDOW = 100     # 每个类别保留最近多少次延迟用于计算基线
+BASELINE_WARMUP = 20      # 每个类别样本数不足时只记录，不判断变慢
+
+
+# ─────────────────────────────────────────────────────────────
+# 配置
+# ─────────────────────────────────────────────────────────────
+
+@dataclass
+class ResilienceConfig:
+    """并发限制与熔断配置"""
+    enabled: bool = True
+    initial_limit: float = 10.0
+    min_limit: float = 1.0
+    max_limit: float = 100.0
+    backoff_ratio: float = 0.7        # 乘性减少系数
+    latency_tolerance: float = 2.0    # 延迟超过基线的倍数视为过载
+    min_slow_latency: float = 0.05    # 比基线多出不到该值（秒）时不视为过载，避免毫秒级抖动触发减少
+    max_wait: float = 10.0            # 排队等待上限（秒）
+    failure_threshold: int = 5        # 连续失败多少次后熔断
+    reset_timeout: float = 30.0       # 熔断后多久放行探测请求（秒）
+    stale_max_age: float = 3600.0     # last known good 结果的最长保留时间（秒）
+    stale_max_entries: int = 512
+
+    @classmethod
+    def from_env(cls) -> "ResilienceConfig":
+        """从环境变量读取配置（PROM_RESILIENCE_*），未设置时使用默认值"""
+        default = cls()
+        return cls(
+            enabled=os.getenv("PROM_RESILIENCE_ENABLED", "true").lower() not in ("0", "false", "no"),
+            initial_limit=float(os.getenv("PROM_RESILIENCE_INITIAL_LIMIT", default.initial_limit)),
+            min_limit=float(os.getenv("PROM_RESILIENCE_MIN_LIMIT", default.min_limit)),
+            max_limit=float(os.getenv("PROM_RESILIENCE_MAX_LIMIT", default.max_limit)),
+            backoff_ratio=float(os.getenv("PROM_RESILIENCE_BACKOFF_RATIO", default.backoff_ratio)),
+            latency_tolerance=float(os.getenv("PROM_RESILIENCE_LATENCY_TOLERANCE", default.latency_tolerance)),
+            min_slow_latency=float(os.getenv("PROM_RESILIENCE_MIN_SLOW_LATENCY", default.min_slow_latency)),
+            max_wait=float(os.getenv("PROM_RESILIENCE_MAX_WAIT", default.max_wait)),
+            failure_threshold=int(os.getenv("PROM_RESILIENCE_FAILURE_THRESHOLD", default.failure_threshold)),
+            reset_timeout=float(os.getenv("PROM_RESILIENCE_RESET_TIMEOUT", default.reset_timeout)),
+            stale_max_age=float(os.getenv("PROM_RESILIENCE_STALE_MAX_AGE", default.stale_max_age)),
+            stale_max_entries=int(os.getenv("PROM_RESILIENCE_STALE_MAX_ENTRIES", default.stale_max_entries)),
+        )
+
+
+class CircuitOpenError(Exception):
+    """熔断期间拒绝请求"""
+
+
+class QueueTimeoutError(Exception):
+    """排队超过 max_wait 仍未获得并发名额"""
+
+
+def _span(params: dict) -> Optional[float]:
+    try:
+        return float(params["end"]) - float(params["start"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def last_good_key(base_url: str, endpoint: str, params: Optional[dict]) -> tuple:
+    """
+    last known good 的键：去掉 time，范围查询的 start/end 换成时间跨度
+
+    同一查询在不同评估时间（例如缓存对齐到新的 resolution 区间后）仍能取到上次的结果
+    """
+    params = dict(params or {})
+    params.pop("time", None)
+    if "start" in params or "end" in params:
+        span = _span(params)
+        params.pop("start", None)
+        params.pop("end", None)
+        params["span"] = span
+    return (base_url,) + request_key(endpoint, params)
+
+
+_RANGE_SELECTOR = re.compile(r"\[\s*([0-9][0-9smhdwy]*)\s*(?::[^\]]*)?\]")
+
+
+def _lookback(query: str) -> Optional[float]:
+    """查询中最长的范围选择器 / 子查询窗口（秒）"""
+    windows = []
+    for match in _RANGE_SELECTOR.finditer(query or ""):
+        try:
+            windows.append(parse_duration(match.group(1)))
+        except ValueError:
+            continue
+    return max(windows) if windows else None
+
+
+def latency_class(endpoint: str, params: Optional[dict]) -> str:
+    """
+    延迟基线的类别：接口名；即时查询按最长回看窗口的 2 的幂次分档（没有范围选择器为 instant），
+    范围查询按点数（span / step）的 2 的幂次分档
+    """
+    if endpoint == "query":
+        lookback = _lookback((params or {}).get("query", ""))
+        return f"query:{int(math.log2(max(lookback, 1)))}" if lookback else "query:instant"
+    if endpoint != "query_range":
+        return endpoint
+    try:
+        points = _span(params or {}) / float(params["step"])
+    except (KeyError, TypeError, ValueError, ZeroDivisionError):
+        return endpoint
+    return f"{endpoint}:{int(math.log2(max(points, 1)))}"
+
+
+# ─────────────────────────────────────────────────────────────
+# 自适应并发限制
+# ─────────────────────────────────────────────────────────────
+
+class AdaptiveLimiter:
+    """AIMD 自适应并发上限"""
+
+    def __init__(self, config: ResilienceConfig, clock: Callable[[], float] = time.monotonic):
+        self.config = config
+        self.clock = clock
+        self.limit = config.initial_limit
+        self.inflight = 0
+        self.waiting = 0
+        self._latencies: dict[Hashable, deque[float]] = {}
+        self._last_decrease = float("-inf")
+        self._condition = asyncio.Condition()
+        self.increases = 0
+        self.decreases = 0
+        self.rejected = 0
+
+    async def acquire(self) -> None:
+        """等待并发名额，超过 max_wait 仍无名额时抛出异常"""
+        async with self._condition:
+            if self.inflight >= int(self.limit):
+                self.waiting += 1
+                try:
+                    await asyncio.wait_for(
+                        self._condition.wait_for(lambda: self.inflight < int(self.limit)),
+                        timeout=self.config.max_wait,
+                    )
+                except asyncio.TimeoutError:
+                    self.rejected += 1
+                    raise QueueTimeoutError(f"Prometheus 并发已达上限 {int(self.limit)}，排队超过 {self.config.max_wait}s")
+                finally:
+                    self.waiting -= 1
+            self.inflight += 1
+
+    async def release(self, latency: float, overloaded: bool, category: Hashable = "default") -> None:
+        """
+        归还名额并按本次结果调整上限
+
+        Args:
+            latency: 本次请求耗时（秒）
+            overloaded: 是否为过载类失败（超时、5xx、429、网络错误）
+            category: 请求类别，与同类请求的基线比较
+        """
+        async with self._condition:
+            self.inflight -= 1
+            now = self.clock()
+            if overloaded or self._is_slow(latency, category):
+                # 与 TCP 拥塞控制相同，每个往返窗口只减少一次：上次减少之前就已发出的请求
+                # 反映的是旧上限下的负载，不再重复减少
+                if now - latency >= self._last_decrease:
+                    self.limit = max(self.config.min_limit, self.limit * self.config.backoff_ratio)
+                    self.decreases += 1
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.config.max_limit, self.limit + 1.0 / self.limit)
+                self.increases += 1
+            self._condition.notify_all()
+
+    def baseline(self, category: Hashable) -> Optional[float]:
+        """该类别最近延迟的 p90；样本不足时为 None"""
+        recent = self._latencies.get(category)
+        if not recent or len(recent) < BASELINE_WARMUP:
+            return None
+        ordered = sorted(recent)
+        return ordered[min(len(ordered) - 1, int(0.9 * len(ordered)))]
+
+    def _is_slow(self, latency: float, category: Hashable) -> bool:
+        # 与本类别最近延迟的 p90 比较：单次快请求不会拉低基线，持续变慢时基线随窗口跟上
+        baseline = self.baseline(category)
+        self._latencies.setdefault(category, deque(maxlen=BASELINE_WINDOW)).append(latency)
+        return (baseline is not None
+                and latency > baseline * self.config.latency_tolerance
+                and latency - baseline > self.config.min_slow_latency)
+
+    def stats(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "inflight": self.inflight,
+            "waiting": self.waiting,
+            "baseline_latency": {str(k): round(v, 4) for k in sorted(self._latencies, key=str)
+                                 if (v := self.baseline(k)) is not None},
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "rejected": self.rejected,
+        }
+
+
+# ─────────────────────────────────────────────────────────────
+# 熔断器
+# ─────────────────────────────────────────────────────────────
+
+class CircuitBreaker:
+    """
+    三态熔断器：closed → open → half_open → closed / open
+
+    half_open 状态下同一时间只放行一个探测请求
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, config: ResilienceConfig, clock: Callable[[], float] = time.monotonic):
+        self.config = config
+        self.clock = clock
+        self._state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._probe_started = 0.0
+        self.opened = 0
+        self.short_circuited = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self.clock() - self.opened_at >= self.config.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probing = False
+        return self._state
+
+    def allow(self) -> bool:
+        """是否放行本次请求"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        # 探测请求被取消等未能回报结果时，超过 reset_timeout 后允许新的探测
+        if state == self.HALF_OPEN and (
+            not self._probing or self.clock() - self._probe_started >= self.config.reset_timeout
+        ):
+            self._probing = True
+            self._probe_started = self.clock()
+            return True
+        self.short_circuited += 1
+        return False
+
+    def record_success(self) -> None:
+        self._state = self.CLOSED
+        self.consecutive_failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self._state == self.HALF_OPEN or self.consecutive_failures >= self.config.failure_threshold:
+            if self._state != self.OPEN:
+                self.opened += 1
+                logger.warning(f"Prometheus 连续失败 {self.consecutive_failures} 次，熔断 {self.config.reset_timeout}s")
+            self._state = self.OPEN
+            self.opened_at = self.clock()
+            self._probing = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "opened": self.opened,
+            "short_circuited": self.short_circuited,
+        }
+
+
+# ─────────────────────────────────────────────────────────────
+# 组合保护
+# ─────────────────────────────────────────────────────────────
+
+class PrometheusGuard:
+    """
+    并发限制 + 熔断 + last known good
+
+    call() 成功时记录结果；熔断或过载类失败时，若同一请求有 stale_max_age
+    内的成功结果则返回其副本（附带 stale 和 stale_age 字段），否则抛出异常。
+    查询语法错误等 4xx 错误不计入熔断。
+    """
+
+    def __init__(self, config: Optional[ResilienceConfig] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.config = config or ResilienceConfig()
+        self.clock = clock
+        self.limiter = AdaptiveLimiter(self.config, clock)
+        self.breaker = CircuitBreaker(self.config, clock)
+        self.last_good = TTLCache(max_entries=self.config.stale_max_entries,
+                                  max_bytes=16 * 1024 * 1024,
+                                  ttl=self.config.stale_max_age, clock=clock)
+        self.stale_served = 0
+
+    async def call(self, key: Hashable, fn: Callable[[], Awaitable[Any]],
+                   keep_last_good: bool = True, category: Hashable = "default",
+                   size: Optional[Callable[[], int]] = None) -> Any:
+        """
+        在保护下执行请求
+
+        Args:
+            key: 请求标识（用于 last known good）
+            fn: 实际发送请求的函数
+            keep_last_good: 是否记录成功结果供故障时返回
+            category: 延迟基线的类别（见 latency_class）
+            size: 返回本次响应字节数的函数，用于 last known good 的容量统计；
+                为空时按结果估算（需要序列化一次）
+        """
+        if not self.config.enabled:
+            return await fn()
+
+        if not self.breaker.allow():
+            return self._fallback(key, CircuitOpenError(
+                f"Prometheus 不可用（熔断中，{self.config.reset_timeout}s 后重试）"
+            ))
+
+        try:
+            await self.limiter.acquire()
+        except QueueTimeoutError as e:
+            # 排队超时说明 Prometheus 已过载：计入熔断，并与其他过载失败一样返回上次的结果
+            self.breaker.record_failure()
+            return self._fallback(key, e)
+        started = self.clock()
+        overloaded = False
+        try:
+            result = await fn()
+        except Exception as e:
+            overloaded = is_retryable(e)
+            if overloaded:
+                self.breaker.record_failure()
+                return self._fallback(key, e)
+            # 请求本身有误，说明 Prometheus 仍在正常响应
+            self.breaker.record_success()
+            raise
+        finally:
+            await self.limiter.release(self.clock() - started, overloaded, category)
+
+        self.breaker.record_success()
+        if keep_last_good and isinstance(result, dict):
+            self.last_good.put(key, (result, self.clock()), size=size() if size else estimate_size(result))
+        return result
+
+    @asynccontextmanager
+    async def slot(self, category: Hashable = "default") -> AsyncIterator[None]:
+        """
+        为不经过 call() 的请求（例如流式读取）占用并发名额，同样受熔断保护，但没有 last known good
+
+        熔断中或排队超时时直接抛出异常；调用方提前结束读取（GeneratorExit）视为成功
+        """
+        if not self.config.enabled:
+            yield
+            return
+
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Prometheus 不可用（熔断中，{self.config.reset_timeout}s 后重试）")
+        try:
+            await self.limiter.acquire()
+        except QueueTimeoutError:
+            self.breaker.record_failure()
+            raise
+        started = self.clock()
+        overloaded = False
+        try:
+            yield
+        except GeneratorExit:
+            self.breaker.record_success()
+            raise
+        except Exception as e:
+            overloaded = is_retryable(e)
+            if overloaded:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            await self.limiter.release(self.clock() - started, overloaded, category)
+
+    def _fallback(self, key: Hashable, error: Exception) -> Any:
+        cached = self.last_good.get(key)
+        if cached is None:
+            raise error
+        result, stored_at = cached
+        self.stale_served += 1
+        logger.warning(f"Prometheus 请求失败（{error!r}），返回 {self.clock() - stored_at:.0f}s 前的结果")
+        return {**result, "stale": True, "stale_age": round(self.clock() - stored_at, 1)}
+
+    def stats(self) -> dict:
+        """保护状态统计"""
+        return {
+            "limiter": self.limiter.stats(),
+            "breaker": self.breaker.stats(),
+            "last_good": {**self.last_good.stats(), "stale_served": self.stale_served},
+            "config": asdict(self.config),
+        }
+
+
+# 进程内共享的调用保护
+prometheus_guard = PrometheusGuard(ResilienceConfig.from_env())
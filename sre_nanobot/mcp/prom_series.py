@@ -0,0 +1,188 @@
+"""
+Prometheus 列式序列表示
+
+将 query_range 返回的 [[timestamp, "value"], ...] 直接转换为连续的 float64 数组，
+避免为每个样本保留 Python 对象：
+- ColumnarSeries: 单条序列（标签元组 + 时间戳数组 + 数值数组）
+- SeriesMatrix: 共享时间网格的多条序列（N×T 数值矩阵，缺失点为 NaN）
+"""
+
+from typing import Iterable, Optional
+
+import numpy as np
+
+
+def labels_key(metric: dict) -> tuple:
+    """以排序后的标签集合作为序列标识"""
+    return tuple(sorted(metric.items()))
+
+
+def decode_values(values: list) -> tuple[np.ndarray, np.ndarray]:
+    """
+    将 Prometheus values 列表解码为 (timestamps, values) 两个 float64 数组
+
+    数值字符串中的 "NaN"、"+Inf"、"-Inf" 按 IEEE 754 解析
+    """
+    count = len(values)
+    timestamps = np.fromiter((pair[0] for pair in values), dtype=np.float64, count=count)
+    samples = np.fromiter((float(pair[1]) for pair in values), dtype=np.float64, count=count)
+    return timestamps, samples
+
+
+def format_value(value: float) -> str:
+    """按 Prometheus 的格式输出样本值"""
+    if np.isnan(value):
+        return "NaN"
+    if np.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+# ─────────────────────────────────────────────────────────────
+# 单条序列
+# ─────────────────────────────────────────────────────────────
+
+class ColumnarSeries:
+    """单条时间序列：标签元组 + 连续的时间戳 / 数值数组"""
+
+    __slots__ = ("labels", "timestamps", "values")
+
+    def __init__(self, labels: tuple, timestamps: np.ndarray, values: np.ndarray):
+        self.labels = labels
+        self.timestamps = timestamps
+        self.values = values
+
+    @classmethod
+    def from_result(cls, result: dict) -> "ColumnarSeries":
+        """从 query_range 结果中的一项构造"""
+        timestamps, values = decode_values(result.get("values", []))
+        return cls(labels_key(result.get("metric", {})), timestamps, values)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __repr__(self) -> str:
+        return f"ColumnarSeries({self.metric!r}, points={len(self)})"
+
+    @property
+    def metric(self) -> dict:
+        return dict(self.labels)
+
+    @property
+    def name(self) -> str:
+        return self.metric.get("__name__", "")
+
+    @property
+    def nbytes(self) -> int:
+        return self.timestamps.nbytes + self.values.nbytes
+
+    def to_values(self) -> list:
+        """转换回 Prometheus values 格式"""
+        return [[float(ts), format_value(val)] for ts, val in zip(self.timestamps, self.values)]
+
+
+def parse_matrix(result: list) -> list[ColumnarSeries]:
+    """将 query_range 的 result 列表解析为 ColumnarSeries 列表"""
+    return [ColumnarSeries.from_result(item) for item in result]
+
+
+# ─────────────────────────────────────────────────────────────
+# 序列矩阵
+# ─────────────────────────────────────────────────────────────
+
+class SeriesMatrix:
+    """
+    共享时间网格的序列集合
+
+    timestamps 为 (T,) 升序数组，values 为 (N, T) 矩阵，
+    某条序列在某个时间点没有样本时为 NaN。
+    """
+
+    def __init__(self, labels: list[tuple], timestamps: np.ndarray, values: np.ndarray):
+        self.labels = labels
+        self.timestamps = timestamps
+        self.values = values
+
+    @classmethod
+    def from_series(cls, series: Iterable[ColumnarSeries]) -> "SeriesMatrix":
+        """按所有序列时间戳的并集对齐"""
+        series = list(series)
+        if not series:
+            return cls([], np.empty(0), np.empty((0, 0)))
+
+        timestamps = np.unique(np.concatenate([s.timestamps for s in series]))
+        values = np.full((len(series), len(timestamps)), np.nan)
+        for row, item in enumerate(series):
+            if len(item):
+                values[row, np.searchsorted(timestamps, item.timestamps)] = item.values
+        return cls([s.labels for s in series], timestamps, values)
+
+    @classmethod
+    def from_result(cls, result: list) -> "SeriesMatrix":
+        """从 query_range 的 result 列表构造"""
+        return cls.from_series(parse_matrix(result))
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def __repr__(self) -> str:
+        return f"SeriesMatrix(series={len(self)}, points={len(self.timestamps)})"
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.values.shape
+
+    @property
+    def nbytes(self) -> int:
+        return self.timestamps.nbytes + self.values.nbytes
+
+    def metric(self, row: int) -> dict:
+        return dict(self.labels[row])
+
+    def series(self, row: int) -> ColumnarSeries:
+        """取出第 row 条序列（去掉 NaN 占位点）"""
+        mask = ~np.isnan(self.values[row])
+        return ColumnarSeries(self.labels[row], self.timestamps[mask], self.values[row][mask])
+
+    def select(self, rows) -> "SeriesMatrix":
+        """按行索引或布尔掩码选出子集"""
+        rows = np.asarray(rows)
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+        return SeriesMatrix([self.labels[i] for i in rows], self.timestamps, self.values[rows])
+
+    def summary(self) -> dict[str, np.ndarray]:
+        """
+        逐序列统计（向量化，忽略 NaN）
+
+        Returns:
+            {"count", "min", "max", "mean", "last"}，每项为长度 N 的数组
+        """
+        valid = ~np.isnan(self.values)
+        count = valid.sum(axis=1)
+        has_data = count > 0
+
+        filled_min = np.where(valid, self.values, np.inf)
+        filled_max = np.where(valid, self.values, -np.inf)
+        total = np.where(valid, self.values, 0.0).sum(axis=1)
+
+        # 每行最后一个非 NaN 值
+        last = np.full(len(self), np.nan)
+        if self.values.size:
+            last_index = self.values.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+            rows = np.flatnonzero(has_data)
+            last[rows] = self.values[rows, last_index[rows]]
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return {
+                "count": count,
+                "min": np.where(has_data, filled_min.min(axis=1, initial=np.inf), np.nan),
+                "max": np.where(has_data, filled_max.max(axis=1, initial=-np.inf), np.nan),
+                "mean": np.where(has_data, total / np.maximum(count, 1), np.nan),
+                "last": last,
+            }
+
+    def to_result(self, rows: Optional[Iterable[int]] = None) -> list:
+        """转换回 query_range 的 result 列表"""
+        rows = range(len(self)) if rows is None else rows
+        return [{"metric": self.metric(row), "values": self.series(row).to_values()} for row in rows]
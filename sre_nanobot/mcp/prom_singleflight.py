@@ -0,0 +1,91 @@
+"""
+Prometheus 请求合并（single-flight）
+
+相同的请求正在进行时，后来的调用方直接等待同一个结果，
+不再向 Prometheus 发起新的 HTTP 请求；请求完成后立即移除，不做缓存
+"""
+
+import asyncio
+import os
+from dataclasses import dataclass, asdict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+
+@dataclass
+class SingleFlightConfig:
+    """请求合并配置"""
+    enabled: bool = True
+
+    @classmethod
+    def from_env(cls) -> "SingleFlightConfig":
+        """从环境变量读取配置（PROM_SINGLEFLIGHT_*），未设置时使用默认值"""
+        return cls(
+            enabled=os.getenv("PROM_SINGLEFLIGHT_ENABLED", "true").lower() not in ("0", "false", "no"),
+        )
+
+
+def request_key(endpoint: str, params: Optional[dict]) -> tuple:
+    """以 endpoint + 排序后的参数作为请求标识（列表参数如 match[] 保持顺序）"""
+    items = []
+    for name, value in sorted((params or {}).items()):
+        if isinstance(value, (list, tuple)):
+            value = tuple(value)
+        items.append((name, value))
+    return (endpoint, tuple(items))
+
+
+class SingleFlight:
+    """
+    合并相同 key 的并发调用
+
+    实际请求在独立的任务中执行，单个调用方被取消不会影响其它等待者；
+    请求失败时所有等待者收到同一个异常。
+    """
+
+    def __init__(self, config: Optional[SingleFlightConfig] = None):
+        self.config = config or SingleFlightConfig()
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self.executed = 0
+        self.collapsed = 0
+
+    @property
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """执行 fn，若相同 key 的调用正在进行则等待其结果"""
+        if not self.config.enabled:
+            self.executed += 1
+            return await fn()
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.collapsed += 1
+        else:
+            self.executed += 1
+            future = asyncio.ensure_future(fn())
+            self._inflight[key] = future
+            future.add_done_callback(lambda done, key=key: self._forget(key, done))
+        return await asyncio.shield(future)
+
+    def _forget(self, key: Hashable, future: asyncio.Future) -> None:
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        # 所有调用方都已取消时，避免 "exception was never retrieved" 警告
+        if not future.cancelled():
+            future.exception()
+
+    def stats(self) -> dict:
+        """请求合并统计"""
+        total = self.executed + self.collapsed
+        return {
+            "executed": self.executed,
+            "collapsed": self.collapsed,
+            "collapse_rate": round(self.collapsed / total, 4) if total else 0.0,
+            "inflight": self.inflight,
+            "config": asdict(self.config),
+        }
+
+
+# 进程内共享的请求合并器
+single_flight = SingleFlight(SingleFlightConfig.from_env())
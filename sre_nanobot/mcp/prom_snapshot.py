@@ -0,0 +1,182 @@
+"""
+预定义指标快照采集
+
+后台按固定周期执行一组预定义的 PromQL（节点/Pod 资源使用率、服务延迟和错误率），
+在内存中保存每个查询的最新快照和最近若干次的历史：
+- 工具直接从快照中按标签过滤，响应时间与 Prometheus 负载无关
+- 快照带采集时间，超过 max_age 视为过期，由调用方回退到实时查询
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# evaluate(query) -> Prometheus 即时查询的 data 字段
+QueryEvaluator = Callable[[str], Awaitable[dict]]
+
+
+# ─────────────────────────────────────────────────────────────
+# 配置
+# ─────────────────────────────────────────────────────────────
+
+@dataclass
+class SnapshotConfig:
+    """快照采集配置（默认关闭）"""
+    enabled: bool = False
+    interval: float = 30.0    # 采集周期（秒）
+    history: int = 20         # 每个查询保留的历史快照数
+    max_age: float = 90.0     # 超过该时长的快照视为过期（秒）
+
+    @classmethod
+    def from_env(cls) -> "SnapshotConfig":
+        """从环境变量读取配置（PROM_SNAPSHOT_*），未设置时使用默认值"""
+        default = cls()
+        return cls(
+            enabled=os.getenv("PROM_SNAPSHOT_ENABLED", "").lower() in ("1", "true", "yes"),
+            interval=float(os.getenv("PROM_SNAPSHOT_INTERVAL", default.interval)),
+            history=int(os.getenv("PROM_SNAPSHOT_HISTORY", default.history)),
+            max_age=float(os.getenv("PROM_SNAPSHOT_MAX_AGE", default.max_age)),
+        )
+
+
+@dataclass
+class Snapshot:
+    """一次采集结果"""
+    name: str
+    result: list
+    evaluated_at: float
+    duration: float
+
+
+# ─────────────────────────────────────────────────────────────
+# 采集器
+# ─────────────────────────────────────────────────────────────
+
+class SnapshotCollector:
+    """预定义查询的后台快照采集器"""
+
+    def __init__(self, config: Optional[SnapshotConfig] = None, clock: Callable[[], float] = time.time):
+        self.config = config or SnapshotConfig()
+        self.clock = clock
+        self.queries: dict[str, str] = {}
+        self._history: dict[str, deque] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.rounds = 0
+        self.errors: dict[str, str] = {}
+        self.served = 0
+        self.stale_misses = 0
+
+    def register(self, name: str, query: str) -> None:
+        """注册一个需要定期采集的查询"""
+        self.queries[name] = query
+        self._history.setdefault(name, deque(maxlen=self.config.history))
+
+    async def collect_once(self, evaluate: QueryEvaluator) -> int:
+        """
+        并发执行所有注册的查询并保存快照
+
+        Returns:
+            成功采集的查询数
+        """
+        async def collect(name: str, query: str) -> bool:
+            started = self.clock()
+            try:
+                data = await evaluate(query)
+            except Exception as e:
+                # 失败时保留上一次快照，由 max_age 决定是否过期
+                self.errors[name] = str(e) or repr(e)
+                logger.warning(f"快照 {name} 采集失败：{e!r}")
+                return False
+            self.errors.pop(name, None)
+            self._history[name].append(
+                Snapshot(name, data.get("result", []), self.clock(), self.clock() - started)
+            )
+            return True
+
+        results = await asyncio.gather(*(collect(n, q) for n, q in self.queries.items()))
+        self.rounds += 1
+        return sum(results)
+
+    def age(self, snapshot: Snapshot) -> float:
+        return self.clock() - snapshot.evaluated_at
+
+    def latest(self, name: str) -> Optional[Snapshot]:
+        """最新快照（可能已过期）"""
+        history = self._history.get(name)
+        return history[-1] if history else None
+
+    def fresh(self, name: str) -> Optional[Snapshot]:
+        """未过期的最新快照，不存在或已过期时返回 None"""
+        if not self.config.enabled:
+            return None
+        snapshot = self.latest(name)
+        if snapshot is None or self.age(snapshot) > self.config.max_age:
+            self.stale_misses += 1
+            return None
+        self.served += 1
+        return snapshot
+
+    def history(self, name: str) -> list[Snapshot]:
+        """按时间先后排列的历史快照"""
+        return list(self._history.get(name, ()))
+
+    # ── 后台任务 ───────────────────────────────────────────
+
+    def start(self, evaluate: QueryEvaluator) -> None:
+        """启动后台采集（未启用或已在运行时忽略）"""
+        if not self.config.enabled or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.ensure_future(self._run(evaluate))
+
+    async def _run(self, evaluate: QueryEvaluator) -> None:
+        while True:
+            started = self.clock()
+            try:
+                await self.collect_once(evaluate)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"快照采集失败：{e!r}")
+            # 固定节奏：扣除本轮耗时
+            await asyncio.sleep(max(0.0, self.config.interval - (self.clock() - started)))
+
+    async def stop(self) -> None:
+        """停止后台采集"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        """采集统计"""
+        snapshots = {}
+        for name in self.queries:
+            latest = self.latest(name)
+            snapshots[name] = {
+                "series": len(latest.result) if latest else 0,
+                "age": round(self.age(latest), 1) if latest else None,
+                "duration": round(latest.duration, 3) if latest else None,
+                "history": len(self._history[name]),
+                "error": self.errors.get(name),
+            }
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "rounds": self.rounds,
+            "served": self.served,
+            "stale_misses": self.stale_misses,
+            "snapshots": snapshots,
+            "config": asdict(self.config),
+        }
+
+
+# 进程内共享的快照采集器
+snapshot_collector = SnapshotCollector(SnapshotConfig.from_env())
@@ -0,0 +1,196 @@
+"""
+Prometheus 长范围查询拆分
+
+将一次长时间范围的 query_range 按 step 对齐拆成多个子区间，
+在并发上限内并行查询，失败的分片单独重试，最后按标签集合拼接序列
+"""
+
+import asyncio
+import logging
+import os
+from dataclasses import dataclass, asdict
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+from .prom_range_cache import series_key
+
+logger = logging.getLogger(__name__)
+
+# fetch(query, start, end, step) -> Prometheus query_range 的 data 字段
+RangeFetcher = Callable[[str, float, float, float], Awaitable[dict]]
+
+# 依赖查询起止时间的 PromQL 函数，拆分后语义会改变
+_RANGE_DEPENDENT_FUNCTIONS = ("start()", "end()")
+
+
+# ─────────────────────────────────────────────────────────────
+# 配置
+# ─────────────────────────────────────────────────────────────
+
+@dataclass
+class SplitConfig:
+    """查询拆分配置"""
+    enabled: bool = True
+    interval: float = 3600.0      # 每个分片覆盖的时长（秒）
+    max_concurrency: int = 8
+    max_retries: int = 2
+    retry_backoff: float = 0.5    # 重试退避基数（秒），按 2^n 递增
+    shard_timeout: float = 30.0   # 单个分片的超时（秒）
+
+    @classmethod
+    def from_env(cls) -> "SplitConfig":
+        """从环境变量读取配置（PROM_SPLIT_*），未设置时使用默认值"""
+        default = cls()
+        return cls(
+            enabled=os.getenv("PROM_SPLIT_ENABLED", "true").lower() not in ("0", "false", "no"),
+            interval=float(os.getenv("PROM_SPLIT_INTERVAL", default.interval)),
+            max_concurrency=int(os.getenv("PROM_SPLIT_MAX_CONCURRENCY", default.max_concurrency)),
+            max_retries=int(os.getenv("PROM_SPLIT_MAX_RETRIES", default.max_retries)),
+            retry_backoff=float(os.getenv("PROM_SPLIT_RETRY_BACKOFF", default.retry_backoff)),
+            shard_timeout=float(os.getenv("PROM_SPLIT_SHARD_TIMEOUT", default.shard_timeout)),
+        )
+
+
+# ─────────────────────────────────────────────────────────────
+# 拆分与拼接
+# ─────────────────────────────────────────────────────────────
+
+def split_range(start: float, end: float, step: float, interval: float) -> list[tuple[float, float]]:
+    """
+    将 [start, end] 拆分为若干子区间
+
+    子区间的边界都落在 start + k * step 上，相邻子区间不重叠，
+    因此各分片的采样点与一次性查询完全相同。
+    """
+    if end < start:
+        return []
+    points_per_shard = max(1, int(interval // step))
+    total_points = int((end - start) // step) + 1
+
+    shards = []
+    for first in range(0, total_points, points_per_shard):
+        last = min(first + points_per_shard, total_points) - 1
+        shards.append((start + first * step, start + last * step))
+    return shards
+
+
+def merge_matrices(parts: list[dict]) -> dict:
+    """按标签集合拼接各分片的序列（parts 需按时间先后排列）"""
+    merged: dict[tuple, dict] = {}
+    for part in parts:
+        for result in part.get("result", []):
+            metric = result.get("metric", {})
+            key = series_key(metric)
+            series = merged.get(key)
+            if series is None:
+                series = merged[key] = {"metric": metric, "values": []}
+            series["values"].extend(result.get("values", []))
+    return {"resultType": "matrix", "result": list(merged.values())}
+
+
+def is_retryable(error: Exception) -> bool:
+    """网络错误、超时、5xx 和 429 可重试，查询语法等 4xx 错误不重试"""
+    if isinstance(error, (httpx.TransportError, asyncio.TimeoutError)):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status >= 500 or status == 429
+    return False
+
+
+# ─────────────────────────────────────────────────────────────
+# 拆分执行器
+# ─────────────────────────────────────────────────────────────
+
+class RangeQuerySplitter:
+    """长范围查询的并行拆分执行器"""
+
+    def __init__(self, config: Optional[SplitConfig] = None):
+        self.config = config or SplitConfig()
+        self.split_queries = 0
+        self.shards_total = 0
+        self.shard_retries = 0
+        self.shard_failures = 0
+
+    def should_split(self, query: str, start: float, end: float, step: float) -> bool:
+        if not self.config.enabled or end - start <= self.config.interval:
+            return False
+        if step > self.config.interval:
+            return False
+        compact = query.replace(" ", "")
+        return not any(fn in compact for fn in _RANGE_DEPENDENT_FUNCTIONS)
+
+    async def query_range(self, query: str, start: float, end: float, step: float,
+                          fetch: RangeFetcher) -> dict:
+        """
+        执行范围查询，超过 interval 的范围拆分为分片并发查询
+
+        Args:
+            query: PromQL 查询语句
+            start: 开始时间（Unix 时间戳）
+            end: 结束时间（Unix 时间戳）
+            step: 步长（秒）
+            fetch: 单个分片的回源函数
+
+        Returns:
+            与 Prometheus query_range 相同结构的 data 字段
+        """
+        if not self.should_split(query, start, end, step):
+            return await fetch(query, start, end, step)
+
+        shards = split_range(start, end, step, self.config.interval)
+        self.split_queries += 1
+        self.shards_total += len(shards)
+        semaphore = asyncio.Semaphore(self.config.max_concurrency)
+        aborted = asyncio.Event()
+
+        async def run_shard(shard_start: float, shard_end: float) -> dict:
+            async with semaphore:
+                # 已有分片最终失败时，排队中的分片不再发起请求
+                if aborted.is_set():
+                    return {}
+                try:
+                    return await self._fetch_with_retry(query, shard_start, shard_end, step, fetch)
+                except Exception:
+                    aborted.set()
+                    raise
+
+        tasks = [asyncio.ensure_future(run_shard(s, e)) for s, e in shards]
+        try:
+            parts = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        return merge_matrices(parts)
+
+    async def _fetch_with_retry(self, query: str, start: float, end: float, step: float,
+                                fetch: RangeFetcher) -> dict:
+        attempt = 0
+        while True:
+            try:
+                return await asyncio.wait_for(fetch(query, start, end, step),
+                                              timeout=self.config.shard_timeout)
+            except Exception as e:
+                if attempt >= self.config.max_retries or not is_retryable(e):
+                    self.shard_failures += 1
+                    raise
+                attempt += 1
+                self.shard_retries += 1
+                logger.warning(f"分片 [{start}, {end}] 查询失败，第 {attempt} 次重试：{e!r}")
+                await asyncio.sleep(self.config.retry_backoff * 2 ** (attempt - 1))
+
+    def stats(self) -> dict:
+        """拆分统计"""
+        return {
+            "split_queries": self.split_queries,
+            "shards_total": self.shards_total,
+            "shard_retries": self.shard_retries,
+            "shard_failures": self.shard_failures,
+            "config": asdict(self.config),
+        }
+
+
+# 进程内共享的查询拆分器
+range_splitter = RangeQuerySplitter(SplitConfig.from_env())
@@ -0,0 +1,151 @@
+"""
+Prometheus 响应流式解码
+
+大响应（高基数 series、query_range）不再整体缓冲后 json 解析，
+而是边读取字节流边逐个解析目标数组（data 或 data.result）中的元素：
+- 每次只保留尚未解析完的一小段文本，内存占用与响应大小无关
+- 调用方可以逐条过滤、计数，达到上限后直接停止读取
+"""
+
+import codecs
+import json
+import re
+from typing import Any, AsyncIterator, Optional
+
+# 目标数组之前的头部（status、resultType 等）不应超过该长度
+MAX_HEADER_CHARS = 64 * 1024
+
+# 单个数组元素（一条序列）的最大长度
+MAX_ELEMENT_CHARS = 64 * 1024 * 1024
+
+_WHITESPACE = " \t\r\n,"
+_DELIMITERS = _WHITESPACE + "]"
+
+
+class JsonArrayStreamParser:
+    """
+    增量解析 JSON 文档中名为 key 的数组
+
+    feed() 每次传入一段文本，返回本次新解析出的完整元素；
+    close() 在输入结束时校验文档完整性和 Prometheus 状态。
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self._marker = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._state = "header"
+        self.header = ""
+        self.items_parsed = 0
+        self.chars_seen = 0
+
+    @property
+    def finished(self) -> bool:
+        """目标数组是否已读完"""
+        return self._state == "trailer"
+
+    def feed(self, text: str) -> list:
+        """输入一段文本，返回新解析出的元素"""
+        self.chars_seen += len(text)
+        if self._state == "trailer":
+            # 数组之后只剩收尾的括号和 warnings，只保留末尾用于完整性校验
+            self._buffer = (self._buffer + text)[-MAX_HEADER_CHARS:]
+            return []
+
+        self._buffer += text
+        if self._state == "header":
+            match = self._marker.search(self._buffer)
+            if match is None:
+                if len(self._buffer) > MAX_HEADER_CHARS:
+                    raise ValueError(f"响应中未找到 {self.key} 数组")
+                return []
+            self.header = self._buffer[:match.start()]
+            self._check_header_status()
+            self._buffer = self._buffer[match.end():]
+            self._state = "array"
+
+        return self._parse_elements()
+
+    def _parse_elements(self) -> list:
+        items = []
+        buffer = self._buffer
+        pos = 0
+        length = len(buffer)
+        while True:
+            while pos < length and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos >= length:
+                break
+            if buffer[pos] == "]":
+                pos += 1
+                self._state = "trailer"
+                break
+            try:
+                value, end = self._decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if length - pos > MAX_ELEMENT_CHARS:
+                    raise ValueError(f"{self.key} 数组元素超过 {MAX_ELEMENT_CHARS} 字符")
+                break
+            # 数字可能被分块截断（如 "12" + ".5"），后面出现分隔符才算完整
+            if isinstance(value, (int, float)) and (end == length or buffer[end] not in _DELIMITERS):
+                break
+            items.append(value)
+            pos = end
+
+        self._buffer = buffer[pos:]
+        self.items_parsed += len(items)
+        return items
+
+    def _check_header_status(self) -> None:
+        match = re.search(r'"status"\s*:\s*"(\w+)"', self.header)
+        if match and match.group(1) != "success":
+            raise Exception(f"Prometheus API 错误：{match.group(1)}")
+
+    def close(self) -> None:
+        """输入结束：未找到目标数组时按完整文档解析，以获取错误信息"""
+        if self._state == "header":
+            try:
+                document = json.loads(self._buffer) if self._buffer.strip() else {}
+            except json.JSONDecodeError:
+                raise ValueError("Prometheus 响应不完整或不是合法 JSON")
+            if document.get("status") != "success":
+                raise Exception(f"Prometheus API 错误：{document.get('error', 'Unknown error')}")
+            # 成功但结构中没有目标数组（如空结果），视为空数组
+            self._state = "trailer"
+            return
+
+        if self._state == "array":
+            raise ValueError(f"Prometheus 响应在 {self.key} 数组中途结束")
+
+
+async def iter_json_array(chunks: AsyncIterator[bytes], key: str) -> AsyncIterator[Any]:
+    """
+    从字节流中逐个产出 key 数组的元素
+
+    Args:
+        chunks: 响应字节流（如 httpx.Response.aiter_bytes()）
+        key: 目标数组的键名，query/query_range 为 "result"，series/label values 为 "data"
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    parser = JsonArrayStreamParser(key)
+    async for chunk in chunks:
+        for item in parser.feed(decoder.decode(chunk)):
+            yield item
+    for item in parser.feed(decoder.decode(b"", final=True)):
+        yield item
+    parser.close()
+
+
+def compile_label_filter(filters: Optional[dict]) -> Optional[dict]:
+    """将 {label: regex} 编译为完整匹配的正则（与 PromQL =~ 一致）"""
+    if not filters:
+        return None
+    return {label: re.compile(pattern) for label, pattern in filters.items()}
+
+
+def match_labels(metric: dict, compiled: Optional[dict]) -> bool:
+    """判断序列标签是否满足过滤条件，缺失的标签按空字符串处理"""
+    if not compiled:
+        return True
+    return all(pattern.fullmatch(metric.get(label, "")) for label, pattern in compiled.items())
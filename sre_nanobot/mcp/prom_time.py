@@ -0,0 +1,92 @@
+"""
+Prometheus 时间参数解析
+
+统一处理 Prometheus API 接受的时间格式（RFC3339 或 Unix 时间戳）和时长格式（15s、1h30m）
+"""
+
+import re
+from datetime import datetime, timezone
+from typing import Union
+
+_DURATION_UNITS = {
+    "ms": 0.001, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800, "y": 31536000
+}
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h|d|w|y)")
+
+
+def parse_timestamp(value: Union[str, int, float]) -> float:
+    """
+    解析时间参数为 Unix 时间戳（秒）
+
+    Args:
+        value: RFC3339 字符串或 Unix 时间戳
+
+    Returns:
+        Unix 时间戳
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    text = str(value).strip()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+
+    if text.endswith("Z"):
+        text = text[:-1] + "+00:00"
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"无法解析时间：{value}")
+
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def parse_duration(value: Union[str, int, float], allow_zero: bool = False) -> float:
+    """
+    解析时长参数为秒，例如：15s, 1m, 1h30m, 0.5
+
+    Args:
+        value: Prometheus 时长字符串或秒数
+        allow_zero: 是否接受 0（例如 0s 表示不做时滞搜索）
+
+    Returns:
+        秒数
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    text = str(value).strip()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+
+    total = 0.0
+    position = 0
+    for match in _DURATION_PART.finditer(text):
+        if match.start() != position:
+            break
+        total += float(match.group(1)) * _DURATION_UNITS[match.group(2)]
+        position = match.end()
+
+    if position != len(text) or total < 0 or (total == 0 and not allow_zero):
+        raise ValueError(f"无法解析时长：{value}")
+    return total
+
+
+def align_timestamp(timestamp: float, resolution: float) -> float:
+    """将时间戳向下对齐到 resolution 的整数倍"""
+    if resolution <= 0:
+        return timestamp
+    return (timestamp // resolution) * resolution
+
+
+def format_timestamp(timestamp: float) -> str:
+    """格式化为 Prometheus API 参数（去掉无意义的小数位）"""
+    if float(timestamp).is_integer():
+        return str(int(timestamp))
+    return f"{timestamp:.3f}"
@@ -0,0 +1,404 @@
+"""
+故障窗口本地时序存储
+
+故障发生时把相关指标冻结到本地，复盘、重新生成报告时直接读取，不再访问 Prometheus，
+超过 Prometheus 保留期后仍可查询：
+- 每个窗口是一个 block 目录：chunks.bin（压缩数据，mmap 读取）+ index.json（序列索引）
+- 压缩沿用 Gorilla 的思路：时间戳存 delta-of-delta，数值存与前一个值的 XOR；
+  为了能用 numpy 整块解码，改为按字节对齐（为零的项用位图表示，非零的 delta-of-delta
+  存 zigzag varint，非零的 XOR 去掉首尾的零字节后存储）
+- 加载 block 时按标签建立倒排索引，等值匹配通过索引求交，正则匹配在候选集上过滤
+"""
+
+import json
+import logging
+import mmap
+import os
+import re
+import shutil
+import struct
+import tempfile
+import threading
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+from .prom_series import ColumnarSeries
+from .prom_stream import compile_label_filter, match_labels
+
+logger = logging.getLogger(__name__)
+
+# 点数, 首个时间戳（毫秒）, 时间戳 varint 字节数, 变化的数值个数, 数值负载字节数
+_CHUNK_HEADER = struct.Struct("<IqIII")
+_BLOCK_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]*")
+
+
+# ─────────────────────────────────────────────────────────────
+# 配置
+# ─────────────────────────────────────────────────────────────
+
+@dataclass
+class TSDBConfig:
+    """本地时序存储配置"""
+    path: str = "data/tsdb"
+
+    @classmethod
+    def from_env(cls) -> "TSDBConfig":
+        """从环境变量读取配置（PROM_TSDB_PATH），未设置时使用默认值"""
+        return cls(path=os.getenv("PROM_TSDB_PATH", cls.path))
+
+
+# ─────────────────────────────────────────────────────────────
+# 块编码
+# ─────────────────────────────────────────────────────────────
+
+def encode_varints(values: np.ndarray) -> bytes:
+    """无符号整数编码为 LEB128 varint（向量化）"""
+    values = np.asarray(values, dtype=np.uint64)
+    if not len(values):
+        return b""
+    columns = np.arange(10)
+    groups = ((values[:, None] >> (columns.astype(np.uint64) * np.uint64(7))) & np.uint64(0x7F)).astype(np.uint8)
+    nonzero = groups != 0
+    length = np.where(nonzero.any(axis=1), 10 - np.argmax(nonzero[:, ::-1], axis=1), 1)
+    groups[columns[None, :] < (length - 1)[:, None]] |= 0x80
+    return groups[columns[None, :] < length[:, None]].tobytes()
+
+
+def decode_varints(data) -> np.ndarray:
+    """LEB128 varint 解码（向量化）"""
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if not len(raw):
+        return np.empty(0, dtype=np.uint64)
+    last = (raw & 0x80) == 0
+    starts = np.concatenate(([0], np.flatnonzero(last)[:-1] + 1))
+    group = np.concatenate(([0], np.cumsum(last)[:-1]))
+    shift = ((np.arange(len(raw)) - starts[group]) * 7).astype(np.uint64)
+    return np.add.reduceat((raw & 0x7F).astype(np.uint64) << shift, starts)
+
+
+def _zigzag(values: np.ndarray) -> np.ndarray:
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+
+def _unzigzag(values: np.ndarray) -> np.ndarray:
+    return (values >> np.uint64(1)).view(np.int64) ^ -(values & np.uint64(1)).view(np.int64)
+
+
+def encode_chunk(timestamps: np.ndarray, values: np.ndarray) -> bytes:
+    """
+    压缩一条序列
+
+    Args:
+        timestamps: 秒级时间戳（按毫秒精度存储）
+        values: float64 数值
+    """
+    n = len(timestamps)
+    if n == 0:
+        return _CHUNK_HEADER.pack(0, 0, 0, 0, 0)
+
+    ms = np.round(np.asarray(timestamps, dtype=np.float64) * 1000).astype(np.int64)
+    delta = np.diff(ms, prepend=ms[0])
+    dod = np.diff(delta, prepend=0)
+    ts_changed = dod != 0
+    ts_varints = encode_varints(_zigzag(dod[ts_changed]))
+
+    bits = np.ascontiguousarray(values, dtype=np.float64).view(np.uint64)
+    xor = bits ^ np.concatenate(([np.uint64(0)], bits[:-1]))
+    val_changed = xor != 0
+    changed = xor[val_changed].view(np.uint8).reshape(-1, 8)   # 小端，第 0 字节最低
+    nonzero = changed != 0
+    trailing = np.argmax(nonzero, axis=1)
+    length = 8 - np.argmax(nonzero[:, ::-1], axis=1) - trailing
+    columns = np.arange(8)[None, :]
+    keep = (columns >= trailing[:, None]) & (columns < (trailing + length)[:, None])
+    headers = ((trailing << 4) | length).astype(np.uint8)
+    payload = changed[keep].tobytes()
+
+    return b"".join((
+        _CHUNK_HEADER.pack(n, int(ms[0]), len(ts_varints), len(headers), len(payload)),
+        np.packbits(ts_changed).tobytes(),
+        ts_varints,
+        np.packbits(val_changed).tobytes(),
+        headers.tobytes(),
+        payload,
+    ))
+
+
+def decode_chunk(data) -> tuple[np.ndarray, np.ndarray]:
+    """解压一条序列，返回 (秒级时间戳, 数值)"""
+    n, first, ts_size, changed_count, payload_size = _CHUNK_HEADER.unpack_from(data, 0)
+    if n == 0:
+        return np.empty(0), np.empty(0)
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    bitmap_size = (n + 7) // 8
+    offset = _CHUNK_HEADER.size
+
+    ts_changed = np.unpackbits(buffer[offset:offset + bitmap_size], count=n).astype(bool)
+    offset += bitmap_size
+    dod = np.zeros(n, dtype=np.int64)
+    dod[ts_changed] = _unzigzag(decode_varints(buffer[offset:offset + ts_size]))
+    offset += ts_size
+    timestamps = (first + np.cumsum(np.cumsum(dod))) / 1000.0
+
+    val_changed = np.unpackbits(buffer[offset:offset + bitmap_size], count=n).astype(bool)
+    offset += bitmap_size
+    headers = buffer[offset:offset + changed_count]
+    offset += changed_count
+    payload = buffer[offset:offset + payload_size]
+
+    trailing = (headers >> 4).astype(np.int64)
+    length = (headers & 0x0F).astype(np.int64)
+    starts = np.cumsum(length) - length
+    columns = np.arange(8)[None, :]
+    keep = (columns >= trailing[:, None]) & (columns < (trailing + length)[:, None])
+    changed = np.zeros((changed_count, 8), dtype=np.uint8)
+    changed[keep] = payload[(starts[:, None] + columns - trailing[:, None])[keep]]
+
+    xor = np.zeros(n, dtype=np.uint64)
+    xor[val_changed] = changed.view(np.uint64).ravel()
+    return timestamps, np.bitwise_xor.accumulate(xor).view(np.float64)
+
+
+# ─────────────────────────────────────────────────────────────
+# Block
+# ─────────────────────────────────────────────────────────────
+
+class Block:
+    """一个冻结的时间窗口（只读，数据文件通过 mmap 访问）"""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        index = json.loads((directory / "index.json").read_text(encoding="utf-8"))
+        self.name = index["name"]
+        self.meta = index.get("meta", {})
+        self.series = index["series"]
+        self._labels = [entry["labels"] for entry in self.series]
+
+        # 倒排索引：label -> value -> 升序的序列号
+        self.postings: dict[str, dict[str, list[int]]] = {}
+        for sid, labels in enumerate(self._labels):
+            for label, value in labels.items():
+                self.postings.setdefault(label, {}).setdefault(value, []).append(sid)
+
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+
+    def _data(self):
+        if self._mmap is None:
+            self._file = open(self.directory / "chunks.bin", "rb")
+            size = os.fstat(self._file.fileno()).st_size
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        return self._mmap
+
+    def lookup(self, match: Optional[dict] = None, series_filter: Optional[dict] = None,
+               query: Optional[str] = None) -> list[int]:
+        """
+        查找序列
+
+        Args:
+            match: 标签等值匹配（走倒排索引）
+            series_filter: 标签正则匹配（完整匹配）
+            query: 只返回由该 PromQL 冻结的序列
+        """
+        candidates: Optional[set] = None
+        for label, value in (match or {}).items():
+            ids = set(self.postings.get(label, {}).get(value, ()))
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                return []
+        ids = sorted(candidates) if candidates is not None else range(len(self.series))
+        compiled = compile_label_filter(series_filter)
+        return [
+            sid for sid in ids
+            if (query is None or self.series[sid].get("query") == query)
+            and match_labels(self._labels[sid], compiled)
+        ]
+
+    def read(self, sid: int, start: Optional[float] = None, end: Optional[float] = None) -> ColumnarSeries:
+        """解压一条序列，可按时间范围裁剪"""
+        entry = self.series[sid]
+        view = memoryview(self._data())[entry["offset"]:entry["offset"] + entry["length"]]
+        try:
+            timestamps, values = decode_chunk(view)
+        finally:
+            view.release()
+        if start is not None or end is not None:
+            mask = np.ones(len(timestamps), dtype=bool)
+            if start is not None:
+                mask &= timestamps >= start
+            if end is not None:
+                mask &= timestamps <= end
+            timestamps, values = timestamps[mask], values[mask]
+        return ColumnarSeries(tuple(sorted(self._labels[sid].items())), timestamps, values)
+
+    def select(self, match: Optional[dict] = None, series_filter: Optional[dict] = None,
+               query: Optional[str] = None, start: Optional[float] = None,
+               end: Optional[float] = None) -> list[ColumnarSeries]:
+        """查找并解压序列"""
+        return [self.read(sid, start, end) for sid in self.lookup(match, series_filter, query)]
+
+    def info(self) -> dict:
+        return {
+            "name": self.name,
+            "series": len(self.series),
+            "samples": sum(entry["count"] for entry in self.series),
+            "bytes": sum(entry["length"] for entry in self.series),
+            "meta": self.meta,
+        }
+
+    def close(self) -> None:
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+        if self._file is not None:
+            self._file.close()
+        self._mmap = self._file = None
+
+
+# ─────────────────────────────────────────────────────────────
+# 存储
+# ─────────────────────────────────────────────────────────────
+
+class MiniTSDB:
+    """
+    按故障窗口组织的本地时序存储
+
+    write_block 通常在线程池中执行，_blocks 及 block 的 mmap 读取由 _lock 保护：
+    替换窗口时不会关闭正在被读取的 mmap
+    """
+
+    def __init__(self, config: Optional[TSDBConfig] = None):
+        self.config = config or TSDBConfig()
+        self.root = Path(self.config.path)
+        self._blocks: dict[str, Block] = {}
+        self._lock = threading.RLock()
+        self.blocks_written = 0
+        self.samples_written = 0
+        self.bytes_written = 0
+        self.series_read = 0
+
+    def _directory(self, name: str) -> Path:
+        if not _BLOCK_NAME.fullmatch(name):
+            raise ValueError(f"无效的窗口名称：{name}（只允许字母、数字、_ . -）")
+        return self.root / name
+
+    def write_block(self, name: str, series: Iterable[tuple[ColumnarSeries, Optional[str]]],
+                    meta: Optional[dict] = None) -> dict:
+        """
+        写入一个窗口（同名窗口被整体替换）
+
+        Args:
+            name: 窗口名称，例如故障 ID
+            series: (序列, 来源 PromQL) 列表
+            meta: 附加信息（时间范围、步长等）
+
+        Returns:
+            block 信息
+        """
+        directory = self._directory(name)
+        # 每次写入使用独立的暂存目录（以 . 开头，不会被当作窗口），同名窗口的并发写入互不干扰
+        self.root.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(dir=self.root, prefix=f".{name}."))
+        try:
+            entries = []
+            offset = 0
+            with open(staging / "chunks.bin", "wb") as f:
+                for item, query in series:
+                    chunk = encode_chunk(item.timestamps, item.values)
+                    f.write(chunk)
+                    entries.append({
+                        "labels": item.metric,
+                        "query": query,
+                        "offset": offset,
+                        "length": len(chunk),
+                        "count": len(item),
+                        "min_time": float(item.timestamps[0]) if len(item) else None,
+                        "max_time": float(item.timestamps[-1]) if len(item) else None,
+                    })
+                    offset += len(chunk)
+            index = {"name": name, "meta": meta or {}, "series": entries}
+            (staging / "index.json").write_text(json.dumps(index, ensure_ascii=False), encoding="utf-8")
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        # 先关闭旧 block 的 mmap；旧目录先改名移开再把新目录改名就位（两次 rename，
+        # 不在替换过程中逐个删除文件），替换失败时恢复旧目录，最后删除移开的旧目录
+        with self._lock:
+            old = self._blocks.pop(name, None)
+            if old is not None:
+                old.close()
+            aside = None
+            try:
+                if directory.exists():
+                    aside = Path(tempfile.mkdtemp(dir=self.root, prefix=f".{name}.old-"))
+                    directory.rename(aside / name)
+                staging.rename(directory)
+            except BaseException:
+                if aside is not None and (aside / name).exists() and not directory.exists():
+                    (aside / name).rename(directory)
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+            finally:
+                if aside is not None:
+                    shutil.rmtree(aside, ignore_errors=True)
+
+            self.blocks_written += 1
+            self.samples_written += sum(entry["count"] for entry in entries)
+            self.bytes_written += offset
+            logger.info(f"冻结窗口 {name}：{len(entries)} 条序列，{offset} 字节")
+            return self.block(name).info()
+
+    def has_block(self, name: str) -> bool:
+        return (self._directory(name) / "index.json").exists()
+
+    def block(self, name: str) -> Block:
+        """打开一个窗口（已打开的直接复用）"""
+        with self._lock:
+            if name not in self._blocks:
+                directory = self._directory(name)
+                if not (directory / "index.json").exists():
+                    raise ValueError(f"窗口不存在：{name}")
+                self._blocks[name] = Block(directory)
+            return self._blocks[name]
+
+    def select(self, name: str, **kwargs) -> list[ColumnarSeries]:
+        """在指定窗口中查找并解压序列（参数同 Block.select）"""
+        with self._lock:
+            result = self.block(name).select(**kwargs)
+            self.series_read += len(result)
+        return result
+
+    def blocks(self) -> list[dict]:
+        """所有窗口的信息"""
+        if not self.root.exists():
+            return []
+        with self._lock:
+            return [
+                self.block(path.name).info() for path in sorted(self.root.iterdir())
+                if path.is_dir() and (path / "index.json").exists() and _BLOCK_NAME.fullmatch(path.name)
+            ]
+
+    def close(self) -> None:
+        with self._lock:
+            for block in self._blocks.values():
+                block.close()
+            self._blocks.clear()
+
+    def stats(self) -> dict:
+        """存储统计"""
+        return {
+            "open_blocks": len(self._blocks),
+            "blocks_written": self.blocks_written,
+            "samples_written": self.samples_written,
+            "bytes_written": self.bytes_written,
+            "bytes_per_sample": round(self.bytes_written / self.samples_written, 3) if self.samples_written else None,
+            "series_read": self.series_read,
+            "config": asdict(self.config),
+        }
+
+
+# 进程内共享的本地时序存储
+mini_tsdb = MiniTSDB(TSDBConfig.from_env())
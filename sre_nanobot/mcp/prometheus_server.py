@@ -5,18 +5,88 @@ Prometheus MCP Server
 """
 
 import asyncio
-import httpx
-from typing import Any
+import json
+from contextlib import aclosing
+from typing import Any, AsyncIterator
 from datetime import datetime, timedelta
 from mcp.server import Server
 from mcp.types import Tool, TextContent
 
+from .prom_anomaly import DETECTORS as ANOMALY_DETECTORS, AnomalyConfig, detect_anomalies
+from .prom_batch import BatchQuery, batch_runner
+from .prom_cache import query_cache
+from .prom_catalog import metric_catalog
+from .prom_client import client_manager
+from .prom_range_cache import range_cache
+from .prom_histogram import buckets_from_matrix, buckets_from_vector, histogram_quantiles
+from .prom_export import FORMATS as EXPORT_FORMATS, range_exporter
+from .prom_fanout import prometheus_fanout
+from .prom_feed import change_feed
+from .prom_correlate import METHODS as CORRELATION_METHODS, correlate, nearest_lag, split_anchor
+from .prom_cost import QueryRejectedError, cost_guard
+from .prom_downsample import METHODS as DOWNSAMPLE_METHODS, downsample_indices
+from .prom_resilience import PrometheusGuard, last_good_key, latency_class, prometheus_guard
+from .prom_series import SeriesMatrix, format_value, parse_matrix
+from .prom_snapshot import snapshot_collector
+from .prom_singleflight import request_key, single_flight
+from .prom_splitter import range_splitter, split_range
+from .prom_stream import compile_label_filter, iter_json_array, match_labels
+from .prom_tsdb import mini_tsdb
+from .prom_time import align_timestamp, format_timestamp, parse_duration, parse_timestamp
+
 # 创建 MCP 服务器实例
 prometheus_server = Server("sre-prometheus-mcp")
 
 # Prometheus 服务器配置
 PROMETHEUS_URL = "http://localhost:9090"
 
+# 跳过结果缓存的通用参数
+NO_CACHE_PROPERTY = {
+    "type": "boolean",
+    "description": "跳过结果缓存，直接查询 Prometheus",
+    "default": False
+}
+
+# 预定义指标的查询语句（不带过滤条件），快照采集器按这些查询定期采集
+NODE_CPU_QUERY = '100 - (avg by(instance) (irate(node_cpu_seconds_total{mode="idle"}[5m])) * 100)'
+NODE_MEMORY_QUERY = '(1 - (node_memory_MemAvailable_bytes / node_memory_MemTotal_bytes)) * 100'
+POD_CPU_QUERY = 'sum by (namespace, pod) (rate(container_cpu_usage_seconds_total{container!=""}[5m])) * 100'
+POD_MEMORY_QUERY = 'sum by (namespace, pod) (container_memory_usage_bytes{container!=""}) / sum by (namespace, pod) (container_spec_memory_limit_bytes{container!=""}) * 100'
+# 延迟分位数在本地由桶计数计算，一次查询可得到任意多个分位数
+SERVICE_LATENCY_BUCKET_QUERY = 'sum by (le, service) (rate(http_request_duration_seconds_bucket[5m]))'
+SERVICE_ERROR_RATE_QUERY = 'sum by (service) (rate(http_requests_total{status=~"5.."}[5m])) / sum by (service) (rate(http_requests_total[5m])) * 100'
+
+PERCENTILE_QUANTILES = {
+    "p50": "0.50",
+    "p90": "0.90",
+    "p99": "0.99",
+    "p999": "0.999"
+}
+
+snapshot_collector.register("node_cpu", NODE_CPU_QUERY)
+snapshot_collector.register("node_memory", NODE_MEMORY_QUERY)
+snapshot_collector.register("pod_cpu", POD_CPU_QUERY)
+snapshot_collector.register("pod_memory", POD_MEMORY_QUERY)
+snapshot_collector.register("service_latency_buckets", SERVICE_LATENCY_BUCKET_QUERY)
+snapshot_collector.register("service_error_rate", SERVICE_ERROR_RATE_QUERY)
+
+# Prometheus 不可用时可以返回上次成功结果的接口
+STALE_ENDPOINTS = ("query", "alerts", "rules", "targets", "metadata")
+
+# 范围查询输出时每条序列默认保留的点数
+DEFAULT_POINTS = 20
+
+# 流式读取时的通用参数：序列数量上限和逐条标签过滤
+LIMIT_PROPERTY = {
+    "type": "integer",
+    "description": "最多返回的序列数，达到后停止读取剩余响应"
+}
+SERIES_FILTER_PROPERTY = {
+    "type": "object",
+    "additionalProperties": {"type": "string"},
+    "description": "按标签正则过滤序列（完整匹配），例如：{\"namespace\": \"prod-.*\"}"
+}
+
 
 # ─────────────────────────────────────────────────────────────
 # 工具定义
@@ -39,7 +109,8 @@ async def list_tools() -> list[Tool]:
                     "time": {
                         "type": "string",
                         "description": "查询时间点（RFC3339 或 Unix 时间戳），默认当前时间"
-                    }
+                    },
+                    "no_cache": NO_CACHE_PROPERTY
                 },
                 "required": ["query"]
             }
@@ -65,11 +136,273 @@ async def list_tools() -> list[Tool]:
                     "step": {
                         "type": "string",
                         "description": "查询步长，例如：15s, 1m, 1h"
-                    }
+                    },
+                    "points": {
+                        "type": "integer",
+                        "description": "每条序列输出的点数，超出时降采样（保留峰值和谷值）",
+                        "default": DEFAULT_POINTS
+                    },
+                    "downsample": {
+                        "type": "string",
+                        "description": "降采样方法：lttb（保持形状）或 minmax（每段保留最小和最大值）",
+                        "enum": list(DOWNSAMPLE_METHODS),
+                        "default": "lttb"
+                    },
+                    "limit": LIMIT_PROPERTY,
+                    "series_filter": SERIES_FILTER_PROPERTY,
+                    "no_cache": NO_CACHE_PROPERTY
                 },
                 "required": ["query", "start", "end", "step"]
             }
         ),
+        Tool(
+            name="prom_detect_anomalies",
+            description="对范围查询的所有序列做异常与变点检测（滚动 z-score、EWMA、CUSUM），只返回按异常程度排序的序列和时间点",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "PromQL 查询语句"
+                    },
+                    "start": {
+                        "type": "string",
+                        "description": "开始时间（RFC3339 或 Unix 时间戳）"
+                    },
+                    "end": {
+                        "type": "string",
+                        "description": "结束时间（RFC3339 或 Unix 时间戳）"
+                    },
+                    "step": {
+                        "type": "string",
+                        "description": "查询步长，例如：15s, 1m"
+                    },
+                    "detectors": {
+                        "type": "array",
+                        "items": {"type": "string", "enum": list(ANOMALY_DETECTORS)},
+                        "description": "启用的检测器，默认全部"
+                    },
+                    "window": {
+                        "type": "integer",
+                        "description": "滚动 z-score 窗口（点数）",
+                        "default": AnomalyConfig.window
+                    },
+                    "threshold": {
+                        "type": "number",
+                        "description": "z-score / EWMA 偏离阈值（标准差倍数）",
+                        "default": AnomalyConfig.z_threshold
+                    },
+                    "top": {
+                        "type": "integer",
+                        "description": "最多返回的异常序列数",
+                        "default": 10
+                    },
+                    "no_cache": NO_CACHE_PROPERTY
+                },
+                "required": ["query", "start", "end", "step"]
+            }
+        ),
+        Tool(
+            name="prom_correlate",
+            description="计算锚点序列（如告警服务的错误率）与候选序列的相关性和滞后互相关，按相关程度排序给出根因线索",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "anchor_query": {
+                        "type": "string",
+                        "description": "锚点 PromQL，须只返回 1 条序列"
+                    },
+                    "candidate_queries": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "候选 PromQL 列表，所有返回的序列都参与计算"
+                    },
+                    "start": {
+                        "type": "string",
+                        "description": "开始时间（RFC3339 或 Unix 时间戳）"
+                    },
+                    "end": {
+                        "type": "string",
+                        "description": "结束时间（RFC3339 或 Unix 时间戳）"
+                    },
+                    "step": {
+                        "type": "string",
+                        "description": "查询步长，例如：15s, 1m"
+                    },
+                    "method": {
+                        "type": "string",
+                        "enum": list(CORRELATION_METHODS),
+                        "description": "pearson（线性）或 spearman（秩相关）",
+                        "default": "pearson"
+                    },
+                    "max_lag": {
+                        "type": "string",
+                        "description": "最大滞后时长，例如 5m；不填时只计算同步相关"
+                    },
+                    "difference": {
+                        "type": "boolean",
+                        "description": "先做一阶差分再计算，排除共同趋势造成的伪相关",
+                        "default": False
+                    },
+                    "min_abs": {
+                        "type": "number",
+                        "description": "只返回 |相关系数| 不低于该值的序列",
+                        "default": 0.5
+                    },
+                    "top": {
+                        "type": "integer",
+                        "description": "最多返回的序列数",
+                        "default": 20
+                    },
+                    "no_cache": NO_CACHE_PROPERTY
+                },
+                "required": ["anchor_query", "candidate_queries", "start", "end", "step"]
+            }
+        ),
+        Tool(
+            name="prom_histogram_quantiles",
+            description="取回一次直方图桶数据，在本地同时计算多个分位数（支持即时和范围查询）",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "桶计数查询，须保留 le 标签，例如 sum by (le, service) (rate(xxx_bucket[5m]))"
+                    },
+                    "quantiles": {
+                        "type": "array",
+                        "items": {"type": "number"},
+                        "description": "分位数列表",
+                        "default": [0.5, 0.9, 0.99]
+                    },
+                    "time": {
+                        "type": "string",
+                        "description": "即时查询时间点，默认当前时间"
+                    },
+                    "start": {
+                        "type": "string",
+                        "description": "范围查询开始时间（与 end、step 同时提供时按范围计算）"
+                    },
+                    "end": {
+                        "type": "string",
+                        "description": "范围查询结束时间"
+                    },
+                    "step": {
+                        "type": "string",
+                        "description": "范围查询步长"
+                    },
+                    "no_cache": NO_CACHE_PROPERTY
+                },
+                "required": ["query"]
+            }
+        ),
+        Tool(
+            name="prom_estimate_cost",
+            description="估算 PromQL 查询会触及的序列数和样本数，以及代价保护将如何处理",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "PromQL 查询语句"
+                    },
+                    "start": {
+                        "type": "string",
+                        "description": "范围查询开始时间（与 end、step 同时提供时按范围查询估算）"
+                    },
+                    "end": {
+                        "type": "string",
+                        "description": "范围查询结束时间"
+                    },
+                    "step": {
+                        "type": "string",
+                        "description": "范围查询步长"
+                    }
+                },
+                "required": ["query"]
+            }
+        ),
+        Tool(
+            name="prom_query_batch",
+            description="批量执行多条即时或范围查询（自动去重、并发执行），返回合并的结构化结果",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "queries": {
+                        "type": "array",
+                        "description": "查询列表；给出 start/end/step 时为范围查询，否则为即时查询",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "name": {"type": "string", "description": "结果标识，默认按序号"},
+                                "query": {"type": "string", "description": "PromQL 查询语句"},
+                                "time": {"type": "string", "description": "即时查询时间点"},
+                                "start": {"type": "string", "description": "范围查询开始时间"},
+                                "end": {"type": "string", "description": "范围查询结束时间"},
+                                "step": {"type": "string", "description": "范围查询步长"}
+                            },
+                            "required": ["query"]
+                        }
+                    },
+                    "max_concurrency": {
+                        "type": "integer",
+                        "description": "并发上限，不超过服务端配置"
+                    },
+                    "max_series": {
+                        "type": "integer",
+                        "description": "每条查询最多输出的序列数，默认使用服务端配置"
+                    },
+                    "points": {
+                        "type": "integer",
+                        "description": "范围查询每条序列输出的点数，超出时降采样（保留峰值和谷值）",
+                        "default": DEFAULT_POINTS
+                    },
+                    "downsample": {
+                        "type": "string",
+                        "description": "降采样方法：lttb（保持形状）或 minmax（每段保留最小和最大值）",
+                        "enum": list(DOWNSAMPLE_METHODS),
+                        "default": "lttb"
+                    },
+                    "no_cache": NO_CACHE_PROPERTY
+                },
+                "required": ["queries"]
+            }
+        ),
+        Tool(
+            name="prom_query_multi",
+            description="在多个 Prometheus 实例（集群/区域）上并发执行同一查询，结果按实例标签合并",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "PromQL 查询语句"
+                    },
+                    "endpoints": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "实例名称列表，不填则查询所有已配置的实例"
+                    },
+                    "time": {
+                        "type": "string",
+                        "description": "即时查询时间点，默认当前时间"
+                    },
+                    "start": {
+                        "type": "string",
+                        "description": "范围查询开始时间（与 end、step 同时提供时执行范围查询）"
+                    },
+                    "end": {
+                        "type": "string",
+                        "description": "范围查询结束时间"
+                    },
+                    "step": {
+                        "type": "string",
+                        "description": "范围查询步长"
+                    }
+                },
+                "required": ["query"]
+            }
+        ),
         Tool(
             name="prom_get_metric_metadata",
             description="获取指标的元数据（帮助信息、类型等）",
@@ -79,11 +412,31 @@ async def list_tools() -> list[Tool]:
                     "metric": {
                         "type": "string",
                         "description": "指标名称"
-                    }
+                    },
+                    "no_cache": NO_CACHE_PROPERTY
                 },
                 "required": ["metric"]
             }
         ),
+        Tool(
+            name="prom_search_metrics",
+            description="按前缀或模糊匹配查找指标名称，返回类型和帮助信息",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "pattern": {
+                        "type": "string",
+                        "description": "指标名前缀或关键字，例如：node_cpu, http latency"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "最多返回的指标数",
+                        "default": 20
+                    }
+                },
+                "required": ["pattern"]
+            }
+        ),
         Tool(
             name="prom_get_targets",
             description="获取 Prometheus 抓取目标状态",
@@ -130,6 +483,20 @@ async def list_tools() -> list[Tool]:
                 }
             }
         ),
+        Tool(
+            name="prom_alert_changes",
+            description="获取告警和规则的增量变化（新触发、恢复、注解/状态变化，规则增删改），只返回 since 之后的变更",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "since": {
+                        "type": "integer",
+                        "description": "上次调用返回的序号，0 表示从头开始（首个事件包含当前全部告警和规则）",
+                        "default": 0
+                    }
+                }
+            }
+        ),
         Tool(
             name="prom_get_config",
             description="获取 Prometheus 当前配置",
@@ -155,7 +522,12 @@ async def list_tools() -> list[Tool]:
                     "label": {
                         "type": "string",
                         "description": "标签名称，例如：namespace, pod, job"
-                    }
+                    },
+                    "prefix": {
+                        "type": "string",
+                        "description": "只返回以该前缀开头的值"
+                    },
+                    "no_cache": NO_CACHE_PROPERTY
                 },
                 "required": ["label"]
             }
@@ -178,7 +550,9 @@ async def list_tools() -> list[Tool]:
                     "end": {
                         "type": "string",
                         "description": "结束时间"
-                    }
+                    },
+                    "limit": LIMIT_PROPERTY,
+                    "series_filter": SERIES_FILTER_PROPERTY
                 },
                 "required": ["match"]
             }
@@ -192,7 +566,8 @@ async def list_tools() -> list[Tool]:
                     "node": {
                         "type": "string",
                         "description": "节点名称，不填则返回所有节点"
-                    }
+                    },
+                    "no_cache": NO_CACHE_PROPERTY
                 }
             }
         ),
@@ -205,7 +580,8 @@ async def list_tools() -> list[Tool]:
                     "node": {
                         "type": "string",
                         "description": "节点名称，不填则返回所有节点"
-                    }
+                    },
+                    "no_cache": NO_CACHE_PROPERTY
                 }
             }
         ),
@@ -222,7 +598,8 @@ async def list_tools() -> list[Tool]:
                     "pod": {
                         "type": "string",
                         "description": "Pod 名称，不填则返回所有"
-                    }
+                    },
+                    "no_cache": NO_CACHE_PROPERTY
                 }
             }
         ),
@@ -239,13 +616,14 @@ async def list_tools() -> list[Tool]:
                     "pod": {
                         "type": "string",
                         "description": "Pod 名称，不填则返回所有"
-                    }
+                    },
+                    "no_cache": NO_CACHE_PROPERTY
                 }
             }
         ),
         Tool(
             name="prom_service_latency",
-            description="获取服务延迟（P50/P90/P99）",
+            description="获取服务延迟（P50/P90/P99/P999），多个百分位只查询一次桶数据",
             inputSchema={
                 "type": "object",
                 "properties": {
@@ -255,9 +633,15 @@ async def list_tools() -> list[Tool]:
                     },
                     "percentile": {
                         "type": "string",
-                        "description": "百分位数：p50, p90, p99",
-                        "enum": ["p50", "p90", "p99"]
-                    }
+                        "description": "百分位数：p50, p90, p99, p999",
+                        "enum": list(PERCENTILE_QUANTILES)
+                    },
+                    "percentiles": {
+                        "type": "array",
+                        "items": {"type": "string", "enum": list(PERCENTILE_QUANTILES)},
+                        "description": "同时计算多个百分位数（优先于 percentile）"
+                    },
+                    "no_cache": NO_CACHE_PROPERTY
                 },
                 "required": ["service"]
             }
@@ -271,10 +655,126 @@ async def list_tools() -> list[Tool]:
                     "service": {
                         "type": "string",
                         "description": "服务名称"
-                    }
+                    },
+                    "no_cache": NO_CACHE_PROPERTY
                 },
                 "required": ["service"]
             }
+        ),
+        Tool(
+            name="prom_freeze_window",
+            description="把故障时间窗口内的指标冻结到本地压缩存储，复盘时不再访问 Prometheus",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "name": {
+                        "type": "string",
+                        "description": "窗口名称（通常为故障 ID），同名窗口会被替换"
+                    },
+                    "queries": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "需要冻结的 PromQL 列表"
+                    },
+                    "start": {
+                        "type": "string",
+                        "description": "开始时间（RFC3339 或 Unix 时间戳）"
+                    },
+                    "end": {
+                        "type": "string",
+                        "description": "结束时间（RFC3339 或 Unix 时间戳）"
+                    },
+                    "step": {
+                        "type": "string",
+                        "description": "查询步长，例如：15s, 1m"
+                    }
+                },
+                "required": ["name", "queries", "start", "end", "step"]
+            }
+        ),
+        Tool(
+            name="prom_frozen_query",
+            description="查询本地冻结的故障窗口；不指定窗口时列出所有窗口",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "name": {
+                        "type": "string",
+                        "description": "窗口名称"
+                    },
+                    "match": {
+                        "type": "object",
+                        "additionalProperties": {"type": "string"},
+                        "description": "标签等值匹配，例如：{\"__name__\": \"up\", \"job\": \"api\"}"
+                    },
+                    "series_filter": SERIES_FILTER_PROPERTY,
+                    "query": {
+                        "type": "string",
+                        "description": "只返回由该 PromQL 冻结的序列"
+                    },
+                    "start": {
+                        "type": "string",
+                        "description": "开始时间，默认窗口起点"
+                    },
+                    "end": {
+                        "type": "string",
+                        "description": "结束时间，默认窗口终点"
+                    },
+                    "points": {
+                        "type": "integer",
+                        "description": "每条序列输出的点数，超出时降采样",
+                        "default": DEFAULT_POINTS
+                    }
+                }
+            }
+        ),
+        Tool(
+            name="prom_export_range",
+            description="把范围查询结果导出为 Parquet 或 Arrow IPC 文件（标签字典编码，按行组流式写出），供离线分析",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "name": {
+                        "type": "string",
+                        "description": "导出文件名（不含扩展名），写到导出目录下，同名文件会被覆盖"
+                    },
+                    "query": {
+                        "type": "string",
+                        "description": "PromQL 查询语句"
+                    },
+                    "start": {
+                        "type": "string",
+                        "description": "开始时间（RFC3339 或 Unix 时间戳）"
+                    },
+                    "end": {
+                        "type": "string",
+                        "description": "结束时间（RFC3339 或 Unix 时间戳）"
+                    },
+                    "step": {
+                        "type": "string",
+                        "description": "查询步长，例如：15s, 1m"
+                    },
+                    "format": {
+                        "type": "string",
+                        "description": "导出格式：parquet（压缩，适合归档）或 arrow（IPC 文件，可 memory-map）",
+                        "enum": list(EXPORT_FORMATS),
+                        "default": "parquet"
+                    },
+                    "row_group_size": {
+                        "type": "integer",
+                        "description": "每个行组的最大行数，默认使用服务端配置"
+                    }
+                },
+                "required": ["name", "query", "start", "end", "step"]
+            }
+        ),
+        Tool(
+            name="prom_runtime_stats",
+            description="获取 MCP Server 运行时统计（连接池、查询缓存命中率等）",
+            inputSchema={
+                "type": "object",
+                "properties": {}
+            }
         )
     ]
 
@@ -292,14 +792,30 @@ async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent]:
             return await prom_query(arguments)
         elif name == "prom_query_range":
             return await prom_query_range(arguments)
+        elif name == "prom_detect_anomalies":
+            return await prom_detect_anomalies(arguments)
+        elif name == "prom_correlate":
+            return await prom_correlate(arguments)
+        elif name == "prom_histogram_quantiles":
+            return await prom_histogram_quantiles(arguments)
+        elif name == "prom_estimate_cost":
+            return await prom_estimate_cost(arguments)
+        elif name == "prom_query_batch":
+            return await prom_query_batch(arguments)
+        elif name == "prom_query_multi":
+            return await prom_query_multi(arguments)
         elif name == "prom_get_metric_metadata":
             return await prom_get_metric_metadata(arguments)
+        elif name == "prom_search_metrics":
+            return await prom_search_metrics(arguments)
         elif name == "prom_get_targets":
             return await prom_get_targets(arguments)
         elif name == "prom_get_alerts":
             return await prom_get_alerts(arguments)
         elif name == "prom_get_rules":
             return await prom_get_rules(arguments)
+        elif name == "prom_alert_changes":
+            return await prom_alert_changes(arguments)
         elif name == "prom_get_config":
             return await prom_get_config(arguments)
         elif name == "prom_get_status":
@@ -320,6 +836,14 @@ async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent]:
             return await prom_service_latency(arguments)
         elif name == "prom_service_error_rate":
             return await prom_service_error_rate(arguments)
+        elif name == "prom_freeze_window":
+            return await prom_freeze_window(arguments)
+        elif name == "prom_frozen_query":
+            return await prom_frozen_query(arguments)
+        elif name == "prom_export_range":
+            return await prom_export_range(arguments)
+        elif name == "prom_runtime_stats":
+            return await prom_runtime_stats(arguments)
         else:
             return [TextContent(type="text", text=f"未知工具：{name}")]
     
@@ -331,19 +855,273 @@ async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent]:
 # HTTP 客户端
 # ─────────────────────────────────────────────────────────────
 
-async def prometheus_request(endpoint: str, params: dict = None) -> dict:
-    """发送请求到 Prometheus API"""
-    url = f"{PROMETHEUS_URL}/api/v1/{endpoint}"
-    
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params, timeout=30.0)
+# 其它 Prometheus 实例各自独立的调用保护（按 URL）
+endpoint_guards: dict[str, PrometheusGuard] = {}
+
+
+def guard_for(base_url: str) -> PrometheusGuard:
+    """默认实例使用 prometheus_guard，其它实例各自维护并发上限和熔断状态"""
+    if base_url == PROMETHEUS_URL:
+        return prometheus_guard
+    guard = endpoint_guards.get(base_url)
+    if guard is None:
+        guard = endpoint_guards[base_url] = PrometheusGuard(prometheus_guard.config)
+    return guard
+
+
+async def prometheus_request(endpoint: str, params: dict = None, timeout: float = None,
+                             base_url: str = None) -> dict:
+    """
+    发送请求到 Prometheus API（base_url 为空时使用 PROMETHEUS_URL）
+    
+    复用 client_manager 维护的长连接池，timeout 为空时使用连接池默认超时；
+    相同 endpoint 和参数的请求正在进行时，直接等待其结果而不重复发送。
+    实际请求经过自适应并发限制和熔断保护，Prometheus 不可用时 STALE_ENDPOINTS
+    中的接口返回上次成功的结果（带 stale 标记）
+    """
+    base_url = base_url or PROMETHEUS_URL
+    url = f"{base_url}/api/v1/{endpoint}"
+    
+    received = 0
+    
+    async def send() -> dict:
+        nonlocal received
+        response = await client_manager.get(url, params=params, timeout=timeout)
         response.raise_for_status()
+        received = len(response.content)
         data = response.json()
         
         if data.get("status") != "success":
             raise Exception(f"Prometheus API 错误：{data.get('error', 'Unknown error')}")
         
         return data.get("data", {})
+    
+    key = (base_url,) + request_key(endpoint, params)
+    guard = guard_for(base_url)
+    return await single_flight.do(
+        key, lambda: guard.call(last_good_key(base_url, endpoint, params), send,
+                                keep_last_good=endpoint in STALE_ENDPOINTS,
+                                category=latency_class(endpoint, params),
+                                size=lambda: received)
+    )
+
+
+async def prometheus_stream(endpoint: str, params: dict = None, key: str = "result",
+                            timeout: float = None) -> AsyncIterator[Any]:
+    """
+    以流式方式请求 Prometheus API，逐个产出 key 数组中的元素
+    
+    响应体边读边解析，内存占用只与单个元素大小有关；调用方提前退出
+    （配合 contextlib.aclosing）时连接随之关闭，剩余响应不再读取。
+    与 prometheus_request 共用并发限制和熔断（读取期间占用一个并发名额），不返回旧结果
+    """
+    url = f"{PROMETHEUS_URL}/api/v1/{endpoint}"
+    
+    async with guard_for(PROMETHEUS_URL).slot(latency_class(endpoint, params)):
+        async with client_manager.stream(url, params=params, timeout=timeout) as response:
+            if response.is_error:
+                await response.aread()
+                response.raise_for_status()
+            async for item in iter_json_array(response.aiter_bytes(), key):
+                yield item
+
+
+async def collect_series(stream: AsyncIterator[dict], limit: int = None,
+                         series_filter: dict = None) -> tuple[list, bool]:
+    """
+    从流中收集满足过滤条件的序列
+    
+    Returns:
+        (序列列表, 是否因达到 limit 提前停止)
+    """
+    compiled = compile_label_filter(series_filter)
+    collected = []
+    async with aclosing(stream) as items:
+        async for item in items:
+            metric = item.get("metric", {})
+            if not match_labels(metric, compiled):
+                continue
+            if limit is not None and len(collected) >= limit:
+                return collected, True
+            collected.append(item)
+    return collected, False
+
+
+async def prometheus_query(query: str, eval_time: str = None, use_cache: bool = True) -> dict:
+    """
+    执行即时查询（带结果缓存）
+    
+    启用缓存时评估时间会向下对齐到缓存的 resolution，使相近时间的相同查询
+    命中同一条目；use_cache=False 时直接查询 Prometheus 且不写入缓存
+    """
+    if not use_cache or not query_cache.config.enabled:
+        if not use_cache:
+            query_cache.bypassed += 1
+        params = {"query": query}
+        if eval_time:
+            params["time"] = eval_time
+        return await prometheus_request("query", params)
+    
+    timestamp = parse_timestamp(eval_time) if eval_time else datetime.now().timestamp()
+    aligned = align_timestamp(timestamp, query_cache.config.resolution)
+    
+    cached = query_cache.get(query, aligned)
+    if cached is not None:
+        return cached
+    
+    data = await prometheus_request("query", {"query": query, "time": format_timestamp(aligned)})
+    if not data.get("stale"):
+        query_cache.put(query, aligned, data)
+    return data
+
+
+async def fetch_range(query: str, start: float, end: float, step: float) -> dict:
+    """直接向 Prometheus 发送范围查询（时间参数为 Unix 时间戳和秒）"""
+    return await prometheus_request("query_range", {
+        "query": query,
+        "start": format_timestamp(start),
+        "end": format_timestamp(end),
+        "step": format_timestamp(step)
+    })
+
+
+async def fetch_range_split(query: str, start: float, end: float, step: float) -> dict:
+    """范围查询回源：长时间范围拆分为分片并发查询"""
+    return await range_splitter.query_range(query, start, end, step, fetch_range)
+
+
+async def prometheus_query_range(query: str, start: str, end: str, step: str,
+                                 use_cache: bool = True) -> dict:
+    """
+    执行范围查询（带增量缓存和分片并发）
+    
+    启用缓存时窗口按 step 对齐，重复查询只回源缺失的头部或尾部；
+    回源的时间范围超过拆分间隔时按分片并发查询
+    """
+    start_ts = parse_timestamp(start)
+    end_ts = parse_timestamp(end)
+    step_seconds = parse_duration(step)
+    
+    if not use_cache or not range_cache.config.enabled:
+        if not use_cache:
+            range_cache.bypassed += 1
+        return await fetch_range_split(query, start_ts, end_ts, step_seconds)
+    
+    return await range_cache.query_range(query, start_ts, end_ts, step_seconds, fetch_range_split)
+
+
+async def correlate_queries(anchor_query: str, candidate_queries: list[str], start: str, end: str, step: str,
+                            method: str = "pearson", max_lag: int = 0, difference: bool = False,
+                            use_cache: bool = True) -> tuple[list, list[str]]:
+    """
+    并发执行锚点和候选范围查询，计算锚点与每条候选序列的相关性
+    
+    Returns:
+        (按 |r| 降序的相关性列表, 每条候选序列所属的查询（按候选行号）)
+    """
+    if not candidate_queries:
+        raise ValueError("candidate_queries 不能为空")
+    
+    # 锚点和候选使用同一 start/end/step，一起构造矩阵以共享时间网格
+    queries = [anchor_query, *candidate_queries]
+    responses = await asyncio.gather(*(
+        prometheus_query_range(query, start, end, step, use_cache=use_cache) for query in queries
+    ))
+    results = [item for data in responses for item in data.get("result", [])]
+    sources = [query for query, data in zip(queries[1:], responses[1:]) for _ in data.get("result", [])]
+    
+    anchor, candidates = split_anchor(SeriesMatrix.from_result(results), len(responses[0].get("result", [])))
+    return correlate(anchor, candidates, method, max_lag, difference=difference), sources
+
+
+async def evaluate_snapshot_query(query: str) -> dict:
+    """快照采集的回源函数：直接查询，不经过即时查询缓存"""
+    return await prometheus_request("query", {"query": query})
+
+
+async def predefined_query(snapshot: str, query: str, labels: dict, use_cache: bool = True) -> tuple[list, str]:
+    """
+    执行预定义指标查询
+    
+    快照采集已启用且快照未过期时，直接按 labels 过滤快照结果；
+    否则执行带过滤条件的实时查询
+    
+    Returns:
+        (结果列表, 数据来源说明)
+    """
+    if use_cache:
+        cached = snapshot_collector.fresh(snapshot)
+        if cached is not None:
+            results = [
+                result for result in cached.result
+                if all(result.get("metric", {}).get(k) == v for k, v in labels.items() if v)
+            ]
+            return results, f"（快照，{snapshot_collector.age(cached):.0f}s 前采集）"
+    
+    data = await prometheus_query(query, use_cache=use_cache)
+    return data.get("result", []), ""
+
+
+async def count_series(selector: str, start: float = None, end: float = None, cap: int = None) -> int:
+    """
+    流式统计选择器匹配的序列数，达到 cap 后停止读取
+    
+    未给出时间范围时统计最近 5 分钟内活跃的序列
+    """
+    if start is None or end is None:
+        end = datetime.now().timestamp()
+        start = end - 300
+    params = {"match[]": selector, "start": format_timestamp(start), "end": format_timestamp(end)}
+    
+    count = 0
+    async with aclosing(prometheus_stream("series", params, key="data")) as items:
+        async for _ in items:
+            count += 1
+            if cap is not None and count >= cap:
+                break
+    return count
+
+
+async def tsdb_status() -> dict:
+    """获取 TSDB 状态（序列总数、按指标名的序列数 Top 统计）"""
+    return await prometheus_request("status/tsdb")
+
+
+def cost_notes(estimate) -> str:
+    """代价保护对查询所做处理的说明"""
+    return "".join(f"⚠️ {note}\n" for note in estimate.notes)
+
+
+def compact_result(data: dict, points: int, method: str, max_series: int) -> dict:
+    """
+    压缩单条查询的结果用于结构化输出
+
+    序列数超过 max_series 时截断；范围查询的每条序列超出 points 时降采样
+    （与 prom_query_range 相同），values 只保留采样点，points 记录原始点数
+    """
+    result_type = data.get("resultType")
+    results = data.get("result", [])
+    compact = {"resultType": result_type}
+    if result_type in ("vector", "matrix"):
+        compact["series"] = len(results)
+        if len(results) > max_series:
+            results = results[:max_series]
+            compact["truncated"] = True
+    if result_type == "matrix":
+        series_list = parse_matrix(results)
+        results = [
+            {
+                "metric": result.get("metric", {}),
+                "points": len(result.get("values", [])),
+                "values": [result["values"][i]
+                           for i in downsample_indices(series.timestamps, series.values, points, method)],
+            }
+            for result, series in zip(results, series_list)
+        ]
+    compact["result"] = results
+    if data.get("stale"):
+        compact["stale_age"] = data.get("stale_age")
+    return compact
 
 
 # ─────────────────────────────────────────────────────────────
@@ -355,16 +1133,18 @@ async def prom_query(args: dict) -> list[TextContent]:
     query = args.get("query")
     time = args.get("time")
     
-    params = {"query": query}
-    if time:
-        params["time"] = time
+    # 执行前估算代价，超限时按策略拒绝或注入 topk
+    estimate = await cost_guard.check(query, count_series, tsdb_status)
     
-    data = await prometheus_request("query", params)
+    data = await prometheus_query(estimate.query, time, use_cache=not args.get("no_cache", False))
     
     result_type = data.get("resultType")
     results = data.get("result", [])
     
-    output = f"查询：{query}\n"
+    output = cost_notes(estimate)
+    if data.get("stale"):
+        output += f"⚠️ Prometheus 暂不可用，以下为 {data.get('stale_age')}s 前的结果\n"
+    output += f"查询：{query}\n"
     output += f"类型：{result_type}\n"
     output += f"结果数量：{len(results)}\n\n"
     
@@ -390,47 +1170,319 @@ async def prom_query_range(args: dict) -> list[TextContent]:
     start = args.get("start")
     end = args.get("end")
     step = args.get("step")
+    limit = args.get("limit")
+    series_filter = args.get("series_filter")
+    points = args.get("points", DEFAULT_POINTS)
+    method = args.get("downsample", "lttb")
+    truncated = False
+    
+    # 执行前估算代价，超限时按策略拒绝、放大 step 或注入 topk
+    start_ts, end_ts = parse_timestamp(start), parse_timestamp(end)
+    estimate = await cost_guard.check(query, count_series, tsdb_status,
+                                      start_ts, end_ts, parse_duration(step))
+    run_query = estimate.query
+    if "widen_step" in estimate.actions:
+        step = f"{format_timestamp(estimate.step)}s"
+    
+    if limit is not None or series_filter:
+        # 限量或过滤时流式读取，不经过缓存和分片，达到上限即停止
+        params = {
+            "query": run_query,
+            "start": format_timestamp(start_ts),
+            "end": format_timestamp(end_ts),
+            "step": format_timestamp(parse_duration(step))
+        }
+        results, truncated = await collect_series(
+            prometheus_stream("query_range", params, key="result"), limit, series_filter
+        )
+    else:
+        data = await prometheus_query_range(run_query, start, end, step,
+                                            use_cache=not args.get("no_cache", False))
+        results = data.get("result", [])
     
-    params = {
-        "query": query,
-        "start": start,
-        "end": end,
-        "step": step
-    }
-    
-    data = await prometheus_request("query_range", params)
-    
-    results = data.get("result", [])
-    output = f"范围查询：{query}\n"
+    output = cost_notes(estimate)
+    output += f"范围查询：{query}\n"
     output += f"时间范围：{start} - {end}\n"
     output += f"步长：{step}\n"
-    output += f"结果数量：{len(results)}\n\n"
+    output += f"结果数量：{len(results)}"
+    if truncated:
+        output += f"（已达到上限 {limit}，其余序列未读取）"
+    output += "\n\n"
     
-    for result in results:
+    # 列式解码后向量化计算每条序列的统计值
+    series_list = parse_matrix(results)
+    summary = SeriesMatrix.from_series(series_list).summary()
+    
+    for row, result in enumerate(results):
         metric = result.get("metric", {})
         values = result.get("values", [])
+        series = series_list[row]
         
         output += f"指标：{metric.get('__name__', 'N/A')}\n"
         for k, v in metric.items():
             if k != "__name__":
                 output += f"  {k}: {v}\n"
         output += f"  数据点数：{len(values)}\n"
+        if values:
+            output += (
+                f"  统计：min={format_value(summary['min'][row])} "
+                f"max={format_value(summary['max'][row])} "
+                f"avg={format_value(summary['mean'][row])} "
+                f"last={format_value(summary['last'][row])}\n"
+            )
         
-        # 显示前 5 个和后 5 个数据点
-        if len(values) > 10:
-            for ts, val in values[:5]:
-                output += f"  [{ts}] {val}\n"
-            output += "  ...\n"
-            for ts, val in values[-5:]:
-                output += f"  [{ts}] {val}\n"
-        else:
-            for ts, val in values:
-                output += f"  [{ts}] {val}\n"
+        # 超出点数预算时降采样，保留峰值和谷值
+        indices = downsample_indices(series.timestamps, series.values, points, method)
+        if len(indices) < len(values):
+            output += f"  采样：{method.upper()} {len(indices)}/{len(values)} 点\n"
+        for i in indices:
+            ts, val = values[i]
+            output += f"  [{ts}] {val}\n"
         output += "\n"
     
     return [TextContent(type="text", text=f"📈 Prometheus 范围查询:\n```\n{output}\n```")]
 
 
+async def prom_detect_anomalies(args: dict) -> list[TextContent]:
+    """异常与变点检测"""
+    query = args.get("query")
+    start, end, step = args.get("start"), args.get("end"), args.get("step")
+    detectors = tuple(args.get("detectors") or ANOMALY_DETECTORS)
+    top = args.get("top", 10)
+    threshold = float(args.get("threshold", AnomalyConfig.z_threshold))
+    config = AnomalyConfig(window=int(args.get("window", AnomalyConfig.window)),
+                           z_threshold=threshold, ewma_threshold=threshold)
+    
+    estimate = await cost_guard.check(query, count_series, tsdb_status,
+                                      parse_timestamp(start), parse_timestamp(end), parse_duration(step))
+    if "widen_step" in estimate.actions:
+        step = f"{format_timestamp(estimate.step)}s"
+    data = await prometheus_query_range(estimate.query, start, end, step,
+                                        use_cache=not args.get("no_cache", False))
+    
+    # 所有序列对齐到同一时间轴后一次性计算
+    matrix = SeriesMatrix.from_result(data.get("result", []))
+    findings = detect_anomalies(matrix, config, detectors, top)
+    
+    output = cost_notes(estimate)
+    output += f"查询：{query}\n"
+    output += f"时间范围：{start} - {end}（步长 {step}）\n"
+    output += f"检测器：{', '.join(detectors)}\n"
+    output += f"异常序列：{len(findings)}/{len(matrix)}\n\n"
+    
+    for rank, finding in enumerate(findings, 1):
+        metric = finding.metric
+        labels = ", ".join(f"{k}={v}" for k, v in metric.items() if k != "__name__")
+        output += f"{rank}. {metric.get('__name__', 'N/A')}{{{labels}}} 得分 {finding.score:.2f}\n"
+        for detector, detail in finding.detectors.items():
+            times = ", ".join(format_timestamp(ts) for ts in detail["timestamps"])
+            output += f"  {detector}: 最大偏离 {detail['max']}σ @ {times}\n"
+        if finding.change_point:
+            change = finding.change_point
+            output += (
+                f"  cusum: 变点 {format_timestamp(change['timestamp'])}，"
+                f"均值变化 {format_value(change['shift'])}（统计量 {change['stat']}）\n"
+            )
+    
+    if not findings:
+        output += "未发现异常\n"
+    
+    return [TextContent(type="text", text=f"🚨 异常检测:\n```\n{output}\n```")]
+
+
+async def prom_correlate(args: dict) -> list[TextContent]:
+    """指标联动相关性搜索"""
+    anchor_query = args.get("anchor_query")
+    start, end, step = args.get("start"), args.get("end"), args.get("step")
+    method = args.get("method", "pearson")
+    min_abs = float(args.get("min_abs", 0.5))
+    top = args.get("top", 20)
+    max_lag = nearest_lag(parse_duration(args.get("max_lag") or 0, allow_zero=True),
+                          parse_duration(step))
+    
+    correlations, sources = await correlate_queries(
+        anchor_query, args.get("candidate_queries", []), start, end, step,
+        method=method, max_lag=max_lag, difference=args.get("difference", False),
+        use_cache=not args.get("no_cache", False)
+    )
+    hits = [c for c in correlations if abs(c.best) >= min_abs][:top]
+    
+    output = f"锚点：{anchor_query}\n"
+    output += f"时间范围：{start} - {end}（步长 {step}）\n"
+    output += f"方法：{method}，最大滞后 {max_lag} 点\n"
+    output += f"相关序列：{len(hits)}/{len(sources)}（|r| ≥ {min_abs}）\n\n"
+    
+    for rank, item in enumerate(hits, 1):
+        metric = item.metric
+        labels = ", ".join(f"{k}={v}" for k, v in metric.items() if k != "__name__")
+        output += f"{rank}. {metric.get('__name__', '')}{{{labels}}} r={item.best:+.3f}"
+        if item.lag:
+            lead = "领先" if item.lag > 0 else "滞后"
+            output += f"（候选{lead}锚点 {format_timestamp(abs(item.lag_seconds))}s，同步 r={item.coefficient:+.3f}）"
+        output += f"\n  来源：{sources[item.row]}\n"
+    
+    return [TextContent(type="text", text=f"🔗 指标相关性:\n```\n{output}\n```")]
+
+
+async def prom_histogram_quantiles(args: dict) -> list[TextContent]:
+    """本地计算直方图分位数"""
+    query = args.get("query")
+    quantiles = [float(q) for q in args.get("quantiles") or (0.5, 0.9, 0.99)]
+    start, end, step = args.get("start"), args.get("end"), args.get("step")
+    use_cache = not args.get("no_cache", False)
+    
+    if start and end and step:
+        data = await prometheus_query_range(query, start, end, step, use_cache=use_cache)
+        buckets = buckets_from_matrix(data.get("result", []))
+    else:
+        data = await prometheus_query(query, args.get("time"), use_cache=use_cache)
+        buckets = buckets_from_vector(data.get("result", []))
+    
+    # (Q, G) 或 (Q, G, T)
+    values = histogram_quantiles(quantiles, buckets.le, buckets.counts)
+    
+    output = f"查询：{query}\n"
+    output += f"分组数：{len(buckets)}，桶数：{len(buckets.le)}\n\n"
+    
+    for group in range(len(buckets)):
+        labels = ", ".join(f"{k}={v}" for k, v in buckets.metric(group).items())
+        output += f"{{{labels}}}\n"
+        for i, q in enumerate(quantiles):
+            if buckets.timestamps is None:
+                output += f"  q{q:g}: {format_value(values[i, group])}\n"
+                continue
+            series = SeriesMatrix([()], buckets.timestamps, values[i, group][None, :]).summary()
+            output += (
+                f"  q{q:g}: min={format_value(series['min'][0])} "
+                f"max={format_value(series['max'][0])} "
+                f"avg={format_value(series['mean'][0])} "
+                f"last={format_value(series['last'][0])}\n"
+            )
+    
+    return [TextContent(type="text", text=f"📊 直方图分位数:\n```\n{output}\n```")]
+
+
+async def prom_estimate_cost(args: dict) -> list[TextContent]:
+    """估算查询代价"""
+    query = args.get("query")
+    start, end, step = args.get("start"), args.get("end"), args.get("step")
+    
+    window = (parse_timestamp(start), parse_timestamp(end), parse_duration(step)) if start and end and step else ()
+    
+    try:
+        estimate = await cost_guard.check(query, count_series, tsdb_status, *window)
+        rejected = None
+    except QueryRejectedError as e:
+        estimate = await cost_guard.estimate(query, count_series, tsdb_status, *window)
+        rejected = str(e)
+    
+    result = estimate.to_dict()
+    result["rejected"] = rejected
+    
+    return [TextContent(type="text", text=f"💰 查询代价估算:\n```json\n{json.dumps(result, ensure_ascii=False, indent=2)}\n```")]
+
+
+async def prom_query_batch(args: dict) -> list[TextContent]:
+    """批量执行查询"""
+    queries = [BatchQuery.from_dict(item, i) for i, item in enumerate(args.get("queries", []))]
+    use_cache = not args.get("no_cache", False)
+    points = args.get("points", DEFAULT_POINTS)
+    method = args.get("downsample", "lttb")
+    max_series = args.get("max_series") or batch_runner.config.max_series
+    
+    async def execute(query: BatchQuery) -> dict:
+        # 每条查询单独估算代价，超限时按策略拒绝（只影响该条）、放大 step 或注入 topk
+        if query.kind == "range":
+            estimate = await cost_guard.check(query.query, count_series, tsdb_status,
+                                              parse_timestamp(query.start), parse_timestamp(query.end),
+                                              parse_duration(query.step))
+            step = f"{format_timestamp(estimate.step)}s" if "widen_step" in estimate.actions else query.step
+            data = await prometheus_query_range(estimate.query, query.start, query.end, step,
+                                                use_cache=use_cache)
+        else:
+            estimate = await cost_guard.check(query.query, count_series, tsdb_status)
+            data = await prometheus_query(estimate.query, query.time, use_cache=use_cache)
+        data = compact_result(data, points, method, max_series)
+        if estimate.notes:
+            data["notes"] = estimate.notes
+        return data
+    
+    results = await batch_runner.run(queries, execute, args.get("max_concurrency"))
+    
+    failed = sum(1 for item in results if item["status"] != "success")
+    output = {
+        "total": len(results),
+        "unique": len({q.key() for q in queries}),
+        "failed": failed,
+        "results": results
+    }
+    
+    return [TextContent(type="text", text=f"📦 批量查询结果:\n```json\n{json.dumps(output, ensure_ascii=False)}\n```")]
+
+
+async def prom_query_multi(args: dict) -> list[TextContent]:
+    """在多个 Prometheus 实例上执行查询"""
+    query = args.get("query")
+    eval_time = args.get("time")
+    start, end, step = args.get("start"), args.get("end"), args.get("step")
+    is_range = bool(start and end and step)
+    
+    endpoints = prometheus_fanout.resolve(args.get("endpoints"), PROMETHEUS_URL)
+    
+    if is_range:
+        params = {
+            "query": query,
+            "start": format_timestamp(parse_timestamp(start)),
+            "end": format_timestamp(parse_timestamp(end)),
+            "step": format_timestamp(parse_duration(step))
+        }
+    else:
+        params = {"query": query}
+        if eval_time:
+            params["time"] = eval_time
+    
+    # 结果缓存按单实例设计，多实例查询直接回源
+    async def fetch(endpoint) -> dict:
+        return await prometheus_request("query_range" if is_range else "query", params,
+                                        timeout=endpoint.timeout or prometheus_fanout.config.timeout,
+                                        base_url=endpoint.url)
+    
+    data = await prometheus_fanout.query(endpoints, fetch)
+    
+    results = data.get("result", [])
+    label = prometheus_fanout.config.label
+    output = f"查询：{query}\n"
+    output += f"类型：{data.get('resultType')}\n"
+    output += f"结果数量：{len(results)}"
+    if data.get("partial"):
+        output += "（部分实例失败，结果不完整）"
+    output += "\n\n实例状态:\n"
+    for name, report in data["endpoints"].items():
+        if report["status"] == "success":
+            output += f"  ✅ {name}: {report['latency'] * 1000:.0f}ms, {report['series']} 条序列\n"
+        else:
+            output += f"  ❌ {name}: {report['latency'] * 1000:.0f}ms, {report['error']}\n"
+    output += "\n"
+    
+    for result in results:
+        metric = result.get("metric", {})
+        output += f"[{metric.get(label)}] {metric.get('__name__', 'N/A')}\n"
+        for k, v in metric.items():
+            if k not in ("__name__", label):
+                output += f"  {k}: {v}\n"
+        if is_range:
+            values = result.get("values", [])
+            output += f"  数据点数：{len(values)}\n"
+            if values:
+                output += f"  最新：[{values[-1][0]}] {values[-1][1]}\n"
+        else:
+            value = result.get("value", [])
+            output += f"  值：{value[1] if len(value) > 1 else 'N/A'}\n"
+        output += "\n"
+    
+    return [TextContent(type="text", text=f"🌐 多实例查询结果:\n```\n{output}\n```")]
+
+
 # ─────────────────────────────────────────────────────────────
 # 工具实现 - 元数据
 # ─────────────────────────────────────────────────────────────
@@ -439,16 +1491,51 @@ async def prom_get_metric_metadata(args: dict) -> list[TextContent]:
     """获取指标元数据"""
     metric = args.get("metric")
     
-    data = await prometheus_request("metadata")
+    if args.get("no_cache", False) or not metric_catalog.config.enabled:
+        data = await prometheus_request("metadata", {"metric": metric})
+        entries = data.get(metric) or []
+        metadata = entries[0] if entries else None
+        suggestions = []
+    else:
+        await metric_catalog.ensure_loaded(prometheus_request)
+        metadata = metric_catalog.get_metadata(metric)
+        suggestions = [] if metadata else metric_catalog.search_metrics(metric, limit=5)
     
-    if metric in data:
-        metadata = data[metric]
+    if metadata:
         output = f"指标：{metric}\n"
         output += f"类型：{metadata.get('type', 'N/A')}\n"
         output += f"帮助：{metadata.get('help', 'N/A')}\n"
+        if metadata.get("unit"):
+            output += f"单位：{metadata['unit']}\n"
         return [TextContent(type="text", text=f"📝 指标元数据:\n```\n{output}\n```")]
-    else:
-        return [TextContent(type="text", text=f"⚠️ 未找到指标 {metric} 的元数据")]
+    
+    text = f"⚠️ 未找到指标 {metric} 的元数据"
+    if suggestions:
+        text += "\n相近的指标：\n" + "\n".join(f"- {name}" for name in suggestions)
+    return [TextContent(type="text", text=text)]
+
+
+async def prom_search_metrics(args: dict) -> list[TextContent]:
+    """查找指标名称"""
+    pattern = args.get("pattern", "")
+    limit = args.get("limit", 20)
+    
+    await metric_catalog.ensure_loaded(prometheus_request)
+    names = metric_catalog.search_metrics(pattern, limit)
+    
+    output = f"查找：{pattern}\n"
+    output += f"匹配数量：{len(names)}\n\n"
+    
+    for name in names:
+        metadata = metric_catalog.metadata.get(name, {})
+        output += f"{name}"
+        if metadata.get("type"):
+            output += f" ({metadata['type']})"
+        output += "\n"
+        if metadata.get("help"):
+            output += f"  {metadata['help']}\n"
+    
+    return [TextContent(type="text", text=f"🔍 指标查找:\n```\n{output}\n```")]
 
 
 async def prom_get_targets(args: dict) -> list[TextContent]:
@@ -551,6 +1638,45 @@ async def prom_get_rules(args: dict) -> list[TextContent]:
     return [TextContent(type="text", text=f"📋 Prometheus 规则:\n```\n{output}\n```")]
 
 
+def describe_alert(alert: dict) -> str:
+    """一行告警摘要：名称、级别和其余标签"""
+    labels = alert.get("labels", {})
+    others = ", ".join(f"{k}={v}" for k, v in labels.items() if k not in ("alertname", "severity"))
+    return f"{labels.get('alertname', 'Unknown')} [{labels.get('severity', 'N/A')}] {others}".rstrip()
+
+
+async def prom_alert_changes(args: dict) -> list[TextContent]:
+    """获取告警和规则的增量变化"""
+    since = int(args.get("since", 0))
+    
+    # 未启用后台拉取时按需拉取一次，变化相对于上一次调用
+    if not change_feed.running:
+        await change_feed.poll_once(prometheus_request)
+    events, complete = change_feed.since(since)
+    
+    output = f"当前序号：{change_feed.seq}（下次调用传入 since={change_feed.seq}）\n"
+    if not complete:
+        output += "⚠️ 部分事件已超出保留范围，请用 prom_get_alerts / prom_get_rules 获取完整列表\n"
+    output += f"事件数：{len(events)}\n\n"
+    
+    for event in events:
+        output += f"#{event.seq} [{format_timestamp(event.at)}]\n"
+        for title, alerts in (("🔥 触发", event.firing), ("⏳ 等待", event.pending), ("✅ 恢复", event.resolved)):
+            for alert in alerts:
+                output += f"  {title}：{describe_alert(alert)}\n"
+        for change in event.changed:
+            output += f"  ✏️ 变化：{describe_alert(change['alert'])}（{', '.join(change['fields'])}）\n"
+        for title, rules in (("➕ 新增规则", event.rules_added), ("➖ 删除规则", event.rules_removed)):
+            for rule in rules:
+                output += f"  {title}：{rule['group']}/{rule.get('name', 'N/A')}\n"
+        for change in event.rules_changed:
+            rule = change["rule"]
+            output += f"  ✏️ 规则变化：{rule['group']}/{rule.get('name', 'N/A')}（{', '.join(change['fields'])}）\n"
+        output += "\n"
+    
+    return [TextContent(type="text", text=f"🔔 告警变更:\n```\n{output}\n```")]
+
+
 # ─────────────────────────────────────────────────────────────
 # 工具实现 - 配置和状态
 # ─────────────────────────────────────────────────────────────
@@ -579,18 +1705,33 @@ async def prom_get_status(args: dict) -> list[TextContent]:
 async def prom_get_label_values(args: dict) -> list[TextContent]:
     """获取标签值"""
     label = args.get("label")
-    
-    data = await prometheus_request(f"label/{label}/values")
+    prefix = args.get("prefix") or ""
+    
+    total = 0
+    shown = []
+    if args.get("no_cache", False) or not metric_catalog.config.enabled:
+        # 流式计数，只保留前 20 个值用于显示
+        async with aclosing(prometheus_stream(f"label/{label}/values", key="data")) as values:
+            async for value in values:
+                if not value.startswith(prefix):
+                    continue
+                total += 1
+                if len(shown) < 20:
+                    shown.append(value)
+    else:
+        index = await metric_catalog.label_values(label, prometheus_request)
+        matched = index.prefix(prefix) if prefix else None
+        total = len(matched) if prefix else len(index)
+        shown = matched[:20] if prefix else index.prefix("", 20)
     
     output = f"标签 '{label}' 的值:\n"
-    output += f"数量：{len(data)}\n\n"
+    output += f"数量：{total}\n\n"
     
-    # 显示前 20 个值
-    for value in data[:20]:
+    for value in shown:
         output += f"- {value}\n"
     
-    if len(data) > 20:
-        output += f"\n... 还有 {len(data) - 20} 个值"
+    if total > 20:
+        output += f"\n... 还有 {total - 20} 个值"
     
     return [TextContent(type="text", text=f"🏷️ {output}")]
 
@@ -600,6 +1741,8 @@ async def prom_get_series(args: dict) -> list[TextContent]:
     match = args.get("match", [])
     start = args.get("start")
     end = args.get("end")
+    limit = args.get("limit")
+    compiled = compile_label_filter(args.get("series_filter"))
     
     params = {"match[]": match}
     if start:
@@ -607,16 +1750,32 @@ async def prom_get_series(args: dict) -> list[TextContent]:
     if end:
         params["end"] = end
     
-    data = await prometheus_request("series", params)
+    # 流式计数，只保留前 10 个序列用于显示；达到 limit 后停止读取
+    total = 0
+    shown = []
+    truncated = False
+    async with aclosing(prometheus_stream("series", params, key="data")) as items:
+        async for series in items:
+            if not match_labels(series, compiled):
+                continue
+            if limit is not None and total >= limit:
+                truncated = True
+                break
+            total += 1
+            if len(shown) < 10:  # 限制显示数量
+                shown.append(series)
     
     output = f"时间序列:\n"
-    output += f"数量：{len(data)}\n\n"
+    output += f"数量：{total}"
+    if truncated:
+        output += f"（已达到上限 {limit}，其余序列未读取）"
+    output += "\n\n"
     
-    for series in data[:10]:  # 限制显示数量
+    for series in shown:
         output += f"- {series}\n"
     
-    if len(data) > 10:
-        output += f"\n... 还有 {len(data) - 10} 个序列"
+    if total > 10:
+        output += f"\n... 还有 {total - 10} 个序列"
     
     return [TextContent(type="text", text=f"📈 {output}")]
 
@@ -629,14 +1788,14 @@ async def prom_node_cpu_usage(args: dict) -> list[TextContent]:
     """获取节点 CPU 使用率"""
     node = args.get("node")
     
-    query = '100 - (avg by(instance) (irate(node_cpu_seconds_total{mode="idle"}[5m])) * 100)'
+    query = NODE_CPU_QUERY
     if node:
         query = f'100 - (avg by(instance) (irate(node_cpu_seconds_total{{mode="idle", instance="{node}"}}[5m])) * 100)'
     
-    data = await prometheus_request("query", {"query": query})
+    results, source = await predefined_query("node_cpu", query, {"instance": node},
+                                             use_cache=not args.get("no_cache", False))
     
-    results = data.get("result", [])
-    output = "节点 CPU 使用率\n\n"
+    output = f"节点 CPU 使用率{source}\n\n"
     
     for result in results:
         instance = result.get("metric", {}).get("instance", "unknown")
@@ -650,14 +1809,14 @@ async def prom_node_memory_usage(args: dict) -> list[TextContent]:
     """获取节点内存使用率"""
     node = args.get("node")
     
-    query = '(1 - (node_memory_MemAvailable_bytes / node_memory_MemTotal_bytes)) * 100'
+    query = NODE_MEMORY_QUERY
     if node:
         query = f'(1 - (node_memory_MemAvailable_bytes{{instance="{node}"}} / node_memory_MemTotal_bytes{{instance="{node}"}})) * 100'
     
-    data = await prometheus_request("query", {"query": query})
+    results, source = await predefined_query("node_memory", query, {"instance": node},
+                                             use_cache=not args.get("no_cache", False))
     
-    results = data.get("result", [])
-    output = "节点内存使用率\n\n"
+    output = f"节点内存使用率{source}\n\n"
     
     for result in results:
         instance = result.get("metric", {}).get("instance", "unknown")
@@ -672,15 +1831,15 @@ async def prom_pod_cpu_usage(args: dict) -> list[TextContent]:
     namespace = args.get("namespace")
     pod = args.get("pod")
     
-    query = 'sum by (namespace, pod) (rate(container_cpu_usage_seconds_total{container!=""}[5m])) * 100'
+    query = POD_CPU_QUERY
     
     if namespace:
         query = f'sum by (namespace, pod) (rate(container_cpu_usage_seconds_total{{container!="", namespace="{namespace}"}}[5m])) * 100'
     
-    data = await prometheus_request("query", {"query": query})
+    results, source = await predefined_query("pod_cpu", query, {"namespace": namespace},
+                                             use_cache=not args.get("no_cache", False))
     
-    results = data.get("result", [])
-    output = "Pod CPU 使用率\n\n"
+    output = f"Pod CPU 使用率{source}\n\n"
     
     for result in results[:10]:  # 限制显示数量
         ns = result.get("metric", {}).get("namespace", "unknown")
@@ -699,15 +1858,15 @@ async def prom_pod_memory_usage(args: dict) -> list[TextContent]:
     namespace = args.get("namespace")
     pod = args.get("pod")
     
-    query = 'sum by (namespace, pod) (container_memory_usage_bytes{container!=""}) / sum by (namespace, pod) (container_spec_memory_limit_bytes{container!=""}) * 100'
+    query = POD_MEMORY_QUERY
     
     if namespace:
         query = f'sum by (namespace, pod) (container_memory_usage_bytes{{container!="", namespace="{namespace}"}}) / sum by (namespace, pod) (container_spec_memory_limit_bytes{{container!="", namespace="{namespace}"}}) * 100'
     
-    data = await prometheus_request("query", {"query": query})
+    results, source = await predefined_query("pod_memory", query, {"namespace": namespace},
+                                             use_cache=not args.get("no_cache", False))
     
-    results = data.get("result", [])
-    output = "Pod 内存使用率\n\n"
+    output = f"Pod 内存使用率{source}\n\n"
     
     for result in results[:10]:
         ns = result.get("metric", {}).get("namespace", "unknown")
@@ -724,26 +1883,24 @@ async def prom_pod_memory_usage(args: dict) -> list[TextContent]:
 async def prom_service_latency(args: dict) -> list[TextContent]:
     """获取服务延迟"""
     service = args.get("service")
-    percentile = args.get("percentile", "p99")
-    
-    # 根据百分位选择查询
-    percentile_map = {
-        "p50": "0.50",
-        "p90": "0.90",
-        "p99": "0.99"
-    }
+    percentiles = [p for p in args.get("percentiles") or [args.get("percentile", "p99")]
+                   if p in PERCENTILE_QUANTILES] or ["p99"]
     
-    quantile = percentile_map.get(percentile, "0.99")
-    query = f'histogram_quantile({quantile}, sum(rate(http_request_duration_seconds_bucket{{service="{service}"}}[5m])) by (le))'
+    # 只取一次桶计数（命中快照或查询缓存时不访问 Prometheus），各分位数在本地插值
+    query = f'sum by (le) (rate(http_request_duration_seconds_bucket{{service="{service}"}}[5m]))'
+    results, source = await predefined_query("service_latency_buckets", query, {"service": service},
+                                             use_cache=not args.get("no_cache", False))
+    buckets = buckets_from_vector(results)
+    values = histogram_quantiles([float(PERCENTILE_QUANTILES[p]) for p in percentiles],
+                                 buckets.le, buckets.counts)
     
-    data = await prometheus_request("query", {"query": query})
+    title = "/".join(p.upper() for p in percentiles)
+    output = f"服务 {service} 延迟 ({title}){source}\n\n"
     
-    results = data.get("result", [])
-    output = f"服务 {service} 延迟 ({percentile.upper()})\n\n"
-    
-    for result in results:
-        value = result.get("value", [None, "N/A"])[1]
-        output += f"延迟：{float(value) * 1000:.2f}ms\n"
+    for group in range(len(buckets)):
+        for i, percentile in enumerate(percentiles):
+            label = f"{percentile.upper()} " if len(percentiles) > 1 else ""
+            output += f"{label}延迟：{values[i, group] * 1000:.2f}ms\n"
     
     return [TextContent(type="text", text=f"⏱️ {output}")]
 
@@ -754,10 +1911,10 @@ async def prom_service_error_rate(args: dict) -> list[TextContent]:
     
     query = f'sum(rate(http_requests_total{{service="{service}", status=~"5.."}}[5m])) / sum(rate(http_requests_total{{service="{service}"}}[5m])) * 100'
     
-    data = await prometheus_request("query", {"query": query})
+    results, source = await predefined_query("service_error_rate", query, {"service": service},
+                                             use_cache=not args.get("no_cache", False))
     
-    results = data.get("result", [])
-    output = f"服务 {service} 错误率\n\n"
+    output = f"服务 {service} 错误率{source}\n\n"
     
     for result in results:
         value = result.get("value", [None, "N/A"])[1]
@@ -766,6 +1923,174 @@ async def prom_service_error_rate(args: dict) -> list[TextContent]:
     return [TextContent(type="text", text=f"❌ {output}")]
 
 
+# ─────────────────────────────────────────────────────────────
+# 工具实现 - 故障窗口
+# ─────────────────────────────────────────────────────────────
+
+async def prom_freeze_window(args: dict) -> list[TextContent]:
+    """冻结故障窗口"""
+    name = args.get("name")
+    queries = args.get("queries", [])
+    start, end, step = args.get("start"), args.get("end"), args.get("step")
+    
+    if not queries:
+        raise ValueError("queries 不能为空")
+    
+    responses = await asyncio.gather(*(prometheus_query_range(query, start, end, step) for query in queries))
+    series = [
+        (item, query)
+        for query, data in zip(queries, responses)
+        for item in parse_matrix(data.get("result", []))
+    ]
+    raw_bytes = sum(len(json.dumps(data.get("result", []), separators=(",", ":"))) for data in responses)
+    
+    info = await asyncio.to_thread(mini_tsdb.write_block, name, series, {
+        "start": parse_timestamp(start),
+        "end": parse_timestamp(end),
+        "step": parse_duration(step),
+        "queries": queries,
+        "frozen_at": datetime.now().timestamp(),
+    })
+    
+    output = f"窗口：{name}\n"
+    output += f"时间范围：{start} - {end}（步长 {step}）\n"
+    output += f"序列数：{info['series']}，样本数：{info['samples']}\n"
+    output += f"压缩后：{info['bytes']} 字节（JSON {raw_bytes} 字节，压缩比 {raw_bytes / max(info['bytes'], 1):.1f}x）\n"
+    
+    return [TextContent(type="text", text=f"🧊 故障窗口已冻结:\n```\n{output}\n```")]
+
+
+async def prom_frozen_query(args: dict) -> list[TextContent]:
+    """查询冻结的故障窗口"""
+    name = args.get("name")
+    
+    if not name:
+        blocks = mini_tsdb.blocks()
+        output = f"窗口数量：{len(blocks)}\n\n"
+        for block in blocks:
+            meta = block["meta"]
+            output += f"{block['name']}: {block['series']} 条序列，{block['samples']} 个样本，{block['bytes']} 字节"
+            if meta.get("start") is not None:
+                output += f"（{format_timestamp(meta['start'])} - {format_timestamp(meta['end'])}）"
+            output += "\n"
+        return [TextContent(type="text", text=f"🧊 故障窗口:\n```\n{output}\n```")]
+    
+    start = parse_timestamp(args["start"]) if args.get("start") else None
+    end = parse_timestamp(args["end"]) if args.get("end") else None
+    points = args.get("points", DEFAULT_POINTS)
+    series_list = mini_tsdb.select(name, match=args.get("match"), series_filter=args.get("series_filter"),
+                                   query=args.get("query"), start=start, end=end)
+    summary = SeriesMatrix.from_series(series_list).summary()
+    
+    output = f"窗口：{name}\n"
+    output += f"结果数量：{len(series_list)}\n\n"
+    
+    for row, series in enumerate(series_list):
+        metric = series.metric
+        output += f"指标：{metric.get('__name__', 'N/A')}\n"
+        for k, v in metric.items():
+            if k != "__name__":
+                output += f"  {k}: {v}\n"
+        output += f"  数据点数：{len(series)}\n"
+        if len(series):
+            output += (
+                f"  统计：min={format_value(summary['min'][row])} "
+                f"max={format_value(summary['max'][row])} "
+                f"avg={format_value(summary['mean'][row])} "
+                f"last={format_value(summary['last'][row])}\n"
+            )
+        for i in downsample_indices(series.timestamps, series.values, points, "lttb"):
+            output += f"  [{format_timestamp(series.timestamps[i])}] {format_value(series.values[i])}\n"
+        output += "\n"
+    
+    return [TextContent(type="text", text=f"🧊 故障窗口查询:\n```\n{output}\n```")]
+
+
+# ─────────────────────────────────────────────────────────────
+# 工具实现 - 导出
+# ─────────────────────────────────────────────────────────────
+
+async def prom_export_range(args: dict) -> list[TextContent]:
+    """导出范围查询结果"""
+    name = args.get("name")
+    query = args.get("query")
+    start, end, step = args.get("start"), args.get("end"), args.get("step")
+    fmt = args.get("format", "parquet")
+    path = range_exporter.config.path_for(name, fmt)
+    
+    start_ts, end_ts, step_seconds = parse_timestamp(start), parse_timestamp(end), parse_duration(step)
+    windows = split_range(start_ts, end_ts, step_seconds, range_exporter.config.window)
+    metadata = {"query": query, "start": start_ts, "end": end_ts, "step": step_seconds}
+    
+    def write_window(series_list: list) -> None:
+        for series in series_list:
+            writer.write(series)
+    
+    # 逐段查询并写出，不经过缓存：内存中只保留当前一段结果和一个行组；失败时不留下文件。
+    # 写出行组（及扩展标签列）是阻塞的 pyarrow I/O，放到线程池中执行；被取消时线程里的
+    # 写入仍在进行，需等它结束后再 abort，避免与删除临时文件交错
+    writer = None
+    pending = None
+    try:
+        for window_start, window_end in windows:
+            data = await fetch_range(query, window_start, window_end, step_seconds)
+            series_list = parse_matrix(data.get("result", []))
+            if writer is None:
+                if not series_list:
+                    continue
+                labels = {label for series in series_list for label, _ in series.labels}
+                writer = range_exporter.writer(name, fmt, labels, metadata, args.get("row_group_size"))
+            pending = asyncio.ensure_future(asyncio.to_thread(write_window, series_list))
+            await asyncio.shield(pending)
+    except BaseException:
+        if pending is not None and not pending.done():
+            await asyncio.wait([pending])
+        if writer is not None:
+            writer.abort()
+        raise
+    result = await asyncio.to_thread(writer.close) if writer is not None else None
+    
+    if result is None:
+        return [TextContent(type="text", text=f"ℹ️ 查询 {query} 在 {start} - {end} 内没有数据，未生成文件")]
+    range_exporter.record(result)
+    
+    output = f"文件：{path}\n"
+    output += f"格式：{fmt}（{len(windows)} 段查询）\n"
+    output += f"序列数：{result['series']}，行数：{result['rows']}，行组：{result['row_groups']}\n"
+    output += f"文件大小：{result['bytes']} 字节\n"
+    output += f"标签列：{', '.join(result['labels'])}\n"
+    if result["added_labels"]:
+        output += f"ℹ️ 首段之后新增的标签列（之前的行为空值）：{', '.join(result['added_labels'])}\n"
+    
+    return [TextContent(type="text", text=f"📦 导出完成:\n```\n{output}\n```")]
+
+
+# ─────────────────────────────────────────────────────────────
+# 工具实现 - 运行时统计
+# ─────────────────────────────────────────────────────────────
+
+async def prom_runtime_stats(args: dict) -> list[TextContent]:
+    """获取运行时统计"""
+    stats = {
+        "http_client": client_manager.stats(),
+        "query_cache": query_cache.stats(),
+        "range_cache": range_cache.stats(),
+        "range_splitter": range_splitter.stats(),
+        "batch": batch_runner.stats(),
+        "single_flight": single_flight.stats(),
+        "catalog": metric_catalog.stats(),
+        "resilience": prometheus_guard.stats(),
+        "snapshots": snapshot_collector.stats(),
+        "fanout": prometheus_fanout.stats(),
+        "cost_guard": cost_guard.stats(),
+        "tsdb": mini_tsdb.stats(),
+        "export": range_exporter.stats(),
+        "feed": change_feed.stats()
+    }
+    
+    return [TextContent(type="text", text=f"📊 运行时统计:\n```json\n{json.dumps(stats, ensure_ascii=False, indent=2)}\n```")]
+
+
 # ─────────────────────────────────────────────────────────────
 # 主入口
 # ─────────────────────────────────────────────────────────────
@@ -775,11 +2100,20 @@ if __name__ == "__main__":
     import asyncio
     
     async def main():
-        async with stdio_server() as (read_stream, write_stream):
-            await prometheus_server.run(
-                read_stream,
-                write_stream,
-                prometheus_server.create_initialization_options()
-            )
+        try:
+            snapshot_collector.start(evaluate_snapshot_query)
+            change_feed.start(prometheus_request)
+            async with stdio_server() as (read_stream, write_stream):
+                await prometheus_server.run(
+                    read_stream,
+                    write_stream,
+                    prometheus_server.create_initialization_options()
+                )
+        finally:
+            await snapshot_collector.stop()
+            await change_feed.stop()
+            await metric_catalog.stop()
+            await client_manager.aclose()
+            mini_tsdb.close()
     
     asyncio.run(main())
@@ -0,0 +1,700 @@
+#!/usr/bin/env python3
+"""
+K8s MCP 测试脚本
+
+在本地启动一个模拟 Kubernetes API Server，测试原生客户端后端、kubectl 回退和输出格式
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from sre_nanobot.mcp import k8s_server
+from sre_nanobot.mcp.k8s_client import K8sClientConfig, K8sClientManager
+from sre_nanobot.mcp.k8s_exec import CommandExecutor, ExecConfig
+from sre_nanobot.mcp.k8s_format import format_age, format_pods, format_resource, parse_quantity, pod_resources
+from sre_nanobot.mcp.k8s_informer import Informer, InformerConfig, ObjectStore, WatchCache
+from sre_nanobot.mcp.k8s_project import compile_path, extract, project
+
+
+NOW = datetime(2024, 1, 10, 12, 0, 0, tzinfo=timezone.utc)
+
+
+# ─────────────────────────────────────────────────────────
+# 模拟 Kubernetes API Server
+# ─────────────────────────────────────────────────────────
+
+def make_pod(name: str, phase: str = "Running", ready: bool = True, restarts: int = 0,
+             waiting: str = None, created: str = "2024-01-10T11:00:00Z", **labels) -> dict:
+    state = {"waiting": {"reason": waiting}} if waiting else {"running": {"startedAt": created}}
+    return {
+        "metadata": {"name": name, "namespace": "prod", "labels": labels, "creationTimestamp": created},
+        "spec": {"nodeName": "node-1", "containers": [{"name": "app", "image": "app:1.0"}]},
+        "status": {"phase": phase, "podIP": "10.0.0.1", "hostIP": "192.168.0.1",
+                   "containerStatuses": [{"name": "app", "ready": ready, "restartCount": restarts, "state": state}]},
+    }
+
+
+class FakeKubernetes:
+    """
+    记录请求并按路径返回固定对象的模拟 API Server
+
+    routes: {(方法, 路径): 返回对象 或 callable(query, body) -> (状态码, 返回对象)}
+    """
+
+    def __init__(self, routes: dict):
+        self.routes = routes
+        self.requests: list[dict] = []
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def handle_one(self, method: str):
+                url = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                fake.requests.append({"method": method, "path": url.path, "query": query, "body": body,
+                                      "content_type": self.headers.get("Content-Type")})
+                route = fake.routes.get((method, url.path))
+                if route is None:
+                    status, payload = 404, {"kind": "Status", "message": f"{url.path} not found", "code": 404}
+                elif callable(route):
+                    status, payload = route(query, body)
+                else:
+                    status, payload = 200, route
+                data = payload.encode() if isinstance(payload, str) else json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self.handle_one("GET")
+
+            def do_PATCH(self):
+                self.handle_one("PATCH")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.directory = tempfile.TemporaryDirectory()
+        self.kubeconfig = Path(self.directory.name) / "config"
+        self.kubeconfig.write_text(json.dumps({
+            "apiVersion": "v1", "kind": "Config", "current-context": "fake",
+            "clusters": [{"name": "fake", "cluster": {"server": f"http://127.0.0.1:{self.server.server_port}"}}],
+            "users": [{"name": "fake", "user": {"token": "test-token"}}],
+            "contexts": [{"name": "fake", "context": {"cluster": "fake", "user": "fake"}}],
+        }))
+
+    def __enter__(self) -> "FakeKubernetes":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def manager(self, **config) -> K8sClientManager:
+        return K8sClientManager(K8sClientConfig(backend="native", kubeconfig=str(self.kubeconfig), **config))
+
+
+def use_client(manager: K8sClientManager):
+    """将 MCP Server 的共享客户端替换为测试实例"""
+    k8s_server.k8s_client = manager
+
+
+def call(name: str, arguments: dict) -> str:
+    return asyncio.run(k8s_server.call_tool(name, arguments))[0].text
+
+
+# ─────────────────────────────────────────────────────────
+# 测试用例
+# ─────────────────────────────────────────────────────────
+
+def test_format_pods_like_kubectl():
+    """Pod 状态、READY、RESTARTS 和 AGE 与 kubectl 一致"""
+    pods = [
+        make_pod("web-1", restarts=1, app="web"),
+        make_pod("web-2", ready=False, restarts=7, waiting="CrashLoopBackOff", created="2024-01-08T09:00:00Z"),
+        make_pod("job-1", phase="Succeeded", ready=False, created="2024-01-10T11:58:30Z"),
+    ]
+    pods[2]["status"]["containerStatuses"][0]["state"] = {"terminated": {"exitCode": 0, "reason": "Completed"}}
+    lines = format_pods(pods, show_labels=True, now=NOW).splitlines()
+
+    assert lines[0].split() == ["NAME", "READY", "STATUS", "RESTARTS", "AGE", "LABELS"]
+    assert lines[1].split() == ["web-1", "1/1", "Running", "1", "60m", "app=web"]
+    assert lines[2].split() == ["web-2", "0/1", "CrashLoopBackOff", "7", "2d3h", "<none>"]
+    assert lines[3].split() == ["job-1", "0/1", "Completed", "0", "90s", "<none>"]
+    assert lines[0].index("STATUS") == lines[1].index("Running") == lines[2].index("CrashLoopBackOff")
+
+    assert format_age("2024-01-10T07:30:00Z", NOW) == "4h30m"
+    assert format_age("2023-12-01T00:00:00Z", NOW) == "40d"
+    assert parse_quantity("250m") == 0.25 and parse_quantity("128Mi") == 128 * 2 ** 20
+    assert abs(parse_quantity("12345n") - 12345e-9) < 1e-15 and parse_quantity("2") == 2.0
+
+
+def test_native_backend_tools():
+    """原生后端：一个共享客户端完成所有调用，输出与 kubectl 格式一致"""
+    patches = []
+
+    def patch(query, body):
+        patches.append(body)
+        return 200, {"kind": "Deployment"}
+
+    routes = {
+        ("GET", "/api/v1/namespaces/prod/pods"): lambda query, body: (200, {"items": [
+            pod for pod in (make_pod("web-1", app="web"), make_pod("db-1", app="db"))
+            if query.get("labelSelector") in (None, f"app={pod['metadata']['labels']['app']}")
+        ]}),
+        ("GET", "/apis/apps/v1/namespaces/prod/deployments"): {"items": [{
+            "metadata": {"name": "web", "creationTimestamp": "2024-01-01T00:00:00Z"},
+            "spec": {"replicas": 3, "selector": {"matchLabels": {"app": "web"}},
+                     "template": {"spec": {"containers": [{"name": "app", "image": "web:2.1"}]}}},
+            "status": {"readyReplicas": 2, "updatedReplicas": 3, "availableReplicas": 2},
+        }]},
+        ("GET", "/api/v1/namespaces/prod/events"): {"items": [
+            {"type": "Warning", "reason": f"Reason{i}", "message": f"event {i}",
+             "lastTimestamp": f"2024-01-10T11:{i:02d}:00Z", "involvedObject": {"kind": "Pod", "name": "web-1"}}
+            for i in (3, 1, 2)
+        ]},
+        ("GET", "/api/v1/namespaces/prod/pods/web-1"): make_pod("web-1", app="web"),
+        ("GET", "/api/v1/namespaces/prod/pods/web-1/log"): "line 1\nline 2\n",
+        ("GET", "/api/v1/namespaces/prod/pods/mesh-1"): {
+            "metadata": {"name": "mesh-1", "annotations": {"kubectl.kubernetes.io/default-container": "app"}},
+            "spec": {"containers": [{"name": "istio-proxy"}, {"name": "app"}]},
+        },
+        ("GET", "/api/v1/namespaces/prod/pods/mesh-1/log"): lambda query, body: (
+            (200, f"from {query['container']}\n") if query.get("container") else
+            (400, {"kind": "Status", "message": "a container name must be specified"})
+        ),
+        ("PATCH", "/apis/apps/v1/namespaces/prod/deployments/web/scale"): patch,
+        ("PATCH", "/apis/apps/v1/namespaces/prod/deployments/web"): patch,
+        ("GET", "/apis/metrics.k8s.io/v1beta1/namespaces/prod/pods"): {"items": [
+            {"metadata": {"name": "web-1"}, "containers": [
+                {"usage": {"cpu": "150000000n", "memory": "64Mi"}},
+                {"usage": {"cpu": "50m", "memory": "32768Ki"}},
+            ]},
+        ]},
+    }
+
+    with FakeKubernetes(routes) as fake:
+        manager = fake.manager()
+        use_client(manager)
+        try:
+            text = call("kubectl_get_pods", {"namespace": "prod", "label_selector": "app=db"})
+            assert "db-1" in text and "web-1" not in text and "1/1     Running" in text
+
+            text = call("kubectl_get_deployments", {"namespace": "prod", "show_details": True})
+            row = next(line for line in text.splitlines() if line.startswith("web "))
+            assert row.split()[:4] == ["web", "2/3", "3", "2"] and row.split()[5:] == ["app", "web:2.1", "app=web"]
+
+            text = call("kubectl_get_events", {"namespace": "prod", "limit": 2})
+            assert "Reason1" not in text and text.index("Reason2") < text.index("Reason3")
+
+            text = call("kubectl_describe_pod", {"namespace": "prod", "pod": "web-1"})
+            assert "Node:             node-1/192.168.0.1" in text and "Image:          app:1.0" in text
+            assert "Reason3" in text
+
+            text = call("kubectl_get_logs", {"namespace": "prod", "pod": "web-1", "tail": 20, "since": "5m"})
+            assert "line 2" in text
+            text = call("kubectl_get_logs", {"namespace": "prod", "pod": "mesh-1"})
+            assert "from app" in text
+            text = call("kubectl_get_logs", {"namespace": "prod", "pod": "mesh-1", "container": "istio-proxy"})
+            assert "from istio-proxy" in text
+
+            text = call("kubectl_scale_deployment", {"namespace": "prod", "deployment": "web", "replicas": 5})
+            assert "deployment.apps/web scaled" in text
+            text = call("kubectl_restart_deployment", {"namespace": "prod", "deployment": "web"})
+            assert "deployment.apps/web restarted" in text
+            assert patches[0] == {"spec": {"replicas": 5}}
+            assert "kubectl.kubernetes.io/restartedAt" in patches[1]["spec"]["template"]["metadata"]["annotations"]
+
+            text = call("kubectl_get_resource_usage", {"namespace": "prod"})
+            assert "web-1   200m         96Mi" in text
+
+            text = call("kubectl_describe_pod", {"namespace": "prod", "pod": "missing"})
+            assert "❌ 执行失败：Kubernetes API 失败（404）" in text and "not found" in text
+        finally:
+            manager.close()
+
+        log = next(r for r in fake.requests if r["path"].endswith("/log"))
+        assert log["query"] == {"container": "app", "tailLines": "20", "sinceSeconds": "300"}
+        assert all(r["content_type"] == "application/strategic-merge-patch+json"
+                   for r in fake.requests if r["method"] == "PATCH")
+        assert manager.clients_created == 1 and manager.requests_total == 15
+
+
+def test_describe_node_allocated_resources():
+    """describe node 汇总节点上未终止 Pod 的 requests / limits，百分比相对 allocatable"""
+    web = make_pod("web-1")
+    web["spec"]["containers"] = [
+        {"name": "app", "resources": {"requests": {"cpu": "250m", "memory": "256Mi"},
+                                      "limits": {"cpu": "1", "memory": "512Mi"}}},
+        {"name": "sidecar", "resources": {"requests": {"cpu": "250m", "memory": "256Mi"}}},
+    ]
+    web["spec"]["initContainers"] = [{"name": "init", "resources": {"requests": {"cpu": "800m"}}}]
+    assert pod_resources(web) == {"requests": {"cpu": 0.8, "memory": 512 * 2 ** 20},
+                                  "limits": {"cpu": 1.0, "memory": 512 * 2 ** 20}}
+    assert format_resource("cpu", 0.8) == "800m" and format_resource("cpu", 2.0) == "2"
+    assert format_resource("memory", 1.5 * 2 ** 30) == "1536Mi" and format_resource("memory", 0) == "0"
+
+    routes = {
+        ("GET", "/api/v1/nodes/node-1"): {
+            "metadata": {"name": "node-1", "creationTimestamp": "2024-01-01T00:00:00Z"},
+            "status": {"allocatable": {"cpu": "2", "memory": "2Gi", "pods": "110"}},
+        },
+        ("GET", "/api/v1/events"): {"items": []},
+        ("GET", "/api/v1/pods"): {"items": [web, make_pod("idle-1")]},
+    }
+    with FakeKubernetes(routes) as fake:
+        manager = fake.manager()
+        use_client(manager)
+        try:
+            text = call("kubectl_describe_node", {"node": "node-1"})
+        finally:
+            manager.close()
+
+    assert "Non-terminated Pods:          (2 in total)" in text
+    row = next(line for line in text.splitlines() if "web-1" in line)
+    assert row.split()[:10] == ["prod", "web-1", "800m", "(40%)", "1", "(50%)", "512Mi", "(25%)", "512Mi", "(25%)"]
+    allocated = text[text.index("Allocated resources:"):].splitlines()
+    assert allocated[2].split() == ["Resource", "Requests", "Limits"]
+    assert allocated[3].split() == ["cpu", "800m", "(40%)", "1", "(50%)"]
+    pods = next(r for r in fake.requests if r["path"] == "/api/v1/pods")
+    assert pods["query"]["fieldSelector"] == "spec.nodeName=node-1,status.phase!=Succeeded,status.phase!=Failed"
+
+
+def test_kubectl_fallback():
+    """kubeconfig 无法加载时 auto 模式回退到 kubectl，native 模式报错"""
+    calls = []
+
+    async def fake_kubectl(args, timeout=30):
+        calls.append(args)
+        return "NAME   READY\n"
+
+    original = k8s_server.run_kubectl
+    k8s_server.run_kubectl = fake_kubectl
+    try:
+        use_client(K8sClientManager(K8sClientConfig(kubeconfig="/nonexistent/kubeconfig")))
+        text = call("kubectl_get_deployments", {"namespace": "prod", "show_details": True})
+        assert "NAME   READY" in text and calls == [["get", "deployments", "-n", "prod", "-o", "wide"]]
+        assert k8s_server.k8s_client.stats()["backend"] == "kubectl"
+
+        use_client(K8sClientManager(K8sClientConfig(backend="native", kubeconfig="/nonexistent/kubeconfig")))
+        text = call("kubectl_get_nodes", {})
+        assert "原生 Kubernetes 客户端不可用" in text and len(calls) == 1
+
+        use_client(K8sClientManager(K8sClientConfig(backend="kubectl")))
+        call("kubectl_get_nodes", {})
+        assert calls[-1] == ["get", "nodes"] and k8s_server.k8s_client.load_error is None
+    finally:
+        k8s_server.run_kubectl = original
+
+
+def test_object_store_indexes():
+    """ObjectStore 按命名空间、标签、owner 索引查询，更新和删除后索引同步"""
+    store = ObjectStore()
+    owner = [{"kind": "ReplicaSet", "name": "web-5d8f"}]
+    store.replace([
+        make_pod("web-1", app="web", tier="frontend"),
+        make_pod("web-2", app="web", tier="backend"),
+        make_pod("db-1", app="db"),
+    ])
+    store.upsert({**make_pod("web-1", app="web", tier="frontend"),
+                  "metadata": {**make_pod("web-1", app="web", tier="frontend")["metadata"], "ownerReferences": owner}})
+    other = make_pod("web-9", app="web")
+    other["metadata"]["namespace"] = "staging"
+    store.upsert(other)
+
+    names = lambda objs: [o["metadata"]["name"] for o in objs]
+    assert names(store.list("prod", "app=web")) == ["web-1", "web-2"]
+    assert names(store.list(label_selector="app==web")) == ["web-1", "web-2", "web-9"]
+    assert names(store.list("prod", "app in (web, db),tier!=backend")) == ["db-1", "web-1"]
+    assert names(store.list("prod", "tier")) == ["web-1", "web-2"]
+    assert names(store.list("prod", "!tier")) == ["db-1"]
+    assert names(store.list("prod", owner=("ReplicaSet", "web-5d8f"))) == ["web-1"]
+    assert names(store.list("prod", field_selector="metadata.name=db-1")) == ["db-1"]
+    assert names(store.list("prod", field_selector="status.phase!=Running")) == []
+    assert store.get("web-9", "staging") is other and store.get("web-9", "prod") is None
+
+    store.upsert(make_pod("web-2", app="api"))
+    store.delete(make_pod("db-1"))
+    assert names(store.list("prod", "app=web")) == ["web-1"]
+    assert names(store.list("prod", "app=api")) == ["web-2"]
+    assert store.list("prod", "app=db") == [] and len(store) == 3
+
+    try:
+        store.list(label_selector="app=(web")
+        assert False, "无效选择器应报错"
+    except ValueError:
+        pass
+
+
+def test_informer_list_watch_relist():
+    """informer 先 list 再应用 watch 增量，410 后重新 list；读取工具直接查缓存"""
+    pods = [make_pod("web-1", app="web"), make_pod("web-2", app="web")]
+    lists = []
+    watches = []
+    script = [
+        [{"type": "ADDED", "object": make_pod("web-3", app="web")},
+         {"type": "MODIFIED", "object": make_pod("web-1", phase="Pending", ready=False, app="web")},
+         {"type": "DELETED", "object": make_pod("web-2", app="web")},
+         {"type": "BOOKMARK", "object": {"metadata": {"resourceVersion": "15"}}}],
+        [{"type": "ERROR", "object": {"kind": "Status", "code": 410, "message": "too old resource version"}}],
+        410,
+    ]
+    for i, events in enumerate(script[0][:3]):
+        events["object"]["metadata"]["resourceVersion"] = str(11 + i)
+
+    def list_or_watch(query, body):
+        if query.get("watch") != "true":
+            lists.append(query)
+            return 200, {"kind": "PodList", "metadata": {"resourceVersion": str(10 * len(lists))}, "items": pods}
+        watches.append(query)
+        if script and script[0] == 410:
+            script.pop(0)
+            return 410, {"kind": "Status", "code": 410, "reason": "Expired", "message": "too old resource version"}
+        if script:
+            return 200, "\n".join(json.dumps(e) for e in script.pop(0)) + "\n"
+        time.sleep(0.2)
+        return 200, ""
+
+    with FakeKubernetes({("GET", "/api/v1/pods"): list_or_watch}) as fake:
+        manager = fake.manager()
+        informer = Informer("pods", manager, InformerConfig(retry_interval=0.05))
+        informer.relist()
+        informer.watch_once()
+        store = informer.store
+        assert [o["metadata"]["name"] for o in store.list("prod")] == ["web-1", "web-3"]
+        assert store.get("web-1", "prod")["status"]["phase"] == "Pending"
+        assert informer.resource_version == "15" and informer.events == 4
+        assert watches[0]["resourceVersion"] == "10" and watches[0]["allowWatchBookmarks"] == "true"
+
+        try:
+            informer.watch_once()
+            assert False, "410 应触发重新 list"
+        except Exception as e:
+            assert type(e).__name__ == "ResourceExpired"
+
+        # watch 请求本身返回 HTTP 410：同样重新 list，而不是按普通错误重试
+        try:
+            informer.watch_once()
+            assert False, "HTTP 410 应触发重新 list"
+        except Exception as e:
+            assert type(e).__name__ == "ResourceExpired" and "410" in str(e)
+
+        # 后台线程：重新 list 后继续 watch，读取工具不再访问 API Server
+        cache = WatchCache(InformerConfig(enabled=True, kinds=("pods",), retry_interval=0.05))
+        original = k8s_server.watch_cache
+        k8s_server.watch_cache = cache
+        try:
+            cache.start(manager)
+            deadline = time.monotonic() + 5
+            while len(lists) < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert cache.informers["pods"].fresh()
+            requests = len(fake.requests)
+            use_client(manager)
+            text = call("kubectl_get_pods", {"namespace": "prod", "label_selector": "app=web"})
+            assert "web-1" in text and "web-2" in text
+            assert all(r["query"].get("watch") == "true" for r in fake.requests[requests:])
+            assert cache.stats()["served"] == 1 and cache.stats()["informers"]["pods"]["lists"] == 1
+        finally:
+            cache.stop()
+            k8s_server.watch_cache = original
+
+
+def test_structured_projection():
+    """字段投影：路径、别名、计算字段、分组计数，以及原生和 kubectl 两种后端的 json 模式"""
+    pods = [make_pod(f"web-{i}", phase="Pending" if i % 4 == 0 else "Running", ready=i % 4 != 0,
+                     restarts=i % 3, app="web", **{"app.kubernetes.io/name": "web"}) for i in range(40)]
+    for pod in pods:
+        pod["metadata"]["managedFields"] = [{"manager": "kube-controller-manager", "fieldsV1": {"f:status": {}}}] * 5
+        pod["spec"]["containers"].append({"name": "sidecar", "image": "proxy:1.2", "env": [{"name": "X", "value": "y"}] * 20})
+
+    pod = pods[1]
+    assert extract(pod, compile_path("{.metadata.labels['app.kubernetes.io/name']}")) == "web"
+    assert extract(pod, compile_path("spec.containers[*].image")) == ["app:1.0", "proxy:1.2"]
+    assert extract(pod, compile_path("$.spec.containers[-1].name")) == "sidecar"
+    assert extract(pod, compile_path("spec.containers[5].name")) is None
+    try:
+        compile_path("spec.containers[")
+        assert False, "无效路径应报错"
+    except ValueError:
+        pass
+
+    result = project(pods[:2], "pods", "name=metadata.name,status,ready,restarts,images=spec.containers[*].image,spec.hostname")
+    assert result["items"][1] == {"name": "web-1", "status": "Running", "ready": "1/2", "restarts": 1,
+                                  "images": ["app:1.0", "proxy:1.2"]}
+    result = project(pods, "pods", group_by="phase=status.phase")
+    assert result == {"count": 40, "groups": {"by": "phase", "counts": {"Running": 30, "Pending": 10}}}
+
+    with FakeKubernetes({("GET", "/api/v1/namespaces/prod/pods"): {"items": pods}}) as fake:
+        manager = fake.manager()
+        use_client(manager)
+        try:
+            text = call("kubectl_get_pods", {"namespace": "prod", "output": "json"})
+            data = json.loads(text.split("```json\n")[1].split("\n```")[0])
+            assert "（40 个）" in text and data["items"][0]["name"] == "web-0" and data["items"][0]["status"] == "Pending"
+            assert len(json.dumps({"items": pods})) / len(text) > 10
+
+            text = call("kubectl_get_pods", {"namespace": "prod", "output": "json", "group_by": "status"})
+            assert '"counts":{"Running":30,"Pending":10}' in text
+            assert len(json.dumps({"items": pods})) / len(text) > 100
+        finally:
+            manager.close()
+
+    calls = []
+
+    async def fake_kubectl(args, timeout=30):
+        calls.append(args)
+        return json.dumps({"items": [{"metadata": {"name": "node-1", "labels": {"node-role.kubernetes.io/worker": ""}},
+                                      "status": {"conditions": [{"type": "Ready", "status": "True"}]}}]})
+
+    original = k8s_server.run_kubectl
+    k8s_server.run_kubectl = fake_kubectl
+    try:
+        use_client(K8sClientManager(K8sClientConfig(backend="kubectl")))
+        text = call("kubectl_get_nodes", {"output": "json", "fields": "name=metadata.name,status,roles"})
+        assert '{"name":"node-1","status":"Ready","roles":"worker"}' in text
+        assert calls == [["get", "nodes", "-o", "json"]]
+    finally:
+        k8s_server.run_kubectl = original
+
+
+def test_informer_freshness_follows_last_contact():
+    """watch 在线但长时间收不到事件（半开连接）时缓存同样视为过期；BOOKMARK 保持缓存新鲜"""
+    now = [0.0]
+    gate = threading.Event()
+
+    class Client:
+        def call(self, api, method):
+            return {"metadata": {"resourceVersion": "1"}, "items": [make_pod("web-1")]}
+
+        def watch(self, api, method, **kwargs):
+            def events():
+                yield {"type": "BOOKMARK", "object": {"metadata": {"resourceVersion": "2"}}}
+                gate.wait(5)
+            return events()
+
+    informer = Informer("pods", Client(), InformerConfig(max_stale=60, max_silence=120), clock=lambda: now[0])
+    informer.relist()
+    thread = threading.Thread(target=informer.watch_once)
+    thread.start()
+    try:
+        deadline = time.monotonic() + 5
+        while informer.resource_version != "2" and time.monotonic() < deadline:
+            time.sleep(0.01)
+        now[0] = 100.0
+        assert informer.connected and informer.fresh()
+        now[0] = 121.0
+        assert informer.connected and not informer.fresh()
+    finally:
+        gate.set()
+        thread.join()
+    # 断开后按 max_stale 计算
+    assert not informer.connected and informer.last_contact == 121.0
+    now[0] = 180.0
+    assert informer.fresh()
+    now[0] = 182.0
+    assert not informer.fresh()
+
+
+def test_command_executor_limits():
+    """kubectl 执行器：并发上限、超时终止整个进程组（忽略 SIGTERM 时 SIGKILL）、输出上限、按动词统计"""
+    executor = CommandExecutor(ExecConfig(binary=sys.executable, max_concurrency=2, max_output=1024 * 1024,
+                                          kill_grace=0.3))
+    directory = tempfile.TemporaryDirectory()
+    pid_file = Path(directory.name) / "grandchild.pid"
+
+    def alive(pid: int) -> bool:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                return f.read().split(")")[-1].split()[0] != "Z"
+        except FileNotFoundError:
+            return False
+
+    async def scenario():
+        start = time.monotonic()
+        outputs = await asyncio.gather(*(
+            executor.run(["-c", f"import time; time.sleep(0.2); print({i})"]) for i in range(6)
+        ))
+        assert [o.strip() for o in outputs] == [str(i) for i in range(6)]
+        assert time.monotonic() - start >= 0.55 and executor.max_waiting >= 4
+
+        # 子进程派生的孙进程也在同一个进程组中，超时后一起被终止；子进程忽略 SIGTERM 时升级为 SIGKILL
+        spawn = ("import signal, subprocess, sys, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); "
+                 "p = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)']); "
+                 f"open({str(pid_file)!r}, 'w').write(str(p.pid)); time.sleep(60)")
+        try:
+            await executor.run(["-c", spawn], timeout=1.0)
+            assert False, "应当超时"
+        except Exception as e:
+            assert "超时（1.0秒）" in str(e)
+
+        huge = await asyncio.gather(executor.run(["-c", "print('x' * (2 * 1024 * 1024))"]), return_exceptions=True)
+        assert "输出超过 1048576 字节上限" in str(huge[0])
+        # 调用方可按次放宽上限（-o json 全量对象、logs）
+        text = await executor.run(["-c", "print('x' * (2 * 1024 * 1024))"], max_output=4 * 1024 * 1024)
+        assert len(text) == 2 * 1024 * 1024 + 1
+
+        failed = await asyncio.gather(executor.run(["-c", "import sys; sys.exit('boom')"]), return_exceptions=True)
+        assert "失败：boom" in str(failed[0])
+
+        # 多字节字符跨越读取块的边界时逐块解码不会出现替换字符
+        text = await executor.run(["-c", "import sys; sys.stdout.buffer.write('中文'.encode() * 50000)"])
+        assert text == "中文" * 50000
+
+    asyncio.run(scenario())
+    stats = executor.stats()
+    assert stats["inflight"] == 0 and stats["waiting"] == 0 and stats["killed"] == 2
+    assert stats["verbs"]["-c"]["calls"] == 11 and stats["verbs"]["-c"]["timeouts"] == 1
+    assert stats["verbs"]["-c"]["errors"] == 3 and stats["verbs"]["-c"]["p95_seconds"] >= 0.2
+
+    # 孙进程不会遗留
+    grandchild = int(pid_file.read_text())
+    deadline = time.monotonic() + 2
+    while alive(grandchild) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    directory.cleanup()
+    assert not alive(grandchild), f"遗留进程：{grandchild}"
+
+
+def test_run_kubectl_bulk_output_limit():
+    """-o json 全量对象和 logs 使用 max_bulk_output，其它输出使用默认上限"""
+    limits = []
+
+    class RecordingExecutor:
+        config = ExecConfig(max_output=1024, max_bulk_output=4096)
+
+        async def run(self, args, timeout=30, max_output=None):
+            limits.append(max_output)
+            return ""
+
+    original = k8s_server.kubectl_executor
+    k8s_server.kubectl_executor = RecordingExecutor()
+    try:
+        for args in (["get", "pods", "-n", "default", "-o", "json"], ["logs", "api-0", "-n", "default"],
+                     ["get", "pods", "-n", "default"], ["describe", "pod", "api-0"]):
+            asyncio.run(k8s_server.run_kubectl(args))
+    finally:
+        k8s_server.kubectl_executor = original
+    assert limits == [4096, 4096, None, None]
+
+
+def test_multi_namespace_fanout():
+    """多命名空间 × 多资源并发查询：目标去重、单目标失败不影响其它目标、结果按资源合并"""
+    def slow(payload, status=200):
+        def handler(query, body):
+            time.sleep(0.3)
+            return status, payload
+        return handler
+
+    staging = make_pod("api-1", phase="Pending", ready=False, app="api")
+    staging["metadata"]["namespace"] = "staging"
+    routes = {
+        ("GET", "/api/v1/namespaces/prod/pods"): slow({"items": [make_pod("web-1", app="web"), make_pod("web-2", app="web")]}),
+        ("GET", "/api/v1/namespaces/staging/pods"): slow({"items": [staging]}),
+        ("GET", "/api/v1/namespaces/dev/pods"): slow({"kind": "Status", "message": "pods is forbidden", "code": 403}, 403),
+        ("GET", "/api/v1/nodes"): slow({"items": [
+            {"metadata": {"name": "node-1"}, "status": {"conditions": [{"type": "Ready", "status": "True"}]}},
+        ]}),
+    }
+
+    with FakeKubernetes(routes) as fake:
+        manager = fake.manager()
+        use_client(manager)
+        try:
+            start = time.monotonic()
+            text = call("k8s_multi_get", {"namespaces": ["prod", "staging", "prod", "dev"], "kinds": ["pods", "nodes", "pods"],
+                                          "group_by": "status"})
+            elapsed = time.monotonic() - start
+        finally:
+            manager.close()
+
+    assert elapsed < 0.9, f"4 个目标应并发执行，实际耗时 {elapsed:.2f}s"
+    assert len(fake.requests) == 4 and "4 个目标（部分目标失败，结果不完整）" in text
+    assert "✅ pods@prod:" in text and "2 个对象" in text and "✅ nodes:" in text
+    assert "❌ pods@dev:" in text and "pods is forbidden" in text
+    data = json.loads(text.split("```json\n")[1].split("\n```")[0])
+    assert data["pods"] == {"count": 3, "groups": {"by": "status", "counts": {"Running": 2, "Pending": 1}}}
+    assert data["nodes"]["groups"]["counts"] == {"Ready": 1}
+
+    # 字段选择器只发给支持其字段的资源类型，也可按类型分别指定
+    routes = {
+        ("GET", "/api/v1/namespaces/prod/pods"): {"items": [make_pod("web-1", app="web")]},
+        ("GET", "/api/v1/namespaces/prod/events"): {"items": []},
+        ("GET", "/api/v1/nodes"): {"items": [{"metadata": {"name": "node-1"}}]},
+    }
+    with FakeKubernetes(routes) as fake:
+        manager = fake.manager()
+        use_client(manager)
+        try:
+            text = call("k8s_multi_get", {"namespaces": ["prod"], "kinds": ["pods", "nodes", "events"],
+                                          "field_selector": "status.phase=Running"})
+            assert "❌" not in text and "字段选择器：pods: status.phase=Running" in text
+            text = call("k8s_multi_get", {"namespaces": ["prod"], "kinds": ["pods", "events"],
+                                          "field_selector": {"events": "type=Warning"}})
+            assert "❌" not in text
+            text = call("k8s_multi_get", {"namespaces": ["prod"], "kinds": ["nodes"],
+                                          "field_selector": "status.phase=Running"})
+            assert "❌ 执行失败" in text and "不适用于任何查询的资源类型" in text
+        finally:
+            manager.close()
+    selectors = sorted((r["path"], r["query"].get("fieldSelector") or "") for r in fake.requests)
+    assert selectors == [
+        ("/api/v1/namespaces/prod/events", ""), ("/api/v1/namespaces/prod/events", "type=Warning"),
+        ("/api/v1/namespaces/prod/pods", ""), ("/api/v1/namespaces/prod/pods", "status.phase=Running"),
+        ("/api/v1/nodes", ""),
+    ]
+
+    text = call("k8s_multi_get", {"namespaces": [], "kinds": ["pods"]})
+    assert "❌ 执行失败：pods 需要指定至少一个命名空间" in text
+    text = call("k8s_multi_get", {"namespaces": ["prod"], "kinds": ["secrets"]})
+    assert "不支持的资源类型：secrets" in text
+
+
+# ─────────────────────────────────────────────────────────
+# 运行入口
+# ─────────────────────────────────────────────────────────
+
+def run_all_tests() -> bool:
+    """运行所有测试"""
+    tests = [(name, fn) for name, fn in globals().items()
+             if name.startswith("test_") and callable(fn)]
+
+    print("=" * 60)
+    print("K8s MCP 测试")
+    print("=" * 60)
+
+    passed = 0
+    for name, fn in tests:
+        try:
+            fn()
+            print(f"✅ {name}")
+            passed += 1
+        except Exception as e:
+            print(f"❌ {name}: {e!r}")
+
+    print()
+    print(f"总测试数：{len(tests)}  ✅ 通过：{passed}  ❌ 失败：{len(tests) - passed}")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run_all_tests() else 1)
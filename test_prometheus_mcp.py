@@ -0,0 +1,1639 @@
+#!/usr/bin/env python3
+"""
+Prometheus MCP 测试脚本
+
+使用 httpx.MockTransport 模拟 Prometheus，测试 MCP Server 的请求链路
+"""
+
+import asyncio
+import json
+import sys
+import tempfile
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:      # 可选依赖，未安装时跳过导出测试
+    pyarrow = None
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from sre_nanobot.mcp import prometheus_server
+from sre_nanobot.mcp.prom_anomaly import cusum_change_points, detect_anomalies
+from sre_nanobot.mcp.prom_batch import BatchConfig, BatchQueryRunner
+from sre_nanobot.mcp.prom_catalog import CatalogConfig, MetricCatalog, SortedIndex
+from sre_nanobot.mcp.prom_cache import CacheConfig, QueryResultCache, TTLCache, normalize_query
+from sre_nanobot.mcp.prom_client import ClientConfig, PrometheusClientManager
+from sre_nanobot.mcp.prom_range_cache import RangeCacheConfig, RangeResultCache
+from sre_nanobot.mcp.prom_singleflight import SingleFlight
+from sre_nanobot.mcp.prom_histogram import buckets_from_matrix, histogram_quantiles
+from sre_nanobot.mcp.prom_feed import ChangeFeed, FeedConfig, fingerprint
+from sre_nanobot.mcp.prom_fanout import FanOutConfig, PrometheusFanOut, parse_endpoints
+from sre_nanobot.mcp.prom_correlate import correlate, rank_rows
+from sre_nanobot.mcp.prom_cost import CostConfig, QueryCostGuard, extract_selectors, widen_step
+from sre_nanobot.mcp.prom_downsample import lttb_indices, minmax_indices
+from sre_nanobot.mcp.prom_export import ExportConfig, RangeExporter, SeriesWriter
+from sre_nanobot.mcp.prom_resilience import PrometheusGuard, ResilienceConfig, last_good_key, latency_class
+from sre_nanobot.mcp.prom_snapshot import SnapshotCollector, SnapshotConfig
+from sre_nanobot.mcp.prom_series import ColumnarSeries, SeriesMatrix
+from sre_nanobot.mcp.prom_splitter import RangeQuerySplitter, SplitConfig, split_range
+from sre_nanobot.mcp.prom_stream import JsonArrayStreamParser, iter_json_array
+from sre_nanobot.mcp.prom_time import parse_timestamp
+from sre_nanobot.mcp.prom_tsdb import MiniTSDB, TSDBConfig, decode_chunk, encode_chunk
+
+
+# ─────────────────────────────────────────────────────────
+# 模拟 Prometheus
+# ─────────────────────────────────────────────────────────
+
+class FakePrometheus:
+    """记录请求并返回固定响应的模拟 Prometheus"""
+
+    def __init__(self, handler=None):
+        self.requests: list[httpx.Request] = []
+        self.handler = handler or self.default_handler
+
+    @staticmethod
+    def default_handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={
+            "status": "success",
+            "data": {
+                "resultType": "vector",
+                "result": [{"metric": {"__name__": "up", "job": "node"}, "value": [1700000000, "1"]}]
+            }
+        })
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        return self.handler(request)
+
+    def manager(self, **config) -> PrometheusClientManager:
+        return PrometheusClientManager(ClientConfig(**config), transport=httpx.MockTransport(self))
+
+
+def use_manager(manager: PrometheusClientManager, cache_config: CacheConfig = None):
+    """将 MCP Server 的共享客户端和缓存替换为测试实例"""
+    prometheus_server.client_manager = manager
+    prometheus_server.query_cache = QueryResultCache(cache_config)
+    prometheus_server.range_cache = RangeResultCache(RangeCacheConfig())
+    prometheus_server.single_flight = SingleFlight()
+    prometheus_server.metric_catalog = MetricCatalog()
+    prometheus_server.prometheus_guard = PrometheusGuard()
+    prometheus_server.cost_guard = QueryCostGuard(CostConfig(enabled=False))
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeRangeSource:
+    """按 step 生成确定性样本的范围查询回源函数"""
+
+    def __init__(self, series: int = 2):
+        self.series = series
+        self.calls: list[tuple[float, float, float]] = []
+
+    def values(self, index: int, start: float, end: float, step: float) -> list:
+        points = []
+        ts = start
+        while ts <= end:
+            points.append([ts, str(index * 1000 + ts % 997)])
+            ts += step
+        return points
+
+    async def __call__(self, query: str, start: float, end: float, step: float) -> dict:
+        self.calls.append((start, end, step))
+        return {
+            "resultType": "matrix",
+            "result": [
+                {"metric": {"__name__": "up", "instance": f"node-{i}"},
+                 "values": self.values(i, start, end, step)}
+                for i in range(self.series)
+            ]
+        }
+
+
+# ─────────────────────────────────────────────────────────
+# 测试用例
+# ─────────────────────────────────────────────────────────
+
+def test_client_reused_across_calls():
+    """多次工具调用复用同一个连接池"""
+    fake = FakePrometheus()
+    manager = fake.manager()
+    use_manager(manager)
+
+    async def run():
+        for _ in range(5):
+            result = await prometheus_server.prom_query({"query": "up", "no_cache": True})
+            assert "结果数量：1" in result[0].text
+        assert manager.clients_created == 1
+        assert manager.requests_total == 5
+        await manager.aclose()
+        assert not manager.is_open
+
+    asyncio.run(run())
+    assert len(fake.requests) == 5
+
+
+def test_per_request_timeout():
+    """单次请求超时覆盖默认超时"""
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.extensions["timeout"])
+        return FakePrometheus.default_handler(request)
+
+    manager = FakePrometheus(handler).manager(timeout=30.0, connect_timeout=5.0)
+    use_manager(manager)
+
+    async def run():
+        await prometheus_server.prometheus_request("query", {"query": "up"})
+        await prometheus_server.prometheus_request("query", {"query": "up"}, timeout=2.0)
+        await manager.aclose()
+
+    asyncio.run(run())
+    assert seen[0]["read"] == 30.0 and seen[0]["connect"] == 5.0
+    assert seen[1]["read"] == 2.0 and seen[1]["connect"] == 2.0
+
+
+def test_api_error_raised():
+    """Prometheus 返回 error 状态时抛出异常"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"status": "error", "error": "bad_data"})
+
+    manager = FakePrometheus(handler).manager()
+    use_manager(manager)
+
+    async def run():
+        try:
+            await prometheus_server.prometheus_request("query", {"query": "up{"})
+        except Exception as e:
+            assert "bad_data" in str(e)
+        else:
+            raise AssertionError("未抛出异常")
+        finally:
+            await manager.aclose()
+
+    asyncio.run(run())
+
+
+def test_normalize_query():
+    """空白差异不影响缓存键，标签值内的空白保持原样"""
+    assert normalize_query('sum by (pod) ( rate(x{ job = "a b" }[5m]) )') == \
+        normalize_query('sum by(pod)(rate(x{job="a b"}[5m]))')
+    assert normalize_query('x{job="a b"}') != normalize_query('x{job="ab"}')
+    assert normalize_query("a  or\n b") == "a or b"
+
+
+def test_ttl_cache_lru_and_bytes():
+    """LRU 淘汰、字节上限和 TTL 过期"""
+    clock = FakeClock()
+    cache = TTLCache(max_entries=2, max_bytes=100, ttl=10, clock=clock)
+
+    cache.put("a", 1, size=10)
+    cache.put("b", 2, size=10)
+    assert cache.get("a") == 1          # a 变为最近使用
+    cache.put("c", 3, size=10)          # 淘汰 b
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+    cache.put("big", 4, size=90)        # 超出字节上限，淘汰最久未使用的条目
+    assert cache.total_bytes <= 100
+    assert not cache.put("huge", 5, size=101)
+
+    clock.now += 11
+    assert cache.get("big") is None
+    stats = cache.stats()
+    assert stats["expirations"] == 1 and stats["evictions"] >= 2
+
+
+def test_query_cache_hit_and_bypass():
+    """相同查询命中缓存，no_cache 强制回源"""
+    fake = FakePrometheus()
+    manager = fake.manager()
+    use_manager(manager, CacheConfig(resolution=60))
+
+    async def run():
+        await prometheus_server.prom_query({"query": "up", "time": "1700000010"})
+        await prometheus_server.prom_query({"query": " up ", "time": "1700000035"})
+        assert len(fake.requests) == 1
+        assert fake.requests[0].url.params["time"] == "1699999980"
+
+        await prometheus_server.prom_node_cpu_usage({})
+        await prometheus_server.prom_node_cpu_usage({})
+        assert len(fake.requests) == 2
+
+        await prometheus_server.prom_node_cpu_usage({"no_cache": True})
+        assert len(fake.requests) == 3
+
+        stats = prometheus_server.query_cache.stats()
+        assert stats["hits"] == 2 and stats["bypassed"] == 1
+        await manager.aclose()
+
+    asyncio.run(run())
+
+
+def test_range_cache_incremental():
+    """重复的滑动窗口查询只回源尾部，合并结果与全量查询一致"""
+    clock = FakeClock(1700003700)
+    cache = RangeResultCache(RangeCacheConfig(max_freshness=60), clock=clock)
+    source = FakeRangeSource()
+
+    async def run():
+        end = clock.now
+        first = await cache.query_range("up", end - 3600, end, 15, source)
+        assert len(source.calls) == 1
+
+        # 完全命中：缓存只覆盖到 now - 60s，之后的部分仍需回源
+        again = await cache.query_range("up", end - 3600, end - 60, 15, source)
+        assert len(source.calls) == 1
+        assert again["result"][0]["values"] == first["result"][0]["values"][:-4]
+
+        # 滑动 5 分钟：只回源缺失的尾部
+        clock.now += 300
+        end = clock.now
+        shifted = await cache.query_range("up", end - 3600, end, 15, source)
+        tail_start, tail_end, _ = source.calls[-1]
+        assert len(source.calls) == 2
+        assert tail_start == 1700003655 and tail_end == end
+
+        expected = await source("up", end - 3600, end, 15)
+        assert shifted == expected
+
+        # 向前扩展：只回源缺失的头部
+        await cache.query_range("up", end - 7200, end - 3600, 15, source)
+        assert source.calls[-1][:2] == (end - 7200, 1700000085)
+
+    asyncio.run(run())
+    stats = cache.stats()
+    assert stats["misses"] == 1 and stats["hits"] == 1 and stats["partial_hits"] == 2
+
+
+def test_range_cache_alignment_and_bounds():
+    """窗口按 step 对齐，条目数和样本数受限"""
+    clock = FakeClock(1700100000)
+    cache = RangeResultCache(RangeCacheConfig(max_entries=2, max_freshness=0), clock=clock)
+    source = FakeRangeSource(series=1)
+
+    async def run():
+        await cache.query_range("up", 1700000007, 1700000100, 15, source)
+        assert source.calls[0] == (1699999995, 1700000100, 15)
+        await cache.query_range("a", 1700000000, 1700000100, 15, source)
+        await cache.query_range("b", 1700000000, 1700000100, 15, source)
+        assert len(cache) == 2
+        assert cache.total_samples == 2 * 8
+
+    asyncio.run(run())
+    assert cache.stats()["evictions"] == 1
+
+
+def test_prom_query_range_uses_cache():
+    """prom_query_range 重复查询不再回源"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        start = parse_timestamp(request.url.params["start"])
+        end = parse_timestamp(request.url.params["end"])
+        return httpx.Response(200, json={
+            "status": "success",
+            "data": {"resultType": "matrix", "result": [
+                {"metric": {"__name__": "up"}, "values": [[start, "1"], [end, "1"]]}
+            ]}
+        })
+
+    fake = FakePrometheus(handler)
+    manager = fake.manager()
+    use_manager(manager)
+
+    async def run():
+        args = {"query": "up", "start": "2023-11-14T00:00:00Z", "end": "2023-11-14T01:00:00Z", "step": "1m"}
+        await prometheus_server.prom_query_range(args)
+        result = await prometheus_server.prom_query_range(args)
+        assert len(fake.requests) == 1
+        assert fake.requests[0].url.params["step"] == "60"
+        assert "数据点数：2" in result[0].text
+        assert "统计：min=1.0 max=1.0 avg=1.0 last=1.0" in result[0].text
+
+        await prometheus_server.prom_query_range({**args, "no_cache": True})
+        assert len(fake.requests) == 2
+        await manager.aclose()
+
+    asyncio.run(run())
+
+
+def test_split_range_points():
+    """分片边界落在采样网格上，既不重叠也不遗漏"""
+    start, end, step = 1700000007, 1700086407, 15
+    shards = split_range(start, end, step, 3600)
+    assert len(shards) == 25
+    points = []
+    for shard_start, shard_end in shards:
+        ts = shard_start
+        while ts <= shard_end:
+            points.append(ts)
+            ts += step
+    expected = list(range(start, end + 1, step))
+    assert points == expected
+
+
+def test_splitter_parallel_and_retry():
+    """24h 查询拆分并发执行，受并发上限约束，瞬时错误按分片重试"""
+    source = FakeRangeSource()
+    in_flight = {"now": 0, "max": 0}
+    failed_once = set()
+
+    async def flaky(query, start, end, step):
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        try:
+            await asyncio.sleep(0.001)
+            if start not in failed_once and len(failed_once) < 3:
+                failed_once.add(start)
+                raise httpx.ConnectError("connection reset")
+            return await source(query, start, end, step)
+        finally:
+            in_flight["now"] -= 1
+
+    splitter = RangeQuerySplitter(SplitConfig(interval=3600, max_concurrency=4, retry_backoff=0))
+
+    async def run():
+        end = 1700086400
+        merged = await splitter.query_range("up", end - 86400, end, 15, flaky)
+        expected = await source("up", end - 86400, end, 15)
+        assert merged == expected
+
+    asyncio.run(run())
+    assert in_flight["max"] <= 4
+    stats = splitter.stats()
+    assert stats["split_queries"] == 1 and stats["shards_total"] == 25
+    assert stats["shard_retries"] == 3 and stats["shard_failures"] == 0
+
+
+def test_splitter_does_not_retry_bad_query():
+    """查询错误（4xx）不重试，直接失败"""
+    calls = []
+
+    async def bad(query, start, end, step):
+        calls.append(start)
+        request = httpx.Request("GET", "http://prometheus/api/v1/query_range")
+        raise httpx.HTTPStatusError("bad_data", request=request,
+                                    response=httpx.Response(400, request=request))
+
+    splitter = RangeQuerySplitter(SplitConfig(interval=3600, max_concurrency=1, retry_backoff=0))
+
+    async def run():
+        try:
+            await splitter.query_range("up{", 0, 7200, 60, bad)
+        except httpx.HTTPStatusError:
+            pass
+        else:
+            raise AssertionError("未抛出异常")
+
+    asyncio.run(run())
+    assert len(calls) == 1
+    assert splitter.stats()["shard_retries"] == 0
+
+
+def test_columnar_series_decode():
+    """字符串样本解码为 float64 数组，特殊值按 IEEE 754 处理"""
+    series = ColumnarSeries.from_result({
+        "metric": {"__name__": "up", "job": "node"},
+        "values": [[1700000000, "1.5"], [1700000015, "NaN"], [1700000030, "+Inf"]]
+    })
+    assert series.labels == (("__name__", "up"), ("job", "node"))
+    assert series.timestamps.dtype == np.float64 and series.values.dtype == np.float64
+    assert series.values[0] == 1.5 and np.isnan(series.values[1]) and np.isinf(series.values[2])
+    assert series.to_values()[2] == [1700000030.0, "+Inf"]
+
+
+def test_series_matrix_summary():
+    """矩阵按时间戳并集对齐，缺失点为 NaN，统计忽略缺失点"""
+    matrix = SeriesMatrix.from_result([
+        {"metric": {"pod": "a"}, "values": [[0, "1"], [15, "3"], [30, "2"]]},
+        {"metric": {"pod": "b"}, "values": [[15, "10"]]},
+        {"metric": {"pod": "c"}, "values": []},
+    ])
+    assert matrix.shape == (3, 3)
+    assert np.isnan(matrix.values[1, 0]) and matrix.values[1, 1] == 10
+
+    summary = matrix.summary()
+    assert list(summary["count"]) == [3, 1, 0]
+    assert summary["min"][0] == 1 and summary["max"][0] == 3 and summary["mean"][0] == 2
+    assert summary["last"][0] == 2 and summary["last"][1] == 10
+    assert np.isnan(summary["mean"][2]) and np.isnan(summary["last"][2])
+
+    assert matrix.to_result([1]) == [{"metric": {"pod": "b"}, "values": [[15.0, "10.0"]]}]
+    assert len(matrix.select(summary["count"] > 0)) == 2
+
+
+def test_stream_parser_chunk_boundaries():
+    """任意位置切分的字节流解析结果与整体解析一致"""
+    body = json.dumps({
+        "status": "success",
+        "data": [{"__name__": "up", "pod": "数据库-0"}, 12.5, "a]b", {"nested": [1, 2]}, 1700000000],
+        "warnings": ["x"]
+    }, ensure_ascii=False).encode()
+
+    async def chunks(size):
+        for i in range(0, len(body), size):
+            yield body[i:i + size]
+
+    async def collect(size):
+        return [item async for item in iter_json_array(chunks(size), "data")]
+
+    expected = json.loads(body)["data"]
+    for size in (1, 2, 3, 7, len(body)):
+        assert asyncio.run(collect(size)) == expected
+
+
+def test_stream_parser_errors():
+    """非 success 状态和中途截断的响应都会报错"""
+    parser = JsonArrayStreamParser("data")
+    parser.feed('{"status":"error","errorType":"bad_data","error":"parse error"}')
+    try:
+        parser.close()
+        assert False, "应当抛出异常"
+    except Exception as e:
+        assert "parse error" in str(e)
+
+    parser = JsonArrayStreamParser("result")
+    assert parser.feed('{"status":"success","data":{"result":[{"a":1},{"b"') == [{"a": 1}]
+    try:
+        parser.close()
+        assert False, "应当抛出异常"
+    except ValueError:
+        pass
+
+
+def test_prom_get_series_stream_limit():
+    """达到 limit 后停止读取剩余响应，序列过滤在读取时生效"""
+    sent = []
+
+    async def body():
+        yield b'{"status":"success","data":['
+        for i in range(10000):
+            sent.append(i)
+            prefix = b"," if i else b""
+            yield prefix + json.dumps({"__name__": "up", "pod": f"pod-{i}", "ns": f"ns-{i % 2}"}).encode()
+        yield b"]}"
+
+    fake = FakePrometheus(lambda request: httpx.Response(200, content=body()))
+    use_manager(fake.manager())
+
+    result = asyncio.run(prometheus_server.prom_get_series({
+        "match": ["up"], "limit": 5, "series_filter": {"ns": "ns-1"}
+    }))
+    text = result[0].text
+    assert "数量：5（已达到上限 5" in text
+    assert "pod-9" in text and "pod-0'" not in text
+    assert len(sent) < 100
+
+    # 流式读取同样经过并发限制和熔断：提前结束后归还名额，熔断期间不发送请求
+    guard = prometheus_server.prometheus_guard
+    assert guard.limiter.inflight == 0 and guard.limiter.increases == 1
+    for _ in range(guard.config.failure_threshold):
+        guard.breaker.record_failure()
+    requests = len(fake.requests)
+    text = asyncio.run(prometheus_server.call_tool("prom_get_series", {"match": ["up"], "limit": 5}))[0].text
+    assert "❌ 执行失败" in text and "熔断" in text
+    assert len(fake.requests) == requests
+
+
+def test_prom_query_batch():
+    """批量查询去重、并发受限，单条错误不影响其它查询"""
+    in_flight = 0
+    peak = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        query = request.url.params["query"]
+        if query == "bad(":
+            return httpx.Response(400, json={"status": "error", "error": "parse error"})
+        return httpx.Response(200, json={"status": "success", "data": {
+            "resultType": "vector", "result": [{"metric": {"q": query}, "value": [1700000000, "1"]}]
+        }})
+
+    fake = FakePrometheus(handler)
+    use_manager(fake.manager())
+    prometheus_server.batch_runner = BatchQueryRunner(BatchConfig(max_concurrency=2))
+
+    queries = [{"name": f"m{i}", "query": f"metric_{i % 4}"} for i in range(8)]
+    queries.append({"name": "dup", "query": "sum( metric_0 )"})
+    queries.append({"name": "dup2", "query": "sum(metric_0)"})
+    queries.append({"name": "bad", "query": "bad("})
+    result = asyncio.run(prometheus_server.prom_query_batch({"queries": queries, "no_cache": True}))
+    payload = json.loads(result[0].text.split("```json\n")[1].split("\n```")[0])
+
+    assert payload["total"] == 11 and payload["unique"] == 6 and payload["failed"] == 1
+    assert len(fake.requests) == 6 and peak <= 2
+    by_name = {item["name"]: item for item in payload["results"]}
+    assert by_name["m5"]["data"]["result"][0]["metric"]["q"] == "metric_1"
+    assert by_name["dup2"]["data"] == by_name["dup"]["data"]
+    assert by_name["bad"]["status"] == "error" and "400" in by_name["bad"]["error"]
+    assert prometheus_server.batch_runner.stats()["queries_deduplicated"] == 5
+
+
+def test_prom_query_batch_compacts_and_guards_cost():
+    """批量查询逐条做代价检查（拒绝只影响该条）；范围结果降采样，序列数超过上限时截断"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/status/tsdb"):
+            return httpx.Response(200, json={"status": "success", "data": {"headStats": {"numSeries": 1000000}}})
+        if request.url.path.endswith("/series"):
+            count = 5000 if "big" in request.url.params["match[]"] else 3
+            body = ",".join(json.dumps({"__name__": "x", "i": str(i)}) for i in range(count))
+            return httpx.Response(200, content=f'{{"status":"success","data":[{body}]}}'.encode())
+        if request.url.path.endswith("/query_range"):
+            start, end = int(request.url.params["start"]), int(request.url.params["end"])
+            values = [[ts, str(ts // 60 % 7)] for ts in range(start, end + 1, 60)]
+            return httpx.Response(200, json={"status": "success", "data": {
+                "resultType": "matrix", "result": [{"metric": {"i": str(i)}, "values": values} for i in range(3)]
+            }})
+        return FakePrometheus.default_handler(request)
+
+    fake = FakePrometheus(handler)
+    use_manager(fake.manager())
+    prometheus_server.cost_guard = QueryCostGuard(CostConfig(max_series=1000))
+    queries = [
+        {"name": "range", "query": "small_metric", "start": "1700000000", "end": "1700011940", "step": "1m"},
+        {"name": "big", "query": 'big_metric{job="a"}'},
+    ]
+    result = asyncio.run(prometheus_server.prom_query_batch({
+        "queries": queries, "points": 10, "max_series": 2, "no_cache": True
+    }))
+    payload = json.loads(result[0].text.split("```json\n")[1].split("\n```")[0])
+    by_name = {item["name"]: item for item in payload["results"]}
+
+    data = by_name["range"]["data"]
+    assert data["series"] == 3 and data["truncated"] and len(data["result"]) == 2
+    assert all(r["points"] == 200 and len(r["values"]) == 10 for r in data["result"])
+    assert data["result"][0]["values"][0] == [1700000000, "0"]
+    assert by_name["big"]["status"] == "error" and "超过上限 1000" in by_name["big"]["error"]
+    assert not any(r.url.path.endswith("/query") for r in fake.requests)
+
+
+def test_single_flight_collapses_inflight_requests():
+    """相同请求进行中时只发送一次 HTTP 请求，完成后不缓存"""
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0.02)
+        return FakePrometheus.default_handler(request)
+
+    fake = FakePrometheus(handler)
+    use_manager(fake.manager())
+
+    async def run():
+        calls = [prometheus_server.prom_query({"query": "up", "no_cache": True}) for _ in range(20)]
+        calls.append(prometheus_server.prom_query({"query": "up == 1", "no_cache": True}))
+        results = await asyncio.gather(*calls)
+        assert all("结果数量：1" in r[0].text for r in results)
+        await prometheus_server.prom_query({"query": "up", "no_cache": True})
+
+    asyncio.run(run())
+    assert len(fake.requests) == 3
+    stats = prometheus_server.single_flight.stats()
+    assert stats["collapsed"] == 19 and stats["executed"] == 3 and stats["inflight"] == 0
+
+
+def test_single_flight_errors_and_cancellation():
+    """失败结果共享给所有等待者，单个等待者取消不影响其它调用方"""
+    flight = SingleFlight()
+    calls = 0
+
+    async def fail():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def slow():
+        await asyncio.sleep(0.02)
+        return "ok"
+
+    async def run():
+        results = await asyncio.gather(*(flight.do("k", fail) for _ in range(3)), return_exceptions=True)
+        assert calls == 1 and all(isinstance(r, RuntimeError) for r in results)
+
+        first = asyncio.ensure_future(flight.do("s", slow))
+        second = asyncio.ensure_future(flight.do("s", slow))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == "ok"
+
+    asyncio.run(run())
+
+
+def test_sorted_index_lookup():
+    """前缀查找按字典序返回，模糊查找依次包含前缀、子串和相似匹配"""
+    index = SortedIndex(["node_cpu_seconds_total", "node_memory_MemTotal_bytes",
+                         "container_cpu_usage_seconds_total", "up", "node_cpu_guest_seconds_total"])
+    assert index.prefix("node_cpu") == ["node_cpu_guest_seconds_total", "node_cpu_seconds_total"]
+    assert index.prefix("node_", limit=1) == ["node_cpu_guest_seconds_total"]
+    assert "up" in index and "down" not in index
+
+    fuzzy = index.fuzzy("cpu_usage")
+    assert fuzzy[0] == "container_cpu_usage_seconds_total"
+    assert "node_memory_MemTotal_bytes" in index.fuzzy("node_memory_memtotal_byte")
+    assert index.add(["up", "zz"]) == 1 and len(index) == 6
+
+
+def test_metric_catalog_tools_and_incremental_refresh():
+    """元数据只在首次加载时拉取，标签值刷新时按 start 增量拉取"""
+    metadata = {
+        "up": [{"type": "gauge", "help": "Target up", "unit": ""}],
+        "http_requests_total": [{"type": "counter", "help": "Requests", "unit": ""}],
+    }
+    namespaces = ["default", "kube-system", "prod-a"]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/metadata"):
+            return httpx.Response(200, json={"status": "success", "data": metadata})
+        values = namespaces
+        if "start" in request.url.params:
+            values = ["prod-b"]
+        return httpx.Response(200, json={"status": "success", "data": values})
+
+    fake = FakePrometheus(handler)
+    use_manager(fake.manager())
+    catalog = prometheus_server.metric_catalog = MetricCatalog(CatalogConfig(refresh_interval=3600))
+
+    async def run():
+        text = (await prometheus_server.prom_get_metric_metadata({"metric": "up"}))[0].text
+        assert "类型：gauge" in text
+        text = (await prometheus_server.prom_get_metric_metadata({"metric": "http_request_total"}))[0].text
+        assert "未找到" in text and "http_requests_total" in text
+        text = (await prometheus_server.prom_search_metrics({"pattern": "http"}))[0].text
+        assert "http_requests_total (counter)" in text
+
+        for _ in range(3):
+            text = (await prometheus_server.prom_get_label_values({"label": "namespace", "prefix": "prod"}))[0].text
+            assert "数量：1" in text and "prod-a" in text
+
+        # 第一次刷新为全量同步，之后为增量
+        metadata["node_load1"] = [{"type": "gauge", "help": "Load", "unit": ""}]
+        changes = await catalog.refresh()
+        assert changes["added"] == 1 and changes["label_values_added"] == 0
+        changes = await catalog.refresh()
+        assert changes["label_values_added"] == 1
+        assert "start" in fake.requests[-1].url.params
+        assert catalog.labels["namespace"].prefix("prod") == ["prod-a", "prod-b"]
+        await catalog.stop()
+
+    asyncio.run(run())
+    paths = [r.url.path for r in fake.requests]
+    assert paths.count("/api/v1/metadata") == 3
+    assert paths.count("/api/v1/label/namespace/values") == 3
+
+
+def test_metric_catalog_ignores_stale_payload():
+    """熔断期间返回的旧元数据：stale 字段不被当作指标，已有索引时跳过本轮刷新"""
+    payloads = [
+        {"up": [{"type": "gauge", "help": "Target up", "unit": ""}], "broken": 1,
+         "stale": True, "stale_age": 12.0},
+        {"up": [{"type": "gauge", "help": "Target up", "unit": ""}], "node_load1": [{"type": "gauge"}],
+         "stale": True, "stale_age": 30.0},
+    ]
+
+    async def fetch(endpoint, params):
+        return payloads.pop(0) if endpoint == "metadata" else []
+
+    catalog = MetricCatalog(CatalogConfig(refresh_interval=3600))
+
+    async def run():
+        await catalog.ensure_loaded(fetch)
+        assert sorted(catalog.metadata) == ["up"]
+        assert catalog.metrics.prefix("sta") == [] and catalog.metrics.prefix("bro") == []
+        changes = await catalog.refresh()
+        assert changes["added"] == 0 and "node_load1" not in catalog.metadata
+        await catalog.stop()
+
+    asyncio.run(run())
+
+
+def test_downsample_keeps_extremes():
+    """降采样结果不超过预算，并保留尖峰和谷底"""
+    timestamps = np.arange(1000, dtype=np.float64) * 15
+    values = np.sin(np.arange(1000) / 50.0)
+    values[437] = 25.0
+    values[803] = -25.0
+
+    for fn, budget in ((lttb_indices, 20), (minmax_indices, 20)):
+        indices = fn(timestamps, values, budget)
+        assert len(indices) <= budget
+        assert indices[0] == 0 and indices[-1] == 999
+        assert np.all(np.diff(indices) > 0)
+        assert 437 in indices and 803 in indices
+
+    assert len(lttb_indices(timestamps[:10], values[:10], 20)) == 10
+
+
+def test_prom_query_range_downsampled_output():
+    """prom_query_range 输出固定点数，中间的尖峰不会被丢弃"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        values = [[1700000000 + i * 15, "1"] for i in range(200)]
+        values[100][1] = "99"
+        return httpx.Response(200, json={"status": "success", "data": {
+            "resultType": "matrix", "result": [{"metric": {"__name__": "up"}, "values": values}]
+        }})
+
+    use_manager(FakePrometheus(handler).manager())
+    result = asyncio.run(prometheus_server.prom_query_range({
+        "query": "up", "start": "1700000000", "end": "1700002985", "step": "15s", "no_cache": True
+    }))
+    text = result[0].text
+    assert "采样：LTTB 20/200 点" in text
+    assert f"[{1700000000 + 100 * 15}] 99" in text
+    assert text.count("] 1\n") == 19
+
+
+def test_adaptive_limiter_aimd():
+    """延迟稳定时上限缓慢增加，变慢或过载时乘性减少，并发不超过上限"""
+    clock = FakeClock()
+    guard = PrometheusGuard(ResilienceConfig(initial_limit=2, max_limit=3, backoff_ratio=0.5), clock)
+    limiter = guard.limiter
+    in_flight = 0
+    peak = 0
+
+    async def request():
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.005)
+        in_flight -= 1
+        return {"ok": True}
+
+    async def run():
+        await asyncio.gather(*(guard.call(("q", i), request) for i in range(20)))
+
+    asyncio.run(run())
+    assert 2 <= peak <= 3 and limiter.limit == 3 and limiter.decreases == 0
+
+    async def slow_release():
+        await limiter.acquire()
+        await limiter.release(10.0, overloaded=False)
+
+    before = limiter.limit
+    asyncio.run(slow_release())
+    assert limiter.limit == before * 0.5
+
+
+def test_circuit_breaker_serves_last_known_good():
+    """连续失败后熔断并快速失败，有历史结果时返回 stale 结果，冷却后探测恢复"""
+    clock = FakeClock()
+    healthy = True
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if not healthy:
+            return httpx.Response(503, text="overloaded")
+        return FakePrometheus.default_handler(request)
+
+    fake = FakePrometheus(handler)
+    use_manager(fake.manager(), CacheConfig(enabled=False))
+    guard = prometheus_server.prometheus_guard = PrometheusGuard(
+        ResilienceConfig(failure_threshold=2, reset_timeout=30), clock
+    )
+
+    async def run():
+        nonlocal healthy
+        await prometheus_server.prom_query({"query": "up"})
+        healthy = False
+        clock.now += 10
+        text = (await prometheus_server.prom_query({"query": "up"}))[0].text
+        assert "10.0s 前的结果" in text and "值：1" in text
+
+        text = (await prometheus_server.call_tool("prom_query", {"query": "down"}))[0].text
+        assert "❌ 执行失败" in text and "503" in text
+        assert guard.breaker.state == "open"
+
+        # 熔断期间不再发送请求
+        sent = len(fake.requests)
+        text = (await prometheus_server.call_tool("prom_query", {"query": "up"}))[0].text
+        assert "前的结果" in text
+        text = (await prometheus_server.call_tool("prom_query", {"query": "other"}))[0].text
+        assert "熔断" in text
+        assert len(fake.requests) == sent
+
+        healthy = True
+        clock.now += 31
+        text = (await prometheus_server.prom_query({"query": "other"}))[0].text
+        assert "结果数量：1" in text and guard.breaker.state == "closed"
+
+    asyncio.run(run())
+    assert guard.stats()["breaker"]["opened"] == 1
+
+
+def test_last_known_good_with_query_cache():
+    """启用查询缓存时评估时间对齐到新的区间，Prometheus 故障时仍返回上次的结果"""
+    clock = FakeClock()
+    healthy = True
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if not healthy:
+            return httpx.Response(503, text="overloaded")
+        return FakePrometheus.default_handler(request)
+
+    fake = FakePrometheus(handler)
+    use_manager(fake.manager(), CacheConfig(enabled=True))
+    guard = prometheus_server.prometheus_guard = PrometheusGuard(ResilienceConfig(failure_threshold=5), clock)
+
+    async def run():
+        nonlocal healthy
+        await prometheus_server.prom_query({"query": "up", "time": "1700000000"})
+        healthy = False
+        clock.now += 20
+        text = (await prometheus_server.call_tool("prom_query", {"query": "up", "time": "1700000600"}))[0].text
+        assert "20.0s 前的结果" in text and "值：1" in text
+
+    asyncio.run(run())
+    times = [request.url.params["time"] for request in fake.requests]
+    assert len(set(times)) == 2 and guard.stale_served == 1
+
+
+def test_adaptive_limiter_baseline_per_category():
+    """重的范围查询与轻的即时查询分别维护基线，混合负载下上限不会一路下降"""
+    limiter = PrometheusGuard(ResilienceConfig(initial_limit=10)).limiter
+
+    async def run():
+        for _ in range(50):
+            for category, latency in (("query", 0.01), ("query_range:10", 2.0)):
+                await limiter.acquire()
+                await limiter.release(latency, overloaded=False, category=category)
+
+    asyncio.run(run())
+    assert limiter.decreases == 0 and limiter.limit > 10
+    assert limiter.stats()["baseline_latency"] == {"query": 0.01, "query_range:10": 2.0}
+    assert latency_class("query_range", {"start": "0", "end": "3600", "step": "15"}) == "query_range:7"
+    assert latency_class("query", {"query": "up"}) == "query:instant"
+    assert latency_class("query", {"query": "rate(x[5m])"}) == "query:8"
+    assert latency_class("query", {"query": "max_over_time(rate(x[5m])[1h:1m])"}) == "query:11"
+    assert last_good_key("http://p", "query", {"query": "up", "time": "1"}) == \
+        last_good_key("http://p", "query", {"query": "up", "time": "2"})
+    assert last_good_key("http://p", "query_range", {"query": "up", "start": "0", "end": "60", "step": "15"}) != \
+        last_good_key("http://p", "query_range", {"query": "up", "start": "0", "end": "120", "step": "15"})
+
+
+def test_adaptive_limiter_stable_under_healthy_jitter():
+    """健康但延迟抖动的服务端不会被逐步限流；同一窗口内的多个慢请求只减少一次"""
+    clock = FakeClock()
+    limiter = PrometheusGuard(ResilienceConfig(initial_limit=10), clock).limiter
+    latencies = np.random.default_rng(7).uniform(0.005, 0.1, 500)
+
+    async def run():
+        for latency in latencies:
+            await limiter.acquire()
+            clock.now += latency
+            await limiter.release(latency, overloaded=False, category="query:instant")
+        assert limiter.decreases == 0 and limiter.limit > 10
+
+        before = limiter.limit
+        for _ in range(8):
+            await limiter.acquire()
+        clock.now += 5
+        for _ in range(8):
+            await limiter.release(5.0, overloaded=True, category="query:instant")
+        assert limiter.decreases == 1 and limiter.limit == before * 0.7
+
+    asyncio.run(run())
+
+
+def test_queue_timeout_serves_last_known_good():
+    """排队超时按过载处理：计入熔断，有历史结果时返回 stale 结果，否则报错"""
+    guard = PrometheusGuard(ResilienceConfig(initial_limit=1, max_limit=1, max_wait=0.05))
+    release = asyncio.Event()
+
+    async def blocked():
+        await release.wait()
+        return {"value": "slow"}
+
+    async def run():
+        await guard.call("up", lambda: asyncio.sleep(0, {"value": 1}))
+        holder = asyncio.ensure_future(guard.call("other", blocked))
+        await asyncio.sleep(0)
+        result = await guard.call("up", lambda: asyncio.sleep(0, {"value": 2}))
+        assert result["stale"] is True and result["value"] == 1
+        try:
+            await guard.call("new", lambda: asyncio.sleep(0, {"value": 3}))
+            assert False, "没有历史结果时应报错"
+        except Exception as e:
+            assert "排队超过 0.05s" in str(e)
+        assert guard.breaker.consecutive_failures == 2
+        release.set()
+        await holder
+
+    asyncio.run(run())
+    assert guard.limiter.rejected == 2 and guard.stale_served == 1
+
+
+def test_snapshot_collector_serves_predefined_tools():
+    """快照未过期时工具直接过滤快照，过期后回退到实时查询"""
+    clock = FakeClock(1700000000)
+    collector = SnapshotCollector(SnapshotConfig(enabled=True, history=3, max_age=60), clock)
+    shared = prometheus_server.snapshot_collector
+    for name, query in shared.queries.items():
+        collector.register(name, query)
+    prometheus_server.snapshot_collector = collector
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        query = request.url.params["query"]
+        if "_bucket" in query:
+            # api 的请求全部落在 (10, 15] 桶，web 全部落在 (0.1, 0.5] 桶
+            result = [
+                {"metric": {"service": service, "le": le}, "value": [1700000000, count]}
+                for service, counts in (("api", ("0", "0", "0", "4", "4")), ("web", ("0", "4", "4", "4", "4")))
+                for le, count in zip(("0.1", "0.5", "10", "15", "+Inf"), counts)
+            ]
+            return httpx.Response(200, json={"status": "success", "data": {"resultType": "vector", "result": result}})
+        label = "service" if "http_" in query else "instance"
+        return httpx.Response(200, json={"status": "success", "data": {"resultType": "vector", "result": [
+            {"metric": {label: "node-a" if label == "instance" else "api"}, "value": [1700000000, "12.5"]},
+            {"metric": {label: "node-b" if label == "instance" else "web"}, "value": [1700000000, "0.25"]},
+        ]}})
+
+    fake = FakePrometheus(handler)
+    use_manager(fake.manager())
+
+    async def run():
+        for _ in range(4):
+            assert await collector.collect_once(prometheus_server.evaluate_snapshot_query) == 6
+        assert len(fake.requests) == 24 and len(collector.history("node_cpu")) == 3
+
+        clock.now += 20
+        text = (await prometheus_server.prom_node_cpu_usage({"node": "node-b"}))[0].text
+        assert "快照，20s 前采集" in text and "node-b: 0.25%" in text and "node-a" not in text
+        text = (await prometheus_server.prom_service_latency({"service": "api", "percentile": "p90"}))[0].text
+        assert "14500.00ms" in text and "460.00ms" not in text
+        assert len(fake.requests) == 24
+
+        clock.now += 60
+        text = (await prometheus_server.prom_node_cpu_usage({}))[0].text
+        assert "快照" not in text and len(fake.requests) == 25
+
+    try:
+        asyncio.run(run())
+    finally:
+        prometheus_server.snapshot_collector = shared
+    stats = collector.stats()
+    assert stats["served"] == 2 and stats["stale_misses"] == 1
+
+
+def test_prom_query_multi_fan_out():
+    """多实例并发查询，结果带实例标签，慢实例超时不影响其它实例"""
+    async def handler(request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        if host == "prom-slow":
+            await asyncio.sleep(1)
+        if host == "prom-down":
+            return httpx.Response(400, json={"status": "error", "error": "bad"})
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json={"status": "success", "data": {"resultType": "vector", "result": [
+            {"metric": {"__name__": "up", "job": host}, "value": [1700000000, "1"]}
+        ]}})
+
+    use_manager(FakePrometheus(handler).manager())
+    endpoints = parse_endpoints(
+        "bj=http://prom-bj:9090/, sh=http://prom-sh:9090,slow=http://prom-slow:9090|0.2,down=http://prom-down:9090"
+    )
+    assert endpoints[0].url == "http://prom-bj:9090" and endpoints[2].timeout == 0.2
+    prometheus_server.prometheus_fanout = PrometheusFanOut(FanOutConfig(endpoints=endpoints, timeout=5))
+
+    async def run():
+        started = asyncio.get_running_loop().time()
+        text = (await prometheus_server.prom_query_multi({"query": "up"}))[0].text
+        assert asyncio.get_running_loop().time() - started < 0.5
+        return text
+
+    text = asyncio.run(run())
+    assert "结果数量：2（部分实例失败" in text
+    assert "[bj] up" in text and "[sh] up" in text and "job: prom-sh" in text
+    assert "✅ bj" in text and "❌ slow" in text and "超时" in text and "❌ down" in text
+
+    text = asyncio.run(prometheus_server.prom_query_multi({"query": "up", "endpoints": ["sh"]}))[0].text
+    assert "结果数量：1\n" in text and "[bj]" not in text
+    try:
+        prometheus_server.prometheus_fanout.resolve(["nope"], "http://x")
+        assert False, "应当抛出异常"
+    except ValueError:
+        pass
+
+
+def test_extract_selectors():
+    """提取向量选择器时跳过函数、聚合分组标签、时长和字符串"""
+    query = ('sum by (pod) (rate(http_requests_total{code=~"5..", path="/a}"}[5m] offset 1h)) '
+             '/ on(pod) group_left count without (x) (up) > 1e3 and {__name__="kube_pod_info"}')
+    assert extract_selectors(query) == [
+        'http_requests_total{code=~"5..", path="/a}"}', "up", '{__name__="kube_pod_info"}'
+    ]
+    assert extract_selectors("vector(1) + time()") == []
+    assert widen_step(0, 86400, 15, 1000) == 90
+    assert widen_step(0, 3600, 15, 11000) == 15
+
+
+def test_cost_guard_policies():
+    """序列数超限时注入 topk 或拒绝，样本数超限时放大 step；计数带缓存"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/status/tsdb"):
+            return httpx.Response(200, json={"status": "success", "data": {
+                "headStats": {"numSeries": 1000000},
+                "seriesCountByMetricName": [{"name": "container_cpu_usage_seconds_total", "value": 80000}]
+            }})
+        if request.url.path.endswith("/series"):
+            match = request.url.params["match[]"]
+            count = 5000 if "big" in match else 3
+            body = ",".join(json.dumps({"__name__": "x", "i": str(i)}) for i in range(count))
+            return httpx.Response(200, content=f'{{"status":"success","data":[{body}]}}'.encode())
+        query = request.url.params["query"]
+        return httpx.Response(200, json={"status": "success", "data": {
+            "resultType": "matrix" if "step" in request.url.params else "vector",
+            "result": [{"metric": {"q": query}, "value": [1, "1"], "values": [[1, "1"]]}]
+        }})
+
+    fake = FakePrometheus(handler)
+    use_manager(fake.manager())
+    config = CostConfig(max_series=1000, max_samples=100000, topk_limit=10, series_action="topk")
+    guard = prometheus_server.cost_guard = QueryCostGuard(config)
+
+    async def run():
+        text = (await prometheus_server.prom_query({"query": "sum(rate(container_cpu_usage_seconds_total[5m])) by (pod)"}))[0].text
+        assert "80000 条序列" in text and "q: topk(10, sum(rate(" in text
+
+        before = len(fake.requests)
+        text = (await prometheus_server.prom_query({"query": 'rate(big_metric{job="a"}[5m])'}))[0].text
+        assert "1001+ 条序列" in text
+        await prometheus_server.prom_query({"query": 'rate(big_metric{job="a"}[1m])'})
+        series_calls = [r for r in fake.requests[before:] if r.url.path.endswith("/series")]
+        assert len(series_calls) == 1
+
+        text = (await prometheus_server.prom_query_range({
+            "query": "small_metric", "start": "1700000000", "end": "1700086400", "step": "1s", "no_cache": True
+        }))[0].text
+        assert "step 已从 1s 放大到 8s" in text and "步长：8s" in text
+
+        text = (await prometheus_server.prom_estimate_cost({"query": "small_metric + big_metric{a=\"b\"}"}))[0].text
+        payload = json.loads(text.split("```json\n")[1].split("\n```")[0])
+        assert payload["selectors"] == {"small_metric": 3, 'big_metric{a="b"}': 1001}
+        assert payload["actions"] == ["topk"] and payload["rejected"] is None
+
+        guard.config.series_action = "reject"
+        text = (await prometheus_server.call_tool("prom_query", {"query": 'big_metric{job="a"}'}))[0].text
+        assert "❌ 执行失败" in text and "超过上限 1000" in text
+
+    asyncio.run(run())
+    assert guard.stats()["rejected"] == 1 and guard.stats()["step_widened"] == 1
+
+
+def test_cost_guard_defaults_and_count_window():
+    """默认拒绝超限查询；序列计数缓存按时间窗口区分，范围查询的样本估算不按 topk 缩小"""
+    assert CostConfig().series_action == "reject"
+    clock = FakeClock()
+    guard = QueryCostGuard(CostConfig(max_series=100, max_samples=10_000, count_ttl=300,
+                                      series_action="topk", samples_action="warn"), clock)
+    calls = []
+
+    async def count_series(selector, start, end, cap):
+        calls.append((start, end))
+        return 500
+
+    async def tsdb_status():
+        return {"headStats": {"numSeries": 1_000_000}}
+
+    async def run():
+        await guard.check("rate(x[5m])", count_series, tsdb_status, 0, 3600, 60)
+        await guard.check("rate(x[5m])", count_series, tsdb_status, 10, 3610, 60)
+        estimate = await guard.check("rate(x[5m])", count_series, tsdb_status, 86400, 90000, 60)
+        assert estimate.samples == 500 * 61 and "超过上限" in estimate.notes[-1]
+        await guard.check("x", count_series, tsdb_status)
+        await guard.check("x", count_series, tsdb_status)
+
+    asyncio.run(run())
+    assert calls == [(0, 3600), (86400, 90000), (None, None)]
+
+
+def test_detect_anomalies_ranks_spike_and_shift():
+    """尖峰和均值跳变被检出并排在前面，平稳和常量序列不报"""
+    rng = np.random.default_rng(7)
+    timestamps = 1700000000 + np.arange(200, dtype=np.float64) * 15
+    values = rng.normal(10, 0.5, (20, 200))
+    values[3, 120] = 30          # 尖峰
+    values[7, 100:] += 5         # 均值跳变
+    values[9, ::7] = np.nan      # 缺失点
+    values[11] = 3.0             # 常量
+    matrix = SeriesMatrix([(("__name__", "m"), ("i", str(i))) for i in range(20)], timestamps, values)
+
+    findings = detect_anomalies(matrix)
+    assert [f.metric["i"] for f in findings[:2]] == ["3", "7"]
+    assert all(f.metric["i"] not in ("9", "11") for f in findings)
+    assert findings[0].detectors["zscore"]["timestamps"] == [timestamps[120]]
+    assert findings[1].change_point["timestamp"] == timestamps[100]
+    assert abs(findings[1].change_point["shift"] - 5) < 0.5
+
+    only_cusum = detect_anomalies(matrix, detectors=("cusum",))
+    assert [f.metric["i"] for f in only_cusum] == ["7"]
+
+    stat, index, _ = cusum_change_points(values[[7]])
+    assert index[0] == 100 and stat[0] > 5
+
+
+def test_prom_detect_anomalies_tool():
+    """工具只输出异常序列，未发现异常时给出说明"""
+    def series(i: int, spike: bool) -> dict:
+        values = [[1700000000 + t * 15, str(1 + 0.01 * (t % 3))] for t in range(120)]
+        if spike:
+            values[80][1] = "50"
+        return {"metric": {"__name__": "up", "pod": f"p{i}"}, "values": values}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        spiky = "spiky" in request.url.params["query"]
+        return httpx.Response(200, json={"status": "success", "data": {
+            "resultType": "matrix", "result": [series(i, spiky and i == 2) for i in range(5)]
+        }})
+
+    use_manager(FakePrometheus(handler).manager())
+    args = {"start": "1700000000", "end": "1700001785", "step": "15s", "no_cache": True}
+    text = asyncio.run(prometheus_server.call_tool("prom_detect_anomalies", {"query": "spiky", **args}))[0].text
+    assert "异常序列：1/5" in text
+    assert "up{pod=p2}" in text and f"@ {1700000000 + 80 * 15}" in text
+
+    text = asyncio.run(prometheus_server.call_tool("prom_detect_anomalies", {"query": "flat", **args}))[0].text
+    assert "异常序列：0/5" in text and "未发现异常" in text
+
+
+def test_correlate_lag_and_spearman():
+    """滞后互相关找到领先的候选序列，spearman 对单调变换不敏感"""
+    rng = np.random.default_rng(3)
+    anchor = rng.normal(0, 1, 240).cumsum()
+    values = rng.normal(0, 1, (1000, 240))
+    values[5] = np.roll(anchor, -3) + rng.normal(0, 0.05, 240)   # 领先锚点 3 个点
+    values[6] = np.exp(anchor / 5)                               # 单调变换
+    values[7] = -anchor
+    values[7, ::5] = np.nan
+    matrix = SeriesMatrix([(("i", str(i)),) for i in range(1000)], np.arange(240) * 15.0, values)
+
+    top = {c.metric["i"]: c for c in correlate(anchor, matrix, "pearson", max_lag=10)[:3]}
+    assert set(top) == {"5", "6", "7"}
+    assert top["5"].lag == 3 and top["5"].lag_seconds == 45.0 and top["5"].best > 0.99
+    assert top["7"].lag == 0 and top["7"].best < -0.999 and top["7"].overlap == 192
+
+    spearman = correlate(anchor, matrix, "spearman")
+    assert spearman[0].metric["i"] in ("6", "7") and abs(spearman[0].best) > 0.999
+
+    assert rank_rows(np.array([3, 1, 2, 2, np.nan, 5.0])).tolist()[0][:4] == [4.0, 1.0, 2.5, 2.5]
+
+
+def test_prom_correlate_tool():
+    """锚点与候选一起对齐，输出相关序列及其来源查询"""
+    timestamps = [1700000000 + t * 15 for t in range(60)]
+    anchor = np.sin(np.arange(60) / 5.0)
+
+    def matrix(metric: dict, values) -> dict:
+        return {"metric": metric, "values": [[ts, str(v)] for ts, v in zip(timestamps, values)]}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        query = request.url.params["query"]
+        if query == "errors":
+            result = [matrix({}, anchor)]
+        elif query == "cpu":
+            result = [matrix({"__name__": "cpu", "pod": "a"}, np.roll(anchor, -2) * 10 + 5),
+                      matrix({"__name__": "cpu", "pod": "b"}, np.cos(np.arange(60) * 1.7))]
+        else:
+            result = [matrix({"__name__": "up"}, [1] * 60), matrix({"__name__": "up", "x": "y"}, [1] * 60)]
+        return httpx.Response(200, json={"status": "success", "data": {"resultType": "matrix", "result": result}})
+
+    use_manager(FakePrometheus(handler).manager())
+    args = {"start": "1700000000", "end": "1700000885", "step": "15s", "max_lag": "1m", "no_cache": True}
+    text = asyncio.run(prometheus_server.call_tool("prom_correlate", {
+        "anchor_query": "errors", "candidate_queries": ["cpu", "up"], **args
+    }))[0].text
+    assert "相关序列：1/4" in text
+    assert "cpu{pod=a} r=+1.000（候选领先锚点 30s" in text and "来源：cpu" in text
+
+    text = asyncio.run(prometheus_server.call_tool("prom_correlate", {
+        "anchor_query": "up", "candidate_queries": ["cpu"], **args
+    }))[0].text
+    assert "❌ 执行失败" in text and "需要恰好 1 条" in text
+
+    text = asyncio.run(prometheus_server.call_tool("prom_correlate", {
+        "anchor_query": "errors", "candidate_queries": ["cpu"], **args, "max_lag": "0s"
+    }))[0].text
+    assert "相关序列：" in text and "❌" not in text
+
+
+def test_incident_analyzer_correlation_without_max_lag():
+    """未配置 max_lag 时按零时滞计算，不因解析时长失败而中断"""
+    from skills.sre_incident_analyzer.handler import SREIncidentAnalyzer
+
+    timestamps = [1700000000 + t * 15 for t in range(60)]
+    anchor = np.sin(np.arange(60) / 5.0)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        values = anchor if request.url.params["query"] == "errors" else anchor * 10 + 5
+        metric = {} if request.url.params["query"] == "errors" else {"__name__": "cpu", "pod": "a"}
+        result = [{"metric": metric, "values": [[ts, str(v)] for ts, v in zip(timestamps, values)]}]
+        return httpx.Response(200, json={"status": "success", "data": {"resultType": "matrix", "result": result}})
+
+    use_manager(FakePrometheus(handler).manager())
+    analyzer = SREIncidentAnalyzer()
+    analyzer.config = {"correlation": {"anchor_query": "errors", "candidate_queries": ["cpu"], "step": "15s"}}
+    correlations = asyncio.run(analyzer.correlate_metrics({
+        "alerts": [{"service": "api"}],
+        "time_range": {"start": "2023-11-14T22:13:20+00:00", "end": "2023-11-14T22:28:05+00:00"},
+    }))
+    assert len(correlations) == 1
+    assert correlations[0]["service"] == "api" and correlations[0]["lag_seconds"] == 0
+    assert correlations[0]["coefficient"] == 1.0
+
+
+def test_histogram_quantiles_match_prometheus():
+    """本地分位数与 histogram_quantile 语义一致，范围结果按分组和时间一次算出"""
+    le = np.array([0.1, 0.5, 1.0, np.inf])
+    counts = np.array([[10, 30, 40, 40], [0, 0, 0, 0], [0, 0, 10, 20]], dtype=np.float64)
+    values = histogram_quantiles([0.5, 0.9, 1.5], le, counts)
+    assert values.shape == (3, 3)
+    assert np.allclose(values[:2, 0], [0.3, 0.8]) and values[2, 0] == np.inf
+    assert np.isnan(values[0, 1])
+    assert values[1, 2] == 1.0   # 落在 +Inf 桶时返回最大的有限上界
+    assert np.isnan(histogram_quantiles([0.5], le[:3], counts[:, :3])).all()
+
+    result = [
+        {"metric": {"service": "api", "le": bound}, "values": [[1, str(c1)], [2, str(c2)]]}
+        for bound, c1, c2 in (("0.1", 10, 0), ("0.5", 30, 0), ("1", 40, 40), ("+Inf", 40, 40))
+    ]
+    buckets = buckets_from_matrix(result)
+    assert buckets.counts.shape == (1, 2, 4) and buckets.metric(0) == {"service": "api"}
+    series = histogram_quantiles([0.5], buckets.le, buckets.counts)[0, 0]
+    assert abs(series[0] - 0.3) < 1e-12 and abs(series[1] - 0.75) < 1e-12
+
+
+def test_prom_service_latency_single_bucket_query():
+    """多个百分位共用一次桶查询，重复调用命中缓存"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        result = [
+            {"metric": {"le": le}, "value": [1700000000, count]}
+            for le, count in (("0.05", "50"), ("0.1", "90"), ("0.5", "99"), ("1", "100"), ("+Inf", "100"))
+        ]
+        return httpx.Response(200, json={"status": "success", "data": {"resultType": "vector", "result": result}})
+
+    fake = FakePrometheus(handler)
+    use_manager(fake.manager())
+
+    async def run():
+        text = (await prometheus_server.prom_service_latency(
+            {"service": "api", "percentiles": ["p50", "p90", "p99", "p999"]}
+        ))[0].text
+        assert "(P50/P90/P99/P999)" in text
+        assert "P50 延迟：50.00ms" in text and "P90 延迟：100.00ms" in text
+        assert "P99 延迟：500.00ms" in text and "P999 延迟：950.00ms" in text
+        text = (await prometheus_server.prom_service_latency({"service": "api", "percentile": "p90"}))[0].text
+        assert "延迟：100.00ms" in text and "P50" not in text
+
+    asyncio.run(run())
+    assert len(fake.requests) == 1
+
+
+def test_tsdb_chunk_roundtrip():
+    """压缩后按位还原数值（含 NaN/Inf），时间戳保留毫秒精度；规则序列压缩率高"""
+    rng = np.random.default_rng(5)
+    timestamps = 1700000000 + np.arange(300) * 15.0
+    timestamps[100:] += 0.25                       # 一次抖动
+    values = np.round(rng.normal(50, 5, 300), 1)
+    values[[3, 7]] = [np.nan, np.inf]
+
+    decoded_ts, decoded_values = decode_chunk(encode_chunk(timestamps, values))
+    assert np.array_equal(decoded_ts, timestamps)
+    assert np.array_equal(decoded_values.view(np.uint64), values.view(np.uint64))
+
+    regular = encode_chunk(timestamps[:100], np.full(100, 1.0))
+    assert len(regular) < 100                # 每点不到 1 字节（原始为 16 字节）
+    assert len(decode_chunk(encode_chunk(np.empty(0), np.empty(0)))[0]) == 0
+
+
+def test_freeze_window_and_frozen_query():
+    """冻结后的窗口按标签索引查询，不再访问 Prometheus"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        query = request.url.params["query"]
+        result = [
+            {"metric": {"__name__": query, "pod": f"p{i}", "ns": "prod" if i % 2 else "dev"},
+             "values": [[1700000000 + t * 15, str(i * 100 + t)] for t in range(40)]}
+            for i in range(4)
+        ]
+        return httpx.Response(200, json={"status": "success", "data": {"resultType": "matrix", "result": result}})
+
+    fake = FakePrometheus(handler)
+    use_manager(fake.manager())
+    shared = prometheus_server.mini_tsdb
+    with tempfile.TemporaryDirectory() as root:
+        prometheus_server.mini_tsdb = MiniTSDB(TSDBConfig(path=root))
+        try:
+            text = asyncio.run(prometheus_server.call_tool("prom_freeze_window", {
+                "name": "INC-42", "queries": ["cpu", "mem"],
+                "start": "1700000000", "end": "1700000585", "step": "15s"
+            }))[0].text
+            assert "序列数：8，样本数：320" in text and "压缩比" in text
+            requests = len(fake.requests)
+
+            text = asyncio.run(prometheus_server.call_tool("prom_frozen_query", {
+                "name": "INC-42", "match": {"__name__": "mem", "ns": "prod"}, "series_filter": {"pod": "p[3-9]"},
+                "start": "1700000150", "points": 5
+            }))[0].text
+            assert "结果数量：1" in text and "pod: p3" in text
+            assert "数据点数：30" in text and "min=310.0 max=339.0" in text
+
+            text = asyncio.run(prometheus_server.call_tool("prom_frozen_query", {}))[0].text
+            assert "INC-42: 8 条序列，320 个样本" in text
+            assert len(fake.requests) == requests
+
+            text = asyncio.run(prometheus_server.call_tool("prom_frozen_query", {"name": "../etc"}))[0].text
+            assert "❌ 执行失败" in text and "无效的窗口名称" in text
+        finally:
+            prometheus_server.mini_tsdb.close()
+            prometheus_server.mini_tsdb = shared
+
+
+def test_frozen_window_respects_time_range():
+    """分析器读取冻结窗口时按请求的时间范围裁剪；替换窗口与读取并发时不会读到已关闭的 mmap"""
+    import threading
+    from skills.sre_incident_analyzer.handler import SREIncidentAnalyzer
+    from sre_nanobot.mcp import prom_tsdb
+
+    timestamps = 1700000000 + np.arange(120) * 15.0
+    series = [(ColumnarSeries((("__name__", "cpu"), ("pod", f"p{i}")), timestamps, np.arange(120) + i * 1.0), "cpu")
+              for i in range(3)]
+    shared = prom_tsdb.mini_tsdb
+    with tempfile.TemporaryDirectory() as root:
+        tsdb = prom_tsdb.mini_tsdb = MiniTSDB(TSDBConfig(path=root))
+        try:
+            tsdb.write_block("INC-7", series)
+            selected = []
+            select = tsdb.select
+            tsdb.select = lambda name, **kwargs: selected.extend(result := select(name, **kwargs)) or result
+
+            analyzer = SREIncidentAnalyzer()
+            analyzer.config = {"metrics": {"queries": [{"name": "cpu", "query": "cpu"}], "step": "15s"}}
+            start = datetime.fromtimestamp(1700000300, tz=timezone.utc)
+            end = datetime.fromtimestamp(1700000600, tz=timezone.utc)
+            asyncio.run(analyzer.fetch_metrics(start, end, incident_id="INC-7"))
+            assert len(selected) == 3
+            assert all(len(item) == 21 and item.timestamps[0] == 1700000300 for item in selected)
+
+            stop = threading.Event()
+            writer = threading.Thread(target=lambda: [tsdb.write_block("INC-7", series) for _ in range(20)] and stop.set())
+            writer.start()
+            while not stop.is_set() and writer.is_alive():
+                assert len(select("INC-7", query="cpu")) == 3
+            writer.join()
+
+            # 同名窗口并发写入：各自使用独立的暂存目录，最终是其中一次完整的写入，不留下临时目录
+            writers = [threading.Thread(target=tsdb.write_block, args=("INC-7", series[:n])) for n in (1, 2, 3) * 3]
+            for thread in writers:
+                thread.start()
+            for thread in writers:
+                thread.join()
+            assert len(select("INC-7", query="cpu")) in (1, 2, 3)
+            assert [p.name for p in Path(root).iterdir()] == ["INC-7"]
+        finally:
+            tsdb.close()
+            prom_tsdb.mini_tsdb = shared
+
+
+def test_series_writer_roundtrip():
+    """两种格式按行组流式写出，标签列为字典类型，Arrow 文件可 memory-map 读取"""
+    if pyarrow is None:
+        return
+    timestamps = 1700000000 + np.arange(50) * 15.0
+    series = [ColumnarSeries(tuple(sorted({"__name__": "cpu", "pod": f"p{i}", **({"ns": "prod"} if i % 2 else {})}.items())),
+                             timestamps, np.arange(50) + i * 100.0) for i in range(10)]
+    with tempfile.TemporaryDirectory() as root:
+        for fmt in ("parquet", "arrow"):
+            path = Path(root) / f"cpu.{fmt}"
+            with SeriesWriter(path, fmt, ["__name__", "ns", "pod"], row_group_size=120) as writer:
+                for item in series:
+                    writer.write(item)
+            result = writer.close()
+            assert result["rows"] == 500 and result["row_groups"] == 4
+
+            if fmt == "parquet":
+                table = pyarrow.parquet.read_table(path)
+                assert pyarrow.parquet.ParquetFile(path).num_row_groups == 4
+            else:
+                with pyarrow.memory_map(str(path)) as source:
+                    table = pyarrow.ipc.open_file(source).read_all()
+            assert pyarrow.types.is_dictionary(table.schema.field("pod").type)
+            assert table.column("ns").null_count == 250
+            rows = table.slice(449, 2).to_pylist()
+            assert [(row["pod"], row["value"]) for row in rows] == [("p8", 849.0), ("p9", 900.0)]
+            assert rows[1]["timestamp"].timestamp() == 1700000000
+
+        # 中途出现新标签：扩展为新列，Parquet 读回的字典按取值重新映射
+        path = Path(root) / "wide.parquet"
+        with SeriesWriter(path, "parquet", ["pod"], row_group_size=50) as writer:
+            writer.write(series[0])
+            writer.write(ColumnarSeries((("pod", "p1"), ("zone", "a")), timestamps, np.zeros(50)))
+            writer.write(series[2])
+        assert writer.close()["added_labels"] == ["__name__", "zone"]
+        table = pyarrow.parquet.read_table(path)
+        assert table.schema.names == ["__name__", "pod", "zone", "timestamp", "value"]
+        assert table.column("pod").to_pylist()[::50] == ["p0", "p1", "p2"]
+        assert table.column("zone").to_pylist()[::50] == [None, "a", None]
+        assert table.column("__name__").to_pylist()[::50] == ["cpu", None, "cpu"]
+
+        # 写出失败：删除临时文件，已有的目标文件保持不变
+        try:
+            with SeriesWriter(path, "parquet", ["pod"]) as writer:
+                writer.write(series[0])
+                raise RuntimeError("boom")
+        except RuntimeError:
+            pass
+        assert pyarrow.parquet.read_table(path).num_rows == 150
+        assert sorted(p.name for p in Path(root).iterdir()) == ["cpu.arrow", "cpu.parquet", "wide.parquet"]
+
+
+def test_prom_export_range_tool():
+    """按窗口分段查询并流式导出，首段之后出现的标签扩展为新列；查询失败时不留下文件"""
+    if pyarrow is None:
+        return
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        start, end = float(request.url.params["start"]), float(request.url.params["end"])
+        points = [[ts, str(ts % 1000)] for ts in np.arange(start, end + 1, 60)]
+        result = [{"metric": {"__name__": "up", "job": "api", "instance": f"i{i}"}, "values": points} for i in range(3)]
+        if start > 1700000000:
+            result[0]["metric"]["extra"] = "x"
+        if request.url.params["query"] == "broken" and start > 1700000000:
+            return httpx.Response(400, json={"status": "error", "errorType": "bad_data", "error": "boom"})
+        return httpx.Response(200, json={"status": "success", "data": {"resultType": "matrix", "result": result}})
+
+    fake = FakePrometheus(handler)
+    use_manager(fake.manager())
+    shared = prometheus_server.range_exporter
+    # 写出（含行组落盘）在线程池中执行，不阻塞事件循环
+    threads = set()
+    write = SeriesWriter.write
+
+    def recording_write(self, series):
+        threads.add(threading.get_ident())
+        write(self, series)
+
+    with tempfile.TemporaryDirectory() as root:
+        prometheus_server.range_exporter = RangeExporter(ExportConfig(directory=root, window=3600))
+        SeriesWriter.write = recording_write
+        try:
+            text = asyncio.run(prometheus_server.call_tool("prom_export_range", {
+                "name": "up-3h", "query": "up", "start": "1700000000", "end": "1700010740",
+                "step": "1m", "format": "arrow", "row_group_size": 100
+            }))[0].text
+            assert "3 段查询" in text and "行数：540" in text and "extra" in text
+            assert threads and threading.get_ident() not in threads
+            assert len(fake.requests) == 3
+
+            with pyarrow.memory_map(str(Path(root) / "up-3h.arrow")) as source:
+                reader = pyarrow.ipc.open_file(source)
+                table = reader.read_all()
+            assert table.num_rows == 540 and reader.num_record_batches == 5
+            assert table.schema.names == ["__name__", "extra", "instance", "job", "timestamp", "value"]
+            assert table.schema.metadata[b"query"] == b"up"
+            assert table.column("extra").null_count == 540 - 120
+            assert table.slice(180, 1).to_pylist()[0]["extra"] == "x"
+            assert prometheus_server.range_exporter.stats()["rows"] == 540
+
+            text = asyncio.run(prometheus_server.call_tool("prom_export_range", {
+                "name": "broken", "query": "broken", "start": "1700000000", "end": "1700010740", "step": "1m"
+            }))[0].text
+            assert "❌ 执行失败" in text
+            assert sorted(p.name for p in Path(root).iterdir()) == ["up-3h.arrow"]
+
+            text = asyncio.run(prometheus_server.call_tool("prom_export_range", {
+                "name": "../up", "query": "up", "start": "1700000000", "end": "1700000600", "step": "1m"
+            }))[0].text
+            assert "❌ 执行失败" in text and "无效的导出名称" in text
+        finally:
+            SeriesWriter.write = write
+            prometheus_server.range_exporter = shared
+
+def make_alert(name: str, state: str = "firing", value: str = "1", **labels) -> dict:
+    return {"labels": {"alertname": name, "severity": "critical", **labels},
+            "annotations": {"summary": f"{name} on {labels}"}, "state": state, "value": value}
+
+
+def test_change_feed_diffs_and_subscribers():
+    """只发布变化：新触发、pending → firing、注解变化、恢复；value 变化不算；慢订阅者丢弃最旧事件"""
+    state = {
+        "alerts": [make_alert("HighCPU", pod="a"), make_alert("HighMem", "pending", pod="b")],
+        "groups": [{"name": "node", "file": "node.yml", "rules": [
+            {"name": "HighCPU", "type": "alerting", "query": "cpu > 0.9", "health": "ok",
+             "evaluationTime": 0.01, "alerts": [make_alert("HighCPU", pod="a")]}]}],
+    }
+
+    async def fetch(endpoint: str) -> dict:
+        return {"alerts": state["alerts"]} if endpoint == "alerts" else {"groups": state["groups"]}
+
+    async def run():
+        feed = ChangeFeed(FeedConfig(queue_size=2), clock=FakeClock())
+        subscription = feed.subscribe()
+        first = await feed.poll_once(fetch)
+        assert [a["labels"]["pod"] for a in first.firing] == ["a"] and len(first.pending) == 1
+        assert len(first.rules_added) == 1 and "alerts" not in first.rules_added[0]
+
+        # 只有 value 和评估耗时变化：没有事件
+        state["alerts"][0] = make_alert("HighCPU", value="2", pod="a")
+        state["groups"][0]["rules"][0]["evaluationTime"] = 0.02
+        assert await feed.poll_once(fetch) is None
+
+        state["alerts"] = [make_alert("HighMem", pod="b"), make_alert("HighCPU", pod="c")]
+        state["groups"][0]["rules"][0]["health"] = "err"
+        second = await feed.poll_once(fetch)
+        assert sorted(a["labels"]["pod"] for a in second.firing) == ["b", "c"]
+        assert [a["labels"]["pod"] for a in second.resolved] == ["a"]
+        assert second.rules_changed[0]["fields"] == ["health"]
+
+        state["alerts"][1]["annotations"] = {"summary": "updated"}
+        third = await feed.poll_once(fetch)
+        assert third.changed[0]["fields"] == ["annotations"] and len(third) == 1
+
+        # 订阅队列上限 2：最旧的事件被丢弃
+        received = [await subscription.get(0.1), await subscription.get(0.1)]
+        assert [event.seq for event in received] == [2, 3] and subscription.dropped == 1
+        assert await subscription.get(0.01) is None
+
+        events, complete = feed.since(1)
+        assert [event.seq for event in events] == [2, 3] and complete
+        assert len(feed.snapshot()["alerts"]) == 2
+
+        await feed.stop()
+        assert [event async for event in subscription] == [] and feed.stats()["subscribers"] == 0
+
+    asyncio.run(run())
+    assert fingerprint({"a": "1", "b": "2"}) == fingerprint({"b": "2", "a": "1"}) != fingerprint({"a": "12"})
+
+
+def test_prom_alert_changes_tool():
+    """按需拉取，since 之后没有变化时不返回事件"""
+    alerts = [make_alert("HighCPU", pod="a")]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/alerts"):
+            data = {"alerts": alerts}
+        else:
+            data = {"groups": []}
+        return httpx.Response(200, json={"status": "success", "data": data})
+
+    use_manager(FakePrometheus(handler).manager())
+    shared = prometheus_server.change_feed
+    prometheus_server.change_feed = ChangeFeed(FeedConfig())
+    try:
+        text = asyncio.run(prometheus_server.call_tool("prom_alert_changes", {}))[0].text
+        assert "当前序号：1" in text and "🔥 触发：HighCPU [critical] pod=a" in text
+
+        alerts[:] = [make_alert("HighCPU", pod="b")]
+        text = asyncio.run(prometheus_server.call_tool("prom_alert_changes", {"since": 1}))[0].text
+        assert "事件数：1" in text and "✅ 恢复：HighCPU [critical] pod=a" in text and "pod=b" in text
+        assert "#1" not in text
+
+        text = asyncio.run(prometheus_server.call_tool("prom_alert_changes", {"since": 2}))[0].text
+        assert "事件数：0" in text
+    finally:
+        prometheus_server.change_feed = shared
+
+
+# ─────────────────────────────────────────────────────────
+# 运行入口
+# ─────────────────────────────────────────────────────────
+
+def run_all_tests() -> bool:
+    """运行所有测试"""
+    tests = [(name, fn) for name, fn in globals().items()
+             if name.startswith("test_") and callable(fn)]
+
+    print("=" * 60)
+    print("Prometheus MCP 测试")
+    print("=" * 60)
+
+    passed = 0
+    for name, fn in tests:
+        try:
+            fn()
+            print(f"✅ {name}")
+            passed += 1
+        except Exception as e:
+            print(f"❌ {name}: {e!r}")
+
+    print()
+    print(f"总测试数：{len(tests)}  ✅ 通过：{passed}  ❌ 失败：{len(tests) - passed}")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run_all_tests() else 1)